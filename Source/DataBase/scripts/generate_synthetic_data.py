@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Генератор синтетических данных для нагрузочного тестирования: гости с семьями (famili_prefer_forms),
+пожелания по еде и алкоголю, аллергии и вишлист. Объём задаётся множителем к текущему масштабу
+свадьбы (BASE_GUESTS гостей, BASE_WISHLIST предметов вишлиста):
+
+    python3 scripts/generate_synthetic_data.py --scale 10
+    python3 scripts/generate_synthetic_data.py --scale 100 --seed 7
+    python3 scripts/generate_synthetic_data.py --guests 5000 --wishlist 300
+    python3 scripts/generate_synthetic_data.py --clean      # только удалить синтетические данные
+
+Синтетические записи помечены префиксом SYNTHETIC_PREFIX в guest_id и wish_id, телефоны — из
+несуществующего диапазона +7000…: настоящие гости не затрагиваются. Перед генерацией прежний
+синтетический набор удаляется. При одинаковом --seed данные совпадают (кроме UUID строк пожеланий).
+Импорт guests.json (import_guests.py) удаляет гостей, которых нет в JSON, — в том числе синтетических.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+import uuid
+from dataclasses import dataclass, field
+
+import psycopg2
+from psycopg2.extras import execute_values, register_uuid
+
+from conf.settings import settings
+
+SYNTHETIC_PREFIX = "synthetic_"
+# Текущий масштаб: гостей и предметов вишлиста на свадьбе
+BASE_GUESTS = 150
+BASE_WISHLIST = 40
+BATCH_SIZE = 1000
+
+SEX_UUIDS = {
+    "male": uuid.UUID("550e8400-e29b-41d4-a716-446655440000"),
+    "female": uuid.UUID("550e8400-e29b-41d4-a716-446655440001"),
+}
+
+# Совпадают со словарями форм (Main_back/schemas/preferences.py)
+FOOD_CHOICES = ["Мясо", "Рыба", "Веган", "Нет предпочтений"]
+ALCOHOL_CHOICES = ["Вино красное", "Вино белое", "Шампанское", "Коньяк", "Водка", "Виски"]
+# allergen — от 3 до 12 символов (CHECK в init.sql)
+ALLERGENS = ["Орехи", "Арахис", "Молоко", "Лактоза", "Глютен", "Яйца", "Цитрусы", "Мёд", "Морепродукты", "Клубника", "Рыба", "Соя"]
+
+FIRST_NAMES = {
+    "male": ["Александр", "Дмитрий", "Максим", "Сергей", "Андрей", "Алексей", "Артём", "Илья", "Кирилл", "Михаил",
+             "Никита", "Матвей", "Роман", "Егор", "Иван", "Павел", "Владимир", "Денис", "Тимофей", "Олег"],
+    "female": ["Анна", "Мария", "Елена", "Ольга", "Наталья", "Екатерина", "Татьяна", "Ирина", "Светлана", "Юлия",
+               "Анастасия", "Дарья", "Полина", "Ксения", "Виктория", "Алина", "Вероника", "Софья", "Людмила", "Марина"],
+}
+# Мужская форма; женская — с окончанием «а» (Иванов → Иванова, Лебедев → Лебедева)
+LAST_NAMES = ["Иванов", "Смирнов", "Кузнецов", "Попов", "Васильев", "Петров", "Соколов", "Михайлов", "Новиков",
+              "Фёдоров", "Морозов", "Волков", "Алексеев", "Лебедев", "Семёнов", "Егоров", "Павлов", "Козлов",
+              "Степанов", "Николаев", "Орлов", "Андреев", "Макаров", "Никитин", "Захаров"]
+PATRONYMIC_ROOTS = ["Александров", "Дмитриев", "Сергеев", "Андреев", "Алексеев", "Михайлов", "Иванов",
+                    "Павлов", "Владимиров", "Николаев", "Викторов", "Юрьев", "Олегов", "Петров"]
+
+GIFTS = ["Кофемашина", "Набор бокалов", "Плед", "Сертификат в SPA", "Робот-пылесос", "Постельное бельё",
+         "Сковорода", "Настольная игра", "Фотоаппарат", "Блендер", "Книга рецептов", "Чайный сервиз",
+         "Ночник", "Увлажнитель воздуха", "Набор ножей", "Путешествие"]
+
+# Размер семьи → вес: в основном одиночки и пары, изредка семьи с детьми
+FAMILY_SIZES = {1: 35, 2: 35, 3: 15, 4: 10, 5: 5}
+
+
+@dataclass
+class Guest:
+    uuid: uuid.UUID
+    guest_id: str
+    last_name: str | None
+    first_name: str
+    patronomic: str | None
+    phone: str
+    sex: str
+    rsvp: bool | None
+    have_allergies: bool | None
+    friend: bool
+    famili_prefer_forms: list[uuid.UUID] = field(default_factory=list)
+
+
+@dataclass
+class Dataset:
+    guests: list[Guest]
+    food: list[tuple]
+    alcohol: list[tuple]
+    allergies: list[tuple]
+    wishlist: list[tuple]
+
+
+def _uuid(rng: random.Random) -> uuid.UUID:
+    return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+
+def _family_sizes(rng: random.Random, total: int) -> list[int]:
+    sizes = []
+    while total > 0:
+        size = min(total, rng.choices(list(FAMILY_SIZES), weights=list(FAMILY_SIZES.values()))[0])
+        sizes.append(size)
+        total -= size
+    return sizes
+
+
+def _person(rng: random.Random, number: int, sex: str, last_name: str, adult: bool) -> Guest:
+    female = sex == "female"
+    patronomic = rng.choice(PATRONYMIC_ROOTS) + ("на" if female else "ич")
+    rsvp = rng.choices([True, False, None], weights=[60, 15, 25])[0]
+    return Guest(
+        uuid=_uuid(rng),
+        guest_id=f"{SYNTHETIC_PREFIX}{number}",
+        last_name=last_name + ("а" if female else "") if rng.random() > 0.03 else None,
+        first_name=rng.choice(FIRST_NAMES[sex]),
+        patronomic=patronomic if adult and rng.random() > 0.1 else None,
+        phone=f"+7000{number:07d}",
+        sex=sex,
+        rsvp=rsvp,
+        have_allergies=rng.choices([True, False, None], weights=[10, 50, 40])[0] if rsvp is not None else None,
+        friend=rng.random() < 0.2,
+    )
+
+
+def generate_guests(rng: random.Random, count: int) -> list[Guest]:
+    """Гости по семьям. Первый в семье заполняет пожелания за всех, в паре — оба друг за друга,
+    в больших семьях второй взрослый — в половине случаев; дети — ни за кого."""
+    guests: list[Guest] = []
+    for size in _family_sizes(rng, count):
+        last_name = rng.choice(LAST_NAMES)
+        first_sex = rng.choice(("male", "female"))
+        family = [_person(rng, len(guests) + 1, first_sex, last_name, adult=True)]
+        for i in range(1, size):
+            # Второй — супруг(а), остальные — дети
+            sex = ("female" if first_sex == "male" else "male") if i == 1 else rng.choice(("male", "female"))
+            family.append(_person(rng, len(guests) + 1 + i, sex, last_name, adult=i == 1))
+        if size > 1:
+            family[0].famili_prefer_forms = [g.uuid for g in family[1:]]
+            if size == 2 or rng.random() < 0.5:
+                family[1].famili_prefer_forms = [g.uuid for g in family if g is not family[1]]
+        guests.extend(family)
+    return guests
+
+
+def generate_dataset(rng: random.Random, guest_count: int, wishlist_count: int) -> Dataset:
+    guests = generate_guests(rng, guest_count)
+    food, alcohol, allergies = [], [], []
+    for guest in guests:
+        # Ответившие «приду» заполняют пожелания чаще
+        answered = 0.9 if guest.rsvp else 0.3
+        if rng.random() < answered:
+            food.append((guest.uuid, rng.choice(FOOD_CHOICES)))
+        if rng.random() < answered * 0.85:
+            alcohol.append((guest.uuid, json.dumps(rng.sample(ALCOHOL_CHOICES, rng.randint(0, 3)), ensure_ascii=False)))
+        if guest.have_allergies:
+            allergies.extend((guest.uuid, allergen) for allergen in rng.sample(ALLERGENS, rng.randint(1, 3)))
+
+    attending = [g.uuid for g in guests if g.rsvp] or [g.uuid for g in guests]
+    wishlist = []
+    for n in range(1, wishlist_count + 1):
+        gift = rng.choice(GIFTS)
+        reserved = rng.random() < 0.4
+        wishlist.append((
+            f"{SYNTHETIC_PREFIX}{(n + 1) // 2}",
+            "bride" if n % 2 else "groom",
+            f"{gift} №{n}",
+            f"https://example.com/gifts/{n}" if rng.random() < 0.5 else None,
+            rng.random() < 0.05,
+            rng.choice(attending) if reserved and attending else None,
+        ))
+    return Dataset(guests, food, alcohol, allergies, wishlist)
+
+
+def get_db_connection():
+    """Подключение к БД по TCP (как в import_guests.py)."""
+    return psycopg2.connect(
+        host=settings.DB_HOST,
+        port=settings.DB_PORT,
+        user=settings.DB_USER,
+        password=settings.DB_PASSWORD,
+        database=settings.DB_NAME
+    )
+
+
+def delete_synthetic(cursor) -> tuple[int, int]:
+    """Удаляет синтетических гостей (пожелания и аллергии — каскадом) и предметы вишлиста."""
+    pattern = SYNTHETIC_PREFIX.replace("_", "\\_") + "%"
+    cursor.execute("DELETE FROM wishlist WHERE wish_id LIKE %s", (pattern,))
+    wishes = cursor.rowcount
+    cursor.execute("DELETE FROM guests WHERE guest_id LIKE %s", (pattern,))
+    return cursor.rowcount, wishes
+
+
+def insert_dataset(cursor, dataset: Dataset) -> None:
+    execute_values(
+        cursor,
+        """
+        INSERT INTO guests (uuid, guest_id, last_name, first_name, patronomic, phone, sex_uuid,
+                            rsvp, have_allergies, friend, famili_prefer_forms)
+        VALUES %s
+        """,
+        [
+            (g.uuid, g.guest_id, g.last_name, g.first_name, g.patronomic, g.phone, SEX_UUIDS[g.sex],
+             g.rsvp, g.have_allergies, g.friend, g.famili_prefer_forms)
+            for g in dataset.guests
+        ],
+        template="(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s::uuid[])",
+        page_size=BATCH_SIZE,
+    )
+    execute_values(
+        cursor, "INSERT INTO food_preferences (user_uuid, food_choice) VALUES %s", dataset.food, page_size=BATCH_SIZE
+    )
+    execute_values(
+        cursor, "INSERT INTO alcohol_preferences (user_uuid, alcohol_choice) VALUES %s", dataset.alcohol,
+        template="(%s, %s::jsonb)", page_size=BATCH_SIZE,
+    )
+    execute_values(
+        cursor, "INSERT INTO allergies (user_uuid, allergen) VALUES %s", dataset.allergies, page_size=BATCH_SIZE
+    )
+    execute_values(
+        cursor,
+        "INSERT INTO wishlist (wish_id, owner_type, item, link, is_donation, user_uuid) VALUES %s",
+        dataset.wishlist,
+        page_size=BATCH_SIZE,
+    )
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Синтетические гости, пожелания и вишлист для нагрузочных тестов")
+    parser.add_argument("--scale", type=float, default=10, help="Множитель к текущему масштабу (10, 100)")
+    parser.add_argument("--guests", type=int, help=f"Число гостей (по умолчанию {BASE_GUESTS} × scale)")
+    parser.add_argument("--wishlist", type=int, help=f"Число предметов вишлиста (по умолчанию {BASE_WISHLIST} × scale)")
+    parser.add_argument("--seed", type=int, default=42, help="Зерно генератора (одинаковое — одинаковые данные)")
+    parser.add_argument("--clean", action="store_true", help="Только удалить синтетические данные")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    guest_count = args.guests if args.guests is not None else round(BASE_GUESTS * args.scale)
+    wishlist_count = args.wishlist if args.wishlist is not None else round(BASE_WISHLIST * args.scale)
+
+    register_uuid()
+    try:
+        conn = get_db_connection()
+    except Exception as e:
+        print(f"❌ Ошибка подключения к БД: {e}")
+        return 1
+
+    started = time.perf_counter()
+    try:
+        with conn, conn.cursor() as cursor:
+            guests_deleted, wishes_deleted = delete_synthetic(cursor)
+            if guests_deleted or wishes_deleted:
+                print(f"🧹 Удалён прежний синтетический набор: {guests_deleted} гостей, {wishes_deleted} предметов вишлиста")
+            if args.clean:
+                return 0
+            dataset = generate_dataset(random.Random(args.seed), guest_count, wishlist_count)
+            families = sum(1 for g in dataset.guests if g.famili_prefer_forms)
+            print(
+                f"🔄 Гостей: {len(dataset.guests)} (заполняют за семью: {families}), еда: {len(dataset.food)}, "
+                f"алкоголь: {len(dataset.alcohol)}, аллергий: {len(dataset.allergies)}, вишлист: {len(dataset.wishlist)}"
+            )
+            insert_dataset(cursor, dataset)
+            cursor.execute("ANALYZE guests, food_preferences, alcohol_preferences, allergies, wishlist")
+    except Exception as e:
+        print(f"❌ Ошибка при генерации: {e}")
+        return 1
+    finally:
+        conn.close()
+
+    print(f"🎉 Синтетические данные загружены за {time.perf_counter() - started:.1f} с")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,37 @@
+"""
+Celery приложение файлового хранилища: обработка загрузок гостей вне процесса API.
+Отдельная очередь file_storage — воркер Notifications её не читает.
+
+    celery -A app.celery_app worker -Q file_storage --concurrency=2 --loglevel=info
+"""
+from celery import Celery
+
+from app.services import tracing
+from conf.settings import settings
+
+FILE_STORAGE_QUEUE = "file_storage"
+
+celery_app = Celery(
+    "wedding_file_storage",
+    broker=settings.celery_broker_url,
+    backend=settings.celery_result_backend_url,
+    include=["app.tasks.uploads"],
+)
+
+celery_app.conf.update(
+    task_serializer=settings.CELERY_TASK_SERIALIZER,
+    accept_content=settings.CELERY_ACCEPT_CONTENT,
+    result_serializer=settings.CELERY_RESULT_SERIALIZER,
+    timezone=settings.CELERY_TIMEZONE,
+    enable_utc=settings.CELERY_ENABLE_UTC,
+    task_track_started=settings.CELERY_TASK_TRACK_STARTED,
+    task_time_limit=settings.CELERY_TASK_TIME_LIMIT,
+    task_soft_time_limit=settings.CELERY_TASK_SOFT_TIME_LIMIT,
+    task_default_queue=FILE_STORAGE_QUEUE,
+    # Задачи тяжёлые (хеш, декодирование, превью): не набирать лишнего, подтверждать после выполнения
+    worker_prefetch_multiplier=1,
+    task_acks_late=True,
+)
+
+# Трассировка: traceparent в заголовках задач (публикация из API), спан задачи в воркере
+tracing.install_celery("file_storage_worker")
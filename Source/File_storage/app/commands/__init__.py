@@ -0,0 +1 @@
+# Commands (python -m app.commands.<name>)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк отдачи видео через /stream: случайные Range-запросы (перемотка) и полная загрузка.
+
+    python -m app.commands.bench_stream
+    python -m app.commands.bench_stream --url http://127.0.0.1:8001 --path wedding_day_video/wedding_video.mp4 \\
+        --requests 200 --concurrency 16 --range-size 2097152
+
+Токен подписывается тем же SECRET_KEY, что и у Main_back.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+import httpx
+import jwt
+
+from conf.settings import settings
+
+from app.models.enums import GalleryVideo
+
+
+def _media_token() -> str:
+    payload = {"type": "media", "exp": datetime.utcnow() + timedelta(hours=1)}
+    return jwt.encode(payload, settings.SECRET_KEY, algorithm=settings.SECRET_ALGORITHM)
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Бенчмарк /stream с Range")
+    parser.add_argument("--url", default="http://127.0.0.1:8001", help="Базовый URL файлового хранилища")
+    parser.add_argument("--path", default=f"wedding_day_video/{GalleryVideo.wedding_video.value}")
+    parser.add_argument("--requests", type=int, default=200, help="Число Range-запросов")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--range-size", type=int, default=2 * 1024 * 1024, help="Размер фрагмента, байт")
+    parser.add_argument("--skip-full", action="store_true", help="Не замерять полную загрузку файла")
+    return parser.parse_args(argv)
+
+
+async def _run(args: argparse.Namespace) -> int:
+    params = {"path": args.path, "token": _media_token()}
+    async with httpx.AsyncClient(base_url=args.url, timeout=120.0) as client:
+        head = await client.get("/stream", params=params, headers={"Range": "bytes=0-0"})
+        if head.status_code != 206:
+            print(f"❌ Ожидался 206, получен {head.status_code}: {head.text[:200]}")
+            return 1
+        size = int(head.headers["content-range"].rsplit("/", 1)[1])
+        print(f"🎬 {args.path}: {size / 1024 / 1024:.1f} МБ")
+
+        semaphore = asyncio.Semaphore(args.concurrency)
+        latencies: list[float] = []
+        received = 0
+
+        async def one_range() -> None:
+            nonlocal received
+            start = random.randrange(0, max(1, size - args.range_size))
+            end = min(size - 1, start + args.range_size - 1)
+            async with semaphore:
+                t0 = time.perf_counter()
+                r = await client.get("/stream", params=params, headers={"Range": f"bytes={start}-{end}"})
+                latencies.append(time.perf_counter() - t0)
+                received += len(r.content)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one_range() for _ in range(args.requests)))
+        elapsed = time.perf_counter() - started
+        latencies.sort()
+        p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+        print(
+            f"📈 Range: {args.requests} запросов × {args.range_size // 1024} КБ, параллельно {args.concurrency}: "
+            f"{received / elapsed / 1024 / 1024:.1f} МБ/с, p50 {statistics.median(latencies) * 1000:.1f} мс, "
+            f"p95 {p95 * 1000:.1f} мс"
+        )
+
+        if not args.skip_full:
+            started = time.perf_counter()
+            total = 0
+            async with client.stream("GET", "/stream", params=params) as r:
+                async for chunk in r.aiter_raw():
+                    total += len(chunk)
+            elapsed = time.perf_counter() - started
+            print(f"📈 Полная загрузка: {total / elapsed / 1024 / 1024:.1f} МБ/с за {elapsed:.2f} с")
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    return asyncio.run(_run(parse_args(argv)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Поиск почти одинаковых фото по dHash и отчёт (то же делает фоновая задача File_storage):
+
+    python -m app.commands.find_duplicates
+    python -m app.commands.find_duplicates --folders wedding_day_all_photos --max-distance 8
+    python -m app.commands.find_duplicates --show 20
+
+Недостающие метаданные (с dHash) извлекаются перед поиском. Отчёт пишется в
+data/.cache/duplicates/<папка>.json — по нему запущенный сервер скрывает дубликаты после перезапуска,
+а архив фото собирается без них.
+"""
+import argparse
+import sys
+import time
+
+from conf.settings import settings
+
+from app.models.enums import DataFolder
+from app.services.duplicates import DuplicateIndex
+from app.services.file_index import FileIndex
+from app.services.image_meta import ImageMetaIndex
+
+# Папки без изображений
+NON_IMAGE_FOLDERS = {DataFolder.wedding_day_video, DataFolder.zip}
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Поиск почти одинаковых фото")
+    parser.add_argument(
+        "--folders",
+        nargs="+",
+        choices=[f.value for f in DataFolder if f not in NON_IMAGE_FOLDERS],
+        default=[f.value for f in DataFolder if f not in NON_IMAGE_FOLDERS],
+        help="Папки с изображениями (по умолчанию все)",
+    )
+    parser.add_argument(
+        "--max-distance",
+        type=int,
+        default=settings.file_storage_duplicate_max_distance,
+        help="Порог: различающихся бит dHash из 64 (по умолчанию FILE_STORAGE_DUPLICATE_MAX_DISTANCE)",
+    )
+    parser.add_argument("--show", type=int, default=10, help="Сколько групп вывести по каждой папке")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    root = settings.file_storage_data_root
+    index = FileIndex()
+    index.build(root)
+    meta_index = ImageMetaIndex(workers=settings.file_storage_meta_workers)
+    meta_index.load(root)
+    duplicates = DuplicateIndex(max_distance=args.max_distance)
+    duplicates.load(root)
+
+    for folder_name in args.folders:
+        folder = DataFolder(folder_name)
+        snapshot = index.folder(folder)
+        started = time.perf_counter()
+        extracted = meta_index.update_folder(snapshot)
+        if extracted:
+            print(f"🖼  {folder_name}: метаданные извлечены для {extracted} файлов за {time.perf_counter() - started:.1f} с")
+        started = time.perf_counter()
+        report = duplicates.update_folder(snapshot, meta_index) or duplicates.report(folder)
+        if report is None:
+            print(f"ℹ️  {folder_name}: изображений нет")
+            continue
+        print(
+            f"✅ {folder_name}: фото с хешем {report.hashed}, групп {len(report.groups)}, "
+            f"дубликатов {report.duplicate_files} ({report.duplicate_bytes / 1024 / 1024:.1f} МБ), "
+            f"поиск {time.perf_counter() - started:.2f} с"
+        )
+        for group in report.groups[:max(0, args.show)]:
+            print(f"   {group.keep}")
+            for dup in group.duplicates:
+                print(f"     ≈ {dup.path} (расстояние {dup.distance})")
+        if len(report.groups) > args.show:
+            print(f"   … ещё групп: {len(report.groups) - args.show}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
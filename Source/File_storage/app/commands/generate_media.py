@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Синтетические фото и видео для нагрузочного тестирования галереи, превью, архивов и /stream.
+Объём — множитель к текущему масштабу (BASE_PHOTOS фото, BASE_VIDEOS видео):
+
+    python -m app.commands.generate_media --scale 10
+    python -m app.commands.generate_media --scale 100 --jobs 16 --photo-size 4000x2667
+    python -m app.commands.generate_media --photos 500 --videos 0
+    python -m app.commands.generate_media --clean      # удалить синтетические файлы
+
+Файлы пишутся в подпапки synthetic/ папок wedding_day_all_photos и wedding_day_video и подхватываются
+индексом при следующем пересканировании. Фото — JPEG с EXIF DateTimeOriginal: серии кадров с паузами
+между моментами дня, часть кадров — почти дубликаты предыдущего (серийная съёмка). Видео — тестовая
+картинка со звуком через ffmpeg (без ffmpeg видео пропускаются). Уже созданные файлы не перезаписываются
+(прерванный прогон можно продолжить; при смене параметров — сначала --clean); при одинаковом --seed
+набор совпадает.
+"""
+import argparse
+import asyncio
+import functools
+import os
+import random
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from PIL import Image, ImageDraw, ImageEnhance
+
+from conf.settings import settings
+
+from app.models.enums import DataFolder
+from app.services.ffmpeg import FFMPEG_BIN, FfmpegError, run_ffmpeg
+
+SYNTHETIC_DIR = "synthetic"
+# Текущий масштаб: фото и видео одной свадьбы
+BASE_PHOTOS = 300
+BASE_VIDEOS = 2
+
+_EXIF_IFD = 0x8769
+_DATETIME_ORIGINAL_TAG = 0x9003
+_MAKE_TAG = 0x010F
+_MODEL_TAG = 0x0110
+_NOISE_MARGIN = 64
+
+
+def _size(value: str) -> tuple[int, int]:
+    try:
+        width, height = (int(part) for part in value.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"ожидается ШИРИНАxВЫСОТА, получено {value!r}")
+    if width < 16 or height < 16:
+        raise argparse.ArgumentTypeError("размер меньше 16 пикселей")
+    return width, height
+
+
+@functools.lru_cache(maxsize=4)
+def _noise(width: int, height: int) -> Image.Image:
+    # Генерация шума дороже остального рендера: один кадр шума на процесс, у каждого фото — свой сдвиг
+    return Image.effect_noise((width + _NOISE_MARGIN, height + _NOISE_MARGIN), 48).convert("RGB")
+
+
+def render_photo(dest: str, scene: int, variant: int, width: int, height: int, taken_at: str, quality: int) -> int:
+    """JPEG-«фото»: размытая цветная сцена с фигурами и шумом сенсора. Кадры с одной scene и разным
+    variant — почти одинаковые (яркость и кадрирование чуть отличаются). Возвращает размер файла."""
+    rng = random.Random(scene)
+    scene_image = Image.new("RGB", (8, 6))
+    scene_image.putdata([tuple(rng.randrange(256) for _ in range(3)) for _ in range(8 * 6)])
+    image = scene_image.resize((width, height), Image.BICUBIC)
+    draw = ImageDraw.Draw(image)
+    for _ in range(rng.randint(3, 8)):
+        x, y = rng.randrange(width), rng.randrange(height)
+        r = rng.randint(min(width, height) // 20, min(width, height) // 4)
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=tuple(rng.randrange(256) for _ in range(3)))
+    if variant:
+        vrng = random.Random(scene * 1000 + variant)
+        image = ImageEnhance.Brightness(image).enhance(1 + vrng.uniform(-0.05, 0.05))
+        dx, dy = vrng.randint(0, max(1, width // 100)), vrng.randint(0, max(1, height // 100))
+        image = image.crop((dx, dy, width - dx, height - dy)).resize((width, height), Image.BILINEAR)
+    # Шум сенсора: без него JPEG однотонных областей в разы меньше настоящих фото
+    dx, dy = rng.randrange(_NOISE_MARGIN), rng.randrange(_NOISE_MARGIN)
+    image = Image.blend(image, _noise(width, height).crop((dx, dy, dx + width, dy + height)), 0.12)
+
+    exif = Image.Exif()
+    exif[_MAKE_TAG] = "Synthetic"
+    exif[_MODEL_TAG] = "Generator"
+    exif[_EXIF_IFD] = {_DATETIME_ORIGINAL_TAG: taken_at}
+    tmp = f"{dest}.tmp"
+    image.save(tmp, "JPEG", quality=quality, exif=exif)
+    os.replace(tmp, dest)
+    return os.path.getsize(dest)
+
+
+def plan_photos(rng: random.Random, count: int, start: datetime, duplicate_ratio: float):
+    """(номер, сцена, вариант, портретный ли, время съёмки): серии кадров по 3–40 с, между моментами —
+    паузы 10–40 мин; с вероятностью duplicate_ratio кадр повторяет сцену предыдущего через секунду."""
+    taken = start
+    scene, variant, portrait = 0, 0, False
+    for number in range(1, count + 1):
+        if number > 1 and rng.random() < duplicate_ratio:
+            variant += 1
+            taken += timedelta(seconds=1)
+        else:
+            scene, variant = rng.getrandbits(48), 0
+            portrait = rng.random() < 0.25
+            gap = rng.uniform(600, 2400) if rng.random() < 0.04 else rng.uniform(3, 40)
+            taken += timedelta(seconds=gap)
+        yield number, scene, variant, portrait, taken
+
+
+def generate_photos(args: argparse.Namespace, photos_dir: Path) -> tuple[int, int]:
+    """Возвращает (создано файлов, байт)."""
+    photos_dir.mkdir(parents=True, exist_ok=True)
+    width, height = args.photo_size
+    jobs = []
+    for number, scene, variant, portrait, taken in plan_photos(
+        random.Random(args.seed), args.photos, args.start, args.duplicate_ratio
+    ):
+        dest = photos_dir / f"IMG_{number:06d}.jpg"
+        if dest.exists():
+            continue
+        w, h = (height, width) if portrait else (width, height)
+        jobs.append((str(dest), scene, variant, w, h, taken.strftime("%Y:%m:%d %H:%M:%S"), args.quality))
+
+    created = total_bytes = 0
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        for size in pool.map(render_photo, *zip(*jobs), chunksize=16) if jobs else ():
+            created += 1
+            total_bytes += size
+            if created % 500 == 0:
+                print(f"📷 {created}/{len(jobs)}")
+    return created, total_bytes
+
+
+async def generate_videos(args: argparse.Namespace, videos_dir: Path) -> tuple[int, int, int]:
+    """Возвращает (создано, байт, ошибок). Кодирование параллельно, не больше --jobs ffmpeg сразу."""
+    videos_dir.mkdir(parents=True, exist_ok=True)
+    width, height = args.video_size
+    rng = random.Random(args.seed)
+    semaphore = asyncio.Semaphore(args.jobs)
+    created = total_bytes = failed = 0
+
+    async def one(number: int, taken: datetime, frequency: int) -> None:
+        nonlocal created, total_bytes, failed
+        dest = videos_dir / f"VID_{number:04d}.mp4"
+        if dest.exists():
+            return
+        # Недописанный файл не должен попасть в индекс как видео: расширение .tmp, формат — явно
+        tmp = dest.with_name(f"{dest.name}.tmp")
+        seconds = args.video_seconds
+        async with semaphore:
+            try:
+                await run_ffmpeg([
+                    "-f", "lavfi", "-i", f"testsrc2=size={width}x{height}:rate=30:duration={seconds}",
+                    "-f", "lavfi", "-i", f"sine=frequency={frequency}:duration={seconds}",
+                    "-c:v", "libx264", "-preset", "veryfast", "-b:v", args.video_bitrate, "-pix_fmt", "yuv420p",
+                    "-c:a", "aac", "-b:a", "128k", "-shortest", "-movflags", "+faststart",
+                    "-metadata", f"creation_time={taken.isoformat()}",
+                    "-f", "mp4", str(tmp),
+                ])
+            except FfmpegError as e:
+                failed += 1
+                tmp.unlink(missing_ok=True)
+                print(f"❌ {dest.name}: {e}")
+                return
+        os.replace(tmp, dest)
+        created += 1
+        total_bytes += dest.stat().st_size
+
+    schedule = [
+        (number, args.start + timedelta(minutes=rng.uniform(0, 12 * 60)), rng.randint(220, 880))
+        for number in range(1, args.videos + 1)
+    ]
+    await asyncio.gather(*(one(*item) for item in schedule))
+    return created, total_bytes, failed
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Синтетические фото и видео для нагрузочных тестов")
+    parser.add_argument("--scale", type=float, default=10, help="Множитель к текущему масштабу (10, 100)")
+    parser.add_argument("--photos", type=int, help=f"Число фото (по умолчанию {BASE_PHOTOS} × scale)")
+    parser.add_argument("--videos", type=int, help=f"Число видео (по умолчанию {BASE_VIDEOS} × scale)")
+    parser.add_argument("--photo-size", type=_size, default=(2048, 1365), help="Размер фото (по умолчанию 2048x1365)")
+    parser.add_argument("--quality", type=int, default=88, help="Качество JPEG")
+    parser.add_argument(
+        "--duplicate-ratio", type=float, default=0.05, help="Доля почти дубликатов (повтор предыдущего кадра)"
+    )
+    parser.add_argument("--video-size", type=_size, default=(1280, 720), help="Размер видео (по умолчанию 1280x720)")
+    parser.add_argument("--video-seconds", type=int, default=30, help="Длительность видео, с")
+    parser.add_argument("--video-bitrate", default="4M", help="Битрейт видео для ffmpeg (по умолчанию 4M)")
+    parser.add_argument(
+        "--start", type=datetime.fromisoformat, default=datetime(2025, 8, 16, 11, 0),
+        help="Время съёмки первого кадра (ISO, по умолчанию 2025-08-16T11:00)",
+    )
+    parser.add_argument("--seed", type=int, default=42, help="Зерно генератора (одинаковое — одинаковые файлы)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Число процессов (по умолчанию все ядра)")
+    parser.add_argument("--clean", action="store_true", help="Только удалить синтетические файлы")
+    args = parser.parse_args(argv)
+    if args.photos is None:
+        args.photos = round(BASE_PHOTOS * args.scale)
+    if args.videos is None:
+        args.videos = round(BASE_VIDEOS * args.scale)
+    return args
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    root = settings.file_storage_data_root
+    photos_dir = root / DataFolder.wedding_day_all_photos.value / SYNTHETIC_DIR
+    videos_dir = root / DataFolder.wedding_day_video.value / SYNTHETIC_DIR
+
+    if args.clean:
+        for directory in (photos_dir, videos_dir):
+            if directory.is_dir():
+                shutil.rmtree(directory)
+                print(f"🧹 Удалено: {directory}")
+        return 0
+
+    failed = 0
+    if args.photos > 0:
+        started = time.perf_counter()
+        created, total_bytes = generate_photos(args, photos_dir)
+        print(
+            f"✅ Фото: создано {created} ({total_bytes / 1024 / 1024:.1f} МБ) из {args.photos} "
+            f"за {time.perf_counter() - started:.1f} с → {photos_dir}"
+        )
+    if args.videos > 0 and shutil.which(FFMPEG_BIN) is None:
+        print(f"⚠️  {FFMPEG_BIN} не найден — видео пропущены (env FILE_STORAGE_FFMPEG)")
+    elif args.videos > 0:
+        started = time.perf_counter()
+        created, total_bytes, failed = asyncio.run(generate_videos(args, videos_dir))
+        print(
+            f"✅ Видео: создано {created} ({total_bytes / 1024 / 1024:.1f} МБ) из {args.videos} "
+            f"за {time.perf_counter() - started:.1f} с → {videos_dir}"
+        )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
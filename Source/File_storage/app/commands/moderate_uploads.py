@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Модерация загрузок гостей (FILE_STORAGE_UPLOAD_MODERATION): до одобрения фото не видно в галерее.
+
+    python -m app.commands.moderate_uploads                       # список ожидающих
+    python -m app.commands.moderate_uploads --approve <id> [<id> ...]
+    python -m app.commands.moderate_uploads --reject <id> [<id> ...]
+    python -m app.commands.moderate_uploads --approve-all
+
+Файлы на проверку лежат в data/.uploads/moderation/<id>.<расширение>.
+"""
+import argparse
+import sys
+import time
+
+from conf.settings import settings
+
+from app.services.storage_service import StorageError
+from app.services.upload_processing import approve_upload, reject_upload
+from app.services.uploads import STATUS_PENDING_REVIEW, upload_store
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Модерация загрузок гостей")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--approve", nargs="+", metavar="ID", help="Показать в галерее")
+    group.add_argument("--reject", nargs="+", metavar="ID", help="Отклонить (файл удаляется)")
+    group.add_argument("--approve-all", action="store_true", help="Показать все ожидающие")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    pending = upload_store.ids_with_status(STATUS_PENDING_REVIEW)
+
+    if not (args.approve or args.reject or args.approve_all):
+        print(f"🕵️  Ожидают модерации: {len(pending)}")
+        for upload_id in pending:
+            state = upload_store.load_state(upload_id)
+            created = time.strftime("%Y-%m-%d %H:%M", time.localtime(state["created"]))
+            print(f"  {upload_id}  {created}  гость {state.get('guest')}  {state['filename']}  "
+                  f"→ {upload_store.review_path(state)}")
+        return 0
+
+    failed = 0
+    for upload_id in (pending if args.approve_all else args.approve or args.reject):
+        try:
+            if args.reject:
+                state = reject_upload(upload_store, upload_id)
+            else:
+                state = approve_upload(upload_store, settings.file_storage_data_root, upload_id)
+        except (StorageError, OSError) as e:
+            failed += 1
+            print(f"❌ {upload_id}: {getattr(e, 'message', e)}")
+            continue
+        print(f"✅ {upload_id}: {state['status']} {state.get('result_path') or ''}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+HLS-упаковка видео из wedding_day_video заранее (иначе она запускается при первом запросе /hls):
+
+    python -m app.commands.package_hls
+    python -m app.commands.package_hls --force
+
+Нужен локальный ffmpeg (env FILE_STORAGE_FFMPEG / FILE_STORAGE_FFPROBE). Актуальные упаковки пропускаются.
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from conf.settings import settings
+
+from app.models.enums import DataFolder
+from app.services.ffmpeg import VIDEO_EXTENSIONS, FfmpegError
+from app.services.file_index import FileIndex
+from app.services.hls import hls_dir, is_packaged, package_hls
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="HLS-упаковка видео галереи")
+    parser.add_argument("--force", action="store_true", help="Упаковать заново даже актуальные")
+    return parser.parse_args(argv)
+
+
+async def run(args: argparse.Namespace) -> int:
+    root = settings.file_storage_data_root
+    index = FileIndex()
+    index.build(root)
+    videos = [
+        e for e in index.folder(DataFolder.wedding_day_video).entries.values()
+        if e.path.suffix.lower() in VIDEO_EXTENSIONS
+    ]
+    if not videos:
+        print("ℹ️  В wedding_day_video нет видео")
+        return 0
+
+    failed = 0
+    for entry in videos:
+        out_dir = hls_dir(root, entry.relative_path)
+        if not args.force and is_packaged(out_dir, entry):
+            print(f"✅ {entry.relative_path}: упаковка актуальна")
+            continue
+        started = time.perf_counter()
+        try:
+            renditions = await package_hls(entry, out_dir)
+        except FfmpegError as e:
+            failed += 1
+            print(f"❌ {entry.relative_path}: {e}")
+            continue
+        elapsed = time.perf_counter() - started
+        print(f"✅ {entry.relative_path}: {', '.join(renditions)} за {elapsed:.1f} с")
+    return 1 if failed else 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    return asyncio.run(run(parse_args(argv)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Массовая генерация превью для папок с изображениями (запускать после заливки фото):
+
+    python -m app.commands.pregenerate_thumbs
+    python -m app.commands.pregenerate_thumbs --folders wedding_day_all_photos --widths 480 960 --jobs 8
+    python -m app.commands.pregenerate_thumbs --formats jpeg webp
+
+Рендер идёт параллельно на всех ядрах, запись превью атомарная.
+Превью, которые новее исходника (по mtime), пропускаются.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from conf.settings import settings
+
+from app.models.enums import DataFolder
+from app.services.file_index import FileIndex
+from app.services.storage_service import IMAGE_EXTENSIONS, snap_thumb_width
+from app.services.thumbnails import THUMB_FORMATS, render_thumbnail, supported_thumb_formats, thumbnail_cache_path
+
+# Папки без изображений
+NON_IMAGE_FOLDERS = {DataFolder.wedding_day_video, DataFolder.zip}
+
+
+def _render_job(source: str, dest: str, width: int, fmt: str, size: int) -> int:
+    render_thumbnail(source, dest, width, fmt)
+    return size
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Генерация превью для галереи")
+    parser.add_argument(
+        "--folders",
+        nargs="+",
+        choices=[f.value for f in DataFolder if f not in NON_IMAGE_FOLDERS],
+        default=[f.value for f in DataFolder if f not in NON_IMAGE_FOLDERS],
+        help="Папки с изображениями (по умолчанию все)",
+    )
+    parser.add_argument(
+        "--widths",
+        nargs="+",
+        type=int,
+        default=list(settings.file_storage_thumb_widths),
+        help="Ширины превью (по умолчанию FILE_STORAGE_THUMB_WIDTHS)",
+    )
+    parser.add_argument(
+        "--formats",
+        nargs="+",
+        choices=list(THUMB_FORMATS),
+        default=None,
+        help="Форматы превью (по умолчанию все, что поддерживает Pillow)",
+    )
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Число процессов (по умолчанию все ядра)")
+    parser.add_argument("--force", action="store_true", help="Перерисовать даже актуальные превью")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    root = settings.file_storage_data_root
+    index = FileIndex()
+    index.build(root)
+
+    supported = supported_thumb_formats()
+    formats = [f for f in (args.formats or supported) if f in supported]
+    if not formats:
+        print("❌ Pillow не поддерживает ни один из запрошенных форматов")
+        return 1
+
+    # Рендерим только разрешённые ширины — остальные сервер всё равно не отдаст
+    widths = sorted({snap_thumb_width(w) for w in args.widths})
+
+    jobs: list[tuple[str, str, int, str, int]] = []
+    skipped = 0
+    for folder_name in args.folders:
+        for entry in index.folder(DataFolder(folder_name)).entries.values():
+            if entry.path.suffix.lower() not in IMAGE_EXTENSIONS:
+                continue
+            for width in widths:
+                for fmt in formats:
+                    dest = thumbnail_cache_path(root, entry.relative_path, width, fmt)
+                    if not args.force:
+                        try:
+                            if dest.stat().st_mtime >= entry.mtime:
+                                skipped += 1
+                                continue
+                        except OSError:
+                            pass
+                    jobs.append((str(entry.path), str(dest), width, fmt, entry.size))
+
+    print(f"🖼  Форматы: {', '.join(formats)}. Превью к генерации: {len(jobs)}, актуальных (пропущено): {skipped}")
+    if not jobs:
+        return 0
+
+    rendered = 0
+    failed = 0
+    source_bytes = 0
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        futures = {pool.submit(_render_job, *job): job for job in jobs}
+        for future in as_completed(futures):
+            try:
+                source_bytes += future.result()
+                rendered += 1
+            except Exception as e:
+                failed += 1
+                print(f"⚠️  {futures[future][0]}: {e}")
+            done = rendered + failed
+            if done % 100 == 0:
+                print(f"   … {done}/{len(jobs)}")
+    elapsed = time.perf_counter() - started
+
+    print(f"✅ Сгенерировано: {rendered}, ошибок: {failed}, время: {elapsed:.1f} с")
+    if elapsed > 0:
+        print(f"📈 {rendered / elapsed:.1f} превью/с, {source_bytes / elapsed / 1024 / 1024:.1f} МБ/с исходников, процессов: {args.jobs}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Обработка принятых загрузок гостей без Celery (или повтор, если очередь была недоступна):
+
+    python -m app.commands.process_uploads
+    python -m app.commands.process_uploads --enqueue   # только поставить в очередь Celery
+
+Обрабатываются загрузки в статусе queued/processing; уже обработанные пропускаются.
+"""
+import argparse
+import sys
+import time
+
+from conf.settings import settings
+
+from app.services.upload_processing import process_upload
+from app.services.uploads import STATUS_DONE, STATUS_DUPLICATE, STATUS_PENDING_REVIEW, upload_store
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Обработка загрузок гостей")
+    parser.add_argument("--enqueue", action="store_true", help="Поставить в очередь Celery вместо обработки здесь")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    pending = upload_store.pending_ids()
+    print(f"📥 Загрузок к обработке: {len(pending)}")
+    if not pending:
+        return 0
+
+    if args.enqueue:
+        from app.tasks.uploads import process_guest_upload
+
+        for upload_id in pending:
+            process_guest_upload.delay(upload_id)
+        print(f"✅ Поставлено в очередь: {len(pending)}")
+        return 0
+
+    failed = 0
+    started = time.perf_counter()
+    for upload_id in pending:
+        try:
+            state = process_upload(upload_store, settings.file_storage_data_root, upload_id)
+        except Exception as e:
+            # Статус failed уже сохранён; остальные загрузки обрабатываем дальше
+            failed += 1
+            print(f"❌ {upload_id}: {getattr(e, 'message', e)}")
+            continue
+        if state["status"] in (STATUS_DONE, STATUS_DUPLICATE):
+            print(f"✅ {upload_id}: {state['status']} → {state['result_path']}")
+        elif state["status"] == STATUS_PENDING_REVIEW:
+            print(f"🕵️  {upload_id}: ждёт модерации (python -m app.commands.moderate_uploads)")
+        else:
+            failed += 1
+            print(f"❌ {upload_id}: {state['status']} {state.get('error') or ''}")
+    print(f"⏱  {time.perf_counter() - started:.1f} с")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
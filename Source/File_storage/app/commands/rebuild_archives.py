@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Пересборка готовых архивов data/zip/ из исходных папок (то же делает фоновая задача File_storage):
+
+    python -m app.commands.rebuild_archives
+    python -m app.commands.rebuild_archives --types wedding_day_all_photos --jobs 8
+    python -m app.commands.rebuild_archives --full
+
+Если в папку только добавились файлы — они дописываются в конец архива, иначе архив собирается заново.
+Запись во временный файл с атомарной заменой: скачивание текущего архива не прерывается.
+Дубликаты фото — по последнему отчёту поиска (data/.cache/duplicates/), если FILE_STORAGE_ARCHIVE_SKIP_DUPLICATES.
+"""
+import argparse
+import os
+import sys
+
+from conf.settings import settings
+
+from app.models.enums import ArchiveType
+from app.services.archive_builder import ARCHIVE_SOURCES, ArchiveBuilder, ArchiveSourceChanged
+from app.services.file_index import FileIndex
+from app.services.storage_service import duplicate_index
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Пересборка архивов галереи")
+    parser.add_argument(
+        "--types",
+        nargs="+",
+        choices=[t.value for t in ARCHIVE_SOURCES],
+        default=[t.value for t in ARCHIVE_SOURCES],
+        help="Архивы (по умолчанию все)",
+    )
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Потоков для CRC (по умолчанию все ядра)")
+    parser.add_argument("--full", action="store_true", help="Собрать заново, даже если можно дописать")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    root = settings.file_storage_data_root
+    index = FileIndex()
+    index.build(root)
+    duplicates = None
+    if settings.file_storage_archive_skip_duplicates:
+        duplicate_index.load(root)
+        duplicates = duplicate_index
+    builder = ArchiveBuilder(crc_workers=args.jobs, duplicates=duplicates)
+
+    failed = 0
+    for type_name in args.types:
+        archive_type = ArchiveType(type_name)
+        try:
+            result = builder.rebuild(index, root, archive_type, full=args.full)
+        except ArchiveSourceChanged as e:
+            failed += 1
+            print(f"⚠️  {type_name}: исходный файл меняется ({e}), повторите позже")
+            continue
+        if result.mode == "empty":
+            print(f"ℹ️  {type_name}: исходная папка пуста, архив не тронут")
+            continue
+        if result.mode == "unchanged":
+            print(f"✅ {type_name}: актуален ({result.members} файлов)")
+            continue
+        speed = result.bytes_written / result.seconds / 1024 / 1024 if result.seconds > 0 else 0.0
+        print(
+            f"✅ {type_name}: {'дописано' if result.mode == 'append' else 'собран заново'}, "
+            f"файлов {result.members} (+{result.added}), записано {result.bytes_written / 1024 / 1024:.1f} МБ "
+            f"за {result.seconds:.1f} с ({speed:.1f} МБ/с)"
+        )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,10 @@
 """
 Проверка медиа-токена (JWT type=media), подписанного тем же SECRET_KEY, что и Main_back.
 """
+import hmac
+
 import jwt
-from fastapi import HTTPException, Query, status
+from fastapi import Header, HTTPException, Query, status
 
 # Конфиг из общего conf (при монтировании в Docker)
 try:
@@ -49,3 +51,30 @@ def verify_media_token(token: str = Query(..., alias="token")) -> dict:
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Недействительный токен",
         )
+
+
+def verify_upload_token(token: str = Query(..., alias="token")) -> dict:
+    """Медиа-токен с scope=upload и UUID гостя в claim guest (выдаёт Main_back авторизованному гостю).
+    Обычный токен просмотра загрузку не разрешает."""
+    payload = verify_media_token(token)
+    if payload.get("scope") != "upload" or not payload.get("guest"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Токен не разрешает загрузку",
+        )
+    return payload
+
+
+def verify_metrics_token(authorization: str | None = Header(None)) -> None:
+    """Bearer-токен /metrics (FILE_STORAGE_METRICS_TOKEN). Без токена эндпоинт выключен (404):
+    /media/ доступен из интернета."""
+    expected = getattr(settings, "file_storage_metrics_token", "")
+    if not expected:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.strip(), expected):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Недействительный токен метрик",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
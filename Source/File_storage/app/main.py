@@ -1,12 +1,31 @@
 """
-Файловое хранилище: отдача файлов по медиа-токену, поддержка Range для видео.
+Файловое хранилище: отдача файлов по медиа-токену, поддержка Range для видео, загрузка фото гостей (tus).
 """
+import asyncio
+import contextlib
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.routers import files
+from app.dependencies import verify_metrics_token
+from app.middleware import MetricsMiddleware
+from app.routers import files, uploads
+from app.services.archive_builder import archive_builder, run_archive_rebuild_loop
+from app.services.duplicates import run_duplicate_scan_loop
+from app.services.file_index import file_index, run_refresh_loop
+from app.services.hls import hls_packager
+from app.services.image_meta import run_meta_refresh_loop
+from app.services import tracing
+from app.services.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, registry
+from app.services.storage_service import (
+    duplicate_index,
+    frame_extractor,
+    image_meta_index,
+    thumb_cache,
+    thumbnail_renderer,
+)
+from app.services.uploads import run_upload_cleanup_loop, upload_store
 
 try:
     from conf.settings import settings
@@ -16,11 +35,44 @@ except ImportError:
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """При старте создаём структуру папок в data/."""
+    """При старте создаём структуру папок в data/, строим индекс файлов и запускаем его обновление,
+    загружаем состояние кеша превью и метаданные фото (недостающие извлекаются в фоне) и отчёты о дубликатах, запускаем
+    фоновые поиск дубликатов, пересборку архивов data/zip/ и очистку брошенных загрузок."""
+    background_tasks: list[asyncio.Task] = []
     if settings is not None:
+        data_root = settings.file_storage_data_root
         for name, path in settings.file_storage_data_paths.items():
             path.mkdir(parents=True, exist_ok=True)
+        await asyncio.to_thread(file_index.build, data_root)
+        await asyncio.to_thread(thumb_cache.load, data_root / ".cache" / "thumbs")
+        await asyncio.to_thread(image_meta_index.load, data_root)
+        await asyncio.to_thread(duplicate_index.load, data_root)
+        background_tasks.append(asyncio.create_task(
+            run_refresh_loop(file_index, settings.file_storage_index_refresh_interval)
+        ))
+        background_tasks.append(asyncio.create_task(
+            run_meta_refresh_loop(file_index, image_meta_index, settings.file_storage_index_refresh_interval)
+        ))
+        background_tasks.append(asyncio.create_task(
+            run_duplicate_scan_loop(
+                file_index, image_meta_index, duplicate_index, settings.file_storage_index_refresh_interval
+            )
+        ))
+        background_tasks.append(asyncio.create_task(run_upload_cleanup_loop(upload_store)))
+        if settings.file_storage_archive_rebuild_interval > 0:
+            background_tasks.append(asyncio.create_task(
+                run_archive_rebuild_loop(
+                    file_index, archive_builder, data_root, settings.file_storage_archive_rebuild_interval
+                )
+            ))
     yield
+    thumbnail_renderer.shutdown()
+    await hls_packager.shutdown()
+    await frame_extractor.shutdown()
+    for task in background_tasks:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
 
 
 app = FastAPI(
@@ -36,11 +88,27 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Заголовки tus, которые клиент загрузки читает из ответа
+    expose_headers=["Location", "Upload-Offset", "Upload-Length", "Upload-Expires", "Tus-Resumable", "Tus-Version", "Tus-Max-Size"],
 )
 
+# Снаружи CORS: учитываются и preflight-ответы, которые CORS формирует сам (endpoint=unmatched)
+app.add_middleware(MetricsMiddleware)
+
+# Трассировка (TRACING_EXPORTER): спан на запрос, продолжение трассы Main_back из заголовка traceparent
+if tracing.configure("file_storage"):
+    app.add_middleware(tracing.TracingMiddleware)
+
 app.include_router(files.router)
+app.include_router(uploads.router)
 
 
 @app.get("/health", tags=["Общее"])
 async def health():
     return {"status": "ok"}
+
+
+@app.get("/metrics", tags=["Общее"], dependencies=[Depends(verify_metrics_token)])
+async def metrics():
+    """Метрики процесса в текстовом формате Prometheus."""
+    return Response(registry.render(), media_type=METRICS_CONTENT_TYPE)
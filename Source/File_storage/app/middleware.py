@@ -0,0 +1,100 @@
+"""
+ASGI-middleware метрик HTTP: запросы по шаблону пути и статусу, время до начала ответа, отправленные
+байты с разбивкой по типу ответа (целый файл, Range, несколько диапазонов, 304, X-Accel-Redirect) и
+ответы в процессе отдачи. Чистый ASGI, а не BaseHTTPMiddleware: тело ответа (sendfile, pathsend)
+проходит без буферизации, поверх отправки — только подсчёт.
+"""
+import time
+
+from app.services.metrics import registry, route_label
+
+HTTP_REQUESTS = registry.counter(
+    "file_storage_http_requests_total", "HTTP-запросы по эндпоинту и статусу ответа", ("endpoint", "status")
+)
+HTTP_DURATION = registry.histogram(
+    "file_storage_http_request_duration_seconds", "Время от получения запроса до начала ответа", ("endpoint",)
+)
+HTTP_RESPONSE_BYTES = registry.counter(
+    "file_storage_http_response_bytes_total", "Отправлено байт тела ответа", ("endpoint", "response")
+)
+HTTP_INFLIGHT_REQUESTS = registry.gauge(
+    "file_storage_http_inflight_requests", "Запросы в обработке (до конца отдачи тела)"
+)
+HTTP_INFLIGHT_RESPONSES = registry.gauge(
+    "file_storage_http_inflight_responses", "Ответы, тело которых ещё отправляется", ("endpoint",)
+)
+
+def _response_kind(status: int, headers: list[tuple[bytes, bytes]]) -> str:
+    if status == 304:
+        return "not_modified"
+    if status >= 400:
+        return "error"
+    if status == 206:
+        for name, value in headers:
+            if name.lower() == b"content-type" and value.startswith(b"multipart/byteranges"):
+                return "multirange"
+        return "range"
+    if status == 200:
+        for name, _value in headers:
+            if name.lower() == b"x-accel-redirect":
+                return "accel"
+        return "full"
+    return "other"
+
+
+def _content_length(headers: list[tuple[bytes, bytes]]) -> int:
+    for name, value in headers:
+        if name.lower() == b"content-length":
+            try:
+                return int(value)
+            except ValueError:
+                return 0
+    return 0
+
+
+class MetricsMiddleware:
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        # Серии выбираются один раз на ответ, при http.response.start
+        response: dict = {}
+
+        async def send_with_metrics(message: dict) -> None:
+            message_type = message["type"]
+            if message_type == "http.response.start":
+                endpoint = route_label(scope)
+                status = message["status"]
+                headers = message.get("headers") or []
+                HTTP_DURATION.labels(endpoint).observe(time.perf_counter() - started)
+                HTTP_REQUESTS.labels(endpoint, status).inc()
+                response["bytes"] = HTTP_RESPONSE_BYTES.labels(endpoint, _response_kind(status, headers))
+                response["headers"] = headers
+                response["inflight"] = HTTP_INFLIGHT_RESPONSES.labels(endpoint)
+                response["inflight"].inc()
+            elif "bytes" in response:
+                if message_type == "http.response.body":
+                    response["bytes"].inc(len(message.get("body", b"")))
+                elif message_type == "http.response.zerocopysend":
+                    response["bytes"].inc(message.get("count") or 0)
+                elif message_type == "http.response.pathsend":
+                    # Файл целиком: объём уже объявлен в Content-Length
+                    response["bytes"].inc(_content_length(response["headers"]))
+            await send(message)
+
+        HTTP_INFLIGHT_REQUESTS.inc()
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        except Exception:
+            # Ответ 500 на необработанное исключение отправляет внешний ServerErrorMiddleware
+            if "bytes" not in response:
+                HTTP_REQUESTS.labels(route_label(scope), 500).inc()
+            raise
+        finally:
+            HTTP_INFLIGHT_REQUESTS.dec()
+            if "inflight" in response:
+                response["inflight"].dec()
@@ -1,4 +1,22 @@
-from app.models.enums import ArchiveType, DataFolder, GalleryVideo
-from app.models.schemas import FileListResponse
+from app.models.enums import ArchiveType, DataFolder, GalleryVideo, ListOrder
+from app.models.schemas import (
+    FileListResponse,
+    ImageMetaInfo,
+    MomentInfo,
+    MomentsResponse,
+    ThumbCacheStats,
+    UploadStatus,
+)
 
-__all__ = ["ArchiveType", "DataFolder", "FileListResponse", "GalleryVideo"]
+__all__ = [
+    "ArchiveType",
+    "DataFolder",
+    "FileListResponse",
+    "GalleryVideo",
+    "ImageMetaInfo",
+    "ListOrder",
+    "MomentInfo",
+    "MomentsResponse",
+    "ThumbCacheStats",
+    "UploadStatus",
+]
@@ -22,3 +22,9 @@ class GalleryVideo(str, Enum):
     """Фиксированные имена видео в папке wedding_day_video/"""
     wedding_video = "wedding_video.mp4"
     wedding_best_moments = "wedding_best_moments.mp4"
+
+
+class ListOrder(str, Enum):
+    """Порядок списка файлов папки"""
+    name = "name"  # По пути
+    time = "time"  # По времени съёмки (EXIF, без него — mtime файла)
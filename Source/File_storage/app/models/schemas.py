@@ -1,7 +1,64 @@
 from pydantic import BaseModel
 
 
+class ImageMetaInfo(BaseModel):
+    """Метаданные фото для сетки: место под карточку и заглушка до загрузки превью"""
+    width: int  # Размеры при показе (с учётом EXIF Orientation)
+    height: int
+    orientation: int
+    taken_at: str | None = None  # Время съёмки (EXIF), ISO 8601 без часового пояса
+    blurhash: str | None = None
+
+
 class FileListResponse(BaseModel):
     """Список относительных путей файлов в папке"""
     folder: str
     paths: list[str]
+    version: str | None = None  # Версия папки (совпадает с ETag ответа /list)
+    meta: dict[str, ImageMetaInfo] | None = None  # Только с meta=true: путь → метаданные (уже извлечённые)
+    # Только с order=time: время съёмки каждого пути (секунды, локальное время камеры как UTC), по возрастанию
+    capture_times: list[float] | None = None
+
+
+class MomentInfo(BaseModel):
+    """Момент — кластер фото по времени съёмки (виртуальный альбом)"""
+    id: str
+    start: float  # Время съёмки первого и последнего кадра (как capture_times)
+    end: float
+    until: float | None = None  # Граница выборки альбома (не включая): начало следующего момента
+    start_index: int  # Позиция первого кадра в порядке съёмки (/list?order=time)
+    count: int
+    cover: str | None = None  # Путь к обложке
+
+
+class MomentsResponse(BaseModel):
+    """Моменты папки в порядке съёмки"""
+    folder: str
+    version: str  # Совпадает с ETag ответа и версией /list?order=time
+    moments: list[MomentInfo]
+
+
+class ThumbCacheStats(BaseModel):
+    """Состояние дискового кеша превью"""
+    max_bytes: int
+    bytes: int
+    files: int
+    hits: int
+    misses: int
+    hit_ratio: float | None = None
+    evictions: int
+    evicted_bytes: int
+    widths: list[int]
+    render_pending: int
+
+
+class UploadStatus(BaseModel):
+    """Состояние загрузки гостя: uploading → queued → processing → done / duplicate / failed;
+    с модерацией — processing → pending_review → done / rejected"""
+    id: str
+    status: str
+    offset: int
+    length: int
+    filename: str
+    result_path: str | None = None  # Путь в галерее (для duplicate — уже существующий файл)
+    error: str | None = None
@@ -1,15 +1,31 @@
 """
-Эндпоинты: список файлов, stream (с Range), download, archive.
+Эндпоинты: список файлов, моменты, stream (с Range и условными запросами), thumb, постер и спрайт видео, hls,
+download, archive, zip выборки.
 Роутер только координирует запрос/ответ, логика — в сервисе.
 """
-from pathlib import Path
+import re
+from dataclasses import asdict, replace
+from urllib.parse import quote
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 
 from app.dependencies import verify_media_token
-from app.models import ArchiveType, DataFolder, FileListResponse
-from app.services.storage_service import StorageError, storage_service
+from app.models import ArchiveType, DataFolder, FileListResponse, ListOrder, MomentsResponse, ThumbCacheStats
+from app.services.conditional import entry_etag, entry_last_modified, if_range_allows, is_not_modified, parse_ranges
+from app.services.ffmpeg import VIDEO_EXTENSIONS
+from app.services.file_index import FileEntry
+from app.services.hls import HLS_MASTER, hls_dir, hls_packager, is_packaged, rewrite_playlist
+from app.services.responses import MultipartRangeResponse, RangeFileResponse
+from app.services.storage_service import (
+    THUMB_WIDTHS,
+    StorageError,
+    storage_service,
+    thumb_cache,
+    thumbnail_renderer,
+)
+from app.services.thumbnails import THUMB_FORMATS, negotiate_thumb_format
+from app.services.video_frames import rewrite_sprite_vtt
+from app.services.zipstream import ZipPlan, ZipStreamResponse, decode_selection
 
 # Совпадает с MEDIA_TOKEN_TTL в conf (секунды). Кеш чуть меньше TTL токена.
 try:
@@ -20,62 +36,166 @@ except Exception:
 
 router = APIRouter(prefix="", tags=["Файлы"])
 
+# Имя файла для ZIP выбранных фото
+SELECTION_ZIP_NAME = "wedding_photos_selection.zip"
+# Файлы внутри HLS-каталога: <рендер>/index.m3u8, <рендер>/seg_00001.ts, master.m3u8
+_HLS_FILE_RE = re.compile(r"^(?:[A-Za-z0-9_-]+/)?[A-Za-z0-9_.-]+\.(?:m3u8|ts)$")
+# Сегменты HLS не меняются (новая версия видео — новый ETag); плейлисты содержат токен — живут не дольше него
+_HLS_SEGMENT_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
 
 def _handle_storage_error(exc: StorageError):
-    raise HTTPException(status_code=exc.status_code, detail=exc.message)
+    raise HTTPException(status_code=exc.status_code, detail=exc.message, headers=exc.headers)
 
 
 @router.get("/list", response_model=FileListResponse)
 async def list_files(
+    request: Request,
+    response: Response,
     folder: DataFolder = Query(...),
+    meta: bool = Query(False, description="Добавить метаданные фото: размеры, время съёмки, blurhash"),
+    order: ListOrder = Query(ListOrder.name, description="name — по пути, time — по времени съёмки (с capture_times)"),
+    hide_duplicates: bool = Query(False, description="Скрыть почти одинаковые фото (остаётся лучший снимок группы)"),
     token_payload: dict = Depends(verify_media_token),
 ):
-    """Список относительных путей файлов в папке (сортировка по имени)."""
+    """Список относительных путей файлов в папке (по умолчанию сортировка по имени).
+    Отдаёт ETag версии папки; при совпадении If-None-Match — 304 без тела.
+    С meta=true — ещё метаданные изображений, извлечённых на момент запроса (ETag учитывает их число).
+    С order=time — порядок съёмки и время каждого файла (для выборки диапазона двоичным поиском).
+    С hide_duplicates=true — без дубликатов из последнего отчёта поиска (ETag учитывает их набор)."""
+    image_meta = None
+    capture_times = None
     try:
-        paths = storage_service.list_files(folder)
+        if order is ListOrder.time:
+            capture_order = storage_service.list_files_by_capture_time(folder, hide_duplicates)
+            paths, version, capture_times = capture_order.paths, capture_order.version, capture_order.times
+            if meta:
+                # Тело с метаданными — другой ETag, чем без них
+                image_meta = capture_order.meta
+                version += "m"
+        elif meta:
+            paths, version, image_meta = storage_service.list_files_with_meta(folder, hide_duplicates)
+        else:
+            paths, version = storage_service.list_files_versioned(folder, hide_duplicates)
     except StorageError as e:
         _handle_storage_error(e)
-    return FileListResponse(folder=folder.value, paths=paths)
-
+    etag = f'"{version}"'
+    if is_not_modified(request.headers, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return FileListResponse(
+        folder=folder.value,
+        paths=paths,
+        version=version,
+        meta={rel: asdict(m) for rel, m in image_meta.items()} if image_meta is not None else None,
+        capture_times=capture_times,
+    )
 
-def _build_file_response(request: Request, file_path: Path, as_attachment: bool = False):
-    """Строит FileResponse или StreamingResponse с поддержкой Range (206)."""
-    path = file_path
-    size = path.stat().st_size
-    content_type = storage_service.get_content_type(path)
-    range_header = request.headers.get("range") if request else None
 
+@router.get("/moments", response_model=MomentsResponse)
+async def list_moments(
+    request: Request,
+    response: Response,
+    folder: DataFolder = Query(...),
+    hide_duplicates: bool = Query(False, description="Без почти одинаковых фото (как /list?hide_duplicates=true)"),
+    token_payload: dict = Depends(verify_media_token),
+):
+    """Моменты папки — кластеры фото по времени съёмки с обложками. Альбом момента — диапазон
+    /list?order=time с start по until. ETag — версия порядка съёмки."""
     try:
-        range_tuple = storage_service.parse_range_header(range_header, size)
-    except ValueError:
-        raise HTTPException(status_code=416, detail="Requested Range Not Satisfiable")
+        order, moments = storage_service.list_moments(folder, hide_duplicates)
+    except StorageError as e:
+        _handle_storage_error(e)
+    etag = f'"{order.version}"'
+    if is_not_modified(request.headers, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return MomentsResponse(folder=folder.value, version=order.version, moments=[asdict(m) for m in moments])
+
 
-    if range_tuple is None:
-        headers = {"Cache-Control": f"private, max-age={_MEDIA_CACHE_MAX_AGE}"}
+def _build_file_response(
+    request: Request,
+    entry: FileEntry,
+    as_attachment: bool = False,
+    extra_headers: dict[str, str] | None = None,
+):
+    """Строит ответ с файлом: 304 по If-None-Match/If-Modified-Since, 206 по Range
+    (несколько диапазонов — multipart/byteranges, с учётом If-Range), иначе 200.
+    Валидаторы и размер — из индекса; если файл на диске уже другой — 412 (404, если его нет) до заголовков ответа.
+    Байты отдаются через sendfile, если ASGI-сервер это поддерживает.
+    В режиме FILE_STORAGE_ACCEL_REDIRECT — пустой ответ с X-Accel-Redirect, файл отдаёт Nginx."""
+    path = entry.path
+    size = entry.size
+    content_type = entry.content_type
+
+    accel_uri = storage_service.accel_redirect_uri(path)
+    if accel_uri is not None:
+        # Байты, Range и условные запросы обслуживает Nginx (internal location); Content-Type,
+        # Content-Disposition и Cache-Control Nginx берёт из этого ответа
+        headers = {
+            "X-Accel-Redirect": accel_uri,
+            "Cache-Control": f"private, max-age={_MEDIA_CACHE_MAX_AGE}",
+        }
+        if extra_headers:
+            headers.update(extra_headers)
         if as_attachment:
             headers["Content-Disposition"] = f'attachment; filename="{path.name}"'
-        return FileResponse(
-            path=path,
-            media_type=content_type,
-            headers=headers,
-        )
+        return Response(media_type=content_type, headers=headers)
 
-    start, end = range_tuple
-    length = end - start + 1
+    etag = entry_etag(entry)
     headers = {
         "Cache-Control": f"private, max-age={_MEDIA_CACHE_MAX_AGE}",
-        "Content-Range": f"bytes {start}-{end}/{size}",
+        "ETag": etag,
+        "Last-Modified": entry_last_modified(entry),
         "Accept-Ranges": "bytes",
-        "Content-Length": str(length),
-        "Content-Type": content_type,
     }
+    if extra_headers:
+        headers.update(extra_headers)
+
+    if is_not_modified(request.headers, etag, entry.mtime):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
     if as_attachment:
         headers["Content-Disposition"] = f'attachment; filename="{path.name}"'
-    return StreamingResponse(
-        storage_service.iter_file_range(path, start, end),
+
+    ranges = None
+    if if_range_allows(request.headers, etag, entry.mtime):
+        try:
+            ranges = parse_ranges(request.headers.get("range"), size)
+        except ValueError:
+            raise HTTPException(
+                status_code=416,
+                detail="Requested Range Not Satisfiable",
+                headers={"Content-Range": f"bytes */{size}"},
+            )
+
+    if ranges is None:
+        return RangeFileResponse(
+            path,
+            start=0,
+            end=size - 1,
+            media_type=content_type,
+            headers=headers,
+            full_file=True,
+            expected_size=size,
+            expected_mtime_ns=entry.mtime_ns,
+        )
+    if len(ranges) > 1:
+        return MultipartRangeResponse(
+            path, ranges, size, content_type, headers=headers, expected_mtime_ns=entry.mtime_ns
+        )
+
+    start, end = ranges[0]
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return RangeFileResponse(
+        path,
+        start=start,
+        end=end,
         status_code=status.HTTP_206_PARTIAL_CONTENT,
         media_type=content_type,
         headers=headers,
+        expected_size=size,
+        expected_mtime_ns=entry.mtime_ns,
     )
 
 
@@ -87,25 +207,160 @@ async def stream_file(
 ):
     """Получить файл для просмотра (inline), с поддержкой Range для видео."""
     try:
-        file_path = storage_service.resolve_path(path)
+        entry = storage_service.resolve_entry(path)
     except StorageError as e:
         _handle_storage_error(e)
-    return _build_file_response(request, file_path, as_attachment=False)
+    return _build_file_response(request, entry, as_attachment=False)
 
 
 @router.get("/thumb")
 async def thumb_file(
+    request: Request,
     path: str = Query(..., description="Относительный путь к изображению"),
     w: int = Query(480, ge=64, le=1200, description="Ширина превью в пикселях"),
     token_payload: dict = Depends(verify_media_token),
 ):
-    """Превью изображения для сетки галереи (кеш на диске)."""
+    """Превью изображения для сетки галереи (кеш на диске). Формат (AVIF/WebP/JPEG) — по Accept,
+    ширина приводится к ближайшей разрешённой."""
+    fmt = negotiate_thumb_format(request.headers.get("accept"))
+    try:
+        thumb_path = await storage_service.get_or_create_thumbnail(path, width=w, fmt=fmt)
+    except StorageError as e:
+        _handle_storage_error(e)
+    try:
+        thumb_entry = replace(FileEntry.from_path(path, thumb_path), content_type=THUMB_FORMATS[fmt][1])
+    except OSError:
+        # Превью вытеснено из кеша между рендером и отдачей
+        raise HTTPException(status_code=503, detail="Превью временно недоступно", headers={"Retry-After": "1"})
+    return _build_file_response(request, thumb_entry, extra_headers={"Vary": "Accept"})
+
+
+@router.get("/poster")
+async def poster_file(
+    request: Request,
+    path: str = Query(..., description="Относительный путь к видео"),
+    w: int = Query(768, ge=64, le=1200, description="Ширина постера в пикселях"),
+    token_payload: dict = Depends(verify_media_token),
+):
+    """Постер видео (кадр из начала ролика) — для <video poster>, чтобы не трогать сам файл видео
+    до нажатия Play. Формат и ширина — как у /thumb."""
+    fmt = negotiate_thumb_format(request.headers.get("accept"))
     try:
-        thumb_path = storage_service.get_or_create_thumbnail(path, width=w)
+        poster_path = await storage_service.get_or_create_poster(path, width=w, fmt=fmt)
     except StorageError as e:
         _handle_storage_error(e)
-    headers = {"Cache-Control": f"private, max-age={_MEDIA_CACHE_MAX_AGE}"}
-    return FileResponse(path=thumb_path, media_type="image/jpeg", headers=headers)
+    try:
+        poster_entry = replace(FileEntry.from_path(path, poster_path), content_type=THUMB_FORMATS[fmt][1])
+    except OSError:
+        raise HTTPException(status_code=503, detail="Постер временно недоступен", headers={"Retry-After": "1"})
+    return _build_file_response(request, poster_entry, extra_headers={"Vary": "Accept"})
+
+
+@router.get("/sprite")
+async def sprite_file(
+    request: Request,
+    path: str = Query(..., description="Относительный путь к видео"),
+    token_payload: dict = Depends(verify_media_token),
+):
+    """Спрайт-лист превью перемотки (JPEG, плитки по /sprite.vtt). Пока не готов — 503 + Retry-After."""
+    try:
+        _entry, image, _vtt = storage_service.get_sprite_paths(path)
+        sprite_entry = FileEntry.from_path(path, image)
+    except StorageError as e:
+        _handle_storage_error(e)
+    except OSError:
+        raise HTTPException(status_code=503, detail="Спрайт временно недоступен", headers={"Retry-After": "1"})
+    return _build_file_response(request, replace(sprite_entry, content_type="image/jpeg"))
+
+
+@router.get("/sprite.vtt")
+async def sprite_vtt(
+    request: Request,
+    path: str = Query(..., description="Относительный путь к видео"),
+    token_payload: dict = Depends(verify_media_token),
+):
+    """WebVTT-индекс превью перемотки: интервал времени → плитка спрайта (#xywh).
+    Ссылки на спрайт дополняются токеном запроса."""
+    try:
+        entry, _image, vtt = storage_service.get_sprite_paths(path)
+        text = vtt.read_text(encoding="utf-8")
+    except StorageError as e:
+        _handle_storage_error(e)
+    except OSError:
+        raise HTTPException(status_code=503, detail="Спрайт временно недоступен", headers={"Retry-After": "1"})
+    token = request.query_params.get("token", "")
+    body = rewrite_sprite_vtt(text, f"sprite?path={quote(entry.relative_path)}&token={token}")
+    return Response(
+        content=body,
+        media_type="text/vtt",
+        headers={"Cache-Control": f"private, max-age={_MEDIA_CACHE_MAX_AGE}"},
+    )
+
+
+@router.get("/hls")
+async def hls_file(
+    request: Request,
+    path: str = Query(..., description="Относительный путь к видео, например wedding_day_video/wedding_video.mp4"),
+    file: str = Query(HLS_MASTER, description="Файл HLS: master.m3u8, <рендер>/index.m3u8 или сегмент"),
+    token_payload: dict = Depends(verify_media_token),
+):
+    """HLS-вариант видео (несколько битрейтов). Пока упаковки нет — запускает её в фоне и отвечает
+    503 + Retry-After (плеер берёт MP4 из /stream). Ссылки в плейлистах дополняются токеном."""
+    if storage_service.folder_for_path(path) != DataFolder.wedding_day_video:
+        raise HTTPException(status_code=400, detail="HLS доступен только для wedding_day_video")
+    if ".." in file or not _HLS_FILE_RE.match(file):
+        raise HTTPException(status_code=400, detail="Недопустимый файл HLS")
+    try:
+        entry = storage_service.resolve_entry(path)
+        data_root = storage_service.get_data_root()
+    except StorageError as e:
+        _handle_storage_error(e)
+    if entry.path.suffix.lower() not in VIDEO_EXTENSIONS:
+        raise HTTPException(status_code=400, detail="Файл не является видео")
+
+    out_dir = hls_dir(data_root, entry.relative_path)
+    if not is_packaged(out_dir, entry):
+        hls_packager.start(entry, out_dir)
+        raise HTTPException(
+            status_code=503,
+            detail="Видео готовится к потоковому просмотру",
+            headers={"Retry-After": "30"},
+        )
+
+    target = out_dir / file
+    try:
+        target_entry = FileEntry.from_path(f"{entry.relative_path}/{file}", target)
+    except OSError:
+        raise HTTPException(status_code=404, detail="Файл HLS не найден")
+
+    if target.suffix == ".m3u8":
+        token = request.query_params.get("token", "")
+        text = target.read_text(encoding="utf-8")
+        body = rewrite_playlist(
+            text,
+            file,
+            lambda f: f"hls?path={quote(entry.relative_path)}&file={quote(f)}&token={token}",
+        )
+        return Response(
+            content=body,
+            media_type="application/vnd.apple.mpegurl",
+            headers={"Cache-Control": f"private, max-age={_MEDIA_CACHE_MAX_AGE}"},
+        )
+    return _build_file_response(
+        request,
+        replace(target_entry, content_type="video/mp2t"),
+        extra_headers={"Cache-Control": _HLS_SEGMENT_CACHE_CONTROL},
+    )
+
+
+@router.get("/thumb/stats", response_model=ThumbCacheStats)
+async def thumb_cache_stats(token_payload: dict = Depends(verify_media_token)):
+    """Состояние кеша превью: объём, попадания, вытеснения, очередь рендера."""
+    return ThumbCacheStats(
+        **thumb_cache.stats(),
+        widths=list(THUMB_WIDTHS),
+        render_pending=thumbnail_renderer.pending,
+    )
 
 
 @router.get("/download")
@@ -121,10 +376,65 @@ async def download_file(
             detail="Скачивание разрешено только для папок wedding_day_all_photos и wedding_day_video",
         )
     try:
-        file_path = storage_service.resolve_path(path)
+        entry = storage_service.resolve_entry(path)
     except StorageError as e:
         _handle_storage_error(e)
-    return _build_file_response(request, file_path, as_attachment=True)
+    return _build_file_response(request, entry, as_attachment=True)
+
+
+@router.get("/zip")
+async def download_selection_zip(
+    request: Request,
+    token_payload: dict = Depends(verify_media_token),
+):
+    """ZIP выбранных файлов, собираемый на лету (stored, без сжатия). Выборка — в подписанном
+    токене (scope=zip, claim files). Размер архива известен заранее, поддерживается Range-докачка."""
+    if token_payload.get("scope") != "zip" or not isinstance(token_payload.get("files"), str):
+        raise HTTPException(status_code=403, detail="Токен не содержит выборку файлов")
+    try:
+        paths = decode_selection(token_payload["files"])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    entries = []
+    for path in paths:
+        if not storage_service.is_download_allowed(path):
+            raise HTTPException(
+                status_code=403,
+                detail="Скачивание разрешено только для папок wedding_day_all_photos и wedding_day_video",
+            )
+        try:
+            entries.append(storage_service.resolve_entry(path))
+        except StorageError as e:
+            _handle_storage_error(e)
+
+    plan = ZipPlan(entries)
+    etag = plan.etag
+    headers = {
+        "Cache-Control": f"private, max-age={_MEDIA_CACHE_MAX_AGE}",
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+    }
+    if is_not_modified(request.headers, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    headers["Content-Disposition"] = f'attachment; filename="{SELECTION_ZIP_NAME}"'
+
+    ranges = None
+    if if_range_allows(request.headers, etag):
+        try:
+            ranges = parse_ranges(request.headers.get("range"), plan.size)
+        except ValueError:
+            raise HTTPException(
+                status_code=416,
+                detail="Requested Range Not Satisfiable",
+                headers={"Content-Range": f"bytes */{plan.size}"},
+            )
+    # Несколько диапазонов для архива не обслуживаем — отдаём целиком
+    if not ranges or len(ranges) > 1:
+        return ZipStreamResponse(plan, 0, plan.size - 1, headers=headers)
+    start, end = ranges[0]
+    headers["Content-Range"] = f"bytes {start}-{end}/{plan.size}"
+    return ZipStreamResponse(plan, start, end, status_code=status.HTTP_206_PARTIAL_CONTENT, headers=headers)
 
 
 @router.get("/archive")
@@ -135,7 +445,7 @@ async def download_archive(
 ):
     """Скачать готовый zip: wedding_photos.zip, wedding_video.zip или wedding_best_moments.zip."""
     try:
-        zip_path = storage_service.get_archive_path(type)
+        entry = storage_service.get_archive_entry(type)
     except StorageError as e:
         _handle_storage_error(e)
-    return _build_file_response(request, zip_path, as_attachment=True)
+    return _build_file_response(request, entry, as_attachment=True)
@@ -0,0 +1,187 @@
+"""
+Загрузка фото гостями по протоколу tus 1.0 (докачка с Upload-Offset, контрольные суммы частей).
+Токен — медиа-токен scope=upload из Main_back с UUID гостя: загрузки привязаны к гостю, чужие — 404.
+Принятый файл обрабатывает воркер Celery.
+"""
+import asyncio
+import logging
+from email.utils import formatdate
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from starlette.requests import ClientDisconnect
+
+from app.dependencies import verify_upload_token
+from app.models import UploadStatus
+from app.services.storage_service import StorageError
+from app.services.uploads import (
+    CHECKSUM_ALGORITHMS,
+    TUS_EXTENSIONS,
+    TUS_VERSION,
+    UPLOAD_MAX_BYTES,
+    parse_upload_checksum,
+    parse_upload_metadata,
+    upload_store,
+)
+
+try:
+    from app.tasks.uploads import process_guest_upload
+except ImportError:
+    # Без Celery принятые загрузки обрабатывает команда app.commands.process_uploads
+    process_guest_upload = None
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/uploads", tags=["Загрузки"])
+
+
+def _handle_storage_error(exc: StorageError):
+    raise HTTPException(
+        status_code=exc.status_code,
+        detail=exc.message,
+        headers={"Tus-Resumable": TUS_VERSION, **(exc.headers or {})},
+    )
+
+
+def _tus_headers(state: dict | None = None, **extra: str) -> dict[str, str]:
+    headers = {"Tus-Resumable": TUS_VERSION, "Cache-Control": "no-store"}
+    if state is not None:
+        headers["Upload-Length"] = str(state["length"])
+        headers["Upload-Expires"] = formatdate(state["expires"], usegmt=True)
+    headers.update(extra)
+    return headers
+
+
+def _check_tus_version(request: Request) -> None:
+    if request.headers.get("tus-resumable") != TUS_VERSION:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="Неподдерживаемая версия tus",
+            headers={"Tus-Version": TUS_VERSION},
+        )
+
+
+def _int_header(request: Request, name: str) -> int:
+    try:
+        value = int(request.headers[name])
+    except (KeyError, ValueError):
+        raise HTTPException(status_code=400, detail=f"Нужен заголовок {name}", headers={"Tus-Resumable": TUS_VERSION})
+    if value < 0:
+        raise HTTPException(status_code=400, detail=f"Неверный {name}", headers={"Tus-Resumable": TUS_VERSION})
+    return value
+
+
+async def _enqueue(upload_id: str) -> None:
+    """Ставит загрузку в очередь Celery. Ошибка брокера не роняет запрос: загрузка остаётся
+    в статусе queued и подхватывается командой process_uploads."""
+    if process_guest_upload is None:
+        logger.warning("Celery недоступен, загрузка %s ждёт process_uploads", upload_id)
+        return
+    try:
+        # delay() синхронно ходит в Redis — не в event loop
+        await asyncio.to_thread(process_guest_upload.delay, upload_id)
+    except Exception:
+        logger.exception("Не удалось поставить загрузку %s в очередь", upload_id)
+
+
+@router.options("")
+async def tus_options():
+    """Возможности сервера (tus discovery)."""
+    return Response(
+        status_code=status.HTTP_204_NO_CONTENT,
+        headers={
+            "Tus-Resumable": TUS_VERSION,
+            "Tus-Version": TUS_VERSION,
+            "Tus-Extension": TUS_EXTENSIONS,
+            "Tus-Max-Size": str(UPLOAD_MAX_BYTES),
+            "Tus-Checksum-Algorithm": ",".join(CHECKSUM_ALGORITHMS),
+        },
+    )
+
+
+@router.post("")
+async def create_upload(request: Request, token_payload: dict = Depends(verify_upload_token)):
+    """Создать загрузку: Upload-Length и Upload-Metadata (filename обязателен, sha256 — hex всего файла,
+    проверяется после приёма). Location — относительный URL загрузки с тем же токеном."""
+    _check_tus_version(request)
+    length = _int_header(request, "upload-length")
+    try:
+        metadata = parse_upload_metadata(request.headers.get("upload-metadata"))
+        state = await asyncio.to_thread(upload_store.create, length, metadata, token_payload["guest"])
+    except StorageError as e:
+        _handle_storage_error(e)
+    token = request.query_params.get("token", "")
+    return Response(
+        status_code=status.HTTP_201_CREATED,
+        headers=_tus_headers(state, Location=f"uploads/{state['id']}?token={token}", **{"Upload-Offset": "0"}),
+    )
+
+
+@router.head("/{upload_id}")
+async def upload_offset(upload_id: str, request: Request, token_payload: dict = Depends(verify_upload_token)):
+    """Текущее смещение — с него клиент продолжает после обрыва."""
+    _check_tus_version(request)
+    try:
+        state = upload_store.load_owned(upload_id, token_payload["guest"])
+        offset = upload_store.offset(upload_id)
+    except StorageError as e:
+        _handle_storage_error(e)
+    return Response(status_code=status.HTTP_200_OK, headers=_tus_headers(state, **{"Upload-Offset": str(offset)}))
+
+
+@router.patch("/{upload_id}")
+async def upload_chunk(upload_id: str, request: Request, token_payload: dict = Depends(verify_upload_token)):
+    """Часть файла с Upload-Offset (application/offset+octet-stream), тело пишется на диск потоком.
+    Upload-Checksum (sha1/sha256/md5) — несошедшаяся часть отбрасывается, ответ 460."""
+    _check_tus_version(request)
+    if request.headers.get("content-type", "").split(";")[0].strip() != "application/offset+octet-stream":
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Нужен Content-Type: application/offset+octet-stream",
+            headers={"Tus-Resumable": TUS_VERSION},
+        )
+    offset = _int_header(request, "upload-offset")
+    try:
+        checksum = parse_upload_checksum(request.headers.get("upload-checksum"))
+        state = upload_store.load_owned(upload_id, token_payload["guest"])
+        new_offset, completed = await upload_store.append(state, offset, request.stream(), checksum)
+    except StorageError as e:
+        _handle_storage_error(e)
+    except ClientDisconnect:
+        # Клиент ушёл; принятое сохранено, смещение узнает через HEAD
+        return Response(status_code=status.HTTP_400_BAD_REQUEST)
+    if completed:
+        await _enqueue(upload_id)
+    return Response(status_code=status.HTTP_204_NO_CONTENT, headers=_tus_headers(state, **{"Upload-Offset": str(new_offset)}))
+
+
+@router.get("/{upload_id}", response_model=UploadStatus)
+async def upload_status(upload_id: str, response: Response, token_payload: dict = Depends(verify_upload_token)):
+    """Состояние обработки: queued → processing → done / duplicate / failed
+    (с модерацией — pending_review → done / rejected)."""
+    try:
+        state = upload_store.load_owned(upload_id, token_payload["guest"])
+        offset = upload_store.offset(upload_id)
+    except StorageError as e:
+        _handle_storage_error(e)
+    response.headers["Cache-Control"] = "no-store"
+    return UploadStatus(
+        id=state["id"],
+        status=state["status"],
+        offset=offset,
+        length=state["length"],
+        filename=state["filename"],
+        result_path=state.get("result_path"),
+        error=state.get("error"),
+    )
+
+
+@router.delete("/{upload_id}")
+async def terminate_upload(upload_id: str, request: Request, token_payload: dict = Depends(verify_upload_token)):
+    """Отменить загрузку (tus termination)."""
+    _check_tus_version(request)
+    try:
+        state = upload_store.load_owned(upload_id, token_payload["guest"])
+        upload_store.terminate(state)
+    except StorageError as e:
+        _handle_storage_error(e)
+    return Response(status_code=status.HTTP_204_NO_CONTENT, headers={"Tus-Resumable": TUS_VERSION})
@@ -0,0 +1,303 @@
+"""
+Пересборка готовых архивов data/zip/ при изменении исходных папок (по версиям папок из индекса).
+Архив — stored ZIP в раскладке ZipPlan (та же, что у ZIP выборки на лету). Если файлы только
+добавились, неизменная часть старого архива копируется в ядре (copy_file_range) и дописываются
+новые файлы и central directory; иначе — полная сборка. CRC новых файлов считаются параллельно
+в потоках (zlib.crc32 отпускает GIL). Запись — во временный файл с атомарной заменой (os.replace).
+С FILE_STORAGE_ARCHIVE_SKIP_DUPLICATES (по умолчанию выключено) дубликаты фото из отчёта duplicates
+в архив не кладутся — набор скрытых путей входит в версию источника, и архив пересобирается при его изменении.
+Состояние архива (файлы, CRC, версия исходной папки) — манифест в data/.cache/archives/.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+from app.models.enums import ArchiveType, DataFolder, GalleryVideo
+from app.services.duplicates import DuplicateIndex
+from app.services.file_index import FileEntry, FileIndex, path_sort_key
+from app.services.storage_service import ARCHIVE_FILES, duplicate_index
+from app.services.zipstream import ZipPlan, file_crc32
+
+try:
+    from conf.settings import settings
+except ImportError:
+    settings = None
+
+logger = logging.getLogger(__name__)
+
+# Источник архива: папка и, при необходимости, единственный файл в ней
+ARCHIVE_SOURCES: dict[ArchiveType, tuple[DataFolder, str | None]] = {
+    ArchiveType.wedding_day_all_photos: (DataFolder.wedding_day_all_photos, None),
+    ArchiveType.wedding_day_video: (DataFolder.wedding_day_video, None),
+    ArchiveType.wedding_best_moments: (DataFolder.wedding_day_video, GalleryVideo.wedding_best_moments.value),
+}
+
+_MANIFEST_FORMAT = 1
+# Блок копирования, если copy_file_range недоступен
+_COPY_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+class ArchiveSourceChanged(Exception):
+    """Исходный файл изменился во время сборки — повторим на следующем цикле"""
+
+
+@dataclass
+class RebuildResult:
+    """Итог пересборки архива"""
+    archive_type: ArchiveType
+    mode: str  # unchanged | append | full | empty
+    members: int = 0
+    added: int = 0
+    bytes_written: int = 0
+    seconds: float = 0.0
+
+
+def _copy_range(src_fd: int, dst_fd: int, offset: int, count: int) -> None:
+    """Копирует count байт src с offset в текущую позицию dst (в ядре, если возможно)."""
+    remaining = count
+    position = offset
+    try:
+        while remaining > 0:
+            copied = os.copy_file_range(src_fd, dst_fd, remaining, position)
+            if copied == 0:
+                raise ArchiveSourceChanged("Файл укоротился во время копирования")
+            remaining -= copied
+            position += copied
+        return
+    except (AttributeError, OSError):
+        pass
+    # Другая ФС или старое ядро — обычное копирование (оставшейся части)
+    while remaining > 0:
+        chunk = os.pread(src_fd, min(_COPY_CHUNK_SIZE, remaining), position)
+        if not chunk:
+            raise ArchiveSourceChanged("Файл укоротился во время копирования")
+        os.write(dst_fd, chunk)
+        remaining -= len(chunk)
+        position += len(chunk)
+
+
+class ArchiveBuilder:
+    """Сборка архивов из ARCHIVE_SOURCES. Одна сборка одновременно (lock), CRC — в пуле потоков."""
+
+    def __init__(self, crc_workers: int, duplicates: DuplicateIndex | None = None) -> None:
+        self.crc_workers = max(1, crc_workers)
+        # Отчёт о дубликатах: его дубликаты в архив папки не кладутся
+        self.duplicates = duplicates
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def archive_path(data_root: Path, archive_type: ArchiveType) -> Path:
+        return data_root / DataFolder.zip.value / ARCHIVE_FILES[archive_type]
+
+    @staticmethod
+    def manifest_path(data_root: Path, archive_type: ArchiveType) -> Path:
+        return data_root / ".cache" / "archives" / f"{ARCHIVE_FILES[archive_type]}.json"
+
+    def read_manifest(self, data_root: Path, archive_type: ArchiveType) -> dict | None:
+        try:
+            manifest = json.loads(self.manifest_path(data_root, archive_type).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if not isinstance(manifest, dict) or manifest.get("format") != _MANIFEST_FORMAT:
+            return None
+        return manifest
+
+    def is_current(self, data_root: Path, archive_type: ArchiveType, source_version: str) -> bool:
+        """Архив собран из текущей версии исходной папки"""
+        manifest = self.read_manifest(data_root, archive_type)
+        return manifest is not None and manifest.get("source_version") == source_version
+
+    def source_entries(self, index: FileIndex, archive_type: ArchiveType) -> tuple[list[FileEntry], str]:
+        """Файлы архива (по пути) и версия источника: версия папки и, без дубликатов, хеш их набора."""
+        folder, only_name = ARCHIVE_SOURCES[archive_type]
+        snapshot = index.folder(folder)
+        entries = [snapshot.entries[p] for p in snapshot.paths]
+        if only_name is not None:
+            return [e for e in entries if e.relative_path == f"{folder.value}/{only_name}"], snapshot.version
+        if self.duplicates is None:
+            return entries, snapshot.version
+        hidden = self.duplicates.hidden(folder)
+        entries = [e for e in entries if e.relative_path not in hidden]
+        return entries, f"{snapshot.version}-d{self.duplicates.digest(folder)}"
+
+    @staticmethod
+    def _arcname(entry: FileEntry) -> str:
+        # Путь внутри исходной папки (подпапки сохраняются)
+        return entry.relative_path.split("/", 1)[1]
+
+    def rebuild(self, index: FileIndex, data_root: Path, archive_type: ArchiveType, full: bool = False) -> RebuildResult:
+        """Приводит архив к содержимому исходной папки: ничего / дописать новые файлы / собрать заново."""
+        with self._lock:
+            return self._rebuild(index, data_root, archive_type, full)
+
+    def _rebuild(self, index: FileIndex, data_root: Path, archive_type: ArchiveType, full: bool) -> RebuildResult:
+        started = time.monotonic()
+        entries, source_version = self.source_entries(index, archive_type)
+        dest = self.archive_path(data_root, archive_type)
+        if not entries:
+            return RebuildResult(archive_type, "empty")
+
+        manifest = None if full else self.read_manifest(data_root, archive_type)
+        old_members = self._reusable_members(manifest, dest, entries)
+        old_crcs: list[int] = []
+        if old_members is not None:
+            old_paths = {m[0] for m in old_members}
+            by_path = {e.relative_path: e for e in entries}
+            new_entries = [e for e in entries if e.relative_path not in old_paths]
+            new_entries.sort(key=lambda e: path_sort_key(e.relative_path))
+            ordered = [by_path[m[0]] for m in old_members] + new_entries
+            old_crcs = [m[4] for m in old_members]
+            if not new_entries:
+                self._write_manifest(data_root, archive_type, manifest["members"], source_version, dest)
+                return RebuildResult(archive_type, "unchanged", members=len(ordered),
+                                     seconds=time.monotonic() - started)
+        else:
+            new_entries = entries
+            ordered = entries
+
+        names = [self._arcname(e) for e in ordered]
+        plan = ZipPlan(ordered, names)
+        keep = len(old_crcs)
+        if keep and plan.members[keep].offset != manifest.get("cd_offset"):
+            # Раскладка старой части не совпала (другой часовой пояс, ручная правка) — полная сборка
+            logger.warning("Архив %s: раскладка изменилась, полная пересборка", dest.name)
+            return self._rebuild(index, data_root, archive_type, full=True)
+
+        with ThreadPoolExecutor(max_workers=self.crc_workers) as pool:
+            new_crcs = list(pool.map(file_crc32, [str(e.path) for e in new_entries]))
+        crcs = old_crcs + new_crcs
+
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        # Временный файл — вне индексируемой папки zip/, на той же ФС (для os.replace)
+        work_dir = self.manifest_path(data_root, archive_type).parent
+        work_dir.mkdir(parents=True, exist_ok=True)
+        tmp = work_dir / f".{dest.name}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as out:
+                if keep:
+                    with open(dest, "rb") as src:
+                        _copy_range(src.fileno(), out.fileno(), 0, plan.members[keep].offset)
+                    out.seek(plan.members[keep].offset)
+                for member, crc in zip(plan.members[keep:], crcs[keep:]):
+                    out.write(member.local_header)
+                    out.flush()
+                    with open(member.entry.path, "rb") as src:
+                        st = os.fstat(src.fileno())
+                        if st.st_size != member.entry.size or st.st_mtime_ns != member.entry.mtime_ns:
+                            raise ArchiveSourceChanged(member.entry.relative_path)
+                        _copy_range(src.fileno(), out.fileno(), 0, member.entry.size)
+                    out.seek(member.descriptor_offset)
+                    out.write(member.descriptor(crc))
+                out.write(b"".join(m.central(crc) for m, crc in zip(plan.members, crcs)))
+                out.write(plan.end_record)
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(tmp, dest)
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+
+        members = [
+            [e.relative_path, name, e.size, e.mtime_ns, crc]
+            for e, name, crc in zip(ordered, names, crcs)
+        ]
+        self._write_manifest(data_root, archive_type, members, source_version, dest, cd_offset=plan.cd_offset)
+        written = plan.size - (plan.members[keep].offset if keep else 0)
+        return RebuildResult(
+            archive_type,
+            "append" if keep else "full",
+            members=len(ordered),
+            added=len(new_entries),
+            bytes_written=written,
+            seconds=time.monotonic() - started,
+        )
+
+    @staticmethod
+    def _reusable_members(manifest: dict | None, dest: Path, entries: list[FileEntry]) -> list[list] | None:
+        """Файлы старого архива, которые можно оставить как есть: архив не менялся после сборки,
+        ни один файл не удалён и не изменён. None — нужна полная сборка."""
+        if not manifest:
+            return None
+        try:
+            st = dest.stat()
+        except OSError:
+            return None
+        if st.st_size != manifest.get("archive_size") or st.st_mtime_ns != manifest.get("archive_mtime_ns"):
+            return None
+        current = {e.relative_path: e for e in entries}
+        old_members = manifest.get("members") or []
+        for rel, _name, size, mtime_ns, _crc in old_members:
+            entry = current.get(rel)
+            if entry is None or entry.size != size or entry.mtime_ns != mtime_ns:
+                return None
+        return old_members or None
+
+    def _write_manifest(
+        self,
+        data_root: Path,
+        archive_type: ArchiveType,
+        members: list[list],
+        source_version: str,
+        dest: Path,
+        cd_offset: int | None = None,
+    ) -> None:
+        path = self.manifest_path(data_root, archive_type)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        previous = self.read_manifest(data_root, archive_type) or {}
+        st = dest.stat()
+        manifest = {
+            "format": _MANIFEST_FORMAT,
+            "source_version": source_version,
+            "archive_size": st.st_size,
+            "archive_mtime_ns": st.st_mtime_ns,
+            "cd_offset": cd_offset if cd_offset is not None else previous.get("cd_offset"),
+            "members": members,
+        }
+        tmp = path.with_name(f".{path.name}.tmp")
+        tmp.write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+
+
+async def run_archive_rebuild_loop(index: FileIndex, builder: ArchiveBuilder, data_root: Path, interval: float) -> None:
+    """Фоновая пересборка: архив пересобирается, когда версия источника (папка и набор дубликатов)
+    изменилась и не менялась целый интервал (заливка фото и поиск дубликатов закончились).
+    Сборка — в отдельном потоке, по одному архиву."""
+    seen: dict[ArchiveType, str] = {}
+    while True:
+        await asyncio.sleep(interval)
+        versions = {archive_type: builder.source_entries(index, archive_type)[1] for archive_type in ARCHIVE_SOURCES}
+        stable = {archive_type for archive_type, version in versions.items() if seen.get(archive_type) == version}
+        seen = versions
+        rebuilt = False
+        for archive_type in ARCHIVE_SOURCES:
+            if archive_type not in stable or builder.is_current(data_root, archive_type, versions[archive_type]):
+                continue
+            try:
+                result = await asyncio.to_thread(builder.rebuild, index, data_root, archive_type)
+            except ArchiveSourceChanged as exc:
+                logger.info("Архив %s: исходный файл меняется (%s), повтор позже", archive_type.value, exc)
+                continue
+            except Exception:
+                logger.exception("Ошибка пересборки архива %s", archive_type.value)
+                continue
+            logger.info(
+                "Архив %s: %s, файлов %s (+%s), записано %.1f МБ за %.1f с",
+                archive_type.value, result.mode, result.members, result.added,
+                result.bytes_written / 1024 / 1024, result.seconds,
+            )
+            rebuilt = rebuilt or result.mode in ("append", "full")
+        if rebuilt:
+            # Новый размер и mtime архивов — сразу в индекс, чтобы /archive отдал актуальный файл
+            await asyncio.to_thread(index.refresh)
+
+
+archive_builder = ArchiveBuilder(
+    crc_workers=min(8, os.cpu_count() or 1),
+    duplicates=duplicate_index if settings is not None and settings.file_storage_archive_skip_duplicates else None,
+)
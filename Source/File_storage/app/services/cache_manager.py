@@ -0,0 +1,131 @@
+"""
+Менеджер дискового кеша производных файлов (превью): бюджет в байтах и LRU-вытеснение.
+Доступы учитываются в памяти; при старте порядок восстанавливается по mtime файлов кеша.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class DiskCacheManager:
+    """LRU по обращениям: hit переносит файл в конец, при превышении бюджета удаляются самые старые.
+
+    Файл, к которому обращались меньше min_age секунд назад, не вытесняется: между touch/add и
+    открытием файла ответом его не должно удалить параллельным рендером. Бюджет при этом может
+    временно превышаться на объём, отрендеренный за min_age."""
+
+    def __init__(self, max_bytes: int, min_age: float = 30.0) -> None:
+        self.max_bytes = max_bytes
+        self.min_age = min_age
+        # Путь → (размер, time.monotonic() последнего обращения); порядок — от давних к свежим
+        self._entries: OrderedDict[str, tuple[int, float]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+
+    def load(self, cache_root: Path) -> None:
+        """Сканирует каталог кеша; самые старые по mtime файлы — первые кандидаты на вытеснение."""
+        found: list[tuple[int, str, int]] = []
+        for dirpath, _dirnames, filenames in os.walk(cache_root):
+            for name in filenames:
+                if name.startswith("."):
+                    continue  # временные файлы рендера
+                full = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(full)
+                except OSError:
+                    continue
+                found.append((st.st_mtime_ns, full, st.st_size))
+        found.sort()
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            for _mtime, full, size in found:
+                # Файлы прошлого запуска сейчас никто не отдаёт — защита от вытеснения не нужна
+                self._entries[full] = (size, 0.0)
+                self._bytes += size
+        logger.info("Кеш %s: %s файлов, %.1f МБ", cache_root, len(found), self._bytes / 1024 / 1024)
+        self._evict()
+
+    def touch(self, path: Path) -> None:
+        """Попадание в кеш: файл становится самым свежим (неизвестный файл — добавляется)."""
+        key = str(path)
+        with self._lock:
+            self.hits += 1
+            if key in self._entries:
+                self._entries[key] = (self._entries[key][0], time.monotonic())
+                self._entries.move_to_end(key)
+                return
+        try:
+            size = path.stat().st_size
+        except OSError:
+            return
+        self._put(key, size)
+
+    def add(self, path: Path) -> None:
+        """Промах: файл только что создан — добавляем и при необходимости вытесняем старые."""
+        with self._lock:
+            self.misses += 1
+        try:
+            size = path.stat().st_size
+        except OSError:
+            return
+        self._put(str(path), size)
+
+    def discard(self, path: Path) -> None:
+        with self._lock:
+            entry = self._entries.pop(str(path), None)
+            if entry is not None:
+                self._bytes -= entry[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "max_bytes": self.max_bytes,
+                "bytes": self._bytes,
+                "files": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "evicted_bytes": self.evicted_bytes,
+            }
+
+    def _put(self, key: str, size: int) -> None:
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[0]
+            self._entries[key] = (size, time.monotonic())
+            self._bytes += size
+        self._evict()
+
+    def _evict(self) -> None:
+        victims: list[str] = []
+        protected_since = time.monotonic() - self.min_age
+        with self._lock:
+            # Самый свежий файл не вытесняем, даже если он один больше бюджета
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                key, (size, accessed) = next(iter(self._entries.items()))
+                if accessed > protected_since:
+                    # Порядок — по обращениям: все следующие файлы ещё свежее
+                    break
+                del self._entries[key]
+                self._bytes -= size
+                self.evictions += 1
+                self.evicted_bytes += size
+                victims.append(key)
+        for key in victims:
+            try:
+                os.unlink(key)
+            except OSError:
+                pass
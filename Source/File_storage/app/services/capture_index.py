@@ -0,0 +1,98 @@
+"""
+Порядок папки по времени съёмки: отсортированный список (время, путь). /list?order=time отдаёт пути
+в этом порядке вместе со временами — диапазон from/to и страница после курсора берутся из него
+двоичным поиском (Main_back), так же дёшево, как в порядке по имени.
+Время — из EXIF (метаданные image_meta), для файлов без него — mtime. Строится один раз на папку,
+дальше при изменении папки или дозаполнении метаданных переставляются только изменившиеся файлы.
+"""
+import bisect
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from app.models.enums import DataFolder
+from app.services.file_index import FileEntry, FolderIndex
+from app.services.image_meta import ImageMeta, ImageMetaIndex
+
+# Если изменилась больше чем четверть папки — полная сортировка дешевле вставок по одному
+_FULL_REBUILD_FRACTION = 4
+
+
+def wall_clock_timestamp(value: datetime) -> float:
+    """Секунды «настенного» времени: наивное локальное время как UTC. Камеры пишут в EXIF время
+    без часового пояса, поэтому сравниваются показания часов, а не абсолютные моменты."""
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+def capture_timestamp(meta: ImageMeta | None, entry: FileEntry) -> float:
+    """Время съёмки файла; без EXIF — mtime в локальном времени сервера."""
+    if meta is not None and meta.taken_at:
+        try:
+            return wall_clock_timestamp(datetime.fromisoformat(meta.taken_at))
+        except ValueError:
+            pass
+    return wall_clock_timestamp(datetime.fromtimestamp(entry.mtime))
+
+
+@dataclass(frozen=True)
+class CaptureOrder:
+    """Снимок папки в порядке съёмки: ключи (время, путь) по возрастанию и метаданные, по которым он построен."""
+    version: str  # Версия папки + число метаданных — ETag ответа /list?order=time
+    keys: list[tuple[float, str]]
+    meta: dict[str, ImageMeta]
+
+    @property
+    def paths(self) -> list[str]:
+        return [path for _t, path in self.keys]
+
+    @property
+    def times(self) -> list[float]:
+        return [t for t, _path in self.keys]
+
+
+class CaptureTimeIndex:
+    """Порядок съёмки по папкам. Готовый снимок заменяется целиком — читатели не видят полуготовых данных."""
+
+    def __init__(self) -> None:
+        self._orders: dict[DataFolder, tuple[tuple[str, int], CaptureOrder, dict[str, float]]] = {}
+        self._lock = threading.Lock()
+
+    def order(self, snapshot: FolderIndex, meta_index: ImageMetaIndex) -> CaptureOrder:
+        """Порядок съёмки для снимка папки. Пересчитывается, только если изменились папка или её метаданные."""
+        folder = snapshot.folder
+        state = (snapshot.version, meta_index.generation(folder))
+        cached = self._orders.get(folder)
+        if cached is not None and cached[0] == state:
+            return cached[1]
+        with self._lock:
+            cached = self._orders.get(folder)
+            if cached is not None and cached[0] == state:
+                return cached[1]
+            meta = meta_index.folder_meta(snapshot)
+            times = {rel: capture_timestamp(meta.get(rel), entry) for rel, entry in snapshot.entries.items()}
+            keys = self._updated_keys(cached, times)
+            order = CaptureOrder(version=f"{snapshot.version}-m{len(meta)}-t", keys=keys, meta=meta)
+            self._orders[folder] = (state, order, times)
+            return order
+
+    @staticmethod
+    def _updated_keys(
+        cached: tuple[tuple[str, int], CaptureOrder, dict[str, float]] | None,
+        times: dict[str, float],
+    ) -> list[tuple[float, str]]:
+        if cached is None:
+            return sorted((t, rel) for rel, t in times.items())
+        _state, previous, previous_times = cached
+        removed = [(t, rel) for rel, t in previous_times.items() if times.get(rel) != t]
+        added = [(t, rel) for rel, t in times.items() if previous_times.get(rel) != t]
+        if (len(removed) + len(added)) * _FULL_REBUILD_FRACTION > len(times):
+            return sorted((t, rel) for rel, t in times.items())
+        # Копия: прежний снимок могут читать параллельные запросы
+        keys = list(previous.keys)
+        for key in removed:
+            i = bisect.bisect_left(keys, key)
+            if i < len(keys) and keys[i] == key:
+                del keys[i]
+        for key in added:
+            bisect.insort(keys, key)
+        return keys
@@ -0,0 +1,113 @@
+"""
+HTTP-семантика отдачи файлов: валидаторы (ETag, Last-Modified), условные запросы
+(If-None-Match, If-Modified-Since, If-Range) и разбор Range с несколькими диапазонами.
+"""
+from email.utils import formatdate, parsedate_to_datetime
+
+from app.services.file_index import FileEntry
+
+# Больше диапазонов в одном запросе не обслуживаем — отдаём файл целиком (RFC 9110 разрешает)
+MAX_RANGES = 16
+
+
+def entry_etag(entry: FileEntry) -> str:
+    """Сильный ETag из индекса: размер и mtime (нс) — без чтения файла."""
+    return f'"{entry.size:x}-{entry.mtime_ns:x}"'
+
+
+def entry_last_modified(entry: FileEntry) -> str:
+    return formatdate(entry.mtime, usegmt=True)
+
+
+def _parse_http_date(value: str) -> float | None:
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+
+def _etag_list(header: str) -> list[str]:
+    return [tag.strip() for tag in header.split(",") if tag.strip()]
+
+
+def _weak_equal(a: str, b: str) -> bool:
+    return a.removeprefix("W/") == b.removeprefix("W/")
+
+
+def is_not_modified(headers, etag: str, mtime: float | None = None) -> bool:
+    """True, если клиент уже имеет актуальную версию (ответ 304).
+    If-None-Match приоритетнее If-Modified-Since (RFC 9110, 13.2.2). Без mtime (списки папок,
+    архив выборки — у них только ETag версии) If-Modified-Since не учитывается."""
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = _etag_list(if_none_match)
+        return "*" in tags or any(_weak_equal(tag, etag) for tag in tags)
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since and mtime is not None:
+        since = _parse_http_date(if_modified_since)
+        return since is not None and int(mtime) <= since
+    return False
+
+
+def if_range_allows(headers, etag: str, mtime: float | None = None) -> bool:
+    """Можно ли выполнить Range: If-Range отсутствует или совпадает (ETag — строго, дата — точно;
+    без mtime дата не совпадает никогда)."""
+    if_range = headers.get("if-range")
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        return if_range == etag
+    since = _parse_http_date(if_range)
+    return since is not None and mtime is not None and since == int(mtime)
+
+
+def parse_ranges(range_header: str | None, size: int) -> list[tuple[int, int]] | None:
+    """Разбирает Range: bytes=a-b, a-, -n через запятую.
+    None — заголовка нет, он некорректен или диапазонов слишком много (отдаём весь файл).
+    ValueError — ни один диапазон не пересекается с файлом (416).
+    Пересекающиеся и смежные диапазоны объединяются."""
+    if not range_header:
+        return None
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec.strip():
+        return None
+    ranges: list[tuple[int, int]] = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        start_s, dash, end_s = part.partition("-")
+        if not dash:
+            return None
+        start_s, end_s = start_s.strip(), end_s.strip()
+        try:
+            if not start_s:
+                # Суффикс: последние n байт
+                suffix = int(end_s)
+                if suffix <= 0:
+                    continue
+                start, end = max(0, size - suffix), size - 1
+            else:
+                start = int(start_s)
+                end = int(end_s) if end_s else None
+                if start < 0 or (end is not None and end < start):
+                    return None
+                end = size - 1 if end is None else min(end, size - 1)
+        except ValueError:
+            return None
+        if start <= end and start < size:
+            ranges.append((start, end))
+    if not ranges:
+        raise ValueError("Range Not Satisfiable")
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        last_start, last_end = merged[-1]
+        if start <= last_end + 1:
+            merged[-1] = (last_start, max(last_end, end))
+        else:
+            merged.append((start, end))
+    if len(merged) > MAX_RANGES:
+        return None
+    return merged
@@ -0,0 +1,294 @@
+"""
+Почти одинаковые фото (серии кадров, один момент у двух фотографов, повторные загрузки гостей):
+поиск по dHash из метаданных image_meta. Расстояние Хэмминга между хешами считается векторно
+(NumPy: XOR и popcount по байтам, блоками строк выше диагонали), без NumPy — BK-деревом.
+Группа — лучший снимок (больше пикселей, затем больше байт) и ещё не разобранные фото не дальше
+порога от него: цепочки «A≈B≈C», где A и C уже заметно разные, не склеиваются.
+Результат — отчёт data/.cache/duplicates/<папка>.json; по нему /list?hide_duplicates=true скрывает
+дубликаты, а архив фото собирается без них.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # type: ignore
+
+from app.models.enums import DataFolder
+from app.services.file_index import FileIndex, FolderIndex
+from app.services.image_meta import ImageMetaIndex
+
+logger = logging.getLogger(__name__)
+
+_REPORT_FORMAT = 1
+# Папки без изображений
+_SKIP_FOLDERS = {DataFolder.wedding_day_video, DataFolder.zip}
+# Строк матрицы расстояний за шаг NumPy: блок × n × 8 байт памяти
+_NUMPY_BLOCK = 256
+
+if np is not None:
+    _POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+@dataclass(frozen=True)
+class Duplicate:
+    path: str
+    distance: int  # Различающихся бит dHash с оставленным фото
+    size: int
+
+
+@dataclass(frozen=True)
+class DuplicateGroup:
+    keep: str  # Остаётся в галерее и архиве
+    duplicates: tuple[Duplicate, ...]
+
+
+@dataclass(frozen=True)
+class DuplicateReport:
+    folder: DataFolder
+    source_version: str  # Версия папки и число метаданных, по которым построен отчёт
+    max_distance: int
+    hashed: int  # Фото с dHash
+    generated_at: str
+    groups: tuple[DuplicateGroup, ...]
+
+    @property
+    def duplicate_files(self) -> int:
+        return sum(len(g.duplicates) for g in self.groups)
+
+    @property
+    def duplicate_bytes(self) -> int:
+        return sum(d.size for g in self.groups for d in g.duplicates)
+
+
+def _near_pairs_numpy(hashes: list[int], max_distance: int) -> list[tuple[int, int, int]]:
+    values = np.array(hashes, dtype=np.uint64)
+    pairs = []
+    for start in range(0, len(values) - 1, _NUMPY_BLOCK):
+        block = values[start:start + _NUMPY_BLOCK]
+        # Сравниваем блок только с собой и последующими: пары ниже диагонали уже посчитаны
+        xor = block[:, None] ^ values[None, start:]
+        if hasattr(np, "bitwise_count"):
+            distances = np.bitwise_count(xor)
+        else:
+            # NumPy < 2.0: popcount по байтам через таблицу
+            distances = _POPCOUNT8[xor.view(np.uint8)].reshape(xor.shape + (8,)).sum(axis=2, dtype=np.uint8)
+        rows, cols = np.nonzero(distances <= max_distance)
+        for row, col in zip(rows.tolist(), cols.tolist()):
+            if col > row:
+                pairs.append((start + row, start + col, int(distances[row, col])))
+    return pairs
+
+
+def _near_pairs_bktree(hashes: list[int], max_distance: int) -> list[tuple[int, int, int]]:
+    # Узел: (хеш, индекс, потомки по расстоянию до узла)
+    root: tuple[int, int, dict] | None = None
+    pairs = []
+    for j, value in enumerate(hashes):
+        if root is None:
+            root = (value, j, {})
+            continue
+        stack = [root]
+        while stack:
+            node_value, i, children = stack.pop()
+            d = (node_value ^ value).bit_count()
+            if d <= max_distance:
+                pairs.append((i, j, d))
+            # Неравенство треугольника: ближе порога могут быть только потомки с |k - d| <= max_distance
+            for k in range(max(0, d - max_distance), d + max_distance + 1):
+                child = children.get(k)
+                if child is not None:
+                    stack.append(child)
+        node = root
+        while True:
+            node_value, _i, children = node
+            d = (node_value ^ value).bit_count()
+            if d not in children:
+                children[d] = (value, j, {})
+                break
+            node = children[d]
+    return sorted(pairs)
+
+
+def near_pairs(hashes: list[int], max_distance: int) -> list[tuple[int, int, int]]:
+    """Пары (i, j, расстояние), i < j, хешей с расстоянием Хэмминга не больше max_distance."""
+    if len(hashes) < 2:
+        return []
+    if np is not None:
+        return _near_pairs_numpy(hashes, max_distance)
+    return _near_pairs_bktree(hashes, max_distance)
+
+
+def group_duplicates(items: list[tuple[str, int, int, int]], max_distance: int) -> list[DuplicateGroup]:
+    """Группы почти одинаковых фото. items — (путь, dHash, пикселей, байт) в порядке путей."""
+    neighbours: dict[int, dict[int, int]] = {}
+    for i, j, d in near_pairs([item[1] for item in items], max_distance):
+        neighbours.setdefault(i, {})[j] = d
+        neighbours.setdefault(j, {})[i] = d
+    # Лучшие снимки первыми: больше пикселей, больше байт, раньше по пути
+    candidates = sorted(neighbours, key=lambda k: (-items[k][2], -items[k][3], k))
+    assigned: set[int] = set()
+    groups: dict[int, DuplicateGroup] = {}
+    for k in candidates:
+        if k in assigned:
+            continue
+        members = sorted((j, d) for j, d in neighbours[k].items() if j not in assigned)
+        if not members:
+            continue
+        assigned.add(k)
+        assigned.update(j for j, _d in members)
+        groups[k] = DuplicateGroup(
+            keep=items[k][0],
+            duplicates=tuple(Duplicate(path=items[j][0], distance=d, size=items[j][3]) for j, d in members),
+        )
+    # В отчёте — в порядке путей оставленных фото
+    return [groups[k] for k in sorted(groups)]
+
+
+def _report_to_json(report: DuplicateReport) -> dict:
+    return {
+        "format": _REPORT_FORMAT,
+        "folder": report.folder.value,
+        "source_version": report.source_version,
+        "max_distance": report.max_distance,
+        "generated_at": report.generated_at,
+        "hashed": report.hashed,
+        "duplicate_files": report.duplicate_files,
+        "duplicate_bytes": report.duplicate_bytes,
+        "groups": [
+            {
+                "keep": g.keep,
+                "duplicates": [{"path": d.path, "distance": d.distance, "size": d.size} for d in g.duplicates],
+            }
+            for g in report.groups
+        ],
+    }
+
+
+def _report_from_json(folder: DataFolder, raw: dict) -> DuplicateReport:
+    return DuplicateReport(
+        folder=folder,
+        source_version=raw["source_version"],
+        max_distance=raw["max_distance"],
+        hashed=raw["hashed"],
+        generated_at=raw["generated_at"],
+        groups=tuple(
+            DuplicateGroup(
+                keep=g["keep"],
+                duplicates=tuple(Duplicate(path=d["path"], distance=d["distance"], size=d["size"]) for d in g["duplicates"]),
+            )
+            for g in raw["groups"]
+        ),
+    )
+
+
+class DuplicateIndex:
+    """Отчёты о дубликатах по папкам и множества скрываемых путей. Отчёт папки заменяется целиком."""
+
+    def __init__(self, max_distance: int = 6) -> None:
+        self.max_distance = max(0, min(64, max_distance))
+        self._root: Path | None = None
+        self._reports: dict[DataFolder, DuplicateReport] = {}
+        # Скрываемые пути и короткий хеш их списка (часть ETag списка без дубликатов)
+        self._hidden: dict[DataFolder, tuple[frozenset[str], str]] = {}
+        self._update_lock = threading.Lock()
+
+    def report_path(self, folder: DataFolder) -> Path:
+        return self._root / ".cache" / "duplicates" / f"{folder.value}.json"
+
+    def load(self, data_root: Path) -> None:
+        """Загружает сохранённые отчёты: дубликаты скрываются сразу после старта, до нового поиска."""
+        self._root = data_root.resolve()
+        for folder in DataFolder:
+            try:
+                raw = json.loads(self.report_path(folder).read_text(encoding="utf-8"))
+                if raw.get("format") != _REPORT_FORMAT:
+                    continue
+                self._set_report(_report_from_json(folder, raw))
+            except (OSError, ValueError, KeyError, TypeError):
+                continue
+
+    def report(self, folder: DataFolder) -> DuplicateReport | None:
+        return self._reports.get(folder)
+
+    def hidden(self, folder: DataFolder) -> frozenset[str]:
+        """Пути, скрываемые из списка папки (дубликаты; лучший снимок группы остаётся)."""
+        return self._hidden.get(folder, (frozenset(), "0"))[0]
+
+    def digest(self, folder: DataFolder) -> str:
+        """Короткий хеш набора скрываемых путей; "0" — скрывать нечего."""
+        return self._hidden.get(folder, (frozenset(), "0"))[1]
+
+    def update_folder(self, snapshot: FolderIndex, meta_index: ImageMetaIndex) -> DuplicateReport | None:
+        """Ищет дубликаты заново, если изменились папка, её метаданные или порог. Возвращает новый
+        отчёт или None, если прежний актуален."""
+        if self._root is None:
+            return None
+        with self._update_lock:
+            folder = snapshot.folder
+            meta = meta_index.folder_meta(snapshot)
+            source_version = f"{snapshot.version}-m{len(meta)}"
+            previous = self._reports.get(folder)
+            if previous is not None and (previous.source_version, previous.max_distance) == (source_version, self.max_distance):
+                return None
+            items = [
+                (rel, int(m.dhash, 16), m.width * m.height, snapshot.entries[rel].size)
+                for rel, m in meta.items()
+                if m.dhash
+            ]
+            if not items and previous is None:
+                return None
+            report = DuplicateReport(
+                folder=folder,
+                source_version=source_version,
+                max_distance=self.max_distance,
+                hashed=len(items),
+                generated_at=datetime.now().isoformat(timespec="seconds"),
+                groups=tuple(group_duplicates(items, self.max_distance)),
+            )
+            self._save(report)
+            self._set_report(report)
+            return report
+
+    def _set_report(self, report: DuplicateReport) -> None:
+        hidden = frozenset(d.path for g in report.groups for d in g.duplicates)
+        digest = hashlib.sha1("\n".join(sorted(hidden)).encode("utf-8")).hexdigest()[:12] if hidden else "0"
+        self._reports[report.folder] = report
+        self._hidden[report.folder] = (hidden, digest)
+
+    def _save(self, report: DuplicateReport) -> None:
+        path = self.report_path(report.folder)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(_report_to_json(report), ensure_ascii=False, indent=1), encoding="utf-8")
+        os.replace(tmp, path)
+
+
+async def run_duplicate_scan_loop(
+    index: FileIndex, meta_index: ImageMetaIndex, duplicate_index: DuplicateIndex, interval: float
+) -> None:
+    """Фоновый поиск дубликатов в папках с фото: при смене версии папки или числа извлечённых
+    метаданных (пока dHash дозаполняются, отчёт уточняется). Поиск — в отдельном потоке."""
+    while True:
+        for folder in DataFolder:
+            if folder in _SKIP_FOLDERS:
+                continue
+            try:
+                report = await asyncio.to_thread(duplicate_index.update_folder, index.folder(folder), meta_index)
+            except Exception:
+                logger.exception("Ошибка поиска дубликатов в папке %s", folder.value)
+                continue
+            if report is not None and report.groups:
+                logger.info(
+                    "Дубликаты %s: групп %s, скрыто файлов %s (%.1f МБ)",
+                    folder.value, len(report.groups), report.duplicate_files, report.duplicate_bytes / 1024 / 1024,
+                )
+        await asyncio.sleep(interval)
@@ -0,0 +1,79 @@
+"""
+Запуск локальных ffmpeg/ffprobe (подпроцессы, event loop не блокируется).
+Пути к бинарникам — env FILE_STORAGE_FFMPEG / FILE_STORAGE_FFPROBE (см. conf/settings.py).
+"""
+import asyncio
+import json
+from dataclasses import dataclass
+from pathlib import Path
+
+try:
+    from conf.settings import settings
+except ImportError:
+    settings = None
+
+FFMPEG_BIN = settings.file_storage_ffmpeg if settings is not None else "ffmpeg"
+FFPROBE_BIN = settings.file_storage_ffprobe if settings is not None else "ffprobe"
+
+VIDEO_EXTENSIONS = {".mp4", ".mov", ".m4v", ".mkv", ".webm"}
+
+
+class FfmpegError(Exception):
+    """ffmpeg/ffprobe не найден или завершился с ошибкой"""
+
+
+@dataclass(frozen=True)
+class VideoInfo:
+    width: int
+    height: int
+    duration: float
+    has_audio: bool
+
+
+async def _run(args: list[str]) -> bytes:
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *args,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+    except FileNotFoundError as exc:
+        raise FfmpegError(f"{args[0]} не найден") from exc
+    try:
+        stdout, stderr = await process.communicate()
+    except asyncio.CancelledError:
+        # Не оставляем осиротевший ffmpeg
+        process.kill()
+        await process.wait()
+        raise
+    if process.returncode != 0:
+        message = stderr.decode("utf-8", "replace").strip().splitlines()[-1:] or ["без вывода"]
+        raise FfmpegError(f"{Path(args[0]).name}: код {process.returncode}: {message[0]}")
+    return stdout
+
+
+async def run_ffmpeg(args: list[str]) -> None:
+    """ffmpeg с аргументами args (без имени бинарника); вывод только об ошибках."""
+    await _run([FFMPEG_BIN, "-hide_banner", "-loglevel", "error", "-nostdin", "-y", *args])
+
+
+async def probe_video(path: Path) -> VideoInfo:
+    """Размер первого видеопотока, длительность и наличие звука."""
+    out = await _run([
+        FFPROBE_BIN, "-v", "error",
+        "-show_entries", "stream=codec_type,width,height:format=duration",
+        "-of", "json", str(path),
+    ])
+    try:
+        data = json.loads(out)
+        streams = data.get("streams") or []
+        video = next(s for s in streams if s.get("codec_type") == "video")
+        return VideoInfo(
+            width=int(video["width"]),
+            height=int(video["height"]),
+            duration=float((data.get("format") or {}).get("duration") or 0.0),
+            has_audio=any(s.get("codec_type") == "audio" for s in streams),
+        )
+    except (ValueError, KeyError, StopIteration) as exc:
+        raise FfmpegError(f"ffprobe: нет видеопотока в {path.name}") from exc
@@ -0,0 +1,187 @@
+"""
+Индекс файлов хранилища в памяти: относительный путь → размер, mtime, content-type.
+Строится при старте и периодически пересканируется (os.scandir, без чтения файлов).
+Список папки и проверка пути становятся поиском в словаре вместо обхода диска на каждый запрос.
+"""
+import asyncio
+import hashlib
+import logging
+import mimetypes
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from app.models.enums import DataFolder
+
+logger = logging.getLogger(__name__)
+
+
+def path_sort_key(relative_path: str) -> tuple[str, ...]:
+    """Порядок как у sorted(Path.rglob()) — по частям пути."""
+    return tuple(relative_path.split("/"))
+
+
+def guess_content_type(name: str) -> str:
+    content_type, _ = mimetypes.guess_type(name)
+    return content_type or "application/octet-stream"
+
+
+@dataclass(frozen=True)
+class FileEntry:
+    """Файл в индексе"""
+    relative_path: str
+    path: Path
+    size: int
+    mtime_ns: int
+    content_type: str
+
+    @property
+    def mtime(self) -> float:
+        return self.mtime_ns / 1_000_000_000
+
+    @classmethod
+    def from_path(cls, relative_path: str, path: Path) -> "FileEntry":
+        """Запись по stat() файла (для файлов вне индекса: превью, только что появившиеся файлы)."""
+        st = path.stat()
+        return cls(
+            relative_path=relative_path,
+            path=path,
+            size=st.st_size,
+            mtime_ns=st.st_mtime_ns,
+            content_type=guess_content_type(path.name),
+        )
+
+
+@dataclass
+class FolderIndex:
+    """Снимок папки: файлы, отсортированные пути и версия (хеш путей, размеров и mtime)."""
+    folder: DataFolder
+    entries: dict[str, FileEntry] = field(default_factory=dict)
+    paths: list[str] = field(default_factory=list)
+    version: str = ""
+    scanned_at: float = 0.0
+
+
+class FileIndex:
+    """Индекс всех папок DataFolder. Снимок папки заменяется целиком — читатели не видят полуготовых данных."""
+
+    def __init__(self) -> None:
+        self._root: Path | None = None
+        self._folders: dict[DataFolder, FolderIndex] = {}
+
+    @property
+    def is_built(self) -> bool:
+        return self._root is not None
+
+    @property
+    def root(self) -> Path | None:
+        return self._root
+
+    def build(self, root: Path) -> None:
+        """Полное построение индекса по всем папкам."""
+        self._root = root.resolve()
+        for folder in DataFolder:
+            self._folders[folder] = self._scan_folder(folder)
+        total = sum(len(f.entries) for f in self._folders.values())
+        logger.info("Индекс файлов построен: %s файлов", total)
+
+    def refresh(self) -> list[DataFolder]:
+        """Пересканирует папки, возвращает список папок, версия которых изменилась."""
+        if self._root is None:
+            return []
+        changed: list[DataFolder] = []
+        for folder in DataFolder:
+            snapshot = self._scan_folder(folder)
+            previous = self._folders.get(folder)
+            if previous is None or previous.version != snapshot.version:
+                self._folders[folder] = snapshot
+                changed.append(folder)
+            else:
+                previous.scanned_at = snapshot.scanned_at
+        if changed:
+            logger.info("Индекс файлов обновлён: %s", ", ".join(f.value for f in changed))
+        return changed
+
+    def folder(self, folder: DataFolder) -> FolderIndex:
+        snapshot = self._folders.get(folder)
+        if snapshot is None:
+            if self._root is None:
+                return FolderIndex(folder=folder, version=hashlib.sha1(folder.value.encode("utf-8")).hexdigest())
+            snapshot = self._scan_folder(folder)
+            self._folders[folder] = snapshot
+        return snapshot
+
+    def get(self, relative_path: str) -> FileEntry | None:
+        """Поиск по нормализованному относительному пути (без ведущего /)."""
+        top = relative_path.split("/", 1)[0]
+        try:
+            folder = DataFolder(top)
+        except ValueError:
+            return None
+        snapshot = self._folders.get(folder)
+        if snapshot is None:
+            return None
+        return snapshot.entries.get(relative_path)
+
+    def _scan_folder(self, folder: DataFolder) -> FolderIndex:
+        root = self._root
+        entries: dict[str, FileEntry] = {}
+        if root is not None:
+            self._scan_dir(root, root / folder.value, entries)
+        paths = sorted(entries, key=path_sort_key)
+        digest = hashlib.sha1(folder.value.encode("utf-8"))
+        for rel in paths:
+            e = entries[rel]
+            digest.update(f"\0{rel}:{e.size}:{e.mtime_ns}".encode("utf-8"))
+        return FolderIndex(
+            folder=folder,
+            entries=entries,
+            paths=paths,
+            version=digest.hexdigest(),
+            scanned_at=time.time(),
+        )
+
+    def _scan_dir(self, root: Path, dir_path: Path, entries: dict[str, FileEntry]) -> None:
+        try:
+            it = os.scandir(dir_path)
+        except OSError:
+            return
+        with it:
+            for entry in it:
+                try:
+                    if entry.is_symlink():
+                        # Симлинки — только на файлы внутри data/
+                        target = Path(entry.path).resolve()
+                        if not target.is_file() or not target.is_relative_to(root):
+                            continue
+                    elif entry.is_dir(follow_symlinks=False):
+                        self._scan_dir(root, Path(entry.path), entries)
+                        continue
+                    elif not entry.is_file(follow_symlinks=False):
+                        continue
+                    st = entry.stat()
+                except OSError:
+                    continue
+                full = Path(entry.path)
+                rel = full.relative_to(root).as_posix()
+                entries[rel] = FileEntry(
+                    relative_path=rel,
+                    path=full,
+                    size=st.st_size,
+                    mtime_ns=st.st_mtime_ns,
+                    content_type=guess_content_type(entry.name),
+                )
+
+
+async def run_refresh_loop(index: FileIndex, interval: float) -> None:
+    """Фоновое обновление индекса раз в interval секунд (скан в отдельном потоке)."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(index.refresh)
+        except Exception:
+            logger.exception("Ошибка обновления индекса файлов")
+
+
+file_index = FileIndex()
@@ -0,0 +1,177 @@
+"""
+HLS-упаковка видео (несколько битрейтов) локальным ffmpeg: один проход с split/scale на все рендеры.
+Результат — data/.cache/hls/<путь к видео>/: master.m3u8, <рендер>/index.m3u8 и сегменты .ts.
+Упаковка идёт в фоне (одна на видео, ограниченное число одновременно), готовый каталог
+подменяется атомарно; source.json хранит размер и mtime исходника — изменённое видео упаковывается заново.
+"""
+import asyncio
+import json
+import logging
+import os
+import shutil
+from dataclasses import dataclass
+from pathlib import Path
+
+from app.services.ffmpeg import FfmpegError, VideoInfo, probe_video, run_ffmpeg
+from app.services.file_index import FileEntry
+
+logger = logging.getLogger(__name__)
+
+HLS_MASTER = "master.m3u8"
+HLS_SEGMENT_SECONDS = 6
+_SOURCE_MARKER = "source.json"
+
+
+@dataclass(frozen=True)
+class HlsRendition:
+    name: str
+    height: int
+    video_kbps: int
+    audio_kbps: int
+
+
+# Лестница битрейтов: рендеры выше исходника пропускаются
+HLS_RENDITIONS = (
+    HlsRendition("360p", 360, 800, 96),
+    HlsRendition("540p", 540, 1400, 128),
+    HlsRendition("720p", 720, 2800, 128),
+    HlsRendition("1080p", 1080, 5000, 160),
+)
+
+
+def hls_dir(data_root: Path, relative_path: str) -> Path:
+    """Каталог HLS для видео: data/.cache/hls/<путь к видео>/"""
+    return data_root / ".cache" / "hls" / relative_path
+
+
+def is_packaged(out_dir: Path, entry: FileEntry) -> bool:
+    """Упаковка есть и сделана из текущей версии исходника."""
+    try:
+        marker = json.loads((out_dir / _SOURCE_MARKER).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return False
+    return marker.get("size") == entry.size and marker.get("mtime_ns") == entry.mtime_ns
+
+
+def select_renditions(info: VideoInfo) -> list[HlsRendition]:
+    selected = [r for r in HLS_RENDITIONS if r.height <= info.height]
+    return selected or [HLS_RENDITIONS[0]]
+
+
+def build_hls_args(source: Path, out_dir: Path, info: VideoInfo, renditions: list[HlsRendition]) -> list[str]:
+    """Аргументы ffmpeg: декодирование один раз, split на рендеры, H.264/AAC, ключевые кадры
+    строго на границах сегментов (переключение битрейта без артефактов)."""
+    count = len(renditions)
+    split = f"[0:v]split={count}" + "".join(f"[v{i}]" for i in range(count))
+    scales = [f"[v{i}]scale=-2:{r.height}[v{i}out]" for i, r in enumerate(renditions)]
+    args = ["-i", str(source), "-filter_complex", ";".join([split, *scales])]
+    stream_map = []
+    for i, r in enumerate(renditions):
+        args += [
+            "-map", f"[v{i}out]",
+            f"-c:v:{i}", "libx264",
+            f"-b:v:{i}", f"{r.video_kbps}k",
+            f"-maxrate:v:{i}", f"{int(r.video_kbps * 1.07)}k",
+            f"-bufsize:v:{i}", f"{int(r.video_kbps * 1.5)}k",
+        ]
+        if info.has_audio:
+            args += ["-map", "0:a:0", f"-c:a:{i}", "aac", f"-b:a:{i}", f"{r.audio_kbps}k", "-ac", "2"]
+            stream_map.append(f"v:{i},a:{i},name:{r.name}")
+        else:
+            stream_map.append(f"v:{i},name:{r.name}")
+    args += [
+        "-preset", "veryfast",
+        "-profile:v", "main",
+        "-sc_threshold", "0",
+        "-force_key_frames", f"expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})",
+        "-f", "hls",
+        "-hls_time", str(HLS_SEGMENT_SECONDS),
+        "-hls_playlist_type", "vod",
+        "-hls_flags", "independent_segments",
+        "-hls_segment_filename", str(out_dir / "%v" / "seg_%05d.ts"),
+        "-master_pl_name", HLS_MASTER,
+        "-var_stream_map", " ".join(stream_map),
+        str(out_dir / "%v" / "index.m3u8"),
+    ]
+    return args
+
+
+async def package_hls(entry: FileEntry, out_dir: Path) -> list[str]:
+    """Упаковывает видео в HLS во временный каталог и атомарно подменяет out_dir.
+    Возвращает имена рендеров. FfmpegError — ffmpeg недоступен или упал."""
+    info = await probe_video(entry.path)
+    renditions = select_renditions(info)
+    out_dir.parent.mkdir(parents=True, exist_ok=True)
+    tmp_dir = out_dir.with_name(f".{out_dir.name}.{os.getpid()}.tmp")
+    old_dir = out_dir.with_name(f".{out_dir.name}.{os.getpid()}.old")
+    await asyncio.to_thread(shutil.rmtree, tmp_dir, True)
+    try:
+        for r in renditions:
+            (tmp_dir / r.name).mkdir(parents=True, exist_ok=True)
+        await run_ffmpeg(build_hls_args(entry.path, tmp_dir, info, renditions))
+        marker = {"size": entry.size, "mtime_ns": entry.mtime_ns, "renditions": [r.name for r in renditions]}
+        (tmp_dir / _SOURCE_MARKER).write_text(json.dumps(marker), encoding="utf-8")
+        if out_dir.exists():
+            os.replace(out_dir, old_dir)
+        os.replace(tmp_dir, out_dir)
+    finally:
+        await asyncio.to_thread(shutil.rmtree, tmp_dir, True)
+        await asyncio.to_thread(shutil.rmtree, old_dir, True)
+    return [r.name for r in renditions]
+
+
+class HlsPackager:
+    """Фоновая упаковка: одна задача на видео, не больше max_concurrent ffmpeg одновременно."""
+
+    def __init__(self, max_concurrent: int = 1) -> None:
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrent))
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.failures: dict[str, str] = {}
+
+    def is_running(self, relative_path: str) -> bool:
+        return relative_path in self._inflight
+
+    def start(self, entry: FileEntry, out_dir: Path) -> asyncio.Task:
+        """Запускает упаковку (или возвращает уже идущую)."""
+        task = self._inflight.get(entry.relative_path)
+        if task is None:
+            task = asyncio.create_task(self._package(entry, out_dir))
+            self._inflight[entry.relative_path] = task
+            task.add_done_callback(lambda _t: self._inflight.pop(entry.relative_path, None))
+        return task
+
+    async def _package(self, entry: FileEntry, out_dir: Path) -> None:
+        async with self._semaphore:
+            if is_packaged(out_dir, entry):
+                return
+            logger.info("HLS: упаковка %s", entry.relative_path)
+            try:
+                renditions = await package_hls(entry, out_dir)
+            except (FfmpegError, OSError) as exc:
+                self.failures[entry.relative_path] = str(exc)
+                logger.error("HLS: ошибка упаковки %s: %s", entry.relative_path, exc)
+                return
+            self.failures.pop(entry.relative_path, None)
+            logger.info("HLS: готово %s (%s)", entry.relative_path, ", ".join(renditions))
+
+    async def shutdown(self) -> None:
+        tasks = list(self._inflight.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+hls_packager = HlsPackager()
+
+
+def rewrite_playlist(text: str, playlist_file: str, uri_for) -> str:
+    """Подставляет в плейлист URL с токеном: ссылки в m3u8 относительные, а токен — в query,
+    который браузер при разрешении относительных ссылок не переносит. uri_for(file) → URL."""
+    base = playlist_file.rsplit("/", 1)[0] + "/" if "/" in playlist_file else ""
+    lines = []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped and not stripped.startswith("#"):
+            line = uri_for(base + stripped)
+        lines.append(line)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,330 @@
+"""
+Метаданные фото для сетки галереи: размеры (с учётом EXIF Orientation), ориентация, время съёмки,
+blurhash-заглушка и перцептивный хеш (dHash — поиск почти одинаковых снимков, см. duplicates).
+Извлекаются один раз на файл (JPEG декодируется сразу в уменьшенном масштабе через draft)
+и пересчитываются только для новых и изменённых файлов индекса — по размеру и mtime.
+Хранятся в памяти и в data/.cache/meta/<папка>.json, после перезапуска повторно не извлекаются.
+"""
+import asyncio
+import json
+import logging
+import math
+import operator
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None  # type: ignore
+
+from app.models.enums import DataFolder
+from app.services.file_index import FileEntry, FileIndex, FolderIndex
+
+logger = logging.getLogger(__name__)
+
+_META_FORMAT = 2
+# Опубликовать промежуточный результат (и сохранить на диск) каждые N извлечённых файлов
+_PUBLISH_EVERY = 200
+
+# blurhash считается по картинке не больше 32x32; компонент 4 по длинной стороне и 3 по короткой
+BLURHASH_SAMPLE = 32
+BLURHASH_COMPONENTS = (4, 3)
+_BASE83 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+# dHash: яркость 9x8, бит — «пиксель светлее соседа справа» (64 бита)
+DHASH_SIZE = 8
+_SRGB_TO_LINEAR = [
+    v / 255 / 12.92 if v / 255 <= 0.04045 else ((v / 255 + 0.055) / 1.055) ** 2.4
+    for v in range(256)
+]
+
+# Теги EXIF
+_ORIENTATION_TAG = 0x0112
+_DATETIME_TAG = 0x0132
+_EXIF_IFD = 0x8769
+_DATETIME_ORIGINAL_TAG = 0x9003
+_SUBSEC_ORIGINAL_TAG = 0x9291
+# Orientation 5–8: ширина и высота при показе меняются местами
+_ORIENTATION_SWAPS_SIDES = {5, 6, 7, 8}
+
+if Image is not None:
+    # Как в ImageOps.exif_transpose
+    _ORIENTATION_TRANSPOSE = {
+        2: Image.Transpose.FLIP_LEFT_RIGHT,
+        3: Image.Transpose.ROTATE_180,
+        4: Image.Transpose.FLIP_TOP_BOTTOM,
+        5: Image.Transpose.TRANSPOSE,
+        6: Image.Transpose.ROTATE_270,
+        7: Image.Transpose.TRANSVERSE,
+        8: Image.Transpose.ROTATE_90,
+    }
+
+
+@dataclass(frozen=True)
+class ImageMeta:
+    width: int  # Размеры при показе (после поворота по EXIF)
+    height: int
+    orientation: int  # EXIF Orientation исходного файла (1 — без поворота)
+    taken_at: str | None  # Время съёмки из EXIF, ISO 8601 без часового пояса (локальное время камеры)
+    blurhash: str | None
+    dhash: str | None = None  # 64-битный dHash (16 hex) в ориентации показа; в /list не отдаётся
+
+
+@dataclass(frozen=True)
+class _MetaRecord:
+    size: int
+    mtime_ns: int
+    meta: ImageMeta | None  # None — файл не читается как изображение (повтор только после изменения)
+
+
+def _encode83(value: int, length: int) -> str:
+    return "".join(_BASE83[(value // 83 ** (length - i)) % 83] for i in range(1, length + 1))
+
+
+def _linear_to_srgb(value: float) -> int:
+    v = max(0.0, min(1.0, value))
+    if v <= 0.0031308:
+        return int(v * 12.92 * 255 + 0.5)
+    return int((1.055 * v ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def _sign_pow(value: float, exp: float) -> float:
+    return math.copysign(abs(value) ** exp, value)
+
+
+def encode_blurhash(img, components_x: int, components_y: int) -> str:
+    """blurhash (https://blurha.sh) по маленькому RGB-изображению: DC-компонента — средний цвет,
+    AC — косинусные гармоники, всё в base83 (20–30 символов)."""
+    width, height = img.size
+    data = img.tobytes()
+    channels = [[_SRGB_TO_LINEAR[b] for b in data[c::3]] for c in range(3)]
+    cos_x = [[math.cos(math.pi * i * x / width) for x in range(width)] for i in range(components_x)]
+    cos_y = [[math.cos(math.pi * j * y / height) for y in range(height)] for j in range(components_y)]
+    factors = []
+    for j in range(components_y):
+        for i in range(components_x):
+            # Пиксели построчно: базис — внешнее произведение косинусов по y и x
+            basis = [cy * cx for cy in cos_y[j] for cx in cos_x[i]]
+            scale = (1 if i == 0 and j == 0 else 2) / (width * height)
+            factors.append(tuple(scale * sum(map(operator.mul, basis, ch)) for ch in channels))
+
+    dc, ac = factors[0], factors[1:]
+    result = _encode83((components_x - 1) + (components_y - 1) * 9, 1)
+    if ac:
+        actual_max = max(abs(v) for f in ac for v in f)
+        quantised_max = max(0, min(82, math.floor(actual_max * 166 - 0.5)))
+        max_value = (quantised_max + 1) / 166
+        result += _encode83(quantised_max, 1)
+    else:
+        max_value = 1.0
+        result += _encode83(0, 1)
+    result += _encode83(
+        (_linear_to_srgb(dc[0]) << 16) + (_linear_to_srgb(dc[1]) << 8) + _linear_to_srgb(dc[2]), 4
+    )
+    for f in ac:
+        q = [max(0, min(18, math.floor(_sign_pow(v / max_value, 0.5) * 9 + 9.5))) for v in f]
+        result += _encode83(q[0] * 19 * 19 + q[1] * 19 + q[2], 2)
+    return result
+
+
+def difference_hash(img) -> str:
+    """dHash: картинка сжимается до (DHASH_SIZE + 1) x DHASH_SIZE в оттенках серого, каждый бит —
+    сравнение соседних пикселей строки. Устойчив к масштабу, сжатию и небольшой правке цвета."""
+    small = img.convert("L").resize((DHASH_SIZE + 1, DHASH_SIZE), Image.Resampling.BILINEAR)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(DHASH_SIZE):
+        line = pixels[row * (DHASH_SIZE + 1):(row + 1) * (DHASH_SIZE + 1)]
+        for left, right in zip(line, line[1:]):
+            value = (value << 1) | (left > right)
+    return f"{value:0{DHASH_SIZE * DHASH_SIZE // 4}x}"
+
+
+def _capture_time(exif) -> str | None:
+    """DateTimeOriginal (+ доли секунды), иначе DateTime из IFD0. Нули и мусор — None."""
+    try:
+        exif_ifd = exif.get_ifd(_EXIF_IFD)
+    except Exception:
+        exif_ifd = {}
+    raw = exif_ifd.get(_DATETIME_ORIGINAL_TAG)
+    original = raw is not None
+    if raw is None:
+        raw = exif.get(_DATETIME_TAG)
+    if not isinstance(raw, str):
+        return None
+    try:
+        taken = datetime.strptime(raw.strip("\x00 "), "%Y:%m:%d %H:%M:%S")
+    except ValueError:
+        return None
+    subsec = str(exif_ifd.get(_SUBSEC_ORIGINAL_TAG) or "").strip("\x00 ")
+    if original and subsec.isdigit():
+        taken = taken.replace(microsecond=int(subsec[:6].ljust(6, "0")))
+    return taken.isoformat()
+
+
+def extract_image_meta(path: Path) -> ImageMeta:
+    """Размеры, ориентация, время съёмки, blurhash и dHash. Пиксели декодируются только в уменьшенном виде."""
+    with Image.open(path) as img:
+        width, height = img.size
+        exif = img.getexif()
+        orientation = exif.get(_ORIENTATION_TAG, 1)
+        if not isinstance(orientation, int) or not 1 <= orientation <= 8:
+            orientation = 1
+        taken_at = _capture_time(exif)
+        # JPEG: масштаб 1/2–1/8 прямо при декодировании DCT (size после draft уже уменьшен)
+        img.draft("RGB", (BLURHASH_SAMPLE * 2, BLURHASH_SAMPLE * 2))
+        small = img.convert("RGB")
+    small.thumbnail((BLURHASH_SAMPLE, BLURHASH_SAMPLE))
+    if orientation != 1:
+        small = small.transpose(_ORIENTATION_TRANSPOSE[orientation])
+    if orientation in _ORIENTATION_SWAPS_SIDES:
+        width, height = height, width
+    long_side, short_side = BLURHASH_COMPONENTS
+    components = (long_side, short_side) if small.width >= small.height else (short_side, long_side)
+    return ImageMeta(
+        width=width,
+        height=height,
+        orientation=orientation,
+        taken_at=taken_at,
+        blurhash=encode_blurhash(small, *components),
+        dhash=difference_hash(small),
+    )
+
+
+def _extract_or_none(entry: FileEntry) -> ImageMeta | None:
+    try:
+        return extract_image_meta(entry.path)
+    except Exception as exc:
+        logger.warning("Метаданные %s не извлечены: %s", entry.relative_path, exc)
+        return None
+
+
+def _is_fresh(record: _MetaRecord | None, entry: FileEntry) -> bool:
+    return record is not None and record.size == entry.size and record.mtime_ns == entry.mtime_ns
+
+
+class ImageMetaIndex:
+    """Метаданные изображений по папкам индекса. Словарь папки заменяется целиком (как снимок
+    в FileIndex) — читатели в event loop не видят полуготовых данных."""
+
+    def __init__(self, workers: int = 2) -> None:
+        self.workers = max(1, workers)
+        self._root: Path | None = None
+        self._folders: dict[DataFolder, dict[str, _MetaRecord]] = {}
+        # Счётчик замен словаря папки — по нему производные индексы (порядок съёмки) видят изменения
+        self._generations: dict[DataFolder, int] = {}
+        # Одну папку обновляет один поток
+        self._update_lock = threading.Lock()
+
+    def cache_path(self, folder: DataFolder) -> Path:
+        return self._root / ".cache" / "meta" / f"{folder.value}.json"
+
+    def load(self, data_root: Path) -> None:
+        """Загружает сохранённые метаданные (устаревшие записи отсеются по размеру и mtime)."""
+        self._root = data_root.resolve()
+        loaded = 0
+        for folder in DataFolder:
+            try:
+                raw = json.loads(self.cache_path(folder).read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            if raw.get("format") != _META_FORMAT:
+                continue
+            records = {}
+            for rel, item in (raw.get("files") or {}).items():
+                try:
+                    meta = ImageMeta(**item["meta"]) if item.get("meta") else None
+                    records[rel] = _MetaRecord(size=item["size"], mtime_ns=item["mtime_ns"], meta=meta)
+                except (KeyError, TypeError):
+                    continue
+            self._folders[folder] = records
+            self._generations[folder] = self._generations.get(folder, 0) + 1
+            loaded += len(records)
+        logger.info("Метаданные фото загружены: %s файлов", loaded)
+
+    def generation(self, folder: DataFolder) -> int:
+        return self._generations.get(folder, 0)
+
+    def get(self, entry: FileEntry) -> ImageMeta | None:
+        """Метаданные файла, если они извлечены для текущей версии файла."""
+        try:
+            folder = DataFolder(entry.relative_path.split("/", 1)[0])
+        except ValueError:
+            return None
+        record = self._folders.get(folder, {}).get(entry.relative_path)
+        return record.meta if _is_fresh(record, entry) else None
+
+    def folder_meta(self, snapshot: FolderIndex) -> dict[str, ImageMeta]:
+        """Метаданные изображений снимка папки (в порядке путей), только актуальные."""
+        records = self._folders.get(snapshot.folder, {})
+        result: dict[str, ImageMeta] = {}
+        for rel in snapshot.paths:
+            record = records.get(rel)
+            if record is not None and record.meta is not None and _is_fresh(record, snapshot.entries[rel]):
+                result[rel] = record.meta
+        return result
+
+    def update_folder(self, snapshot: FolderIndex) -> int:
+        """Извлекает метаданные новых и изменённых изображений папки (в потоках: Pillow отпускает GIL
+        при декодировании), удаляет записи исчезнувших файлов. Возвращает число обработанных файлов."""
+        if Image is None or self._root is None:
+            return 0
+        with self._update_lock:
+            folder = snapshot.folder
+            current = self._folders.get(folder, {})
+            records = {rel: r for rel, r in current.items() if rel in snapshot.entries}
+            pending = [
+                entry for rel, entry in snapshot.entries.items()
+                if entry.content_type.startswith("image/") and not _is_fresh(records.get(rel), entry)
+            ]
+            if not pending:
+                if len(records) != len(current):
+                    self._publish(folder, records)
+                return 0
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="image-meta") as pool:
+                for n, (entry, meta) in enumerate(zip(pending, pool.map(_extract_or_none, pending)), 1):
+                    records[entry.relative_path] = _MetaRecord(size=entry.size, mtime_ns=entry.mtime_ns, meta=meta)
+                    if n % _PUBLISH_EVERY == 0:
+                        self._publish(folder, records)
+            self._publish(folder, records)
+            return len(pending)
+
+    def _publish(self, folder: DataFolder, records: dict[str, _MetaRecord]) -> None:
+        self._folders[folder] = dict(records)
+        self._generations[folder] = self._generations.get(folder, 0) + 1
+        path = self.cache_path(folder)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "format": _META_FORMAT,
+            "files": {
+                rel: {"size": r.size, "mtime_ns": r.mtime_ns, "meta": asdict(r.meta) if r.meta else None}
+                for rel, r in records.items()
+            },
+        }
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+
+
+async def run_meta_refresh_loop(index: FileIndex, meta_index: ImageMetaIndex, interval: float) -> None:
+    """Фоновое извлечение метаданных: сразу после старта (файлы, появившиеся с прошлого запуска),
+    затем при каждой смене версии папки в индексе. Обрабатываются только изменившиеся файлы."""
+    seen: dict[DataFolder, str] = {}
+    while True:
+        for folder in DataFolder:
+            snapshot = index.folder(folder)
+            if seen.get(folder) == snapshot.version:
+                continue
+            try:
+                extracted = await asyncio.to_thread(meta_index.update_folder, snapshot)
+            except Exception:
+                logger.exception("Ошибка извлечения метаданных папки %s", folder.value)
+                continue
+            seen[folder] = snapshot.version
+            if extracted:
+                logger.info("Метаданные %s: обработано файлов %s", folder.value, extracted)
+        await asyncio.sleep(interval)
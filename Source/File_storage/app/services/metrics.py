@@ -0,0 +1,43 @@
+"""
+Метрики File_storage — общий модуль conf/metrics.py. Без conf (локальный запуск без общего
+конфига) — пустой реестр с тем же интерфейсом: значения не копятся, /metrics отдаёт пустой текст.
+"""
+try:
+    from conf.metrics import CONTENT_TYPE, registry, route_label
+except ImportError:
+    CONTENT_TYPE = "text/plain; version=0.0.4"
+
+    class _NoopMetric:
+        def labels(self, *values) -> "_NoopMetric":
+            return self
+
+        def inc(self, amount: float = 1.0) -> None:
+            return None
+
+        def dec(self, amount: float = 1.0) -> None:
+            return None
+
+        def set(self, value: float) -> None:
+            return None
+
+        def observe(self, value: float) -> None:
+            return None
+
+    class _NoopRegistry:
+        def counter(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), collect=None) -> _NoopMetric:
+            return _NoopMetric()
+
+        def gauge(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), collect=None) -> _NoopMetric:
+            return _NoopMetric()
+
+        def histogram(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), buckets=()) -> _NoopMetric:
+            return _NoopMetric()
+
+        def render(self) -> str:
+            return ""
+
+    registry = _NoopRegistry()
+
+    def route_label(scope: dict) -> str:
+        route = scope.get("route")
+        return getattr(route, "path", None) or "unmatched"
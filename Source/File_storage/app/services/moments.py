@@ -0,0 +1,149 @@
+"""
+Моменты свадьбы (церемония, ужин, танцы…) — кластеры фото по времени съёмки. Граница моментов —
+промежуток между соседними кадрами больше max(MOMENT_MIN_GAP, MOMENT_GAP_FACTOR × медианный промежуток):
+серии снимков идут плотно, а переход между событиями — пауза. Промежутки считаются векторно (NumPy,
+без него — списками), слишком мелкие кластеры присоединяются к ближайшему соседу.
+Момент — непрерывный диапазон порядка съёмки (capture_index), поэтому альбом отдаётся той же выборкой
+from/to, что и обычный диапазон времени. Результат кешируется по версии порядка съёмки.
+"""
+import statistics
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Sequence
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # type: ignore
+
+from app.models.enums import DataFolder
+from app.services.capture_index import CaptureOrder
+from app.services.image_meta import ImageMeta
+
+# Пауза, которая точно разделяет события, и во сколько раз она должна превышать типичный промежуток
+MOMENT_MIN_GAP = 20 * 60
+MOMENT_GAP_FACTOR = 10.0
+# Кластер меньше MOMENT_MIN_PHOTOS — не отдельный момент; больше MOMENT_MAX моментов не показываем
+MOMENT_MIN_PHOTOS = 12
+MOMENT_MAX = 24
+
+
+@dataclass(frozen=True)
+class Moment:
+    id: str  # Время первого кадра: 20240817-150210
+    start: float  # Время съёмки первого и последнего кадра (секунды, как capture_times)
+    end: float
+    until: float | None  # Начало следующего момента (граница диапазона, не включая); None — до конца
+    start_index: int  # Диапазон в порядке съёмки [start_index, start_index + count)
+    count: int
+    cover: str | None  # Путь к обложке
+
+
+def _split_points(times: Sequence[float], min_gap: float, gap_factor: float, max_moments: int) -> list[int]:
+    """Индексы i, перед которыми начинается новый момент (промежуток times[i] - times[i-1] велик),
+    не больше max_moments - 1 самых больших."""
+    if len(times) < 2:
+        return []
+    if np is not None:
+        gaps = np.diff(np.asarray(times, dtype=np.float64))
+        positive = gaps[gaps > 0]
+        typical = float(np.median(positive)) if positive.size else 0.0
+        threshold = max(min_gap, gap_factor * typical)
+        candidates = np.flatnonzero(gaps > threshold)
+        if candidates.size > max_moments - 1:
+            # Оставляем самые большие паузы
+            keep = np.argpartition(gaps[candidates], -(max_moments - 1))[-(max_moments - 1):]
+            candidates = np.sort(candidates[keep])
+        return [int(i) + 1 for i in candidates]
+    gaps = [b - a for a, b in zip(times, times[1:])]
+    positive = [g for g in gaps if g > 0]
+    typical = statistics.median(positive) if positive else 0.0
+    threshold = max(min_gap, gap_factor * typical)
+    candidates = [i for i, g in enumerate(gaps) if g > threshold]
+    if len(candidates) > max_moments - 1:
+        candidates = sorted(sorted(candidates, key=lambda i: gaps[i])[-(max_moments - 1):])
+    return [i + 1 for i in candidates]
+
+
+def cluster_moments(
+    times: Sequence[float],
+    min_gap: float = MOMENT_MIN_GAP,
+    gap_factor: float = MOMENT_GAP_FACTOR,
+    min_photos: int = MOMENT_MIN_PHOTOS,
+    max_moments: int = MOMENT_MAX,
+) -> list[tuple[int, int]]:
+    """Кластеры отсортированных времён: список диапазонов индексов [start, end)."""
+    if not times:
+        return []
+    bounds = [0, *_split_points(times, min_gap, gap_factor, max_moments), len(times)]
+    clusters = [[bounds[k], bounds[k + 1]] for k in range(len(bounds) - 1)]
+    # Мелкий кластер присоединяется к соседу, от которого его отделяет меньшая пауза
+    while len(clusters) > 1:
+        small = min(range(len(clusters)), key=lambda k: clusters[k][1] - clusters[k][0])
+        start, end = clusters[small]
+        if end - start >= min_photos:
+            break
+        gap_before = times[start] - times[start - 1] if small > 0 else float("inf")
+        gap_after = times[end] - times[end - 1] if small < len(clusters) - 1 else float("inf")
+        if gap_before <= gap_after:
+            clusters[small - 1][1] = end
+        else:
+            clusters[small + 1][0] = start
+        del clusters[small]
+    return [(start, end) for start, end in clusters]
+
+
+def pick_cover(paths: Sequence[str], meta: dict[str, ImageMeta]) -> str | None:
+    """Обложка — фото из середины момента (по времени), горизонтальное, если такое есть в средней трети."""
+    images = [i for i, path in enumerate(paths) if path in meta]
+    if not images:
+        return None
+    middle = len(paths) // 2
+    half_window = max(1, len(paths) // 6)
+    in_window = [i for i in images if abs(i - middle) <= half_window]
+    landscape = [i for i in in_window if meta[paths[i]].width >= meta[paths[i]].height]
+    candidates = landscape or in_window or images
+    return paths[min(candidates, key=lambda i: abs(i - middle))]
+
+
+def moment_id(start: float) -> str:
+    return datetime.fromtimestamp(start, tz=timezone.utc).strftime("%Y%m%d-%H%M%S")
+
+
+def build_moments(order: CaptureOrder) -> list[Moment]:
+    times = order.times
+    paths = order.paths
+    clusters = cluster_moments(times)
+    moments = []
+    for k, (start, end) in enumerate(clusters):
+        moments.append(Moment(
+            id=moment_id(times[start]),
+            start=times[start],
+            end=times[end - 1],
+            until=times[clusters[k + 1][0]] if k + 1 < len(clusters) else None,
+            start_index=start,
+            count=end - start,
+            cover=pick_cover(paths[start:end], order.meta),
+        ))
+    return moments
+
+
+class MomentIndex:
+    """Моменты по папкам, пересчитываются при смене версии порядка съёмки."""
+
+    def __init__(self) -> None:
+        self._cache: dict[DataFolder, tuple[str, list[Moment]]] = {}
+        self._lock = threading.Lock()
+
+    def moments(self, folder: DataFolder, order: CaptureOrder) -> list[Moment]:
+        cached = self._cache.get(folder)
+        if cached is not None and cached[0] == order.version:
+            return cached[1]
+        with self._lock:
+            cached = self._cache.get(folder)
+            if cached is not None and cached[0] == order.version:
+                return cached[1]
+            moments = build_moments(order)
+            self._cache[folder] = (order.version, moments)
+            return moments
@@ -0,0 +1,228 @@
+"""
+Ответ с фрагментом файла без копирования через Python, когда сервер это умеет:
+- ASGI-расширение http.response.zerocopysend (sendfile с offset/count) — для Range и целого файла;
+- http.response.pathsend — для целого файла;
+- иначе чтение крупными блоками через os.pread в пуле потоков (event loop не блокируется).
+Размер и mtime из индекса файлов могут отставать от диска (индекс пересканируется периодически):
+файл открывается и сверяется через fstat до отправки заголовков, иначе Content-Length разойдётся с телом.
+"""
+import errno
+import os
+import secrets
+import typing
+
+import anyio
+from starlette.background import BackgroundTask
+from starlette.responses import JSONResponse, Response
+from starlette.types import Receive, Scope, Send
+
+# Размер блока при чтении без sendfile
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+class FileChangedError(Exception):
+    """Файл на диске не совпадает с записью индекса (размер или mtime)."""
+
+
+def open_checked(path: str, size: int | None = None, mtime_ns: int | None = None) -> int:
+    """Открывает файл и сверяет fstat с ожидаемыми размером и mtime. Дальше читается именно этот
+    дескриптор: замена файла (os.replace) после проверки на отдачу не влияет."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        st = os.fstat(fd)
+        if (size is not None and st.st_size != size) or (mtime_ns is not None and st.st_mtime_ns != mtime_ns):
+            raise FileChangedError(path)
+    except BaseException:
+        os.close(fd)
+        raise
+    return fd
+
+
+async def _open_or_error(path: str, size: int | None, mtime_ns: int | None) -> int | Response:
+    """Дескриптор файла или готовый ответ: 404 — файла уже нет, 412 — файл изменился после индексации
+    (клиент повторит запрос и получит новые валидаторы)."""
+    try:
+        return await anyio.to_thread.run_sync(open_checked, path, size, mtime_ns)
+    except FileNotFoundError:
+        return JSONResponse({"detail": "Файл не найден"}, status_code=404, headers={"Cache-Control": "no-store"})
+    except FileChangedError:
+        return JSONResponse({"detail": "Файл изменился"}, status_code=412, headers={"Cache-Control": "no-store"})
+
+
+class RangeFileResponse(Response):
+    """Отдаёт байты файла [start, end] (включительно). Заголовки (Content-Range и т.п.) задаёт вызывающий.
+    С expected_size/expected_mtime_ns (запись индекса) файл, изменившийся на диске, — 412 до начала ответа."""
+
+    def __init__(
+        self,
+        path: str | os.PathLike,
+        start: int,
+        end: int,
+        status_code: int = 200,
+        headers: typing.Mapping[str, str] | None = None,
+        media_type: str | None = None,
+        background: BackgroundTask | None = None,
+        full_file: bool = False,
+        expected_size: int | None = None,
+        expected_mtime_ns: int | None = None,
+    ) -> None:
+        self.path = os.fspath(path)
+        self.start = start
+        self.end = end
+        self.full_file = full_file
+        self.expected_size = expected_size
+        self.expected_mtime_ns = expected_mtime_ns
+        self.status_code = status_code
+        self.media_type = media_type
+        self.background = background
+        self.init_headers(headers)
+        self.headers["content-length"] = str(max(0, end - start + 1))
+        self.headers.setdefault("accept-ranges", "bytes")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        fd = await _open_or_error(self.path, self.expected_size, self.expected_mtime_ns)
+        if isinstance(fd, Response):
+            await fd(scope, receive, send)
+            return
+        try:
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": self.status_code,
+                    "headers": self.raw_headers,
+                }
+            )
+            if scope.get("method") == "HEAD":
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+            else:
+                await send_file_range(
+                    scope, send, self.path, self.start, self.end - self.start + 1, self.full_file, fd=fd
+                )
+        finally:
+            os.close(fd)
+        if self.background is not None:
+            await self.background()
+
+
+class MultipartRangeResponse(Response):
+    """206 multipart/byteranges для нескольких диапазонов одного файла (size и expected_mtime_ns
+    сверяются с файлом до начала ответа, как в RangeFileResponse)."""
+
+    def __init__(
+        self,
+        path: str | os.PathLike,
+        ranges: list[tuple[int, int]],
+        size: int,
+        content_type: str,
+        headers: typing.Mapping[str, str] | None = None,
+        expected_mtime_ns: int | None = None,
+    ) -> None:
+        self.path = os.fspath(path)
+        self.ranges = ranges
+        self.size = size
+        self.expected_mtime_ns = expected_mtime_ns
+        self.status_code = 206
+        self.background = None
+        boundary = secrets.token_hex(16)
+        self.media_type = None
+        self.init_headers(headers)
+        self.headers["content-type"] = f"multipart/byteranges; boundary={boundary}"
+        self.part_headers = [
+            (
+                f"--{boundary}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+            ).encode("latin-1")
+            for start, end in ranges
+        ]
+        self.closing = f"\r\n--{boundary}--\r\n".encode("latin-1")
+        body_length = sum(end - start + 1 for start, end in ranges)
+        # Между частями — CRLF перед следующим разделителем
+        separators = 2 * (len(ranges) - 1)
+        length = sum(len(h) for h in self.part_headers) + body_length + separators + len(self.closing)
+        self.headers["content-length"] = str(length)
+        self.headers.setdefault("accept-ranges", "bytes")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        fd = await _open_or_error(self.path, self.size, self.expected_mtime_ns)
+        if isinstance(fd, Response):
+            await fd(scope, receive, send)
+            return
+        try:
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": self.status_code,
+                    "headers": self.raw_headers,
+                }
+            )
+            if scope.get("method") == "HEAD":
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+                return
+            for i, ((start, end), part_header) in enumerate(zip(self.ranges, self.part_headers)):
+                prefix = (b"\r\n" if i else b"") + part_header
+                await send({"type": "http.response.body", "body": prefix, "more_body": True})
+                await send_file_range(scope, send, self.path, start, end - start + 1, more_body=True, fd=fd)
+            await send({"type": "http.response.body", "body": self.closing, "more_body": False})
+        finally:
+            os.close(fd)
+
+
+async def send_file_range(
+    scope: Scope,
+    send: Send,
+    path: str,
+    offset: int,
+    count: int,
+    full_file: bool = False,
+    more_body: bool = False,
+    fd: int | None = None,
+) -> None:
+    """Отправляет count байт файла начиная с offset как http.response.body (последний — с more_body).
+    fd — уже открытый и проверенный дескриптор этого файла (не закрывается); без него файл открывается здесь.
+    Файл короче ожидаемого (укоротился после отправки заголовков) — OSError: тело не совпадёт
+    с Content-Length, и сервер должен оборвать соединение, а не завершить ответ как успешный."""
+    extensions = scope.get("extensions") or {}
+    # pathsend открывает файл заново по пути; проверенный дескриптор лучше отдать через zerocopysend
+    use_fd = fd is not None and "http.response.zerocopysend" in extensions
+    if full_file and not more_body and not use_fd and "http.response.pathsend" in extensions:
+        await send({"type": "http.response.pathsend", "path": path})
+        return
+
+    own_fd = fd is None
+    if own_fd:
+        fd = await anyio.to_thread.run_sync(os.open, path, os.O_RDONLY)
+    try:
+        if "http.response.zerocopysend" in extensions:
+            await send(
+                {
+                    "type": "http.response.zerocopysend",
+                    "file": fd,
+                    "offset": offset,
+                    "count": count,
+                    "more_body": more_body,
+                }
+            )
+            return
+
+        remaining = count
+        position = offset
+        while remaining > 0:
+            chunk = await anyio.to_thread.run_sync(os.pread, fd, min(READ_CHUNK_SIZE, remaining), position)
+            if not chunk:
+                raise OSError(errno.EIO, f"файл укоротился во время отдачи: осталось {remaining} байт", path)
+            remaining -= len(chunk)
+            position += len(chunk)
+            await send(
+                {
+                    "type": "http.response.body",
+                    "body": chunk,
+                    "more_body": more_body or remaining > 0,
+                }
+            )
+        if count == 0:
+            # Пустой диапазон — закрываем тело
+            await send({"type": "http.response.body", "body": b"", "more_body": more_body})
+    finally:
+        if own_fd:
+            os.close(fd)
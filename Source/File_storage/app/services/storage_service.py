@@ -1,14 +1,17 @@
 """
 Сервис файлового хранилища: работа с путями, список файлов, чтение с Range.
 """
-import mimetypes
+import logging
+import os
+import time
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
+from urllib.parse import quote
 
 try:
-    from PIL import Image, ImageOps
+    from PIL import Image
 except ImportError:
     Image = None  # type: ignore
-    ImageOps = None  # type: ignore
 
 try:
     from conf.settings import settings
@@ -16,13 +19,39 @@ except ImportError:
     settings = None
 
 from app.models.enums import ArchiveType, DataFolder
+from app.services.cache_manager import DiskCacheManager
+from app.services.capture_index import CaptureOrder, CaptureTimeIndex
+from app.services.duplicates import DuplicateIndex
+from app.services.ffmpeg import VIDEO_EXTENSIONS, FfmpegError
+from app.services.file_index import FileEntry, file_index, guess_content_type
+from app.services.image_meta import ImageMeta, ImageMetaIndex
+from app.services.metrics import registry
+from app.services import tracing
+from app.services.moments import Moment, MomentIndex
+from app.services.thumbnails import (
+    DEFAULT_THUMB_FORMAT,
+    ThumbnailQueueFull,
+    ThumbnailRenderer,
+    thumbnail_cache_path,
+)
+from app.services.video_frames import (
+    VideoFrameExtractor,
+    extract_poster,
+    extract_sprite,
+    poster_frame_path,
+    poster_thumb_key,
+    sprite_paths,
+)
+
+logger = logging.getLogger(__name__)
 
 
 class StorageError(Exception):
     """Ошибка доступа к хранилищу"""
-    def __init__(self, message: str, status_code: int = 400):
+    def __init__(self, message: str, status_code: int = 400, headers: dict[str, str] | None = None):
         self.message = message
         self.status_code = status_code
+        self.headers = headers
         super().__init__(message)
 
 
@@ -39,6 +68,67 @@ ARCHIVE_FILES = {
 IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp"}
 DEFAULT_THUMB_WIDTH = 480
 MAX_THUMB_WIDTH = 1200
+# Разрешённые ширины превью: запрос другой ширины приводится к ближайшей (env FILE_STORAGE_THUMB_WIDTHS)
+THUMB_WIDTHS = settings.file_storage_thumb_widths if settings is not None else (320, 480, 768, 1080)
+
+# Пул рендера превью: число процессов и максимум рендеров в очереди (env, см. conf/settings.py)
+thumbnail_renderer = ThumbnailRenderer(
+    workers=settings.file_storage_thumb_workers if settings is not None else min(4, os.cpu_count() or 1),
+    max_pending=settings.file_storage_thumb_queue_size if settings is not None else 64,
+)
+# Бюджет дискового кеша превью (LRU-вытеснение)
+thumb_cache = DiskCacheManager(
+    max_bytes=settings.file_storage_thumb_cache_max_bytes if settings is not None else 2 * 1024 ** 3,
+)
+# Метаданные фото для сетки галереи (размеры, время съёмки, blurhash) — извлекаются в фоне
+image_meta_index = ImageMetaIndex(
+    workers=settings.file_storage_meta_workers if settings is not None else 2,
+)
+# Порядок папок по времени съёмки (строится по метаданным, обновляется инкрементально)
+capture_index = CaptureTimeIndex()
+# Моменты (кластеры по времени съёмки) — виртуальные альбомы галереи
+moment_index = MomentIndex()
+# Почти одинаковые фото по dHash: отчёт и пути, скрываемые из списков и архива
+duplicate_index = DuplicateIndex(
+    max_distance=settings.file_storage_duplicate_max_distance if settings is not None else 6,
+)
+# ffmpeg для постеров и спрайтов видео (файлы — в том же кеше превью)
+frame_extractor = VideoFrameExtractor()
+# Спрайт строится проходом по всему видео — клиенту сразу 503, пока он готовится
+SPRITE_RETRY_AFTER = 30
+
+# Метрики превью (фото и постеры видео): попадания в кеш, время рендера, отказы
+THUMB_REQUESTS = registry.counter(
+    "file_storage_thumb_requests_total", "Запросы превью: hit — из дискового кеша, miss — рендер", ("format", "result")
+)
+THUMB_RENDER_SECONDS = registry.histogram(
+    "file_storage_thumb_render_seconds", "Рендер превью в пуле процессов, включая ожидание в очереди", ("format",)
+)
+THUMB_RENDER_FAILURES = registry.counter(
+    "file_storage_thumb_render_failures_total", "Неудачные рендеры превью", ("reason",)
+)
+registry.gauge(
+    "file_storage_thumb_render_pending", "Рендеры превью в очереди и в работе",
+    collect=lambda: thumbnail_renderer.pending,
+)
+registry.gauge(
+    "file_storage_thumb_cache_bytes", "Объём дискового кеша превью", collect=lambda: thumb_cache.stats()["bytes"]
+)
+registry.gauge(
+    "file_storage_thumb_cache_max_bytes", "Бюджет дискового кеша превью", collect=lambda: thumb_cache.max_bytes
+)
+registry.gauge(
+    "file_storage_thumb_cache_files", "Файлов в дисковом кеше превью", collect=lambda: thumb_cache.stats()["files"]
+)
+registry.counter(
+    "file_storage_thumb_cache_evicted_bytes_total", "Вытеснено из кеша превью по LRU",
+    collect=lambda: thumb_cache.stats()["evicted_bytes"],
+)
+
+
+def snap_thumb_width(width: int) -> int:
+    """Ближайшая разрешённая ширина превью (при равенстве — большая)."""
+    return min(THUMB_WIDTHS, key=lambda w: (abs(w - width), -w))
 
 
 class StorageService:
@@ -49,22 +139,76 @@ class StorageService:
 
     def list_files(self, folder: DataFolder) -> list[str]:
         """Список относительных путей файлов в папке, включая вложенные (сортировка по имени)."""
-        root = self.get_data_root()
-        dir_path = root / folder.value
-        if not dir_path.is_dir():
-            return []
-        paths: list[str] = []
-        for f in sorted(dir_path.rglob("*")):
-            if f.is_file():
-                paths.append(f.relative_to(root).as_posix())
+        paths, _ = self.list_files_versioned(folder)
         return paths
 
+    def list_files_versioned(self, folder: DataFolder, hide_duplicates: bool = False) -> tuple[list[str], str]:
+        """Список файлов папки из индекса и её версия (хеш путей, размеров и mtime) — используется как ETag."""
+        self._ensure_index()
+        snapshot = file_index.folder(folder)
+        if hide_duplicates:
+            return self._without_duplicates(folder, snapshot.paths, snapshot.version)
+        return snapshot.paths, snapshot.version
+
+    def list_files_with_meta(
+        self, folder: DataFolder, hide_duplicates: bool = False
+    ) -> tuple[list[str], str, dict[str, ImageMeta]]:
+        """Список папки и метаданные уже обработанных изображений. Версия учитывает их число:
+        пока метаданные дозаполняются в фоне, ETag меняется и клиенты получают новые."""
+        self._ensure_index()
+        snapshot = file_index.folder(folder)
+        meta = image_meta_index.folder_meta(snapshot)
+        paths, version = snapshot.paths, f"{snapshot.version}-m{len(meta)}"
+        if hide_duplicates:
+            paths, version = self._without_duplicates(folder, paths, version)
+            hidden = duplicate_index.hidden(folder)
+            meta = {rel: m for rel, m in meta.items() if rel not in hidden}
+        return paths, version, meta
+
+    def list_files_by_capture_time(self, folder: DataFolder, hide_duplicates: bool = False) -> CaptureOrder:
+        """Папка в порядке съёмки (EXIF, без него — mtime), при равном времени — по пути."""
+        self._ensure_index()
+        order = capture_index.order(file_index.folder(folder), image_meta_index)
+        if not hide_duplicates:
+            return order
+        hidden = duplicate_index.hidden(folder)
+        if not hidden:
+            return CaptureOrder(version=f"{order.version}-d0", keys=order.keys, meta=order.meta)
+        return CaptureOrder(
+            version=f"{order.version}-d{duplicate_index.digest(folder)}",
+            keys=[key for key in order.keys if key[1] not in hidden],
+            meta={rel: m for rel, m in order.meta.items() if rel not in hidden},
+        )
+
+    @staticmethod
+    def _without_duplicates(folder: DataFolder, paths: list[str], version: str) -> tuple[list[str], str]:
+        """Список без дубликатов из последнего отчёта; версия — с хешем набора скрытых путей."""
+        hidden = duplicate_index.hidden(folder)
+        if hidden:
+            paths = [p for p in paths if p not in hidden]
+        return paths, f"{version}-d{duplicate_index.digest(folder)}"
+
+    def list_moments(self, folder: DataFolder, hide_duplicates: bool = False) -> tuple[CaptureOrder, list[Moment]]:
+        """Моменты папки и порядок съёмки, по которому они построены (его версия — ETag)."""
+        order = self.list_files_by_capture_time(folder, hide_duplicates)
+        return order, moment_index.moments(folder, order)
+
     def resolve_path(self, relative_path: str) -> Path:
         """Проверяет path traversal и возвращает Path внутри data. При ошибке — StorageError."""
-        root = self.get_data_root().resolve()
+        return self.resolve_entry(relative_path).path
+
+    def resolve_entry(self, relative_path: str) -> FileEntry:
+        """Файл из индекса по относительному пути. Если в индексе нет (файл появился
+        после последнего скана) — проверка на диске. При ошибке — StorageError."""
         clean = relative_path.replace("\\", "/").strip("/")
         if not clean or ".." in clean:
             raise StorageError("Недопустимый путь", status_code=400)
+        self._ensure_index()
+        entry = file_index.get(clean)
+        if entry is not None:
+            return entry
+
+        root = self.get_data_root().resolve()
         full = (root / clean).resolve()
         try:
             full.relative_to(root)
@@ -74,7 +218,12 @@ class StorageService:
             raise StorageError("Файл не найден", status_code=404)
         if not full.is_file():
             raise StorageError("Не файл", status_code=400)
-        return full
+        return FileEntry.from_path(clean, full)
+
+    def _ensure_index(self) -> None:
+        """Индекс строится в lifespan; ленивое построение — для запуска без lifespan (скрипты)."""
+        if not file_index.is_built:
+            file_index.build(self.get_data_root())
 
     def folder_for_path(self, relative_path: str) -> DataFolder | None:
         parts = relative_path.replace("\\", "/").strip("/").split("/")
@@ -91,92 +240,176 @@ class StorageService:
 
     def get_archive_path(self, archive_type: ArchiveType) -> Path:
         """Путь к готовому zip-файлу. StorageError если архив не найден."""
-        root = self.get_data_root()
+        return self.get_archive_entry(archive_type).path
+
+    def get_archive_entry(self, archive_type: ArchiveType) -> FileEntry:
+        """Готовый zip-файл из индекса. StorageError если архив не найден."""
         zip_name = ARCHIVE_FILES.get(archive_type)
         if not zip_name:
             raise StorageError("Неизвестный тип архива", status_code=400)
-        zip_path = root / "zip" / zip_name
-        if not zip_path.is_file():
-            raise StorageError("Архив не найден", status_code=404)
-        return zip_path
+        try:
+            return self.resolve_entry(f"{DataFolder.zip.value}/{zip_name}")
+        except StorageError as exc:
+            if exc.status_code == 404:
+                raise StorageError("Архив не найден", status_code=404) from exc
+            raise
 
-    def get_or_create_thumbnail(self, relative_path: str, width: int = DEFAULT_THUMB_WIDTH) -> Path:
-        """Превью JPEG с кешем на диске (.cache/thumbs)."""
+    async def get_or_create_thumbnail(
+        self,
+        relative_path: str,
+        width: int = DEFAULT_THUMB_WIDTH,
+        fmt: str = DEFAULT_THUMB_FORMAT,
+    ) -> Path:
+        """Превью (JPEG/WebP/AVIF) с кешем на диске (.cache/thumbs).
+        Ширина приводится к ближайшей из THUMB_WIDTHS; рендер — в пуле процессов,
+        один на (путь, ширину, формат); кеш ограничен по размеру (LRU)."""
         if Image is None:
             raise StorageError("Обработка изображений недоступна", status_code=503)
         if width < 64 or width > MAX_THUMB_WIDTH:
             raise StorageError("Недопустимая ширина превью", status_code=400)
+        width = snap_thumb_width(width)
 
-        source = self.resolve_path(relative_path)
-        if source.suffix.lower() not in IMAGE_EXTENSIONS:
+        entry = self.resolve_entry(relative_path)
+        if entry.path.suffix.lower() not in IMAGE_EXTENSIONS:
             raise StorageError("Файл не является изображением", status_code=400)
+        return await self._render_thumbnail(entry.relative_path, entry.path, entry.mtime, width, fmt)
 
-        cache_path = (
-            self.get_data_root()
-            / ".cache"
-            / "thumbs"
-            / str(width)
-            / Path(relative_path.replace("\\", "/")).with_suffix(".jpg")
-        )
-        if cache_path.is_file():
-            try:
-                if cache_path.stat().st_mtime >= source.stat().st_mtime:
-                    return cache_path
-            except OSError:
-                pass
+    async def _render_thumbnail(self, key: str, source: Path, source_mtime: float, width: int, fmt: str) -> Path:
+        """Превью source из кеша (если новее source_mtime) или рендер в пуле процессов."""
+        cache_path = thumbnail_cache_path(self.get_data_root(), key, width, fmt)
+        try:
+            if cache_path.stat().st_mtime >= source_mtime:
+                thumb_cache.touch(cache_path)
+                THUMB_REQUESTS.labels(fmt, "hit").inc()
+                return cache_path
+        except OSError:
+            pass
 
-        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        THUMB_REQUESTS.labels(fmt, "miss").inc()
+        started = time.perf_counter()
         try:
-            with Image.open(source) as img:
-                img = ImageOps.exif_transpose(img)
-                img = img.convert("RGB")
-                w, h = img.size
-                if w > width:
-                    new_h = max(1, int(h * width / w))
-                    img = img.resize((width, new_h), Image.Resampling.LANCZOS)
-                img.save(cache_path, "JPEG", quality=82, optimize=True)
+            with tracing.span("thumbnail.render", width=width, format=fmt, pending=thumbnail_renderer.pending):
+                await thumbnail_renderer.render((key, width, fmt), source, cache_path, width, fmt)
+        except ThumbnailQueueFull as exc:
+            THUMB_RENDER_FAILURES.labels("queue_full").inc()
+            raise StorageError(
+                "Сервер перегружен, повторите запрос позже",
+                status_code=503,
+                headers={"Retry-After": str(exc.retry_after)},
+            ) from exc
+        except BrokenProcessPool as exc:
+            THUMB_RENDER_FAILURES.labels("pool_broken").inc()
+            thumbnail_renderer.shutdown()
+            raise StorageError("Обработка изображений недоступна", status_code=503) from exc
         except OSError as exc:
+            THUMB_RENDER_FAILURES.labels("bad_image").inc()
             raise StorageError("Не удалось обработать изображение", status_code=422) from exc
 
+        THUMB_RENDER_SECONDS.labels(fmt).observe(time.perf_counter() - started)
+        thumb_cache.add(cache_path)
         return cache_path
 
-    @staticmethod
-    def get_content_type(file_path: Path) -> str:
-        content_type, _ = mimetypes.guess_type(str(file_path)) or ("application/octet-stream", None)
-        return content_type
+    def resolve_video_entry(self, relative_path: str) -> FileEntry:
+        entry = self.resolve_entry(relative_path)
+        if entry.path.suffix.lower() not in VIDEO_EXTENSIONS:
+            raise StorageError("Файл не является видео", status_code=400)
+        return entry
+
+    async def get_or_create_poster(
+        self,
+        relative_path: str,
+        width: int = DEFAULT_THUMB_WIDTH,
+        fmt: str = DEFAULT_THUMB_FORMAT,
+    ) -> Path:
+        """Постер видео нужной ширины и формата. Кадр извлекается ffmpeg один раз
+        (.cache/thumbs/frames), дальше — тот же рендер и кеш, что у превью фото."""
+        if Image is None:
+            raise StorageError("Обработка изображений недоступна", status_code=503)
+        if width < 64 or width > MAX_THUMB_WIDTH:
+            raise StorageError("Недопустимая ширина превью", status_code=400)
+        width = snap_thumb_width(width)
+
+        entry = self.resolve_video_entry(relative_path)
+        frame = poster_frame_path(self.get_data_root(), entry.relative_path)
+        try:
+            frame_mtime = frame.stat().st_mtime
+            fresh = frame_mtime >= entry.mtime
+        except OSError:
+            fresh = False
+        if fresh:
+            thumb_cache.touch(frame)
+        else:
+            try:
+                await frame_extractor.run(("poster", entry.relative_path), lambda: extract_poster(entry, frame))
+            except ThumbnailQueueFull as exc:
+                raise StorageError(
+                    "Сервер перегружен, повторите запрос позже",
+                    status_code=503,
+                    headers={"Retry-After": str(exc.retry_after)},
+                ) from exc
+            except FfmpegError as exc:
+                logger.error("Постер %s: %s", entry.relative_path, exc)
+                raise StorageError("Не удалось получить кадр видео", status_code=503) from exc
+            thumb_cache.add(frame)
+            frame_mtime = frame.stat().st_mtime
+        return await self._render_thumbnail(poster_thumb_key(entry.relative_path), frame, frame_mtime, width, fmt)
+
+    def get_sprite_paths(self, relative_path: str) -> tuple[FileEntry, Path, Path]:
+        """Видео, его спрайт превью перемотки и VTT-индекс. Если спрайта нет или он старше видео —
+        запускает сборку в фоне и отвечает StorageError 503 + Retry-After."""
+        entry = self.resolve_video_entry(relative_path)
+        image, vtt = sprite_paths(self.get_data_root(), entry.relative_path)
+        try:
+            if vtt.stat().st_mtime >= entry.mtime and image.exists():
+                thumb_cache.touch(image)
+                thumb_cache.touch(vtt)
+                return entry, image, vtt
+        except OSError:
+            pass
+        try:
+            frame_extractor.start(("sprite", entry.relative_path), lambda: self._build_sprite(entry, image, vtt))
+        except ThumbnailQueueFull as exc:
+            raise StorageError(
+                "Сервер перегружен, повторите запрос позже",
+                status_code=503,
+                headers={"Retry-After": str(exc.retry_after)},
+            ) from exc
+        raise StorageError(
+            "Превью перемотки готовится",
+            status_code=503,
+            headers={"Retry-After": str(SPRITE_RETRY_AFTER)},
+        )
 
     @staticmethod
-    def parse_range_header(range_header: str | None, size: int) -> tuple[int, int] | None:
-        """Парсит Range. Возвращает (start, end) или None если без range. ValueError при неверном range."""
-        if not range_header or not range_header.startswith("bytes="):
+    async def _build_sprite(entry: FileEntry, image: Path, vtt: Path) -> None:
+        try:
+            layout = await extract_sprite(entry, image, vtt)
+        except (FfmpegError, OSError) as exc:
+            logger.error("Спрайт %s: %s", entry.relative_path, exc)
+            return
+        thumb_cache.add(image)
+        thumb_cache.add(vtt)
+        logger.info("Спрайт %s: %s плиток по %.1f с", entry.relative_path, layout.count, layout.interval)
+
+    def accel_redirect_uri(self, file_path: Path) -> str | None:
+        """URI internal-location Nginx для X-Accel-Redirect или None, если режим выключен.
+        Путь — относительно data/ (файлы, превью в .cache, архивы), percent-encoded."""
+        if settings is None or not settings.file_storage_accel_redirect:
             return None
-        range_spec = range_header.replace("bytes=", "").strip()
-        if "-" in range_spec:
-            start_s, end_s = range_spec.split("-", 1)
-            start = int(start_s) if start_s else 0
-            end = int(end_s) if end_s else size - 1
-        else:
-            start = 0
-            end = size - 1
-        end = min(end, size - 1)
-        if start > end or start < 0:
-            raise ValueError("Invalid range")
-        return start, end
+        root = self.get_data_root()
+        try:
+            relative = file_path.relative_to(root)
+        except ValueError:
+            # Индекс хранит пути от root.resolve()
+            try:
+                relative = file_path.relative_to(root.resolve())
+            except ValueError:
+                return None
+        return settings.file_storage_accel_prefix + quote(relative.as_posix())
 
     @staticmethod
-    def iter_file_range(file_path: Path, start: int, end: int, chunk_size: int = 8192):
-        """Итератор байтов файла с start по end включительно."""
-        length = end - start + 1
-        with open(file_path, "rb") as f:
-            f.seek(start)
-            remaining = length
-            while remaining > 0:
-                read_size = min(chunk_size, remaining)
-                data = f.read(read_size)
-                if not data:
-                    break
-                remaining -= len(data)
-                yield data
+    def get_content_type(file_path: Path) -> str:
+        return guess_content_type(file_path.name)
 
 
 storage_service = StorageService()
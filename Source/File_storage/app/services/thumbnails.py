@@ -0,0 +1,132 @@
+"""
+Рендер превью изображений вне event loop: пул процессов, single-flight по (путь, ширина, формат)
+и ограничение очереди (при переполнении — 503 + Retry-After).
+"""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None  # type: ignore
+    ImageOps = None  # type: ignore
+
+# Форматы превью: имя → (формат Pillow, MIME, расширение, параметры сохранения).
+# Порядок — предпочтение при согласовании по Accept (лучшее сжатие первым).
+THUMB_FORMATS: dict[str, tuple[str, str, str, dict]] = {
+    "avif": ("AVIF", "image/avif", ".avif", {"quality": 55}),
+    "webp": ("WEBP", "image/webp", ".webp", {"quality": 78, "method": 4}),
+    "jpeg": ("JPEG", "image/jpeg", ".jpg", {"quality": 82, "optimize": True}),
+}
+DEFAULT_THUMB_FORMAT = "jpeg"
+
+
+class ThumbnailQueueFull(Exception):
+    """Очередь рендера превью заполнена"""
+    def __init__(self, retry_after: int):
+        self.retry_after = retry_after
+        super().__init__("Очередь рендера превью заполнена")
+
+
+def supported_thumb_formats() -> list[str]:
+    """Форматы превью, которые умеет кодировать установленный Pillow (AVIF — только с плагином)."""
+    if Image is None:
+        return []
+    Image.init()
+    return [name for name, (pil_format, *_rest) in THUMB_FORMATS.items() if pil_format in Image.SAVE]
+
+
+def negotiate_thumb_format(accept: str | None) -> str:
+    """Выбирает формат превью по заголовку Accept: AVIF → WebP → JPEG."""
+    accepted: set[str] = set()
+    for part in (accept or "").split(","):
+        media_type, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            accepted.add(media_type.strip().lower())
+    for name in supported_thumb_formats():
+        if THUMB_FORMATS[name][1] in accepted:
+            return name
+    return DEFAULT_THUMB_FORMAT
+
+
+def thumbnail_cache_path(data_root: Path, relative_path: str, width: int, fmt: str = DEFAULT_THUMB_FORMAT) -> Path:
+    """Путь превью в кеше: data/.cache/thumbs/<width>/<путь>.<jpg|webp|avif>"""
+    suffix = THUMB_FORMATS[fmt][2]
+    return data_root / ".cache" / "thumbs" / str(width) / Path(relative_path).with_suffix(suffix)
+
+
+def render_thumbnail(source: str, dest: str, width: int, fmt: str = DEFAULT_THUMB_FORMAT) -> None:
+    """Декодирует, поворачивает по EXIF, уменьшает до width и пишет в формате fmt.
+    Выполняется в дочернем процессе; запись атомарная (временный файл + os.replace)."""
+    pil_format, _mime, _suffix, save_params = THUMB_FORMATS[fmt]
+    dest_path = Path(dest)
+    dest_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = dest_path.with_name(f".{dest_path.name}.{os.getpid()}.tmp")
+    try:
+        with Image.open(source) as img:
+            img = ImageOps.exif_transpose(img)
+            img = img.convert("RGB")
+            w, h = img.size
+            if w > width:
+                new_h = max(1, int(h * width / w))
+                img = img.resize((width, new_h), Image.Resampling.LANCZOS)
+            img.save(tmp_path, pil_format, **save_params)
+        os.replace(tmp_path, dest_path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+class ThumbnailRenderer:
+    """Пул процессов для рендера превью. Один рендер на ключ, остальные запросы ждут его результат."""
+
+    def __init__(self, workers: int, max_pending: int, retry_after: int = 2) -> None:
+        self.workers = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self.retry_after = retry_after
+        self._executor: ProcessPoolExecutor | None = None
+        self._inflight: dict[tuple[str, int, str], asyncio.Future] = {}
+
+    @property
+    def pending(self) -> int:
+        """Рендеры в очереди и в работе"""
+        return len(self._inflight)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: не форкаем процесс с потоками event loop
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    async def render(self, key: tuple[str, int, str], source: Path, dest: Path, width: int, fmt: str) -> None:
+        """Рендерит превью или присоединяется к уже идущему рендеру того же ключа.
+        ThumbnailQueueFull — если в очереди уже max_pending рендеров."""
+        future = self._inflight.get(key)
+        if future is None:
+            if len(self._inflight) >= self.max_pending:
+                raise ThumbnailQueueFull(self.retry_after)
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._get_executor(), render_thumbnail, str(source), str(dest), width, fmt)
+            self._inflight[key] = future
+            future.add_done_callback(lambda _f: self._inflight.pop(key, None))
+        # shield: отключившийся клиент не отменяет общий рендер
+        await asyncio.shield(future)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,20 @@
+"""
+Трассировка File_storage — общий модуль conf/tracing.py. Без conf (локальный запуск без общего
+конфига) — пустые заглушки с тем же интерфейсом, спаны не создаются.
+"""
+import contextlib
+
+try:
+    from conf.tracing import INTERNAL, TracingMiddleware, configure, install_celery, span
+except ImportError:
+    INTERNAL = 1
+    TracingMiddleware = None
+
+    def configure(service_name: str) -> bool:
+        return False
+
+    def install_celery(service_name: str) -> None:
+        return None
+
+    def span(name: str, kind: int = INTERNAL, **attributes):
+        return contextlib.nullcontext()
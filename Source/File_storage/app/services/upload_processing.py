@@ -0,0 +1,359 @@
+"""
+Обработка принятой загрузки гостя (выполняется воркером Celery или командой process_uploads, не в API):
+проверка sha256 и что это изображение, поиск дубликата, поворот по EXIF, перенос в
+wedding_day_all_photos/guests/ и рендер превью всех ширин — первый показ в галерее не ждёт рендера.
+С модерацией (FILE_STORAGE_UPLOAD_MODERATION) обработанный файл ждёт в data/.uploads/moderation/,
+в галерею его переносит approve_upload (команда app.commands.moderate_uploads).
+"""
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+import unicodedata
+from pathlib import Path
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None  # type: ignore
+    ImageOps = None  # type: ignore
+
+try:
+    from conf.settings import settings
+except ImportError:
+    settings = None
+
+from app.models.enums import DataFolder
+from app.services import tracing
+from app.services.file_index import FileEntry, file_index
+from app.services.storage_service import THUMB_WIDTHS
+from app.services.thumbnails import render_thumbnail, supported_thumb_formats, thumbnail_cache_path
+from app.services.uploads import (
+    STATUS_DONE,
+    STATUS_DUPLICATE,
+    STATUS_FAILED,
+    STATUS_PENDING_REVIEW,
+    STATUS_PROCESSING,
+    STATUS_QUEUED,
+    STATUS_REJECTED,
+    UploadStore,
+)
+
+logger = logging.getLogger(__name__)
+
+# Подпапка фото гостей внутри wedding_day_all_photos
+GUEST_UPLOADS_DIR = "guests"
+_HASH_CHUNK = 1024 * 1024
+# EXIF Orientation
+_ORIENTATION_TAG = 0x0112
+# Форматы, которые Pillow сохраняет с EXIF
+_EXIF_SAVE_FORMATS = {"JPEG", "PNG", "WEBP"}
+UPLOAD_MODERATION = settings.file_storage_upload_moderation if settings is not None else True
+INDEX_REFRESH_INTERVAL = settings.file_storage_index_refresh_interval if settings is not None else 30.0
+
+
+class UploadRejected(Exception):
+    """Загрузка не может быть принята (не изображение, не сошлась контрольная сумма)"""
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(_HASH_CHUNK):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def safe_filename(name: str) -> str:
+    """Имя файла без путей и служебных символов (кириллица сохраняется)."""
+    name = unicodedata.normalize("NFC", Path(name.replace("\\", "/")).name)
+    stem, suffix = os.path.splitext(name)
+    stem = re.sub(r"[^\w.-]+", "_", stem).strip("._") or "photo"
+    return f"{stem[:80]}{suffix.lower()}"
+
+
+class UploadHashRegistry:
+    """sha256 исходных байтов уже принятых загрузок → путь в галерее (data/.cache/uploads/hashes.json).
+    Нужен потому, что после поворота по EXIF файл в галерее отличается от присланного.
+    Изменения — под flock: воркеров может быть несколько."""
+
+    def __init__(self, data_root: Path) -> None:
+        self.path = data_root / ".cache" / "uploads" / "hashes.json"
+
+    def _locked(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        lock = open(self.path.with_suffix(".lock"), "a")
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return lock
+
+    def _read(self) -> dict[str, str]:
+        try:
+            return json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, sha256: str) -> str | None:
+        return self._read().get(sha256)
+
+    def add(self, sha256: str, relative_path: str) -> None:
+        with self._locked():
+            data = self._read()
+            data[sha256] = relative_path
+            tmp = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, self.path)
+
+
+class GalleryHashCache(UploadHashRegistry):
+    """sha256 фото галереи, уже посчитанные при поиске дубликатов (data/.cache/uploads/gallery_hashes.json):
+    относительный путь → [размер, mtime_ns, sha256]. Запись устаревает, если файл изменился."""
+
+    def __init__(self, data_root: Path) -> None:
+        self.path = data_root / ".cache" / "uploads" / "gallery_hashes.json"
+
+    def lookup(self, entries: list[FileEntry]) -> dict[str, str]:
+        data = self._read()
+        result = {}
+        for entry in entries:
+            cached = data.get(entry.relative_path)
+            if cached and cached[0] == entry.size and cached[1] == entry.mtime_ns:
+                result[entry.relative_path] = cached[2]
+        return result
+
+    def put_many(self, hashes: list[tuple[FileEntry, str]]) -> None:
+        with self._locked():
+            data = self._read()
+            for entry, sha256 in hashes:
+                data[entry.relative_path] = [entry.size, entry.mtime_ns, sha256]
+            tmp = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, self.path)
+
+
+# Фото галереи по размеру для текущей версии снимка индекса: (версия, размер → записи)
+_gallery_by_size: tuple[str, dict[int, list[FileEntry]]] = ("", {})
+
+
+def gallery_files_by_size(data_root: Path) -> dict[int, list[FileEntry]]:
+    """Фото wedding_day_all_photos по размеру — из индекса файлов (file_index), без обхода диска.
+    В воркере индекс строится при первом вызове и пересканируется не чаще FILE_STORAGE_INDEX_REFRESH_INTERVAL."""
+    global _gallery_by_size
+    root = data_root.resolve()
+    if file_index.root != root:
+        file_index.build(root)
+    elif time.time() - file_index.folder(DataFolder.wedding_day_all_photos).scanned_at > INDEX_REFRESH_INTERVAL:
+        file_index.refresh()
+    snapshot = file_index.folder(DataFolder.wedding_day_all_photos)
+    version, by_size = _gallery_by_size
+    if version != snapshot.version:
+        by_size = {}
+        for entry in snapshot.entries.values():
+            by_size.setdefault(entry.size, []).append(entry)
+        _gallery_by_size = (snapshot.version, by_size)
+    return by_size
+
+
+def find_duplicate(data_root: Path, sha256: str, size: int, registry: UploadHashRegistry) -> str | None:
+    """Уже есть в галерее: среди прошлых загрузок гостей (по реестру) или среди фото того же размера.
+    Каждое фото галереи хешируется один раз за версию файла (GalleryHashCache)."""
+    known = registry.get(sha256)
+    if known and (data_root / known).is_file():
+        return known
+    candidates = gallery_files_by_size(data_root).get(size, [])
+    if not candidates:
+        return None
+    cache = GalleryHashCache(data_root)
+    hashes = cache.lookup(candidates)
+    computed: list[tuple[FileEntry, str]] = []
+    found = None
+    for entry in candidates:
+        digest = hashes.get(entry.relative_path)
+        if digest is None:
+            try:
+                digest = file_sha256(entry.path)
+            except OSError:
+                continue
+            computed.append((entry, digest))
+        if digest == sha256:
+            found = entry.relative_path
+            break
+    if computed:
+        cache.put_many(computed)
+    return found
+
+
+def normalize_orientation(source: Path, dest: Path) -> bool:
+    """Поворачивает пиксели по EXIF Orientation и сбрасывает тег (ICC-профиль и остальной EXIF сохраняются).
+    Если поворот не нужен — False, файл не перекодируется. Файл, который не декодируется, — UploadRejected;
+    ошибка записи dest пробрасывается как есть."""
+    with Image.open(source) as img:
+        exif = img.getexif()
+        if exif.get(_ORIENTATION_TAG, 1) == 1 or img.format not in _EXIF_SAVE_FORMATS:
+            return False
+        pil_format = img.format
+        icc_profile = img.info.get("icc_profile")
+        try:
+            rotated = ImageOps.exif_transpose(img)
+        except (OSError, Image.DecompressionBombError, ValueError) as exc:
+            # verify() не декодирует пиксели: обрезанный или битый файл обнаруживается только здесь
+            raise UploadRejected(f"не удалось декодировать изображение: {exc}") from exc
+        exif[_ORIENTATION_TAG] = 1
+        params = {"exif": exif.tobytes()}
+        if icc_profile:
+            params["icc_profile"] = icc_profile
+        if pil_format == "JPEG":
+            params["quality"] = 95
+        rotated.save(dest, pil_format, **params)
+    return True
+
+
+def _unique_destination(folder: Path, filename: str) -> Path:
+    candidate = folder / filename
+    stem, suffix = os.path.splitext(filename)
+    n = 1
+    while candidate.exists():
+        n += 1
+        candidate = folder / f"{stem}_{n}{suffix}"
+    return candidate
+
+
+def prerender_thumbnails(data_root: Path, relative_path: str, source: Path) -> int:
+    """Превью всех разрешённых ширин и форматов — как pregenerate_thumbs, но для одного файла.
+    Пишутся по путям кеша превью API (thumbnail_cache_path): thumb_cache регистрирует их при первом
+    обращении к /thumb (touch неизвестного файла) или при загрузке кеша на старте и вытесняет по LRU."""
+    rendered = 0
+    for width in THUMB_WIDTHS:
+        for fmt in supported_thumb_formats():
+            render_thumbnail(str(source), str(thumbnail_cache_path(data_root, relative_path, width, fmt)), width, fmt)
+            rendered += 1
+    return rendered
+
+
+def process_upload(store: UploadStore, data_root: Path, upload_id: str, moderation: bool = UPLOAD_MODERATION) -> dict:
+    """Обрабатывает загрузку в статусе queued. Повторный вызов для уже обработанной — без действий.
+    Возвращает итоговое состояние (status done / duplicate / failed, с модерацией — pending_review).
+    Непредвиденная ошибка (диск, права) сохраняет статус failed и пробрасывается; .part остаётся,
+    поэтому повторный вызов (retry Celery) обработает загрузку заново."""
+    state = store.load_state(upload_id)
+    if state["status"] not in (STATUS_QUEUED, STATUS_PROCESSING, STATUS_FAILED):
+        return state
+    part = store.part_path(upload_id)
+    try:
+        fd = os.open(part, os.O_RDONLY)
+    except FileNotFoundError:
+        return store.load_state(upload_id)
+    try:
+        try:
+            # Ту же загрузку уже обрабатывает другой воркер
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return state
+        state = {**state, "status": STATUS_PROCESSING}
+        store.save_state(state)
+        try:
+            state = _process_locked(store, data_root, state, part, moderation)
+        except UploadRejected as exc:
+            logger.warning("Загрузка %s отклонена: %s", upload_id, exc)
+            part.unlink(missing_ok=True)
+            state = {**state, "status": STATUS_FAILED, "error": str(exc)}
+        except BaseException as exc:
+            store.save_state({**state, "status": STATUS_FAILED, "error": f"ошибка обработки: {exc}"})
+            raise
+        store.save_state(state)
+        return state
+    finally:
+        os.close(fd)
+
+
+def _process_locked(store: UploadStore, data_root: Path, state: dict, part: Path, moderation: bool) -> dict:
+    if Image is None:
+        raise OSError("Pillow не установлен")
+    size = part.stat().st_size
+    if size != state["length"]:
+        raise UploadRejected(f"размер {size} вместо {state['length']}")
+    sha256 = file_sha256(part)
+    if state.get("sha256") and state["sha256"] != sha256:
+        raise UploadRejected("sha256 файла не совпал")
+    try:
+        with tracing.span("upload.verify_image", size=size), Image.open(part) as img:
+            img.verify()
+    except Exception as exc:
+        raise UploadRejected(f"не изображение: {exc}") from exc
+
+    registry = UploadHashRegistry(data_root)
+    duplicate = find_duplicate(data_root, sha256, size, registry)
+    if duplicate is not None:
+        part.unlink(missing_ok=True)
+        logger.info("Загрузка %s — дубликат %s", state["id"], duplicate)
+        return {**state, "status": STATUS_DUPLICATE, "result_path": duplicate}
+
+    state = {**state, "sha256": sha256}
+    # Временный файл — в .uploads (та же ФС): дальше файл попадает только целиком
+    tmp = part.with_name(f".{state['id']}.normalized{Path(state['filename']).suffix.lower()}")
+    try:
+        with tracing.span("upload.normalize_orientation"):
+            source = tmp if normalize_orientation(part, tmp) else part
+        if moderation:
+            review = store.review_path(state)
+            review.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(source, review)
+            logger.info("Загрузка %s ждёт модерации", state["id"])
+            state = {**state, "status": STATUS_PENDING_REVIEW}
+        else:
+            state = publish_upload(data_root, state, source)
+    finally:
+        tmp.unlink(missing_ok=True)
+    part.unlink(missing_ok=True)
+    return state
+
+
+def publish_upload(data_root: Path, state: dict, source: Path) -> dict:
+    """Переносит обработанный файл в wedding_day_all_photos/guests/ и рисует превью."""
+    folder = data_root / DataFolder.wedding_day_all_photos.value / GUEST_UPLOADS_DIR
+    folder.mkdir(parents=True, exist_ok=True)
+    stamp = time.strftime("%Y%m%d", time.localtime(state["created"]))
+    dest = _unique_destination(folder, f"{stamp}_{state['id'][:8]}_{safe_filename(state['filename'])}")
+    os.replace(source, dest)
+
+    relative_path = dest.relative_to(data_root).as_posix()
+    UploadHashRegistry(data_root).add(state["sha256"], relative_path)
+    try:
+        with tracing.span("upload.prerender_thumbnails"):
+            rendered = prerender_thumbnails(data_root, relative_path, dest)
+    except (OSError, ValueError) as exc:
+        # Превью отрисуются по первому запросу
+        logger.warning("Превью для %s не созданы: %s", relative_path, exc)
+        rendered = 0
+    logger.info("Загрузка %s принята: %s, превью: %s", state["id"], relative_path, rendered)
+    return {**state, "status": STATUS_DONE, "result_path": relative_path}
+
+
+def approve_upload(store: UploadStore, data_root: Path, upload_id: str) -> dict:
+    """Решение модератора «показать»: файл из очереди модерации — в галерею (если за время ожидания
+    такое же фото не появилось в галерее — тогда duplicate)."""
+    state = store.load_state(upload_id)
+    if state["status"] != STATUS_PENDING_REVIEW:
+        return state
+    review = store.review_path(state)
+    duplicate = find_duplicate(data_root, state["sha256"], review.stat().st_size, UploadHashRegistry(data_root))
+    if duplicate is not None:
+        review.unlink(missing_ok=True)
+        state = {**state, "status": STATUS_DUPLICATE, "result_path": duplicate}
+    else:
+        state = publish_upload(data_root, state, review)
+    store.save_state(state)
+    return state
+
+
+def reject_upload(store: UploadStore, upload_id: str, reason: str = "отклонено модератором") -> dict:
+    """Решение модератора «не показывать»: файл удаляется, гость видит статус rejected."""
+    state = store.load_state(upload_id)
+    if state["status"] != STATUS_PENDING_REVIEW:
+        return state
+    store.review_path(state).unlink(missing_ok=True)
+    state = {**state, "status": STATUS_REJECTED, "error": reason}
+    store.save_state(state)
+    return state
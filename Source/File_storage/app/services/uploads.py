@@ -0,0 +1,357 @@
+"""
+Докачиваемые загрузки фото гостей (протокол tus 1.0: creation, checksum, expiration, termination).
+Части пишутся прямо в data/.uploads/<id>.part (буфер не больше UPLOAD_WRITE_BUFFER, запись — в потоке),
+состояние — рядом в <id>.json; смещение — размер .part, поэтому переживает перезапуск сервиса.
+Готовый файл обрабатывает воркер Celery (см. app/services/upload_processing.py). Загрузка принадлежит
+гостю из токена: чужие загрузки для него не существуют (404).
+"""
+import asyncio
+import base64
+import binascii
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import re
+import secrets
+import time
+from pathlib import Path
+from typing import AsyncIterator
+
+from app.services.storage_service import IMAGE_EXTENSIONS, StorageError
+
+try:
+    from conf.settings import settings
+except ImportError:
+    settings = None
+
+logger = logging.getLogger(__name__)
+
+TUS_VERSION = "1.0.0"
+TUS_EXTENSIONS = "creation,checksum,expiration,termination"
+# Алгоритмы Upload-Checksum (имя tus → hashlib)
+CHECKSUM_ALGORITHMS = ("sha1", "sha256", "md5")
+# Нестандартный статус tus: контрольная сумма части не сошлась
+STATUS_CHECKSUM_MISMATCH = 460
+
+UPLOAD_WRITE_BUFFER = 1024 * 1024
+UPLOAD_MAX_BYTES = settings.file_storage_upload_max_bytes if settings is not None else 50 * 1024 * 1024
+# Квота гостя на сутки: суммарный Upload-Length и число загрузок
+UPLOAD_GUEST_MAX_BYTES = settings.file_storage_upload_guest_max_bytes if settings is not None else 500 * 1024 * 1024
+UPLOAD_GUEST_MAX_FILES = settings.file_storage_upload_guest_max_files if settings is not None else 100
+UPLOAD_QUOTA_WINDOW = 24 * 3600
+UPLOAD_EXPIRE_SECONDS = (settings.file_storage_upload_expire_hours if settings is not None else 24.0) * 3600
+_UPLOAD_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+# Статусы загрузки в <id>.json
+STATUS_UPLOADING = "uploading"
+STATUS_QUEUED = "queued"
+STATUS_PROCESSING = "processing"
+STATUS_DONE = "done"
+STATUS_DUPLICATE = "duplicate"
+STATUS_FAILED = "failed"
+# Ждёт решения модератора (FILE_STORAGE_UPLOAD_MODERATION), файл — в data/.uploads/moderation/
+STATUS_PENDING_REVIEW = "pending_review"
+STATUS_REJECTED = "rejected"
+# Отменена гостем (DELETE): состояние остаётся до истечения, чтобы отмена не сбрасывала квоту
+STATUS_TERMINATED = "terminated"
+
+
+def parse_upload_metadata(header: str | None) -> dict[str, str]:
+    """Upload-Metadata: "key base64value,key2 base64value2" (значение может отсутствовать)."""
+    result: dict[str, str] = {}
+    for pair in (header or "").split(","):
+        pair = pair.strip()
+        if not pair:
+            continue
+        key, _, encoded = pair.partition(" ")
+        try:
+            result[key] = base64.b64decode(encoded.strip(), validate=True).decode("utf-8") if encoded else ""
+        except (binascii.Error, UnicodeDecodeError):
+            raise StorageError("Неверный Upload-Metadata", status_code=400)
+    return result
+
+
+def parse_upload_checksum(header: str | None) -> tuple[str, bytes] | None:
+    """Upload-Checksum: "<алгоритм> <base64 digest>". Неподдерживаемый алгоритм — 400."""
+    if not header:
+        return None
+    algorithm, _, encoded = header.strip().partition(" ")
+    if algorithm not in CHECKSUM_ALGORITHMS:
+        raise StorageError("Неподдерживаемый алгоритм Upload-Checksum", status_code=400)
+    try:
+        return algorithm, base64.b64decode(encoded.strip(), validate=True)
+    except binascii.Error:
+        raise StorageError("Неверный Upload-Checksum", status_code=400)
+
+
+def _pwrite_all(fd: int, data: bytes, offset: int) -> None:
+    view = memoryview(data)
+    while view:
+        written = os.pwrite(fd, view, offset)
+        view = view[written:]
+        offset += written
+
+
+class UploadStore:
+    """Незавершённые и обработанные загрузки в data/.uploads/. PATCH одной загрузки — под flock
+    (параллельная часть получает 423), число одновременных PATCH ограничено (503 + Retry-After)."""
+
+    def __init__(self, max_active: int = 64, retry_after: int = 5) -> None:
+        self.max_active = max(1, max_active)
+        self.retry_after = retry_after
+        self.active = 0
+
+    def upload_dir(self) -> Path:
+        if settings is None:
+            raise StorageError("Настройки не загружены", status_code=500)
+        return settings.file_storage_data_root / ".uploads"
+
+    def part_path(self, upload_id: str) -> Path:
+        return self.upload_dir() / f"{upload_id}.part"
+
+    def state_path(self, upload_id: str) -> Path:
+        return self.upload_dir() / f"{upload_id}.json"
+
+    def review_path(self, state: dict) -> Path:
+        """Обработанный файл, ожидающий модерации."""
+        return self.upload_dir() / "moderation" / f"{state['id']}{Path(state['filename']).suffix.lower()}"
+
+    def create(self, length: int, metadata: dict[str, str], guest: str | None = None) -> dict:
+        """Новая загрузка гостя guest. Проверяет размер, расширение имени файла (только изображения)
+        и суточную квоту гостя (429)."""
+        if length <= 0:
+            raise StorageError("Пустой файл", status_code=400)
+        if length > UPLOAD_MAX_BYTES:
+            raise StorageError("Файл слишком большой", status_code=413)
+        filename = metadata.get("filename") or ""
+        if Path(filename).suffix.lower() not in IMAGE_EXTENSIONS:
+            raise StorageError("Можно загружать только фотографии", status_code=415)
+        sha256 = (metadata.get("sha256") or "").lower() or None
+        if sha256 is not None and not re.fullmatch(r"[0-9a-f]{64}", sha256):
+            raise StorageError("Неверный sha256 в Upload-Metadata", status_code=400)
+
+        upload_dir = self.upload_dir()
+        upload_dir.mkdir(parents=True, exist_ok=True)
+        # Проверка квоты и запись состояния — под одной блокировкой: параллельные POST не обходят квоту
+        with open(upload_dir / ".create.lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            now = time.time()
+            if guest is not None:
+                count, total = self.guest_usage(guest, now - UPLOAD_QUOTA_WINDOW)
+                if count >= UPLOAD_GUEST_MAX_FILES or total + length > UPLOAD_GUEST_MAX_BYTES:
+                    raise StorageError("Превышен суточный лимит загрузок", status_code=429)
+            upload_id = secrets.token_hex(16)
+            state = {
+                "id": upload_id,
+                "length": length,
+                "filename": filename,
+                "filetype": metadata.get("filetype"),
+                "sha256": sha256,
+                "guest": guest,
+                "created": now,
+                "expires": now + UPLOAD_EXPIRE_SECONDS,
+                "status": STATUS_UPLOADING,
+                "result_path": None,
+                "error": None,
+            }
+            self.part_path(upload_id).touch(exist_ok=False)
+            self.save_state(state)
+        return state
+
+    def guest_usage(self, guest: str, since: float) -> tuple[int, int]:
+        """Число загрузок гостя, созданных после since, и их суммарный Upload-Length."""
+        count = total = 0
+        for path in self.upload_dir().glob("*.json"):
+            try:
+                state = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            if state.get("guest") == guest and state.get("created", 0) >= since:
+                count += 1
+                total += state.get("length", 0)
+        return count, total
+
+    def load_state(self, upload_id: str) -> dict:
+        if not _UPLOAD_ID_RE.match(upload_id):
+            raise StorageError("Загрузка не найдена", status_code=404)
+        try:
+            state = json.loads(self.state_path(upload_id).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            raise StorageError("Загрузка не найдена", status_code=404)
+        if state["status"] == STATUS_TERMINATED:
+            raise StorageError("Загрузка не найдена", status_code=404)
+        if state["status"] == STATUS_UPLOADING and state["expires"] < time.time():
+            raise StorageError("Загрузка просрочена", status_code=410)
+        return state
+
+    def load_owned(self, upload_id: str, guest: str) -> dict:
+        """Состояние загрузки гостя guest; чужая загрузка — 404, как несуществующая."""
+        state = self.load_state(upload_id)
+        if state.get("guest") != guest:
+            raise StorageError("Загрузка не найдена", status_code=404)
+        return state
+
+    def save_state(self, state: dict) -> None:
+        """Атомарная запись <id>.json (её читают и API, и воркер)."""
+        path = self.state_path(state["id"])
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(state, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def offset(self, upload_id: str) -> int:
+        try:
+            return self.part_path(upload_id).stat().st_size
+        except OSError:
+            # .part уже обработан воркером
+            return self.load_state(upload_id)["length"]
+
+    async def append(
+        self,
+        state: dict,
+        offset: int,
+        stream: AsyncIterator[bytes],
+        checksum: tuple[str, bytes] | None = None,
+    ) -> tuple[int, bool]:
+        """Дописывает тело PATCH с offset. Возвращает новое смещение и признак, что этот запрос
+        завершил загрузку (статус уже переведён в queued — в очередь её ставит ровно один запрос).
+        Обрыв соединения без контрольной суммы сохраняет принятые байты (клиент докачает с HEAD-смещения);
+        с контрольной суммой незавершённая или несошедшаяся часть откатывается."""
+        if state["status"] != STATUS_UPLOADING:
+            raise StorageError("Загрузка уже завершена", status_code=403)
+        if self.active >= self.max_active:
+            raise StorageError(
+                "Сервер перегружен, повторите запрос позже",
+                status_code=503,
+                headers={"Retry-After": str(self.retry_after)},
+            )
+        length = state["length"]
+        self.active += 1
+        try:
+            fd = os.open(self.part_path(state["id"]), os.O_WRONLY)
+        except OSError:
+            self.active -= 1
+            raise StorageError("Загрузка не найдена", status_code=404)
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise StorageError("Загрузка уже принимает данные", status_code=423)
+            if self.load_state(state["id"])["status"] != STATUS_UPLOADING:
+                raise StorageError("Загрузка уже завершена", status_code=403)
+            current = os.fstat(fd).st_size
+            if offset != current:
+                raise StorageError("Upload-Offset не совпадает", status_code=409, headers={"Upload-Offset": str(current)})
+
+            hasher = hashlib.new(checksum[0]) if checksum else None
+            buffer = bytearray()
+            written = 0
+            try:
+                async for chunk in stream:
+                    if not chunk:
+                        continue
+                    if offset + written + len(buffer) + len(chunk) > length:
+                        raise StorageError("Данные за пределами Upload-Length", status_code=413)
+                    buffer += chunk
+                    if hasher is not None:
+                        hasher.update(chunk)
+                    if len(buffer) >= UPLOAD_WRITE_BUFFER:
+                        await asyncio.to_thread(_pwrite_all, fd, bytes(buffer), offset + written)
+                        written += len(buffer)
+                        buffer.clear()
+            except BaseException:
+                if hasher is None:
+                    # Принятые байты сохраняем: клиент продолжит с HEAD-смещения
+                    _pwrite_all(fd, bytes(buffer), offset + written)
+                else:
+                    os.ftruncate(fd, offset)
+                raise
+            if buffer:
+                await asyncio.to_thread(_pwrite_all, fd, bytes(buffer), offset + written)
+                written += len(buffer)
+            if hasher is not None and hasher.digest() != checksum[1]:
+                os.ftruncate(fd, offset)
+                raise StorageError("Контрольная сумма части не совпала", status_code=STATUS_CHECKSUM_MISMATCH)
+            new_offset = offset + written
+            completed = new_offset == length
+            if completed:
+                self.save_state({**state, "status": STATUS_QUEUED})
+            return new_offset, completed
+        finally:
+            os.close(fd)
+            self.active -= 1
+
+    def terminate(self, state: dict) -> None:
+        """Отмена загрузки; ожидающую модерации гость тоже может отозвать. Для гостя загрузки больше нет (404),
+        запись о ней учитывается в квоте до удаления cleanup_expired."""
+        if state["status"] not in (
+            STATUS_UPLOADING, STATUS_DONE, STATUS_DUPLICATE, STATUS_FAILED, STATUS_PENDING_REVIEW, STATUS_REJECTED
+        ):
+            raise StorageError("Загрузка обрабатывается", status_code=409)
+        self.part_path(state["id"]).unlink(missing_ok=True)
+        self.review_path(state).unlink(missing_ok=True)
+        self.save_state({**state, "status": STATUS_TERMINATED})
+
+    def pending_ids(self) -> list[str]:
+        """Загрузки, принятые целиком, но не обработанные (для повторной постановки в очередь), и упавшие
+        с непредвиденной ошибкой: у них остался .part (у отклонённых он удалён)."""
+        failed = [i for i in self.ids_with_status(STATUS_FAILED) if self.part_path(i).exists()]
+        return sorted(self.ids_with_status(STATUS_QUEUED, STATUS_PROCESSING) + failed)
+
+    def ids_with_status(self, *statuses: str) -> list[str]:
+        result = []
+        for path in sorted(self.upload_dir().glob("*.json")):
+            try:
+                state = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            if state.get("status") in statuses:
+                result.append(state["id"])
+        return result
+
+    def cleanup_expired(self) -> int:
+        """Удаляет просроченные незавершённые загрузки и старые записи о завершённых
+        (ожидающие модерации не трогает; записи моложе суток нужны для квоты гостя)."""
+        upload_dir = self.upload_dir()
+        if not upload_dir.is_dir():
+            return 0
+        now = time.time()
+        removed = 0
+        for path in upload_dir.glob("*.json"):
+            try:
+                state = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            if state.get("expires", 0) >= now or state.get("status") in (
+                STATUS_QUEUED, STATUS_PROCESSING, STATUS_PENDING_REVIEW
+            ):
+                continue
+            part = self.part_path(state["id"])
+            # Запись остаётся до конца окна квоты: по ней считается суточный лимит гостя
+            keep_record = state.get("created", 0) >= now - UPLOAD_QUOTA_WINDOW
+            if keep_record and not part.exists():
+                continue
+            part.unlink(missing_ok=True)
+            if not keep_record:
+                path.unlink(missing_ok=True)
+            removed += 1
+        return removed
+
+
+upload_store = UploadStore(
+    max_active=settings.file_storage_upload_max_active if settings is not None else 64,
+)
+
+
+async def run_upload_cleanup_loop(store: UploadStore, interval: float = 3600) -> None:
+    """Периодически удаляет брошенные загрузки (tus expiration)."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            removed = await asyncio.to_thread(store.cleanup_expired)
+        except Exception:
+            logger.exception("Ошибка очистки загрузок")
+            continue
+        if removed:
+            logger.info("Удалено просроченных загрузок: %s", removed)
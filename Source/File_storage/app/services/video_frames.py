@@ -0,0 +1,201 @@
+"""
+Кадры видео для галереи (ffmpeg): постер и спрайт-лист превью перемотки с WebVTT-индексом.
+Файлы лежат в кеше превью (data/.cache/thumbs/frames, .../sprites) и учитываются его бюджетом (LRU);
+постер дальше ужимается обычным рендером превью (ширины, AVIF/WebP/JPEG по Accept).
+"""
+import asyncio
+import logging
+import math
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from app.services.ffmpeg import probe_video, run_ffmpeg
+from app.services.file_index import FileEntry
+from app.services.thumbnails import ThumbnailQueueFull
+
+logger = logging.getLogger(__name__)
+
+# Постер: кадр около 10% длительности (не дальше 10 с), из 50 кадров ffmpeg выбирает самый «типичный»
+POSTER_MAX_WIDTH = 1280
+POSTER_SEEK_FRACTION = 0.1
+POSTER_SEEK_MAX = 10.0
+POSTER_CANDIDATE_FRAMES = 50
+
+# Спрайт: до 100 плиток 160x90 в сетке по 10, не чаще одной плитки на 2 с
+SPRITE_TILE_WIDTH = 160
+SPRITE_TILE_HEIGHT = 90
+SPRITE_COLUMNS = 10
+SPRITE_MAX_TILES = 100
+SPRITE_MIN_INTERVAL = 2.0
+# Ссылка на спрайт внутри сохранённого VTT; при отдаче заменяется на URL с токеном
+SPRITE_IMAGE_REF = "sprite.jpg"
+
+
+@dataclass(frozen=True)
+class SpriteLayout:
+    interval: float  # секунд на плитку
+    count: int
+    columns: int
+    rows: int
+
+
+def poster_frame_path(data_root: Path, relative_path: str) -> Path:
+    """Исходный кадр постера: data/.cache/thumbs/frames/<путь к видео>.jpg"""
+    return data_root / ".cache" / "thumbs" / "frames" / f"{relative_path}.jpg"
+
+
+def poster_thumb_key(relative_path: str) -> str:
+    """Ключ превью постера для thumbnail_cache_path (не пересекается с превью фото)."""
+    return f"{relative_path}.poster"
+
+
+def sprite_paths(data_root: Path, relative_path: str) -> tuple[Path, Path]:
+    """Спрайт и его VTT: data/.cache/thumbs/sprites/<путь к видео>.jpg / .vtt"""
+    base = data_root / ".cache" / "thumbs" / "sprites"
+    return base / f"{relative_path}.jpg", base / f"{relative_path}.vtt"
+
+
+def sprite_layout(duration: float) -> SpriteLayout:
+    interval = max(SPRITE_MIN_INTERVAL, duration / SPRITE_MAX_TILES)
+    count = max(1, min(SPRITE_MAX_TILES, math.ceil(duration / interval)))
+    columns = min(SPRITE_COLUMNS, count)
+    return SpriteLayout(interval=interval, count=count, columns=columns, rows=math.ceil(count / columns))
+
+
+def _format_vtt_time(seconds: float) -> str:
+    ms = int(round(seconds * 1000))
+    h, rest = divmod(ms, 3_600_000)
+    m, rest = divmod(rest, 60_000)
+    s, ms = divmod(rest, 1000)
+    return f"{h:02d}:{m:02d}:{s:02d}.{ms:03d}"
+
+
+def build_sprite_vtt(layout: SpriteLayout, duration: float) -> str:
+    """WebVTT: для каждого интервала — плитка спрайта (медиафрагмент #xywh)."""
+    lines = ["WEBVTT", ""]
+    for i in range(layout.count):
+        start = i * layout.interval
+        end = min(duration, start + layout.interval) if duration > 0 else start + layout.interval
+        x = (i % layout.columns) * SPRITE_TILE_WIDTH
+        y = (i // layout.columns) * SPRITE_TILE_HEIGHT
+        lines += [
+            f"{_format_vtt_time(start)} --> {_format_vtt_time(max(end, start + 0.001))}",
+            f"{SPRITE_IMAGE_REF}#xywh={x},{y},{SPRITE_TILE_WIDTH},{SPRITE_TILE_HEIGHT}",
+            "",
+        ]
+    return "\n".join(lines)
+
+
+def rewrite_sprite_vtt(text: str, sprite_uri: str) -> str:
+    """Подставляет в VTT URL спрайта (с токеном) вместо SPRITE_IMAGE_REF."""
+    prefix = SPRITE_IMAGE_REF + "#"
+    return "\n".join(
+        sprite_uri + line[len(SPRITE_IMAGE_REF):] if line.startswith(prefix) else line
+        for line in text.splitlines()
+    ) + "\n"
+
+
+def _tmp_path(dest: Path) -> Path:
+    # Точка в начале — кеш превью не подхватит недописанный файл при загрузке
+    return dest.with_name(f".{dest.name}.{os.getpid()}.tmp")
+
+
+async def extract_poster(entry: FileEntry, dest: Path) -> None:
+    """Кадр-постер (JPEG не шире POSTER_MAX_WIDTH). Перемотка до декодирования (-ss перед -i) —
+    читается только нужный кусок файла. FfmpegError — ffmpeg недоступен или видео не читается."""
+    info = await probe_video(entry.path)
+    seek = min(POSTER_SEEK_MAX, info.duration * POSTER_SEEK_FRACTION)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = _tmp_path(dest)
+    try:
+        await run_ffmpeg([
+            "-ss", f"{seek:.3f}",
+            "-i", str(entry.path),
+            "-vf", f"thumbnail={POSTER_CANDIDATE_FRAMES},scale='min({POSTER_MAX_WIDTH},iw)':-2",
+            "-frames:v", "1",
+            "-an", "-sn",
+            "-q:v", "2",
+            "-f", "image2", "-c:v", "mjpeg",
+            str(tmp),
+        ])
+        os.replace(tmp, dest)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+async def extract_sprite(entry: FileEntry, image_dest: Path, vtt_dest: Path) -> SpriteLayout:
+    """Спрайт-лист плиток и VTT-индекс к нему. Декодируются только ключевые кадры (-skip_frame nokey):
+    плитка — ближайший предыдущий ключевой кадр, зато проход по длинному видео в разы быстрее."""
+    info = await probe_video(entry.path)
+    layout = sprite_layout(info.duration)
+    w, h = SPRITE_TILE_WIDTH, SPRITE_TILE_HEIGHT
+    vf = ",".join([
+        f"fps=fps={1 / layout.interval:.6f}",
+        f"scale={w}:{h}:force_original_aspect_ratio=decrease",
+        f"pad={w}:{h}:(ow-iw)/2:(oh-ih)/2",
+        f"tile={layout.columns}x{layout.rows}",
+    ])
+    image_dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp_image = _tmp_path(image_dest)
+    tmp_vtt = _tmp_path(vtt_dest)
+    try:
+        await run_ffmpeg([
+            "-skip_frame", "nokey",
+            "-i", str(entry.path),
+            "-vf", vf,
+            "-frames:v", "1",
+            "-an", "-sn",
+            "-q:v", "4",
+            "-f", "image2", "-c:v", "mjpeg",
+            str(tmp_image),
+        ])
+        tmp_vtt.write_text(build_sprite_vtt(layout, info.duration), encoding="utf-8")
+        # VTT — последним: его наличие означает готовый спрайт
+        os.replace(tmp_image, image_dest)
+        os.replace(tmp_vtt, vtt_dest)
+    finally:
+        tmp_image.unlink(missing_ok=True)
+        tmp_vtt.unlink(missing_ok=True)
+    return layout
+
+
+class VideoFrameExtractor:
+    """Запуски ffmpeg за кадрами: один на ключ (остальные ждут его), не больше max_concurrent
+    одновременно; при max_pending в очереди — ThumbnailQueueFull (503 + Retry-After)."""
+
+    def __init__(self, max_concurrent: int = 2, max_pending: int = 16, retry_after: int = 5) -> None:
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrent))
+        self.max_pending = max(1, max_pending)
+        self.retry_after = retry_after
+        self._inflight: dict[tuple[str, str], asyncio.Task] = {}
+
+    @property
+    def pending(self) -> int:
+        return len(self._inflight)
+
+    def start(self, key: tuple[str, str], factory: Callable[[], Awaitable[None]]) -> asyncio.Task:
+        """Запускает задачу в фоне (или возвращает уже идущую с тем же ключом)."""
+        task = self._inflight.get(key)
+        if task is None:
+            if len(self._inflight) >= self.max_pending:
+                raise ThumbnailQueueFull(self.retry_after)
+            task = asyncio.create_task(self._limited(factory))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _t: self._inflight.pop(key, None))
+        return task
+
+    async def run(self, key: tuple[str, str], factory: Callable[[], Awaitable[None]]) -> None:
+        # shield: отключившийся клиент не отменяет общий ffmpeg
+        await asyncio.shield(self.start(key, factory))
+
+    async def _limited(self, factory: Callable[[], Awaitable[None]]) -> None:
+        async with self._semaphore:
+            await factory()
+
+    async def shutdown(self) -> None:
+        tasks = list(self._inflight.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
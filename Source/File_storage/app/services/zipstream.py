@@ -0,0 +1,387 @@
+"""
+ZIP выбранных файлов «на лету»: stored (без сжатия), data descriptor, ZIP64 при необходимости.
+Раскладка архива детерминирована (имена, размеры и mtime из индекса), поэтому Content-Length
+и смещения известны заранее — Range-докачка работает без сборки архива на диске.
+CRC-32 считается отдельно (кеш по пути/размеру/mtime) и нужен только для data descriptor и central directory.
+"""
+import asyncio
+import base64
+import bisect
+import hashlib
+import struct
+import time
+import typing
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import PurePosixPath
+
+import anyio
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from app.services.file_index import FileEntry
+from app.services.responses import READ_CHUNK_SIZE, send_file_range
+
+# Максимум файлов в одной выборке (защита от огромных токенов и central directory)
+ZIP_SELECTION_MAX_FILES = 500
+# Предел распакованной выборки из токена
+_SELECTION_MAX_BYTES = 256 * 1024
+
+ZIP64_LIMIT = 0xFFFFFFFF
+# Бит 3 — CRC и размеры в data descriptor после данных; бит 11 — имена в UTF-8
+_ZIP_FLAGS = 0x0008 | 0x0800
+_VERSION = 20
+_VERSION_ZIP64 = 45
+# Создано на Unix: права файла в старших 16 битах external attributes
+_VERSION_MADE_BY = (3 << 8) | _VERSION_ZIP64
+_EXTERNAL_ATTR = (0o100644 << 16)
+
+_LOCAL = struct.Struct("<IHHHHHIIIHH")
+_CENTRAL = struct.Struct("<IHHHHHHIIIHHHHHII")
+_DESCRIPTOR = struct.Struct("<IIII")
+_DESCRIPTOR64 = struct.Struct("<IIQQ")
+_EOCD = struct.Struct("<IHHHHIIH")
+_EOCD64 = struct.Struct("<IQHHIIQQQQ")
+_EOCD64_LOCATOR = struct.Struct("<IIQI")
+
+
+def encode_selection(paths: list[str]) -> str:
+    """Выборка путей для claim токена: zlib + base64url (короткий URL даже для сотен файлов)."""
+    raw = zlib.compress("\n".join(paths).encode("utf-8"), 9)
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_selection(value: str) -> list[str]:
+    """Обратное к encode_selection. ValueError — повреждённая или слишком большая выборка."""
+    try:
+        raw = base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+        decompressor = zlib.decompressobj()
+        data = decompressor.decompress(raw, _SELECTION_MAX_BYTES)
+        if decompressor.unconsumed_tail:
+            raise ValueError("Слишком большая выборка")
+        paths = data.decode("utf-8").split("\n")
+    except (zlib.error, UnicodeDecodeError, TypeError) as exc:
+        raise ValueError("Повреждённая выборка") from exc
+    paths = [p for p in paths if p]
+    if not paths or len(paths) > ZIP_SELECTION_MAX_FILES:
+        raise ValueError("Недопустимый размер выборки")
+    return paths
+
+
+def _dos_datetime(mtime: float) -> tuple[int, int]:
+    t = time.localtime(mtime)
+    if t.tm_year < 1980:
+        return 0, (0 << 9) | (1 << 5) | 1
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return dos_time, dos_date
+
+
+@dataclass(frozen=True)
+class ZipMember:
+    """Файл в архиве: смещение local header и всё, что не зависит от CRC."""
+    entry: FileEntry
+    name: bytes
+    offset: int
+    local_header: bytes
+    zip64: bool
+    dos_time: int
+    dos_date: int
+
+    @property
+    def data_offset(self) -> int:
+        return self.offset + len(self.local_header)
+
+    @property
+    def descriptor_offset(self) -> int:
+        return self.data_offset + self.entry.size
+
+    @property
+    def descriptor_size(self) -> int:
+        return _DESCRIPTOR64.size if self.zip64 else _DESCRIPTOR.size
+
+    def descriptor(self, crc: int) -> bytes:
+        if self.zip64:
+            return _DESCRIPTOR64.pack(0x08074B50, crc, self.entry.size, self.entry.size)
+        return _DESCRIPTOR.pack(0x08074B50, crc, self.entry.size, self.entry.size)
+
+    def _central_extra(self) -> bytes:
+        fields = []
+        if self.zip64:
+            fields += [self.entry.size, self.entry.size]
+        if self.offset >= ZIP64_LIMIT:
+            fields.append(self.offset)
+        if not fields:
+            return b""
+        return struct.pack(f"<HH{len(fields)}Q", 0x0001, 8 * len(fields), *fields)
+
+    @property
+    def central_size(self) -> int:
+        return _CENTRAL.size + len(self.name) + len(self._central_extra())
+
+    def central(self, crc: int) -> bytes:
+        extra = self._central_extra()
+        size = ZIP64_LIMIT if self.zip64 else self.entry.size
+        offset = min(self.offset, ZIP64_LIMIT)
+        needs_zip64 = bool(extra)
+        header = _CENTRAL.pack(
+            0x02014B50,
+            _VERSION_MADE_BY,
+            _VERSION_ZIP64 if needs_zip64 else _VERSION,
+            _ZIP_FLAGS,
+            0,  # stored
+            self.dos_time,
+            self.dos_date,
+            crc,
+            size,
+            size,
+            len(self.name),
+            len(extra),
+            0,
+            0,
+            0,
+            _EXTERNAL_ATTR,
+            offset,
+        )
+        return header + self.name + extra
+
+
+def _local_header(name: bytes, zip64: bool, dos_time: int, dos_date: int) -> bytes:
+    # С битом 3 CRC и размеры в local header нулевые; для ZIP64 — нулевые 8-байтовые размеры в extra
+    extra = struct.pack("<HHQQ", 0x0001, 16, 0, 0) if zip64 else b""
+    header = _LOCAL.pack(
+        0x04034B50,
+        _VERSION_ZIP64 if zip64 else _VERSION,
+        _ZIP_FLAGS,
+        0,
+        dos_time,
+        dos_date,
+        0,
+        0,
+        0,
+        len(name),
+        len(extra),
+    )
+    return header + name + extra
+
+
+def _archive_names(entries: list[FileEntry]) -> list[str]:
+    """Имена в архиве: имя файла; при совпадении имён — полный относительный путь."""
+    basenames = [PurePosixPath(e.relative_path).name for e in entries]
+    counts: dict[str, int] = {}
+    for name in basenames:
+        counts[name] = counts.get(name, 0) + 1
+    return [name if counts[name] == 1 else e.relative_path for name, e in zip(basenames, entries)]
+
+
+class ZipPlan:
+    """Раскладка архива: сегменты (local header, данные, descriptor, central directory, конец) со смещениями."""
+
+    def __init__(self, entries: list[FileEntry], names: list[str] | None = None) -> None:
+        """names — имена файлов в архиве; по умолчанию имя файла (при совпадении — относительный путь)."""
+        self.members: list[ZipMember] = []
+        offset = 0
+        for entry, name in zip(entries, names if names is not None else _archive_names(entries)):
+            encoded = name.encode("utf-8")
+            zip64 = entry.size >= ZIP64_LIMIT
+            dos_time, dos_date = _dos_datetime(entry.mtime)
+            member = ZipMember(
+                entry=entry,
+                name=encoded,
+                offset=offset,
+                local_header=_local_header(encoded, zip64, dos_time, dos_date),
+                zip64=zip64,
+                dos_time=dos_time,
+                dos_date=dos_date,
+            )
+            self.members.append(member)
+            offset = member.descriptor_offset + member.descriptor_size
+
+        self.cd_offset = offset
+        self.cd_size = sum(m.central_size for m in self.members)
+        self.end_record = self._end_record()
+        self.size = self.cd_offset + self.cd_size + len(self.end_record)
+
+        # (начало, длина, вид, индекс файла)
+        self.segments: list[tuple[int, int, str, int]] = []
+        for i, m in enumerate(self.members):
+            self.segments.append((m.offset, len(m.local_header), "local", i))
+            self.segments.append((m.data_offset, m.entry.size, "data", i))
+            self.segments.append((m.descriptor_offset, m.descriptor_size, "descriptor", i))
+        self.segments.append((self.cd_offset, self.cd_size, "central", -1))
+        self.segments.append((self.cd_offset + self.cd_size, len(self.end_record), "end", -1))
+        self._starts = [s[0] for s in self.segments]
+
+    @property
+    def etag(self) -> str:
+        """Сильный ETag: байты архива определяются именами, размерами и mtime файлов."""
+        digest = hashlib.sha1()
+        for m in self.members:
+            digest.update(m.name + f"\0{m.entry.size}:{m.entry.mtime_ns}\0".encode("ascii"))
+        return f'"zip-{digest.hexdigest()}"'
+
+    def _end_record(self) -> bytes:
+        count = len(self.members)
+        zip64 = count >= 0xFFFF or self.cd_offset >= ZIP64_LIMIT or self.cd_size >= ZIP64_LIMIT
+        eocd = _EOCD.pack(
+            0x06054B50,
+            0,
+            0,
+            min(count, 0xFFFF),
+            min(count, 0xFFFF),
+            min(self.cd_size, ZIP64_LIMIT),
+            min(self.cd_offset, ZIP64_LIMIT),
+            0,
+        )
+        if not zip64:
+            return eocd
+        eocd64_offset = self.cd_offset + self.cd_size
+        eocd64 = _EOCD64.pack(
+            0x06064B50,
+            _EOCD64.size - 12,
+            _VERSION_MADE_BY,
+            _VERSION_ZIP64,
+            0,
+            0,
+            count,
+            count,
+            self.cd_size,
+            self.cd_offset,
+        )
+        locator = _EOCD64_LOCATOR.pack(0x07064B50, 0, eocd64_offset, 1)
+        return eocd64 + locator + eocd
+
+    def segments_in(self, start: int, end: int) -> typing.Iterator[tuple[int, str, int, int, int]]:
+        """Сегменты, пересекающие [start, end]: (начало, вид, индекс файла, смещение внутри сегмента, число байт)."""
+        i = max(0, bisect.bisect_right(self._starts, start) - 1)
+        while i < len(self.segments):
+            seg_start, seg_len, kind, index = self.segments[i]
+            if seg_start > end:
+                break
+            a = max(start, seg_start) - seg_start
+            b = min(end + 1, seg_start + seg_len) - seg_start
+            if b > a:
+                yield seg_start, kind, index, a, b - a
+            i += 1
+
+
+class CrcCache:
+    """CRC-32 файлов по (путь, размер, mtime_ns): LRU в памяти, один расчёт на файл одновременно."""
+
+    def __init__(self, max_entries: int = 100_000) -> None:
+        self.max_entries = max_entries
+        self._values: OrderedDict[tuple[str, int, int], int] = OrderedDict()
+        self._inflight: dict[tuple[str, int, int], asyncio.Future] = {}
+
+    @staticmethod
+    def _key(entry: FileEntry) -> tuple[str, int, int]:
+        return (str(entry.path), entry.size, entry.mtime_ns)
+
+    def peek(self, entry: FileEntry) -> int | None:
+        return self._values.get(self._key(entry))
+
+    def put(self, entry: FileEntry, crc: int) -> None:
+        key = self._key(entry)
+        self._values[key] = crc
+        self._values.move_to_end(key)
+        while len(self._values) > self.max_entries:
+            self._values.popitem(last=False)
+
+    async def get(self, entry: FileEntry) -> int:
+        key = self._key(entry)
+        crc = self._values.get(key)
+        if crc is not None:
+            self._values.move_to_end(key)
+            return crc
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(anyio.to_thread.run_sync(file_crc32, str(entry.path)))
+            self._inflight[key] = future
+
+            def _done(f: asyncio.Future) -> None:
+                self._inflight.pop(key, None)
+                if not f.cancelled() and f.exception() is None:
+                    self.put(entry, f.result())
+
+            future.add_done_callback(_done)
+        return await asyncio.shield(future)
+
+
+def file_crc32(path: str) -> int:
+    crc = 0
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+crc_cache = CrcCache()
+
+
+class ZipStreamResponse(Response):
+    """Отдаёт байты [start, end] архива по плану. Файлы — через sendfile/pread, как обычные файлы,
+    заголовки архива генерируются по ходу. CRC для descriptor/central directory считаются заранее в фоне."""
+
+    def __init__(
+        self,
+        plan: ZipPlan,
+        start: int,
+        end: int,
+        status_code: int = 200,
+        headers: typing.Mapping[str, str] | None = None,
+    ) -> None:
+        self.plan = plan
+        self.start = start
+        self.end = end
+        self.status_code = status_code
+        self.media_type = "application/zip"
+        self.background = None
+        self.init_headers(headers)
+        self.headers["content-length"] = str(max(0, end - start + 1))
+        self.headers.setdefault("accept-ranges", "bytes")
+
+    def _crc_members_needed(self) -> list[ZipMember]:
+        """Файлы, чей CRC попадает в диапазон (descriptor или central directory)."""
+        if self.end >= self.plan.cd_offset:
+            return self.plan.members
+        return [
+            m for m in self.plan.members
+            if m.descriptor_offset <= self.end and m.descriptor_offset + m.descriptor_size > self.start
+        ]
+
+    async def _prefetch_crcs(self, members: list[ZipMember]) -> None:
+        for m in members:
+            await crc_cache.get(m.entry)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope.get("method") == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        needed = self._crc_members_needed()
+        prefetch = asyncio.create_task(self._prefetch_crcs(needed)) if needed else None
+        try:
+            for _seg_start, kind, index, offset, count in self.plan.segments_in(self.start, self.end):
+                if kind == "data":
+                    member = self.plan.members[index]
+                    await send_file_range(scope, send, str(member.entry.path), offset, count, more_body=True)
+                    continue
+                if kind == "local":
+                    data = self.plan.members[index].local_header
+                elif kind == "descriptor":
+                    member = self.plan.members[index]
+                    data = member.descriptor(await crc_cache.get(member.entry))
+                elif kind == "central":
+                    parts = [m.central(await crc_cache.get(m.entry)) for m in self.plan.members]
+                    data = b"".join(parts)
+                else:
+                    data = self.plan.end_record
+                await send({"type": "http.response.body", "body": data[offset:offset + count], "more_body": True})
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            if prefetch is not None and not prefetch.done():
+                prefetch.cancel()
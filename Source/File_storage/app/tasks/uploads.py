@@ -0,0 +1,37 @@
+"""
+Celery задачи обработки загрузок гостей
+"""
+import logging
+
+from app.celery_app import celery_app
+from app.services.storage_service import StorageError
+from app.services.upload_processing import process_upload
+from app.services.uploads import upload_store
+
+from conf.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(
+    name="file_storage.process_guest_upload",
+    bind=True,
+    max_retries=3,
+    default_retry_delay=30,
+)
+def process_guest_upload(self, upload_id: str) -> dict:
+    """
+    Проверяет и переносит принятую загрузку в галерею (см. app/services/upload_processing.py).
+
+    Returns:
+        dict: {"id": str, "status": str, "result_path": str | None, "error": str | None}
+    """
+    try:
+        state = process_upload(upload_store, settings.file_storage_data_root, upload_id)
+    except StorageError as exc:
+        # Загрузку удалили (termination / истечение срока) до обработки
+        logger.warning("Загрузка %s: %s", upload_id, exc.message)
+        return {"id": upload_id, "status": None, "result_path": None, "error": exc.message}
+    except OSError as exc:
+        raise self.retry(exc=exc)
+    return {key: state.get(key) for key in ("id", "status", "result_path", "error")}
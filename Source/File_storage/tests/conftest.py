@@ -0,0 +1,25 @@
+"""
+Общие фикстуры тестов File_storage. Модули app.* импортируют conf.settings, поэтому нужны те же
+переменные окружения (.env), что у сервиса; без них тесты пропускаются. Данные тестов пишутся во
+временную папку (фикстура data_root), рабочая data/ не меняется.
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+FILE_STORAGE_DIR = Path(__file__).resolve().parents[1]
+SOURCE_DIR = FILE_STORAGE_DIR.parent
+
+# Импорты как в контейнере: app.* из File_storage, conf.* из корня Source
+for path in (FILE_STORAGE_DIR, SOURCE_DIR):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+
+@pytest.fixture
+def data_root(tmp_path, monkeypatch) -> Path:
+    """Корень данных хранилища во временной папке: settings.file_storage_data_root читает
+    FILE_STORAGE_DATA_DIR при каждом обращении."""
+    monkeypatch.setenv("FILE_STORAGE_DATA_DIR", str(tmp_path))
+    return tmp_path
@@ -0,0 +1,176 @@
+"""
+Разбор Range (app/services/conditional.py, parse_ranges) по таблице случаев и условная отдача файла
+(_build_file_response): 206 по Range, 416 для диапазона за концом файла, If-Range — при
+несовпадении валидатора файл целиком (200); файл, изменившийся после индексации, — 412 до заголовков.
+"""
+import asyncio
+import os
+from email.utils import formatdate
+
+import pytest
+
+try:
+    from fastapi import FastAPI, Request
+    from fastapi.testclient import TestClient
+
+    from app.routers.files import _build_file_response
+    from app.services.conditional import MAX_RANGES, entry_etag, entry_last_modified, parse_ranges
+    from app.services.file_index import FileEntry
+    from app.services.responses import send_file_range
+except Exception as exc:  # Нет зависимостей или не заданы настройки (.env)
+    pytest.skip(f"File_storage не импортируется: {exc}", allow_module_level=True)
+
+SIZE = 1000
+CONTENT = bytes(i % 251 for i in range(SIZE))
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        (None, None),
+        ("", None),
+        ("bytes=0-99", [(0, 99)]),
+        ("bytes=0-0", [(0, 0)]),
+        # Открытый конец — до конца файла; конец за пределами файла обрезается
+        ("bytes=900-", [(900, 999)]),
+        ("bytes=990-5000", [(990, 999)]),
+        # Суффикс — последние n байт; длиннее файла — весь файл
+        ("bytes=-100", [(900, 999)]),
+        ("bytes=-5000", [(0, 999)]),
+        # Пересекающиеся и смежные объединяются, порядок — по началу
+        ("bytes=0-99,50-150", [(0, 150)]),
+        ("bytes=0-99,100-199", [(0, 199)]),
+        ("bytes=500-599, 0-99", [(0, 99), (500, 599)]),
+        ("bytes=0-0,-1", [(0, 0), (999, 999)]),
+        ("bytes=0-499,-600", [(0, 999)]),
+        # Неудовлетворимые части пропускаются, если есть другие
+        ("bytes=0-9,2000-3000", [(0, 9)]),
+        ("bytes=-0,0-9", [(0, 9)]),
+        # Некорректный заголовок — файл целиком
+        ("items=0-99", None),
+        ("bytes=", None),
+        ("bytes=abc", None),
+        ("bytes=a-b", None),
+        ("bytes=100-50", None),
+        # Слишком много диапазонов — файл целиком
+        ("bytes=" + ",".join(f"{i * 10}-{i * 10}" for i in range(MAX_RANGES + 1)), None),
+        ("bytes=" + ",".join(f"{i * 10}-{i * 10}" for i in range(MAX_RANGES)), [(i * 10, i * 10) for i in range(MAX_RANGES)]),
+    ],
+)
+def test_parse_ranges(header, expected):
+    assert parse_ranges(header, SIZE) == expected
+
+
+@pytest.mark.parametrize(
+    "header, size",
+    [
+        ("bytes=1000-", SIZE),
+        ("bytes=1000-1100", SIZE),
+        ("bytes=-0", SIZE),
+        ("bytes=2000-3000,1500-", SIZE),
+        ("bytes=0-", 0),
+        ("bytes=-10", 0),
+    ],
+)
+def test_parse_ranges_unsatisfiable(header, size):
+    with pytest.raises(ValueError):
+        parse_ranges(header, size)
+
+
+@pytest.fixture
+def entry(tmp_path) -> FileEntry:
+    path = tmp_path / "VID_0001.mp4"
+    path.write_bytes(CONTENT)
+    return FileEntry.from_path("wedding_day_video/VID_0001.mp4", path)
+
+
+@pytest.fixture
+def client(entry):
+    app = FastAPI()
+
+    @app.get("/file")
+    async def file(request: Request):
+        return _build_file_response(request, entry)
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def test_range_is_206(client):
+    response = client.get("/file", headers={"Range": "bytes=-100"})
+    assert response.status_code == 206
+    assert response.headers["Content-Range"] == f"bytes 900-999/{SIZE}"
+    assert response.content == CONTENT[900:]
+
+
+def test_multiple_ranges_are_multipart(client):
+    response = client.get("/file", headers={"Range": "bytes=0-9,500-509"})
+    assert response.status_code == 206
+    assert response.headers["Content-Type"].startswith("multipart/byteranges; boundary=")
+    assert CONTENT[:10] in response.content and CONTENT[500:510] in response.content
+    assert int(response.headers["Content-Length"]) == len(response.content)
+
+
+def test_unsatisfiable_range_is_416(client):
+    response = client.get("/file", headers={"Range": f"bytes={SIZE}-"})
+    assert response.status_code == 416
+    assert response.headers["Content-Range"] == f"bytes */{SIZE}"
+
+
+@pytest.mark.parametrize(
+    "if_range, partial",
+    [
+        ("etag", True),
+        ('"stale-etag"', False),
+        ("W/etag", False),  # If-Range сравнивает ETag строго: слабый не подходит
+        ("last_modified", True),
+        ("older", False),
+    ],
+)
+def test_if_range(client, entry, if_range, partial):
+    values = {
+        "etag": entry_etag(entry),
+        "W/etag": "W/" + entry_etag(entry),
+        "last_modified": entry_last_modified(entry),
+        "older": formatdate(entry.mtime - 3600, usegmt=True),
+    }
+    response = client.get("/file", headers={"Range": "bytes=0-99", "If-Range": values.get(if_range, if_range)})
+    if partial:
+        assert (response.status_code, response.content) == (206, CONTENT[:100])
+    else:
+        # Файл изменился с прошлого запроса клиента: куски разных версий склеивать нельзя
+        assert (response.status_code, response.content) == (200, CONTENT)
+        assert "Content-Range" not in response.headers
+
+
+@pytest.mark.parametrize("range_header", [None, "bytes=0-99", "bytes=0-9,500-509"])
+def test_file_changed_after_indexing_is_412(client, entry, range_header):
+    # Индекс ещё не пересканирован: в записи старый размер
+    entry.path.write_bytes(CONTENT[:500])
+    response = client.get("/file", headers={"Range": range_header} if range_header else {})
+    assert response.status_code == 412
+    assert "Content-Range" not in response.headers
+
+
+def test_same_size_rewrite_is_412(client, entry):
+    entry.path.write_bytes(CONTENT[::-1])
+    os.utime(entry.path, ns=(entry.mtime_ns + 1_000_000_000, entry.mtime_ns + 1_000_000_000))
+    assert client.get("/file").status_code == 412
+
+
+def test_file_removed_after_indexing_is_404(client, entry):
+    entry.path.unlink()
+    assert client.get("/file", headers={"Range": "bytes=0-99"}).status_code == 404
+
+
+def test_short_read_aborts_body(entry):
+    sent = []
+
+    async def send(message: dict) -> None:
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "extensions": {}}
+    # Файл укоротился после отправки заголовков: тело не должно завершиться как успешное
+    with pytest.raises(OSError):
+        asyncio.run(send_file_range(scope, send, str(entry.path), SIZE - 100, 200))
+    assert all(m["more_body"] for m in sent)
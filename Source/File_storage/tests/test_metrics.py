@@ -0,0 +1,37 @@
+"""
+Метрики без общего конфига (app/services/metrics.py): если conf.metrics не импортируется, реестр
+пустой, но с тем же интерфейсом — модули File_storage, объявляющие метрики, импортируются.
+"""
+import importlib
+import sys
+
+import pytest
+
+try:
+    from app.services import metrics
+except Exception as exc:  # Нет зависимостей или не заданы настройки (.env)
+    pytest.skip(f"File_storage не импортируется: {exc}", allow_module_level=True)
+
+
+@pytest.fixture
+def noop_metrics(monkeypatch):
+    monkeypatch.setitem(sys.modules, "conf.metrics", None)  # import conf.metrics → ImportError
+    yield importlib.reload(metrics)
+    monkeypatch.undo()
+    importlib.reload(metrics)
+
+
+def test_noop_registry_without_conf(noop_metrics):
+    requests = noop_metrics.registry.counter("requests_total", "Запросы", ("endpoint", "status"))
+    requests.labels("/list", 200).inc()
+    duration = noop_metrics.registry.histogram("duration_seconds", "Время", ("endpoint",))
+    duration.labels("/list").observe(0.1)
+    noop_metrics.registry.gauge("cache_bytes", "Кеш", collect=lambda: 1.0).set(5)
+
+    assert noop_metrics.registry.render() == ""
+    assert noop_metrics.route_label({}) == "unmatched"
+
+
+def test_conf_registry_when_available():
+    conf_metrics = pytest.importorskip("conf.metrics")
+    assert metrics.registry is conf_metrics.registry
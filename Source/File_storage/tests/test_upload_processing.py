@@ -0,0 +1,128 @@
+"""
+Обработка принятой загрузки (app/services/upload_processing.py, process_upload): битое изображение
+отклоняется (failed, .part удалён), непредвиденная ошибка сохраняет failed и оставляет .part для повтора;
+поиск дубликата (find_duplicate) — по индексу файлов, каждое фото галереи хешируется один раз.
+"""
+import asyncio
+import hashlib
+import io
+
+import pytest
+
+try:
+    from PIL import Image
+
+    from app.services import upload_processing
+    from app.services.file_index import FileIndex
+    from app.services.storage_service import THUMB_WIDTHS
+    from app.services.thumbnails import DEFAULT_THUMB_FORMAT, thumbnail_cache_path
+    from app.services.upload_processing import UploadHashRegistry, find_duplicate, process_upload
+    from app.services.uploads import STATUS_DONE, STATUS_FAILED, UploadStore
+except Exception as exc:  # Нет зависимостей или не заданы настройки (.env)
+    pytest.skip(f"File_storage не импортируется: {exc}", allow_module_level=True)
+
+GUEST = "550e8400-e29b-41d4-a716-446655440000"
+_ORIENTATION_TAG = 0x0112
+
+
+def jpeg(orientation: int = 1, size: tuple[int, int] = (640, 480)) -> bytes:
+    image = Image.effect_noise(size, 64).convert("RGB")
+    exif = Image.Exif()
+    exif[_ORIENTATION_TAG] = orientation
+    buf = io.BytesIO()
+    image.save(buf, "JPEG", quality=90, exif=exif)
+    return buf.getvalue()
+
+
+async def _body(data: bytes):
+    yield data
+
+
+@pytest.fixture(autouse=True)
+def gallery_index(monkeypatch):
+    """Свой индекс файлов: общий file_index строится по data_root другого теста."""
+    monkeypatch.setattr(upload_processing, "file_index", FileIndex())
+
+
+@pytest.fixture
+def store(data_root) -> UploadStore:
+    return UploadStore()
+
+
+def upload(store: UploadStore, data: bytes) -> dict:
+    state = store.create(len(data), {"filename": "IMG_0001.jpg"}, GUEST)
+    asyncio.run(store.append(state, 0, _body(data)))
+    return state
+
+
+def test_truncated_rotated_jpeg_is_rejected(store, data_root):
+    data = jpeg(orientation=6)
+    # Заголовок цел (verify() проходит), пиксели обрезаны — падает только поворот по EXIF
+    state = upload(store, data[: len(data) // 2])
+
+    result = process_upload(store, data_root, state["id"], moderation=False)
+
+    assert result["status"] == STATUS_FAILED
+    assert "декодировать" in result["error"]
+    assert store.load_state(state["id"])["status"] == STATUS_FAILED
+    assert not store.part_path(state["id"]).exists()
+    assert store.pending_ids() == []
+
+
+def test_unexpected_error_marks_failed_and_keeps_part(store, data_root, monkeypatch):
+    state = upload(store, jpeg())
+
+    publish = upload_processing.publish_upload
+
+    def broken_publish(*args, **kwargs):
+        raise PermissionError("нет прав на wedding_day_all_photos")
+
+    monkeypatch.setattr(upload_processing, "publish_upload", broken_publish)
+    with pytest.raises(PermissionError):
+        process_upload(store, data_root, state["id"], moderation=False)
+
+    saved = store.load_state(state["id"])
+    assert saved["status"] == STATUS_FAILED
+    assert "нет прав" in saved["error"]
+    assert store.part_path(state["id"]).exists()
+    assert store.pending_ids() == [state["id"]]
+
+    # Повтор (retry Celery, process_uploads) после устранения причины
+    monkeypatch.setattr(upload_processing, "publish_upload", publish)
+    result = process_upload(store, data_root, state["id"], moderation=False)
+    assert result["status"] == STATUS_DONE
+    assert (data_root / result["result_path"]).is_file()
+    # Превью всех ширин — заранее, в кеше превью API
+    for width in THUMB_WIDTHS:
+        assert thumbnail_cache_path(data_root, result["result_path"], width, DEFAULT_THUMB_FORMAT).is_file()
+
+
+def test_find_duplicate_hashes_gallery_photo_once(data_root, monkeypatch):
+    photos = data_root / "wedding_day_all_photos" / "ceremony"
+    photos.mkdir(parents=True)
+    (photos / "IMG_0001.jpg").write_bytes(b"a" * 100)
+    (photos / "IMG_0002.jpg").write_bytes(b"b" * 100)
+    (photos / "IMG_0003.jpg").write_bytes(b"c" * 50)
+    hashed = []
+
+    def counting_sha256(path):
+        hashed.append(path.name)
+        return hashlib.sha256(path.read_bytes()).hexdigest()
+
+    monkeypatch.setattr(upload_processing, "file_sha256", counting_sha256)
+    registry = UploadHashRegistry(data_root)
+    target = hashlib.sha256(b"b" * 100).hexdigest()
+
+    assert find_duplicate(data_root, target, 100, registry) == "wedding_day_all_photos/ceremony/IMG_0002.jpg"
+    # Фото другого размера не читается
+    assert "IMG_0003.jpg" not in hashed
+
+    other = hashlib.sha256(b"x" * 100).hexdigest()
+    assert find_duplicate(data_root, other, 100, registry) is None
+    assert sorted(hashed) == ["IMG_0001.jpg", "IMG_0002.jpg"]
+
+    # Хеши — в кеше: повторный поиск файлы не читает
+    hashed.clear()
+    assert find_duplicate(data_root, other, 100, registry) is None
+    assert find_duplicate(data_root, target, 100, registry) == "wedding_day_all_photos/ceremony/IMG_0002.jpg"
+    assert hashed == []
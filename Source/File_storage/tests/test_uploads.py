@@ -0,0 +1,185 @@
+"""
+Приём частей загрузки (UploadStore.append, PATCH /uploads/{id}): Upload-Offset, откат части с
+несошедшейся Upload-Checksum, передача завершённой загрузки в очередь обработки и суточная квота гостя.
+"""
+import asyncio
+import base64
+import hashlib
+import time
+
+import pytest
+
+try:
+    import jwt
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from app.dependencies import settings as token_settings
+    from app.routers import uploads as uploads_router
+    from app.services import uploads
+    from app.services.storage_service import StorageError
+    from app.services.uploads import (
+        STATUS_CHECKSUM_MISMATCH,
+        STATUS_QUEUED,
+        STATUS_UPLOADING,
+        UploadStore,
+        upload_store,
+    )
+except Exception as exc:  # Нет зависимостей или не заданы настройки (.env)
+    pytest.skip(f"File_storage не импортируется: {exc}", allow_module_level=True)
+
+GUEST = "550e8400-e29b-41d4-a716-446655440000"
+OTHER_GUEST = "6ba7b810-9dad-11d1-80b4-00c04fd430c8"
+PHOTO = b"\xff\xd8" + bytes(range(256)) * 40
+
+
+async def _body(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+
+def append(store: UploadStore, state: dict, offset: int, *chunks: bytes, checksum=None) -> tuple[int, bool]:
+    return asyncio.run(store.append(state, offset, _body(*chunks), checksum))
+
+
+def sha1(data: bytes) -> tuple[str, bytes]:
+    return "sha1", hashlib.sha1(data).digest()
+
+
+@pytest.fixture
+def store(data_root) -> UploadStore:
+    return UploadStore(max_active=4)
+
+
+@pytest.fixture
+def state(store) -> dict:
+    return store.create(len(PHOTO), {"filename": "IMG_0001.jpg"}, GUEST)
+
+
+def test_parts_append_at_offset(store, state):
+    assert append(store, state, 0, PHOTO[:1000]) == (1000, False)
+    assert store.offset(state["id"]) == 1000
+    assert store.load_state(state["id"])["status"] == STATUS_UPLOADING
+
+
+def test_offset_mismatch_is_409_with_current_offset(store, state):
+    append(store, state, 0, PHOTO[:1000])
+    with pytest.raises(StorageError) as exc_info:
+        append(store, state, 500, PHOTO[500:1500])
+    assert exc_info.value.status_code == 409
+    assert exc_info.value.headers == {"Upload-Offset": "1000"}
+    assert store.offset(state["id"]) == 1000
+
+
+def test_checksum_mismatch_truncates_to_previous_offset(store, state):
+    append(store, state, 0, PHOTO[:1000], checksum=sha1(PHOTO[:1000]))
+    with pytest.raises(StorageError) as exc_info:
+        append(store, state, 1000, PHOTO[1000:2000], checksum=sha1(b"other bytes"))
+    assert exc_info.value.status_code == STATUS_CHECKSUM_MISMATCH
+    assert store.offset(state["id"]) == 1000
+    assert store.part_path(state["id"]).read_bytes() == PHOTO[:1000]
+
+    # Клиент повторяет часть с того же смещения
+    assert append(store, state, 1000, PHOTO[1000:2000], checksum=sha1(PHOTO[1000:2000])) == (2000, False)
+
+
+def test_data_beyond_upload_length_is_413(store, state):
+    with pytest.raises(StorageError) as exc_info:
+        append(store, state, 0, PHOTO, b"extra")
+    assert exc_info.value.status_code == 413
+
+
+def test_last_part_queues_upload(store, state):
+    append(store, state, 0, PHOTO[:1000])
+    assert append(store, state, 1000, PHOTO[1000:2000], PHOTO[2000:]) == (len(PHOTO), True)
+    assert store.load_state(state["id"])["status"] == STATUS_QUEUED
+    assert store.part_path(state["id"]).read_bytes() == PHOTO
+
+    # Завершённая загрузка больше частей не принимает
+    with pytest.raises(StorageError) as exc_info:
+        append(store, state, len(PHOTO), b"x")
+    assert exc_info.value.status_code == 403
+
+
+def test_guest_upload_count_quota(store, monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_GUEST_MAX_FILES", 2)
+    first = store.create(len(PHOTO), {"filename": "IMG_0001.jpg"}, GUEST)
+    store.create(len(PHOTO), {"filename": "IMG_0002.jpg"}, GUEST)
+    with pytest.raises(StorageError) as exc_info:
+        store.create(len(PHOTO), {"filename": "IMG_0003.jpg"}, GUEST)
+    assert exc_info.value.status_code == 429
+
+    # Квота — у каждого гостя своя
+    store.create(len(PHOTO), {"filename": "IMG_0003.jpg"}, OTHER_GUEST)
+
+    # Отмена загрузки квоту не возвращает
+    store.terminate(first)
+    with pytest.raises(StorageError) as exc_info:
+        store.load_state(first["id"])
+    assert exc_info.value.status_code == 404
+    with pytest.raises(StorageError) as exc_info:
+        store.create(len(PHOTO), {"filename": "IMG_0003.jpg"}, GUEST)
+    assert exc_info.value.status_code == 429
+
+
+def test_guest_upload_bytes_quota(store, monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_GUEST_MAX_BYTES", len(PHOTO) * 2 + 10)
+    store.create(len(PHOTO), {"filename": "IMG_0001.jpg"}, GUEST)
+    store.create(len(PHOTO), {"filename": "IMG_0002.jpg"}, GUEST)
+    with pytest.raises(StorageError) as exc_info:
+        store.create(len(PHOTO), {"filename": "IMG_0003.jpg"}, GUEST)
+    assert exc_info.value.status_code == 429
+    assert store.create(10, {"filename": "IMG_0003.jpg"}, GUEST)["length"] == 10
+
+
+def test_quota_window_is_a_day(store, monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_GUEST_MAX_FILES", 1)
+    old = store.create(len(PHOTO), {"filename": "IMG_0001.jpg"}, GUEST)
+    day_ago = time.time() - uploads.UPLOAD_QUOTA_WINDOW - 60
+    store.save_state({**old, "created": day_ago, "expires": day_ago + uploads.UPLOAD_EXPIRE_SECONDS})
+    store.create(len(PHOTO), {"filename": "IMG_0002.jpg"}, GUEST)
+
+
+def test_patch_completing_upload_enqueues_processing(data_root, monkeypatch):
+    enqueued = []
+
+    class Task:
+        @staticmethod
+        def delay(upload_id: str) -> None:
+            enqueued.append(upload_id)
+
+    monkeypatch.setattr(uploads_router, "process_guest_upload", Task)
+    app = FastAPI()
+    app.include_router(uploads_router.router)
+    token = jwt.encode(
+        {"type": "media", "scope": "upload", "guest": GUEST, "exp": int(time.time()) + 600},
+        token_settings.SECRET_KEY,
+        algorithm=token_settings.SECRET_ALGORITHM,
+    )
+    filename = base64.b64encode(b"IMG_0001.jpg").decode("ascii")
+    tus = {"Tus-Resumable": "1.0.0"}
+    patch_headers = {**tus, "Content-Type": "application/offset+octet-stream"}
+
+    with TestClient(app) as client:
+        created = client.post(
+            "/uploads",
+            params={"token": token},
+            headers={**tus, "Upload-Length": str(len(PHOTO)), "Upload-Metadata": f"filename {filename}"},
+        )
+        assert created.status_code == 201
+        upload_id = created.headers["Location"].split("?")[0].rsplit("/", 1)[1]
+
+        first = client.patch(
+            f"/uploads/{upload_id}", params={"token": token}, content=PHOTO[:1000],
+            headers={**patch_headers, "Upload-Offset": "0"},
+        )
+        assert (first.status_code, first.headers["Upload-Offset"], enqueued) == (204, "1000", [])
+
+        last = client.patch(
+            f"/uploads/{upload_id}", params={"token": token}, content=PHOTO[1000:],
+            headers={**patch_headers, "Upload-Offset": "1000"},
+        )
+        assert (last.status_code, last.headers["Upload-Offset"]) == (204, str(len(PHOTO)))
+
+    assert enqueued == [upload_id]
+    assert upload_store.load_state(upload_id)["status"] == STATUS_QUEUED
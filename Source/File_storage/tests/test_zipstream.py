@@ -0,0 +1,196 @@
+"""
+ZIP выборки «на лету» (app/services/zipstream.py): архив, собранный ZipStreamResponse по ZipPlan,
+читается zipfile; смещения local header и data descriptor совпадают с планом; Range-куски
+складываются в тот же архив; ZIP64 для файла больше 4 ГБ; кеш CRC-32; имена при совпадении имён файлов.
+"""
+import asyncio
+import io
+import os
+import struct
+import zipfile
+import zlib
+from pathlib import Path
+
+import pytest
+
+try:
+    from app.services import zipstream
+    from app.services.file_index import FileEntry
+    from app.services.zipstream import ZIP64_LIMIT, CrcCache, ZipPlan, ZipStreamResponse, file_crc32
+except Exception as exc:  # Нет зависимостей или не заданы настройки (.env)
+    pytest.skip(f"File_storage не импортируется: {exc}", allow_module_level=True)
+
+# 2025-08-16 12:00:00 UTC — дата съёмки, в DOS-формате без потерь (чётные секунды)
+MTIME = 1755345600
+
+
+def _write(root: Path, relative_path: str, data: bytes) -> FileEntry:
+    path = root / relative_path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    os.utime(path, (MTIME, MTIME))
+    return FileEntry.from_path(relative_path, path)
+
+
+async def _stream(plan: ZipPlan, start: int, end: int) -> bytes:
+    chunks = []
+
+    async def send(message: dict) -> None:
+        if message["type"] == "http.response.body":
+            chunks.append(message["body"])
+
+    # Без расширений ASGI-сервера: данные файлов читаются через pread
+    scope = {"type": "http", "method": "GET", "extensions": {}}
+    await ZipStreamResponse(plan, start, end)(scope, None, send)
+    return b"".join(chunks)
+
+
+def stream(plan: ZipPlan, start: int = 0, end: int | None = None) -> bytes:
+    return asyncio.run(_stream(plan, start, plan.size - 1 if end is None else end))
+
+
+@pytest.fixture
+def files() -> dict[str, bytes]:
+    return {
+        "wedding_day_all_photos/IMG_0001.jpg": os.urandom(150_000),
+        "wedding_day_all_photos/empty.txt": b"",
+        "wedding_day_video/VID_0001.mp4": os.urandom(3_000_000),
+    }
+
+
+@pytest.fixture
+def plan(tmp_path, files) -> ZipPlan:
+    return ZipPlan([_write(tmp_path, rel, data) for rel, data in files.items()])
+
+
+def test_stream_is_valid_zip(plan, files):
+    data = stream(plan)
+    assert len(data) == plan.size
+
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert zf.testzip() is None
+        assert zf.namelist() == ["IMG_0001.jpg", "empty.txt", "VID_0001.mp4"]
+        for rel, content in files.items():
+            info = zf.getinfo(Path(rel).name)
+            assert zf.read(info) == content
+            assert info.compress_type == zipfile.ZIP_STORED
+            assert info.date_time[:3] == (2025, 8, 16)
+
+
+def test_local_header_and_descriptor_offsets(plan, files):
+    data = stream(plan)
+
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        for member, content in zip(plan.members, files.values()):
+            assert data[member.offset:member.offset + 4] == b"PK\x03\x04"
+            assert data[member.offset:member.data_offset] == member.local_header
+            assert data[member.data_offset:member.descriptor_offset] == content
+            descriptor = data[member.descriptor_offset:member.descriptor_offset + member.descriptor_size]
+            assert struct.unpack("<IIII", descriptor) == (0x08074B50, zlib.crc32(content), len(content), len(content))
+            assert zf.getinfo(member.name.decode("utf-8")).header_offset == member.offset
+    assert data[plan.cd_offset:plan.cd_offset + 4] == b"PK\x01\x02"
+    assert data.endswith(plan.end_record)
+
+
+def test_ranges_concatenate_to_full_archive(plan):
+    full = stream(plan)
+    # Границы внутри local header, данных, descriptor и central directory
+    member = plan.members[2]
+    cuts = [0, 10, member.offset + 5, member.data_offset + 1000, member.descriptor_offset + 3, plan.cd_offset + 7, plan.size]
+    pieces = [stream(plan, start, end - 1) for start, end in zip(cuts, cuts[1:])]
+    assert b"".join(pieces) == full
+
+
+def test_zip64_for_file_over_4gb(tmp_path):
+    big = tmp_path / "wedding_day_video" / "big.mp4"
+    big.parent.mkdir(parents=True)
+    with open(big, "wb") as f:
+        f.truncate(ZIP64_LIMIT + 1)  # разреженный файл: место на диске не занимает
+    big_entry = FileEntry.from_path("wedding_day_video/big.mp4", big)
+    small_entry = _write(tmp_path, "wedding_day_all_photos/small.jpg", b"after zip64")
+    plan = ZipPlan([big_entry, small_entry])
+    # CRC заранее в кеше: считать 4 ГБ нулей незачем, содержимое большого файла не читается
+    zipstream.crc_cache.put(big_entry, 0)
+
+    big_member, small_member = plan.members
+    assert big_member.zip64 and not small_member.zip64
+    assert big_member.descriptor_size == 24
+    assert small_member.offset > ZIP64_LIMIT
+    assert plan.end_record.startswith(b"PK\x06\x06")
+
+    # Архив в разреженном файле: всё, кроме данных большого файла
+    archive = tmp_path / "selection.zip"
+    with open(archive, "wb") as f:
+        for start, end in ((0, big_member.data_offset - 1), (big_member.descriptor_offset, plan.size - 1)):
+            f.seek(start)
+            f.write(stream(plan, start, end))
+
+    with zipfile.ZipFile(archive) as zf:
+        big_info, small_info = zf.infolist()
+        assert (big_info.filename, big_info.file_size, big_info.header_offset) == ("big.mp4", ZIP64_LIMIT + 1, 0)
+        assert small_info.header_offset == small_member.offset
+        # Проверяет local header за границей 4 ГБ и CRC
+        assert zf.read(small_info) == b"after zip64"
+
+
+def test_file_crc32_reads_in_chunks(tmp_path):
+    data = os.urandom(zipstream.READ_CHUNK_SIZE * 2 + 123)
+    path = tmp_path / "file.bin"
+    path.write_bytes(data)
+    assert file_crc32(str(path)) == zlib.crc32(data)
+
+
+def test_crc_cache_computes_once_and_follows_file_version(tmp_path, monkeypatch):
+    calls = []
+
+    def counting_crc32(path: str) -> int:
+        calls.append(path)
+        return file_crc32(path)
+
+    monkeypatch.setattr(zipstream, "file_crc32", counting_crc32)
+    cache = CrcCache()
+    entry = _write(tmp_path, "a.jpg", b"first version")
+
+    async def twice() -> list[int]:
+        return await asyncio.gather(cache.get(entry), cache.get(entry))
+
+    assert asyncio.run(twice()) == [zlib.crc32(b"first version")] * 2
+    assert asyncio.run(cache.get(entry)) == zlib.crc32(b"first version")
+    assert len(calls) == 1
+    assert cache.peek(entry) == zlib.crc32(b"first version")
+
+    # Новый размер и mtime — другой ключ
+    entry.path.write_bytes(b"second version!")
+    os.utime(entry.path, (MTIME + 60, MTIME + 60))
+    changed = FileEntry.from_path(entry.relative_path, entry.path)
+    assert cache.peek(changed) is None
+    assert asyncio.run(cache.get(changed)) == zlib.crc32(b"second version!")
+    assert len(calls) == 2
+
+
+def test_crc_cache_evicts_least_recently_used(tmp_path):
+    cache = CrcCache(max_entries=2)
+    a, b, c = (_write(tmp_path, name, name.encode()) for name in ("a", "b", "c"))
+    cache.put(a, 1)
+    cache.put(b, 2)
+    assert cache.peek(a) == 1
+    asyncio.run(cache.get(a))  # a — самый свежий
+    cache.put(c, 3)
+    assert (cache.peek(a), cache.peek(b), cache.peek(c)) == (1, None, 3)
+
+
+def test_same_basename_uses_relative_path(tmp_path):
+    entries = [
+        _write(tmp_path, "wedding_day_all_photos/ceremony/IMG_0001.jpg", b"ceremony"),
+        _write(tmp_path, "wedding_day_all_photos/guests/IMG_0001.jpg", b"guests"),
+        _write(tmp_path, "wedding_day_all_photos/guests/IMG_0002.jpg", b"unique"),
+    ]
+    plan = ZipPlan(entries)
+    with zipfile.ZipFile(io.BytesIO(stream(plan))) as zf:
+        assert zf.namelist() == [
+            "wedding_day_all_photos/ceremony/IMG_0001.jpg",
+            "wedding_day_all_photos/guests/IMG_0001.jpg",
+            "IMG_0002.jpg",
+        ]
+        assert zf.read("wedding_day_all_photos/guests/IMG_0001.jpg") == b"guests"
+        assert zf.testzip() is None
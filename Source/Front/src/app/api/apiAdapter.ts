@@ -398,6 +398,44 @@ export const wishlistAPI = {
 const STREAM_URL_CACHE_TTL_MS = 55 * 60 * 1000;
 const streamUrlCache: Record<string, { url: string; expiresAt: number }> = {};
 
+/** Поля элемента /gallery/stream-urls-batch (path есть всегда) */
+export type StreamUrlField = 'url' | 'thumb_url' | 'thumb_srcset' | 'poster_url' | 'sprite_vtt_url' | 'meta';
+
+/** Метаданные фото из файлового хранилища: место под карточку и заглушка до загрузки превью */
+export interface ImageMeta {
+  /** Размеры при показе (с учётом EXIF Orientation) */
+  width: number;
+  height: number;
+  orientation: number;
+  /** Время съёмки (EXIF), ISO 8601 без часового пояса */
+  taken_at?: string | null;
+  blurhash?: string | null;
+}
+
+export interface StreamUrlItem {
+  path: string;
+  url: string;
+  thumb_url?: string | null;
+  thumb_srcset?: string | null;
+  /** Постер видео (только wedding_day_video) */
+  poster_url?: string | null;
+  /** WebVTT превью перемотки (только wedding_day_video) */
+  sprite_vtt_url?: string | null;
+  /** Метаданные фото (если хранилище их уже извлекло) */
+  meta?: ImageMeta | null;
+}
+
+/** Момент (церемония, ужин, танцы…) — виртуальный альбом из фото, снятых подряд */
+export interface GalleryMoment {
+  id: string;
+  /** Время первого и последнего кадра, ISO 8601 без часового пояса (время камеры) */
+  start: string;
+  end: string;
+  count: number;
+  cover_path?: string | null;
+  cover_thumb_url?: string | null;
+}
+
 // Gallery (медиа из файлового хранилища по токену)
 export const galleryAPI = {
   /** Флаги: показывать ли видео и фото в галерее. */
@@ -425,22 +463,58 @@ export const galleryAPI = {
     return { url };
   },
 
-  /** Все stream-URL для папки одним запросом (галерея, дресс-код). */
+  /**
+   * Stream-URL для папки (галерея, дресс-код). Без limit — вся папка одним запросом;
+   * с limit/cursor — постранично (next_cursor = null на последней странице).
+   * order: 'time' — в порядке съёмки; from/to (ISO 8601, время камеры) — только снятые в этом диапазоне,
+   * moment — только фото момента из getMoments. total — число файлов (в диапазоне/моменте).
+   */
   getStreamUrlsBatch: async (
     folder: string,
-  ): Promise<{ items: Array<{ path: string; url: string; thumb_url?: string | null }> }> => {
-    const response = await apiRequest(`/gallery/stream-urls-batch?folder=${encodeURIComponent(folder)}`);
+    options: {
+      cursor?: string | null;
+      limit?: number;
+      fields?: Array<StreamUrlField>;
+      order?: 'name' | 'time';
+      from?: string;
+      to?: string;
+      moment?: string;
+    } = {},
+  ): Promise<{
+    items: StreamUrlItem[];
+    next_cursor: string | null;
+    total: number | null;
+  }> => {
+    const params = new URLSearchParams({ folder });
+    if (options.cursor) params.set('cursor', options.cursor);
+    if (options.limit) params.set('limit', String(options.limit));
+    if (options.fields?.length) params.set('fields', options.fields.join(','));
+    if (options.order) params.set('order', options.order);
+    if (options.from) params.set('from', options.from);
+    if (options.to) params.set('to', options.to);
+    if (options.moment) params.set('moment', options.moment);
+    const response = await apiRequest(`/gallery/stream-urls-batch?${params.toString()}`);
     const data = await response.json();
     if (!response.ok) throw new Error(data.detail || 'Ошибка получения URL');
-    const items = (data.items || []) as Array<{ path: string; url: string; thumb_url?: string | null }>;
+    const items = (data.items || []) as StreamUrlItem[];
     const expiresAt = Date.now() + STREAM_URL_CACHE_TTL_MS;
     for (const item of items) {
-      streamUrlCache[item.path] = { url: item.url, expiresAt };
+      if (item.url) {
+        streamUrlCache[item.path] = { url: item.url, expiresAt };
+      }
       if (item.thumb_url) {
         streamUrlCache[`thumb:${item.path}`] = { url: item.thumb_url, expiresAt };
       }
     }
-    return { items };
+    return { items, next_cursor: data.next_cursor ?? null, total: data.total ?? null };
+  },
+
+  /** Моменты папки (по паузам в съёмке) с обложками; фото момента — getStreamUrlsBatch с moment */
+  getMoments: async (folder: string): Promise<GalleryMoment[]> => {
+    const response = await apiRequest(`/gallery/moments?folder=${encodeURIComponent(folder)}`);
+    const data = await response.json();
+    if (!response.ok) throw new Error(data.detail || 'Ошибка получения моментов');
+    return (data.moments || []) as GalleryMoment[];
   },
 
   /** Список относительных путей файлов в папке (couple_photo, dress_code, background_photo и т.д.) */
@@ -451,6 +525,22 @@ export const galleryAPI = {
     return { folder: data.folder, paths: data.paths || [] };
   },
 
+  /** URL master-плейлиста HLS для видео (если упаковки ещё нет — сервер ответит 503, плеер возьмёт MP4) */
+  getHlsUrl: async (path: string): Promise<{ url: string }> => {
+    const response = await apiRequest(`/gallery/hls-url?path=${encodeURIComponent(path)}`);
+    const data = await response.json();
+    if (!response.ok) throw new Error(data.detail || 'Ошибка получения URL видео');
+    return { url: data.url };
+  },
+
+  /** URL для загрузки фото гостями (tus, токен scope=upload) */
+  getUploadUrl: async (): Promise<{ url: string }> => {
+    const response = await apiRequest('/gallery/upload-url');
+    const data = await response.json();
+    if (!response.ok) throw new Error(data.detail || 'Ошибка получения URL загрузки');
+    return { url: data.url };
+  },
+
   /** URL для скачивания файла (только wedding_day_all_photos и wedding_day_video) */
   getDownloadUrl: async (path: string): Promise<{ url: string }> => {
     const response = await apiRequest(`/gallery/download-url?path=${encodeURIComponent(path)}`);
@@ -466,4 +556,15 @@ export const galleryAPI = {
     if (!response.ok) throw new Error(data.detail || 'Ошибка получения URL архива');
     return { url: data.url };
   },
+
+  /** URL для скачивания выбранных файлов одним ZIP (собирается на лету, с докачкой) */
+  getSelectionZipUrl: async (paths: string[]): Promise<{ url: string }> => {
+    const response = await apiRequest('/gallery/selection-zip-url', {
+      method: 'POST',
+      body: JSON.stringify({ paths }),
+    });
+    const data = await response.json();
+    if (!response.ok) throw new Error(data.detail || 'Ошибка получения URL архива');
+    return { url: data.url };
+  },
 };
@@ -0,0 +1,73 @@
+import React, { useRef, useState } from 'react';
+import { Upload, Loader2 } from 'lucide-react';
+import { galleryAPI } from '../api/apiAdapter';
+import { uploadGuestPhoto } from '../../utils/tusUpload';
+
+/** Кнопка «Добавить свои фото»: загрузка с докачкой, файлы по очереди, прогресс текущего файла. */
+export const GalleryGuestUpload: React.FC = () => {
+  const inputRef = useRef<HTMLInputElement>(null);
+  const [progress, setProgress] = useState<{ index: number; total: number; percent: number } | null>(null);
+  const [message, setMessage] = useState<string | null>(null);
+
+  const handleFiles = async (files: FileList | null) => {
+    if (!files?.length) return;
+    const list = Array.from(files);
+    let failed = 0;
+    setMessage(null);
+    for (let i = 0; i < list.length; i++) {
+      setProgress({ index: i, total: list.length, percent: 0 });
+      try {
+        await uploadGuestPhoto(
+          list[i],
+          () => galleryAPI.getUploadUrl().then((r) => r.url),
+          (sent, size) => setProgress({ index: i, total: list.length, percent: Math.round((sent / size) * 100) }),
+        );
+      } catch {
+        failed += 1;
+      }
+    }
+    setProgress(null);
+    setMessage(
+      failed
+        ? `Не удалось загрузить ${failed} из ${list.length}. Попробуйте ещё раз — загрузка продолжится с места обрыва`
+        : 'Спасибо! Фото появятся в галерее через пару минут',
+    );
+    if (inputRef.current) inputRef.current.value = '';
+  };
+
+  return (
+    <div className="flex flex-col items-center gap-2">
+      <input
+        ref={inputRef}
+        type="file"
+        accept="image/*"
+        multiple
+        className="hidden"
+        onChange={(e) => handleFiles(e.target.files)}
+      />
+      <button
+        onClick={() => inputRef.current?.click()}
+        disabled={progress !== null}
+        className="flex items-center gap-2 px-6 py-3 rounded-xl font-semibold transition-all hover:shadow-md disabled:opacity-70"
+        style={{
+          backgroundColor: 'var(--color-cream-light)',
+          color: 'var(--color-text)',
+          borderWidth: '1px',
+          borderColor: 'var(--color-border)',
+        }}
+      >
+        {progress ? <Loader2 className="w-5 h-5 animate-spin" /> : <Upload className="w-5 h-5" />}
+        <span>
+          {progress
+            ? `Загружаем ${progress.index + 1} из ${progress.total} (${progress.percent}%)`
+            : 'Добавить свои фото'}
+        </span>
+      </button>
+      {message && (
+        <p className="text-sm text-center" style={{ color: 'var(--color-text-light)' }}>
+          {message}
+        </p>
+      )}
+    </div>
+  );
+};
@@ -0,0 +1,79 @@
+import React from 'react';
+import type { GalleryMoment } from '../api/apiAdapter';
+
+interface GalleryMomentsProps {
+  moments: GalleryMoment[];
+  activeId: string | null;
+  /** null — все фото */
+  onSelect: (id: string | null) => void;
+}
+
+/** Время камеры из ISO без часового пояса: показываем как есть, без перевода в пояс браузера */
+function formatClock(iso: string): string {
+  const match = /T(\d{2}):(\d{2})/.exec(iso);
+  return match ? `${match[1]}:${match[2]}` : '';
+}
+
+function formatRange(moment: GalleryMoment): string {
+  const start = formatClock(moment.start);
+  const end = formatClock(moment.end);
+  return start === end ? start : `${start}–${end}`;
+}
+
+/**
+ * Моменты свадьбы — виртуальные альбомы по паузам в съёмке: обложка, время и число фото.
+ * Выбор момента показывает в сетке только его фото.
+ */
+export const GalleryMoments: React.FC<GalleryMomentsProps> = ({ moments, activeId, onSelect }) => {
+  if (moments.length < 2) return null;
+
+  const chipStyle = (active: boolean): React.CSSProperties => ({
+    background: active ? 'var(--gradient-main)' : 'var(--color-cream-light)',
+    color: active ? '#fff' : 'var(--color-text)',
+  });
+
+  return (
+    <div className="flex gap-2 overflow-x-auto pb-2 mb-6" role="tablist" aria-label="Моменты">
+      <button
+        type="button"
+        role="tab"
+        aria-selected={activeId === null}
+        onClick={() => onSelect(null)}
+        className="shrink-0 px-4 py-2 rounded-xl text-sm font-semibold transition-all"
+        style={chipStyle(activeId === null)}
+      >
+        Все фото
+      </button>
+      {moments.map((moment) => {
+        const active = moment.id === activeId;
+        return (
+          <button
+            key={moment.id}
+            type="button"
+            role="tab"
+            aria-selected={active}
+            onClick={() => onSelect(moment.id)}
+            className="shrink-0 flex items-center gap-2 pl-1 pr-4 py-1 rounded-xl text-sm transition-all"
+            style={chipStyle(active)}
+          >
+            {moment.cover_thumb_url ? (
+              <img
+                src={moment.cover_thumb_url}
+                alt=""
+                loading="lazy"
+                decoding="async"
+                className="w-10 h-10 rounded-lg object-cover"
+              />
+            ) : (
+              <span className="w-10 h-10 rounded-lg" style={{ background: 'rgba(184, 162, 200, 0.2)' }} />
+            )}
+            <span className="flex flex-col items-start leading-tight">
+              <span className="font-semibold">{formatRange(moment)}</span>
+              <span className="text-xs opacity-75">{moment.count} фото</span>
+            </span>
+          </button>
+        );
+      })}
+    </div>
+  );
+};
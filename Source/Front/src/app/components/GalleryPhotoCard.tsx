@@ -10,6 +10,10 @@ interface GalleryPhotoCardProps {
   onOpen?: () => void;
   onPrefetchFull?: () => void;
   onImageLoad?: (height: number) => void;
+  /** Заглушка до загрузки превью (data URL из blurhash) */
+  placeholderSrc?: string | null;
+  /** Ширина / высота фото — место под карточку резервируется сразу, без скачка сетки */
+  aspectRatio?: number;
 }
 
 const LAZY_ROOT_MARGIN = '800px';
@@ -23,6 +27,8 @@ export const GalleryPhotoCard: React.FC<GalleryPhotoCardProps> = ({
   onOpen,
   onPrefetchFull,
   onImageLoad,
+  placeholderSrc,
+  aspectRatio,
 }) => {
   const containerRef = useRef<HTMLDivElement>(null);
 
@@ -59,19 +65,26 @@ export const GalleryPhotoCard: React.FC<GalleryPhotoCardProps> = ({
   return (
     <div
       ref={setRootRef}
-      className={`relative group overflow-hidden rounded-lg md:rounded-2xl shadow-md md:shadow-lg min-h-[72px] md:min-h-[200px] ${
-        onOpen ? 'cursor-pointer' : ''
-      }`}
-      style={{ background: 'linear-gradient(135deg, rgba(184, 162, 200, 0.18), rgba(144, 198, 149, 0.12))' }}
+      className={`relative group overflow-hidden rounded-lg md:rounded-2xl shadow-md md:shadow-lg ${
+        aspectRatio ? '' : 'min-h-[72px] md:min-h-[200px]'
+      } ${onOpen ? 'cursor-pointer' : ''}`}
+      style={{
+        background: 'linear-gradient(135deg, rgba(184, 162, 200, 0.18), rgba(144, 198, 149, 0.12))',
+        aspectRatio: aspectRatio && !loaded ? String(aspectRatio) : undefined,
+      }}
       onClick={() => onOpen?.()}
       onMouseEnter={() => onPrefetchFull?.()}
       onFocus={() => onPrefetchFull?.()}
     >
       <div
         className={`absolute inset-0 transition-opacity duration-300 ${
-          loaded ? 'opacity-0 pointer-events-none' : 'opacity-100 animate-pulse'
+          loaded ? 'opacity-0 pointer-events-none' : placeholderSrc ? 'opacity-100' : 'opacity-100 animate-pulse'
         }`}
-        style={{ background: 'linear-gradient(135deg, rgba(184, 162, 200, 0.12), rgba(144, 198, 149, 0.08))' }}
+        style={{
+          background: placeholderSrc
+            ? `center / cover no-repeat url(${placeholderSrc})`
+            : 'linear-gradient(135deg, rgba(184, 162, 200, 0.12), rgba(144, 198, 149, 0.08))',
+        }}
         aria-hidden
       />
       {shouldLoad && thumbSrc && (
@@ -11,9 +11,54 @@ const formatTime = (seconds: number): string => {
   return `${m}:${s.toString().padStart(2, '0')}`;
 };
 
+/** Плитка спрайта превью перемотки из WebVTT (#xywh) */
+interface SpriteCue {
+  start: number;
+  end: number;
+  url: string;
+  x: number;
+  y: number;
+  w: number;
+  h: number;
+}
+
+const parseVttTime = (value: string): number => {
+  const parts = value.trim().split(':').map(parseFloat);
+  return parts.reduce((acc, part) => acc * 60 + part, 0);
+};
+
+/** Разбирает WebVTT спрайта: «00:00:00.000 --> 00:00:02.000» + «sprite?…#xywh=x,y,w,h». */
+const parseSpriteVtt = (text: string, vttUrl: string): SpriteCue[] => {
+  const cues: SpriteCue[] = [];
+  const lines = text.split(/\r?\n/);
+  for (let i = 0; i < lines.length - 1; i++) {
+    const timing = lines[i].split('-->');
+    if (timing.length !== 2) continue;
+    const [ref, fragment] = lines[i + 1].trim().split('#xywh=');
+    const box = (fragment || '').split(',').map(Number);
+    if (!ref || box.length !== 4 || box.some((n) => !Number.isFinite(n))) continue;
+    cues.push({
+      start: parseVttTime(timing[0]),
+      end: parseVttTime(timing[1]),
+      url: new URL(ref, vttUrl).toString(),
+      x: box[0],
+      y: box[1],
+      w: box[2],
+      h: box[3],
+    });
+  }
+  return cues;
+};
+
 export interface GalleryVideoBlockProps {
   title: string;
   streamUrl: string | null;
+  /** HLS master-плейлист; браузеры с нативным HLS берут его, остальные — MP4 из streamUrl */
+  hlsUrl?: string | null;
+  /** Постер: до нажатия Play само видео не загружается */
+  posterUrl?: string | null;
+  /** WebVTT превью перемотки (плитки спрайта) */
+  spriteVttUrl?: string | null;
   downloadUrl: string | null;
   archiveUrl: string | null;
   downloadFileName: string;
@@ -24,6 +69,9 @@ export interface GalleryVideoBlockProps {
 export const GalleryVideoBlock: React.FC<GalleryVideoBlockProps> = ({
   title,
   streamUrl,
+  hlsUrl = null,
+  posterUrl = null,
+  spriteVttUrl = null,
   downloadUrl,
   archiveUrl,
   downloadFileName,
@@ -36,7 +84,10 @@ export const GalleryVideoBlock: React.FC<GalleryVideoBlockProps> = ({
   const [currentTime, setCurrentTime] = useState(0);
   const [duration, setDuration] = useState(0);
   const [videoHover, setVideoHover] = useState(false);
+  const [spriteCues, setSpriteCues] = useState<SpriteCue[] | null>(null);
+  const [scrubPreview, setScrubPreview] = useState<{ ratio: number; time: number; cue: SpriteCue | null } | null>(null);
   const videoRef = React.useRef<HTMLVideoElement>(null);
+  const spriteRequestedRef = React.useRef(false);
 
   useEffect(() => {
     if (streamUrl) {
@@ -45,6 +96,34 @@ export const GalleryVideoBlock: React.FC<GalleryVideoBlockProps> = ({
     }
   }, [streamUrl]);
 
+  useEffect(() => {
+    spriteRequestedRef.current = false;
+    setSpriteCues(null);
+  }, [spriteVttUrl]);
+
+  /** VTT спрайта грузится при первом наведении на полосу перемотки */
+  const loadSpriteCues = () => {
+    if (!spriteVttUrl || spriteRequestedRef.current) return;
+    spriteRequestedRef.current = true;
+    fetch(spriteVttUrl)
+      .then((r) => (r.ok ? r.text() : Promise.reject(new Error(String(r.status)))))
+      .then((text) => setSpriteCues(parseSpriteVtt(text, spriteVttUrl)))
+      .catch(() => {
+        // Спрайт ещё готовится (503) — попробуем при следующем наведении
+        spriteRequestedRef.current = false;
+      });
+  };
+
+  const handleSeekHover = (e: React.MouseEvent<HTMLInputElement>) => {
+    const total = duration || (spriteCues?.length ? spriteCues[spriteCues.length - 1].end : 0);
+    if (!total) return;
+    const rect = e.currentTarget.getBoundingClientRect();
+    const ratio = Math.min(1, Math.max(0, (e.clientX - rect.left) / rect.width));
+    const time = ratio * total;
+    const cue = spriteCues?.find((c) => time >= c.start && time < c.end) ?? spriteCues?.[spriteCues.length - 1] ?? null;
+    setScrubPreview({ ratio, time, cue });
+  };
+
   const togglePlay = () => {
     if (videoRef.current) {
       if (isPlaying) videoRef.current.pause();
@@ -119,7 +198,9 @@ export const GalleryVideoBlock: React.FC<GalleryVideoBlockProps> = ({
             <video
               ref={videoRef}
               className="w-full aspect-video cursor-pointer"
-              src={streamUrl}
+              src={hlsUrl ? undefined : streamUrl}
+              poster={posterUrl ?? undefined}
+              preload={posterUrl ? 'none' : 'metadata'}
               onClick={(e) => {
                 e.stopPropagation();
                 togglePlay();
@@ -130,7 +211,10 @@ export const GalleryVideoBlock: React.FC<GalleryVideoBlockProps> = ({
               onTimeUpdate={() => videoRef.current && setCurrentTime(videoRef.current.currentTime)}
               onLoadedMetadata={() => videoRef.current && setDuration(videoRef.current.duration)}
               onDurationChange={() => videoRef.current && setDuration(videoRef.current.duration)}
-            />
+            >
+              {hlsUrl && <source src={hlsUrl} type="application/vnd.apple.mpegurl" />}
+              {hlsUrl && <source src={streamUrl} type="video/mp4" />}
+            </video>
             {!isPlaying && (
               <div
                 className="absolute inset-0 flex items-center justify-center bg-black/30 cursor-pointer"
@@ -156,16 +240,43 @@ export const GalleryVideoBlock: React.FC<GalleryVideoBlockProps> = ({
               </div>
             )}
             <div className="absolute bottom-0 left-0 right-0 bg-gradient-to-t from-black/80 to-transparent p-2 md:p-3 flex items-center gap-2">
-              <input
-                type="range"
-                min={0}
-                max={duration || 100}
-                step={0.1}
-                value={currentTime}
-                onChange={handleSeek}
-                onClick={(e) => e.stopPropagation()}
-                className="flex-1 min-w-0 h-2 rounded-full cursor-pointer accent-white [color-scheme:dark]"
-              />
+              <div className="relative flex-1 min-w-0 flex items-center">
+                {scrubPreview && (
+                  <div
+                    className="absolute bottom-full mb-2 -translate-x-1/2 pointer-events-none flex flex-col items-center gap-1"
+                    style={{ left: `${scrubPreview.ratio * 100}%` }}
+                    aria-hidden
+                  >
+                    {scrubPreview.cue && (
+                      <div
+                        className="rounded-md shadow-lg border border-white/40"
+                        style={{
+                          width: scrubPreview.cue.w,
+                          height: scrubPreview.cue.h,
+                          backgroundImage: `url("${scrubPreview.cue.url}")`,
+                          backgroundPosition: `-${scrubPreview.cue.x}px -${scrubPreview.cue.y}px`,
+                        }}
+                      />
+                    )}
+                    <span className="text-white text-xs font-medium tabular-nums bg-black/60 rounded px-1">
+                      {formatTime(scrubPreview.time)}
+                    </span>
+                  </div>
+                )}
+                <input
+                  type="range"
+                  min={0}
+                  max={duration || 100}
+                  step={0.1}
+                  value={currentTime}
+                  onChange={handleSeek}
+                  onClick={(e) => e.stopPropagation()}
+                  onMouseEnter={loadSpriteCues}
+                  onMouseMove={handleSeekHover}
+                  onMouseLeave={() => setScrubPreview(null)}
+                  className="w-full h-2 rounded-full cursor-pointer accent-white [color-scheme:dark]"
+                />
+              </div>
               <span className="text-white text-xs font-medium tabular-nums shrink-0 whitespace-nowrap">
                 {formatTime(currentTime)} / {formatTime(duration)}
               </span>
@@ -3,12 +3,22 @@ import { motion } from 'motion/react';
 import { Download, Image as ImageIcon, Loader2, Camera, Video } from 'lucide-react';
 import { Navigation } from '../components/Navigation';
 import { GalleryVideoBlock } from '../components/GalleryVideoBlock';
+import { GalleryGuestUpload } from '../components/GalleryGuestUpload';
 import { GalleryMasonry } from '../components/GalleryMasonry';
 import { GalleryPhotoCard } from '../components/GalleryPhotoCard';
 import { GalleryPhotoLightbox } from '../components/GalleryPhotoLightbox';
-import { galleryAPI } from '../api/apiAdapter';
+import { GalleryMoments } from '../components/GalleryMoments';
+import { galleryAPI, type GalleryMoment, type ImageMeta, type StreamUrlItem } from '../api/apiAdapter';
+import { blurhashToDataUrl } from '../../utils/blurhash';
 
 const FOLDER_PHOTOS = 'wedding_day_all_photos';
+const FOLDER_VIDEO = 'wedding_day_video';
+/** Первая страница stream-urls-batch — хватает на первый экран */
+const PHOTO_FIRST_PAGE_SIZE = 60;
+/** Размер следующих страниц, догружаемых в фоне */
+const PHOTO_NEXT_PAGE_SIZE = 300;
+/** Фото разных фотографов — в порядке съёмки, а не вперемешку по именам файлов */
+const PHOTO_ORDER = 'time' as const;
 /** Сколько фото монтировать в DOM за раз */
 const PHOTO_MOUNT_BATCH = 24;
 /** За сколько строк до конца текущей порции начинать монтировать следующую */
@@ -60,7 +70,16 @@ export const Gallery: React.FC = () => {
   const [photoPaths, setPhotoPaths] = useState<string[]>([]);
   const [photoUrlByPath, setPhotoUrlByPath] = useState<Record<string, string>>({});
   const [photoThumbByPath, setPhotoThumbByPath] = useState<Record<string, string>>({});
+  // Размеры и blurhash из списка хранилища: место под карточку и заглушка до загрузки превью
+  const [photoMetaByPath, setPhotoMetaByPath] = useState<Record<string, ImageMeta>>({});
   const [photosUrlsLoading, setPhotosUrlsLoading] = useState(false);
+  // Моменты (виртуальные альбомы по времени съёмки); null — все фото
+  const [moments, setMoments] = useState<GalleryMoment[]>([]);
+  const [activeMoment, setActiveMoment] = useState<string | null>(null);
+  // Всего фото в папке — для кнопки архива (сетка может показывать только момент)
+  const [photoTotal, setPhotoTotal] = useState<number | null>(null);
+  // Поколение загрузки страниц: смена момента останавливает догрузку прежней выборки
+  const photoLoadIdRef = useRef(0);
   const [visiblePhotoCount, setVisiblePhotoCount] = useState(PHOTO_MOUNT_BATCH);
   const [loadThroughIndex, setLoadThroughIndex] = useState(-1);
   const columnCount = useColumnCount();
@@ -75,6 +94,10 @@ export const Gallery: React.FC = () => {
   const [bestMomentsDownloadUrl, setBestMomentsDownloadUrl] = useState<string | null>(null);
   const [bestMomentsArchiveUrl, setBestMomentsArchiveUrl] = useState<string | null>(null);
   const [videoStreamUrl, setVideoStreamUrl] = useState<string | null>(null);
+  const [videoHlsUrl, setVideoHlsUrl] = useState<string | null>(null);
+  const [bestMomentsHlsUrl, setBestMomentsHlsUrl] = useState<string | null>(null);
+  // Постеры и превью перемотки видео (path → элемент stream-urls-batch)
+  const [videoFrameUrls, setVideoFrameUrls] = useState<Record<string, StreamUrlItem>>({});
   const [videoDownloadUrl, setVideoDownloadUrl] = useState<string | null>(null);
   const [videoArchiveUrl, setVideoArchiveUrl] = useState<string | null>(null);
   const [photoArchiveUrl, setPhotoArchiveUrl] = useState<string | null>(null);
@@ -87,8 +110,99 @@ export const Gallery: React.FC = () => {
   const galleryClosed = videoEnabled === false && photosEnabled === false;
   const visiblePaths = photoPaths.slice(0, visiblePhotoCount);
 
+  /** Размеры из метаданных — сетка раскладывается сразу, до загрузки превью */
+  const seedPhotoDimensions = (metaMap: Record<string, ImageMeta>) => {
+    for (const [path, meta] of Object.entries(metaMap)) {
+      if (meta.width > 0 && meta.height > 0 && !photoDimensionsRef.current[path]) {
+        photoDimensionsRef.current[path] = { width: meta.width, height: meta.height };
+      }
+    }
+  };
+
+  /** Первая страница выборки: сетка начинается заново */
+  const applyFirstPhotoPage = (items: StreamUrlItem[]) => {
+    const map: Record<string, string> = {};
+    const thumbMap: Record<string, string> = {};
+    const metaMap: Record<string, ImageMeta> = {};
+    const paths: string[] = [];
+    for (const item of items) {
+      map[item.path] = item.url;
+      if (item.thumb_url) thumbMap[item.path] = item.thumb_url;
+      if (item.meta) metaMap[item.path] = item.meta;
+      paths.push(item.path);
+    }
+    seedPhotoDimensions(metaMap);
+    setPhotoPaths(paths);
+    setPhotoUrlByPath(map);
+    setPhotoThumbByPath(thumbMap);
+    setPhotoMetaByPath(metaMap);
+    setVisiblePhotoCount(Math.min(PHOTO_MOUNT_BATCH, paths.length));
+    loadedThroughRef.current = -1;
+    mountExpandedAtRef.current = 0;
+    setLoadThroughIndex(-1);
+  };
+
+  /** Следующая страница — дописывается в конец сетки */
+  const appendPhotoPage = (items: StreamUrlItem[]) => {
+    const pageMap: Record<string, string> = {};
+    const pageThumbMap: Record<string, string> = {};
+    const pageMetaMap: Record<string, ImageMeta> = {};
+    for (const item of items) {
+      pageMap[item.path] = item.url;
+      if (item.thumb_url) pageThumbMap[item.path] = item.thumb_url;
+      if (item.meta) pageMetaMap[item.path] = item.meta;
+    }
+    seedPhotoDimensions(pageMetaMap);
+    setPhotoPaths((prev) => [...prev, ...items.map((item) => item.path)]);
+    setPhotoUrlByPath((prev) => ({ ...prev, ...pageMap }));
+    setPhotoThumbByPath((prev) => ({ ...prev, ...pageThumbMap }));
+    setPhotoMetaByPath((prev) => ({ ...prev, ...pageMetaMap }));
+  };
+
+  /** Остальные страницы в фоне, пока не сменилась выборка (loadId) */
+  const loadRemainingPhotoPages = async (cursor: string | null, moment: string | null, loadId: number) => {
+    while (cursor && photoLoadIdRef.current === loadId) {
+      const page = await galleryAPI.getStreamUrlsBatch(FOLDER_PHOTOS, {
+        cursor,
+        limit: PHOTO_NEXT_PAGE_SIZE,
+        order: PHOTO_ORDER,
+        moment: moment ?? undefined,
+      });
+      if (photoLoadIdRef.current !== loadId) return;
+      appendPhotoPage(page.items);
+      cursor = page.next_cursor;
+    }
+  };
+
+  /** Выбор момента: сетка перезагружается только его фото (null — все фото) */
+  const selectMoment = async (moment: string | null) => {
+    if (moment === activeMoment) return;
+    const loadId = ++photoLoadIdRef.current;
+    setActiveMoment(moment);
+    setLightboxIndex(null);
+    setPhotoPaths([]);
+    setPhotosUrlsLoading(true);
+    try {
+      const batch = await galleryAPI.getStreamUrlsBatch(FOLDER_PHOTOS, {
+        limit: PHOTO_FIRST_PAGE_SIZE,
+        order: PHOTO_ORDER,
+        moment: moment ?? undefined,
+      });
+      if (photoLoadIdRef.current !== loadId) return;
+      applyFirstPhotoPage(batch.items);
+      setPhotosUrlsLoading(false);
+      await loadRemainingPhotoPages(batch.next_cursor, moment, loadId);
+    } catch (e) {
+      if (photoLoadIdRef.current === loadId) {
+        setPhotosUrlsLoading(false);
+        setMessage(e instanceof Error ? e.message : 'Ошибка загрузки фотографий');
+      }
+    }
+  };
+
   useEffect(() => {
     let cancelled = false;
+    const loadId = ++photoLoadIdRef.current;
     setLoading(true);
     setMessage('');
     (async () => {
@@ -118,17 +232,24 @@ export const Gallery: React.FC = () => {
               galleryAPI.getDownloadUrl(VIDEO_PATH_MAIN).then((r) => r.url).catch(() => null),
               galleryAPI.getArchiveUrl('wedding_day_video').then((r) => r.url),
               galleryAPI.getArchiveUrl('wedding_best_moments').then((r) => r.url).catch(() => null),
+              galleryAPI.getHlsUrl(VIDEO_PATH_BEST_MOMENTS).then((r) => r.url).catch(() => null),
+              galleryAPI.getHlsUrl(VIDEO_PATH_MAIN).then((r) => r.url).catch(() => null),
+              galleryAPI
+                .getStreamUrlsBatch(FOLDER_VIDEO, { fields: ['poster_url', 'sprite_vtt_url'] })
+                .then((r) => r.items)
+                .catch(() => [] as StreamUrlItem[]),
             ])
           : Promise.resolve(null);
 
         const photosPromise = status.photos_enabled
           ? (async () => {
               try {
-                const [batch, archive] = await Promise.all([
-                  galleryAPI.getStreamUrlsBatch(FOLDER_PHOTOS),
+                const [batch, archive, photoMoments] = await Promise.all([
+                  galleryAPI.getStreamUrlsBatch(FOLDER_PHOTOS, { limit: PHOTO_FIRST_PAGE_SIZE, order: PHOTO_ORDER }),
                   galleryAPI.getArchiveUrl('wedding_day_all_photos').then((r) => r.url),
+                  galleryAPI.getMoments(FOLDER_PHOTOS).catch(() => [] as GalleryMoment[]),
                 ]);
-                return { batch, archive };
+                return { batch, archive, photoMoments };
               } finally {
                 if (!cancelled) setPhotosUrlsLoading(false);
               }
@@ -139,8 +260,12 @@ export const Gallery: React.FC = () => {
         if (cancelled) return;
 
         if (videoData) {
-          const [bestStream, bestDownload, mainStream, mainDownload, videoArchive, bestArchive] = videoData;
+          const [bestStream, bestDownload, mainStream, mainDownload, videoArchive, bestArchive, bestHls, mainHls, frameItems] =
+            videoData;
+          setVideoFrameUrls(Object.fromEntries(frameItems.map((item) => [item.path, item])));
           setBestMomentsStreamUrl(bestStream);
+          setBestMomentsHlsUrl(bestHls);
+          setVideoHlsUrl(mainHls);
           setBestMomentsDownloadUrl(bestDownload);
           setBestMomentsArchiveUrl(bestArchive);
           setVideoStreamUrl(mainStream);
@@ -149,26 +274,13 @@ export const Gallery: React.FC = () => {
         }
 
         if (photosData) {
-          const { batch, archive } = photosData;
+          const { batch, archive, photoMoments } = photosData;
           setPhotoArchiveUrl(archive);
-          const items = batch.items || [];
-          if (items.length > 0 && !cancelled) {
-            const map: Record<string, string> = {};
-            const thumbMap: Record<string, string> = {};
-            const paths: string[] = [];
-            for (const item of items) {
-              map[item.path] = item.url;
-              if (item.thumb_url) thumbMap[item.path] = item.thumb_url;
-              paths.push(item.path);
-            }
-            setPhotoPaths(paths);
-            setPhotoUrlByPath(map);
-            setPhotoThumbByPath(thumbMap);
-            setVisiblePhotoCount(Math.min(PHOTO_MOUNT_BATCH, paths.length));
-            loadedThroughRef.current = -1;
-            mountExpandedAtRef.current = 0;
-            setLoadThroughIndex(-1);
-          }
+          setMoments(photoMoments);
+          setPhotoTotal(batch.total);
+          if (batch.items.length > 0 && photoLoadIdRef.current === loadId) applyFirstPhotoPage(batch.items);
+          // Остальные страницы догружаем в фоне и дописываем в конец сетки
+          await loadRemainingPhotoPages(batch.next_cursor, null, loadId);
         }
       } catch (e) {
         if (!cancelled) setMessage(e instanceof Error ? e.message : 'Ошибка загрузки галереи');
@@ -176,6 +288,7 @@ export const Gallery: React.FC = () => {
     })();
     return () => {
       cancelled = true;
+      photoLoadIdRef.current += 1;
     };
   }, []);
 
@@ -429,6 +542,9 @@ export const Gallery: React.FC = () => {
           <GalleryVideoBlock
             title="Лучшие моменты"
             streamUrl={bestMomentsStreamUrl}
+            hlsUrl={bestMomentsHlsUrl}
+            posterUrl={videoFrameUrls[VIDEO_PATH_BEST_MOMENTS]?.poster_url}
+            spriteVttUrl={videoFrameUrls[VIDEO_PATH_BEST_MOMENTS]?.sprite_vtt_url}
             downloadUrl={bestMomentsDownloadUrl}
             archiveUrl={bestMomentsArchiveUrl}
             downloadFileName="wedding_best_moments.mp4"
@@ -447,6 +563,9 @@ export const Gallery: React.FC = () => {
           <GalleryVideoBlock
             title="Видео со свадьбы"
             streamUrl={videoStreamUrl}
+            hlsUrl={videoHlsUrl}
+            posterUrl={videoFrameUrls[VIDEO_PATH_MAIN]?.poster_url}
+            spriteVttUrl={videoFrameUrls[VIDEO_PATH_MAIN]?.sprite_vtt_url}
             downloadUrl={videoDownloadUrl}
             archiveUrl={videoArchiveUrl}
             downloadFileName="wedding_video.mp4"
@@ -476,18 +595,23 @@ export const Gallery: React.FC = () => {
                   Фотографии
                 </h2>
               </div>
-              {photoArchiveUrl && (
-                <button
-                  onClick={downloadPhotoArchive}
-                  className="flex items-center gap-2 px-6 py-3 rounded-xl text-white font-semibold transition-all hover:shadow-lg"
-                  style={{ background: 'linear-gradient(135deg, #d4af37, #f4e4a6)' }}
-                >
-                  <Download className="w-5 h-5" />
-                  <span>Скачать архив ({photoPaths.length} фото)</span>
-                </button>
-              )}
+              <div className="flex flex-col sm:flex-row items-center gap-3">
+                <GalleryGuestUpload />
+                {photoArchiveUrl && (
+                  <button
+                    onClick={downloadPhotoArchive}
+                    className="flex items-center gap-2 px-6 py-3 rounded-xl text-white font-semibold transition-all hover:shadow-lg"
+                    style={{ background: 'linear-gradient(135deg, #d4af37, #f4e4a6)' }}
+                  >
+                    <Download className="w-5 h-5" />
+                    <span>Скачать архив ({photoTotal ?? photoPaths.length} фото)</span>
+                  </button>
+                )}
+              </div>
             </div>
 
+            <GalleryMoments moments={moments} activeId={activeMoment} onSelect={selectMoment} />
+
             {photoPaths.length > 0 ? (
               <>
                 {photosUrlsLoading && (
@@ -509,6 +633,8 @@ export const Gallery: React.FC = () => {
                     );
                     const isPrefetchTrigger =
                       visiblePhotoCount < photoPaths.length && index === prefetchTriggerIndex;
+                    const meta = photoMetaByPath[path];
+                    const aspectRatio = meta && meta.width > 0 && meta.height > 0 ? meta.width / meta.height : undefined;
 
                     return (
                       <GalleryPhotoCard
@@ -526,6 +652,8 @@ export const Gallery: React.FC = () => {
                           }
                         }}
                         onImageLoad={(height) => reportHeight(path, height)}
+                        aspectRatio={aspectRatio}
+                        placeholderSrc={meta?.blurhash ? blurhashToDataUrl(meta.blurhash, aspectRatio) : null}
                       />
                     );
                   }}
@@ -0,0 +1,108 @@
+/**
+ * Декодер blurhash (https://blurha.sh): строка 20–30 символов из списка файлового хранилища
+ * превращается в размытую картинку 32px — заглушку карточки до загрузки превью.
+ * Результат (data URL) кешируется по строке: заглушка одного фото рисуется один раз.
+ */
+
+const BASE83 = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~';
+/** Сторона декодируемой картинки: браузер растягивает её на всю карточку */
+const PLACEHOLDER_SIZE = 32;
+
+const dataUrlCache = new Map<string, string | null>();
+
+const decode83 = (str: string): number => {
+  let value = 0;
+  for (const ch of str) {
+    const digit = BASE83.indexOf(ch);
+    if (digit < 0) throw new Error('Неверный символ blurhash');
+    value = value * 83 + digit;
+  }
+  return value;
+};
+
+const srgbToLinear = (value: number): number => {
+  const v = value / 255;
+  return v <= 0.04045 ? v / 12.92 : Math.pow((v + 0.055) / 1.055, 2.4);
+};
+
+const linearToSrgb = (value: number): number => {
+  const v = Math.max(0, Math.min(1, value));
+  return v <= 0.0031308
+    ? Math.trunc(v * 12.92 * 255 + 0.5)
+    : Math.trunc((1.055 * Math.pow(v, 1 / 2.4) - 0.055) * 255 + 0.5);
+};
+
+const signPow = (value: number, exp: number): number => Math.sign(value) * Math.pow(Math.abs(value), exp);
+
+/** Пиксели RGBA width×height по blurhash */
+export function decodeBlurhash(hash: string, width: number, height: number): Uint8ClampedArray {
+  const sizeFlag = decode83(hash[0]);
+  const numY = Math.floor(sizeFlag / 9) + 1;
+  const numX = (sizeFlag % 9) + 1;
+  if (hash.length !== 4 + 2 * numX * numY) throw new Error('Неверная длина blurhash');
+
+  const maxValue = (decode83(hash[1]) + 1) / 166;
+  const colors: Array<[number, number, number]> = [];
+  const dc = decode83(hash.substring(2, 6));
+  colors.push([srgbToLinear(dc >> 16), srgbToLinear((dc >> 8) & 255), srgbToLinear(dc & 255)]);
+  for (let i = 1; i < numX * numY; i++) {
+    const value = decode83(hash.substring(4 + i * 2, 6 + i * 2));
+    colors.push([
+      signPow((Math.floor(value / (19 * 19)) - 9) / 9, 2) * maxValue,
+      signPow(((Math.floor(value / 19) % 19) - 9) / 9, 2) * maxValue,
+      signPow(((value % 19) - 9) / 9, 2) * maxValue,
+    ]);
+  }
+
+  const pixels = new Uint8ClampedArray(width * height * 4);
+  for (let y = 0; y < height; y++) {
+    for (let x = 0; x < width; x++) {
+      let r = 0;
+      let g = 0;
+      let b = 0;
+      for (let j = 0; j < numY; j++) {
+        const cosY = Math.cos((Math.PI * y * j) / height);
+        for (let i = 0; i < numX; i++) {
+          const basis = Math.cos((Math.PI * x * i) / width) * cosY;
+          const color = colors[i + j * numX];
+          r += color[0] * basis;
+          g += color[1] * basis;
+          b += color[2] * basis;
+        }
+      }
+      const offset = 4 * (x + y * width);
+      pixels[offset] = linearToSrgb(r);
+      pixels[offset + 1] = linearToSrgb(g);
+      pixels[offset + 2] = linearToSrgb(b);
+      pixels[offset + 3] = 255;
+    }
+  }
+  return pixels;
+}
+
+/** data URL заглушки с пропорциями фото; null — строка неверная или canvas недоступен */
+export function blurhashToDataUrl(hash: string, aspectRatio = 1): string | null {
+  const key = `${hash}:${aspectRatio.toFixed(2)}`;
+  const cached = dataUrlCache.get(key);
+  if (cached !== undefined) return cached;
+
+  let url: string | null = null;
+  try {
+    const width = aspectRatio >= 1 ? PLACEHOLDER_SIZE : Math.max(1, Math.round(PLACEHOLDER_SIZE * aspectRatio));
+    const height = aspectRatio >= 1 ? Math.max(1, Math.round(PLACEHOLDER_SIZE / aspectRatio)) : PLACEHOLDER_SIZE;
+    const canvas = document.createElement('canvas');
+    canvas.width = width;
+    canvas.height = height;
+    const ctx = canvas.getContext('2d');
+    if (ctx) {
+      const image = ctx.createImageData(width, height);
+      image.data.set(decodeBlurhash(hash, width, height));
+      ctx.putImageData(image, 0, 0);
+      url = canvas.toDataURL();
+    }
+  } catch {
+    url = null;
+  }
+  dataUrlCache.set(key, url);
+  return url;
+}
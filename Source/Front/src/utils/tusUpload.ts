@@ -0,0 +1,143 @@
+/**
+ * Клиент tus 1.0 для загрузки фото гостей в файловое хранилище: части по 8 МБ с Upload-Checksum (sha256),
+ * после обрыва — продолжение с Upload-Offset. Адрес незавершённой загрузки хранится в localStorage
+ * по отпечатку файла, поэтому докачка переживает и перезагрузку страницы.
+ */
+
+const TUS_VERSION = '1.0.0';
+const CHUNK_SIZE = 8 * 1024 * 1024;
+const MAX_RETRIES = 5;
+const STORAGE_PREFIX = 'tus_upload:';
+
+const toBase64 = (bytes: ArrayBuffer | Uint8Array): string => {
+  const view = bytes instanceof Uint8Array ? bytes : new Uint8Array(bytes);
+  let binary = '';
+  for (let i = 0; i < view.length; i++) binary += String.fromCharCode(view[i]);
+  return btoa(binary);
+};
+
+const toHex = (bytes: ArrayBuffer): string =>
+  Array.from(new Uint8Array(bytes), (b) => b.toString(16).padStart(2, '0')).join('');
+
+const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms));
+
+/** URL загрузки с актуальным токеном (токен живёт ограниченное время — при 401/403 берём новый) */
+const withToken = (url: string, token: string): string => {
+  const u = new URL(url);
+  u.searchParams.set('token', token);
+  return u.toString();
+};
+
+export class TusUploadError extends Error {
+  constructor(message: string, public status?: number) {
+    super(message);
+  }
+}
+
+/**
+ * Загружает файл. getUploadUrl — URL создания загрузки (/media/uploads?token=…) из Main_back.
+ * Возвращает URL загрузки (GET по нему — статус обработки).
+ */
+export async function uploadGuestPhoto(
+  file: File,
+  getUploadUrl: () => Promise<string>,
+  onProgress?: (sent: number, total: number) => void,
+): Promise<string> {
+  const fingerprint = `${STORAGE_PREFIX}${file.name}:${file.size}:${file.lastModified}`;
+  let createUrl = await getUploadUrl();
+  let token = new URL(createUrl, window.location.href).searchParams.get('token') || '';
+  const baseHeaders = { 'Tus-Resumable': TUS_VERSION };
+
+  const refreshToken = async () => {
+    createUrl = await getUploadUrl();
+    token = new URL(createUrl, window.location.href).searchParams.get('token') || '';
+  };
+
+  const fetchOffset = async (uploadUrl: string): Promise<number | null> => {
+    const response = await fetch(withToken(uploadUrl, token), { method: 'HEAD', headers: baseHeaders });
+    if (!response.ok) return null;
+    return Number(response.headers.get('Upload-Offset'));
+  };
+
+  let uploadUrl = localStorage.getItem(fingerprint);
+  let offset = 0;
+  if (uploadUrl) {
+    const resumed = await fetchOffset(uploadUrl).catch(() => null);
+    if (resumed === null || !Number.isFinite(resumed)) {
+      localStorage.removeItem(fingerprint);
+      uploadUrl = null;
+    } else {
+      offset = resumed;
+    }
+  }
+
+  if (!uploadUrl) {
+    const sha256 = toHex(await crypto.subtle.digest('SHA-256', await file.arrayBuffer()));
+    const metadata = [
+      `filename ${toBase64(new TextEncoder().encode(file.name))}`,
+      `filetype ${toBase64(new TextEncoder().encode(file.type || 'application/octet-stream'))}`,
+      `sha256 ${toBase64(new TextEncoder().encode(sha256))}`,
+    ].join(',');
+    const response = await fetch(createUrl, {
+      method: 'POST',
+      headers: { ...baseHeaders, 'Upload-Length': String(file.size), 'Upload-Metadata': metadata },
+    });
+    if (response.status !== 201) {
+      const data = await response.json().catch(() => ({}));
+      throw new TusUploadError(data.detail || 'Не удалось начать загрузку', response.status);
+    }
+    const location = new URL(response.headers.get('Location') || '', new URL(createUrl, window.location.href));
+    location.searchParams.delete('token');
+    uploadUrl = location.toString();
+    localStorage.setItem(fingerprint, uploadUrl);
+  }
+
+  let retries = 0;
+  onProgress?.(offset, file.size);
+  while (offset < file.size) {
+    const chunk = await file.slice(offset, offset + CHUNK_SIZE).arrayBuffer();
+    const checksum = toBase64(await crypto.subtle.digest('SHA-256', chunk));
+    let response: Response | null = null;
+    try {
+      response = await fetch(withToken(uploadUrl, token), {
+        method: 'PATCH',
+        headers: {
+          ...baseHeaders,
+          'Content-Type': 'application/offset+octet-stream',
+          'Upload-Offset': String(offset),
+          'Upload-Checksum': `sha256 ${checksum}`,
+        },
+        body: chunk,
+      });
+    } catch {
+      response = null; // обрыв сети
+    }
+
+    if (response?.status === 204) {
+      offset = Number(response.headers.get('Upload-Offset'));
+      retries = 0;
+      onProgress?.(offset, file.size);
+      continue;
+    }
+    if (response && (response.status === 404 || response.status === 410 || response.status === 413 || response.status === 415)) {
+      localStorage.removeItem(fingerprint);
+      const data = await response.json().catch(() => ({}));
+      throw new TusUploadError(data.detail || 'Загрузка отклонена', response.status);
+    }
+    if (++retries > MAX_RETRIES) {
+      throw new TusUploadError('Не удалось загрузить файл, попробуйте позже', response?.status);
+    }
+    if (response && (response.status === 401 || response.status === 403)) {
+      await refreshToken();
+    } else {
+      // 409/423/460/5xx и обрывы: пауза, затем сверяем смещение с сервером
+      const retryAfter = Number(response?.headers.get('Retry-After'));
+      await sleep(Number.isFinite(retryAfter) && retryAfter > 0 ? retryAfter * 1000 : 1000 * 2 ** (retries - 1));
+    }
+    const serverOffset = await fetchOffset(uploadUrl).catch(() => null);
+    if (serverOffset !== null && Number.isFinite(serverOffset)) offset = serverOffset;
+  }
+
+  localStorage.removeItem(fingerprint);
+  return withToken(uploadUrl, token);
+}
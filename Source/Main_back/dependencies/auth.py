@@ -1,7 +1,10 @@
 """
 Зависимости для авторизации
 """
+import hmac
+
 from fastapi import Header, HTTPException, status
+from conf.settings import settings
 from redis.asyncio import Redis
 from dependencies.redis import RedisDep
 from services.session import session_service
@@ -53,3 +56,17 @@ async def get_current_user(
     
     return guest
 
+
+def verify_metrics_token(authorization: str | None = Header(None)) -> None:
+    """Bearer-токен /metrics и /debug/slow-queries (MAIN_BACK_METRICS_TOKEN). Без токена эндпоинты
+    выключены (404): /api/ доступен из интернета, а они показывают SQL, параметры и планы запросов."""
+    expected = settings.main_back_metrics_token
+    if not expected:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.strip(), expected):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Недействительный токен метрик",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
@@ -5,6 +5,7 @@ from typing import Annotated
 from fastapi import Depends
 import redis.asyncio as redis
 from conf.settings import settings
+from services.instrumentation import InstrumentedRedis
 
 # Глобальный клиент Redis (создается при старте приложения)
 _redis_client: redis.Redis | None = None
@@ -12,11 +13,11 @@ _redis_client: redis.Redis | None = None
 
 async def get_redis_client() -> redis.Redis:
     """
-    Получает клиент Redis (singleton)
+    Получает клиент Redis (singleton); команды замеряются (services/instrumentation.py)
     """
     global _redis_client
     if _redis_client is None:
-        _redis_client = redis.from_url(
+        _redis_client = InstrumentedRedis.from_url(
             settings.redis_url,
             encoding="utf-8",
             decode_responses=True
@@ -1,10 +1,19 @@
 """
 Главный файл FastAPI приложения
 """
-from fastapi import FastAPI
+from typing import Literal
+
+from fastapi import Depends, FastAPI, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
 
+from conf import tracing
+from conf.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, registry
+from conf.settings import settings
+from dependencies.auth import verify_metrics_token
+from middleware import InstrumentationMiddleware
 from routers import auth, oauth, preferences, wishlist, rsvp, gallery, guests
+from schemas.slow_queries import SlowQueriesResponse, SlowQueryItem
+from services.db import slow_query_log
 
 app = FastAPI(
     title="Wedding Invitation API",
@@ -19,8 +28,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
+# Замеры запросов (время, БД, Redis) для /metrics и заголовка Server-Timing
+app.add_middleware(InstrumentationMiddleware, server_timing=settings.main_back_server_timing)
+
+# Трассировка (TRACING_EXPORTER): спан на запрос, продолжение трассы из заголовка traceparent
+if tracing.configure("main_back"):
+    app.add_middleware(tracing.TracingMiddleware)
+
 # Подключение роутеров
 app.include_router(auth.router)  # Авторизация по телефону
 app.include_router(oauth.router)  # OAuth2 авторизация
@@ -46,6 +63,44 @@ async def health_check():
     return {"status": "ok"}
 
 
+@app.get("/metrics", tags=["Общее"], dependencies=[Depends(verify_metrics_token)])
+async def metrics():
+    """Метрики процесса в текстовом формате Prometheus"""
+    return Response(registry.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+@app.get(
+    "/debug/slow-queries",
+    tags=["Общее"],
+    response_model=SlowQueriesResponse,
+    dependencies=[Depends(verify_metrics_token)],
+)
+async def slow_queries(
+    limit: int = Query(20, ge=1, le=500),
+    order: Literal["total", "max", "slow"] = Query("total", description="Сортировка: суммарное, максимальное время или число медленных"),
+):
+    """Запросы к БД с наибольшим временем (с момента старта процесса) и снятые планы медленных"""
+    return SlowQueriesResponse(
+        threshold_ms=slow_query_log.threshold_seconds * 1000,
+        queries=[
+            SlowQueryItem(
+                statement=s.statement,
+                calls=s.calls,
+                total_ms=round(s.total_seconds * 1000, 3),
+                mean_ms=round(s.total_seconds * 1000 / s.calls, 3) if s.calls else 0.0,
+                max_ms=round(s.max_seconds * 1000, 3),
+                slow_calls=s.slow_calls,
+                last_slow_at=s.last_slow_at,
+                last_slow_ms=round(s.last_slow_seconds * 1000, 3) if s.last_slow_seconds is not None else None,
+                last_slow_params=s.last_slow_params,
+                plan=s.plan,
+                plan_captured_at=s.plan_captured_at,
+            )
+            for s in slow_query_log.top(limit, order)
+        ],
+    )
+
+
 @app.get("/config", tags=["Общее"])
 async def get_public_config():
     """
@@ -0,0 +1,80 @@
+"""
+ASGI-middleware замеров Main_back: время запроса по шаблону пути, а также сколько раз и как долго
+запрос ходил в БД (подключение и запросы) и Redis. Всё публикуется в /metrics; с
+MAIN_BACK_SERVER_TIMING те же цифры уходят клиенту в заголовке Server-Timing (видны в DevTools).
+"""
+import time
+
+from conf.metrics import registry, route_label
+from services.instrumentation import FAST_BUCKETS, begin_request, end_request
+
+# Число обращений к БД/Redis за запрос
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34)
+
+HTTP_REQUESTS = registry.counter(
+    "main_back_http_requests_total", "HTTP-запросы по эндпоинту, методу и статусу", ("route", "method", "status")
+)
+HTTP_DURATION = registry.histogram(
+    "main_back_http_request_duration_seconds", "Время от получения запроса до начала ответа", ("route", "method")
+)
+REQUEST_DB_SECONDS = registry.histogram(
+    "main_back_request_db_seconds", "Время в БД за запрос (подключения и запросы)", ("route",), buckets=FAST_BUCKETS
+)
+REQUEST_DB_OPERATIONS = registry.histogram(
+    "main_back_request_db_operations", "Подключений и запросов к БД за запрос", ("route",), buckets=COUNT_BUCKETS
+)
+REQUEST_REDIS_SECONDS = registry.histogram(
+    "main_back_request_redis_seconds", "Время в Redis за запрос", ("route",), buckets=FAST_BUCKETS
+)
+REQUEST_REDIS_COMMANDS = registry.histogram(
+    "main_back_request_redis_commands", "Команд Redis за запрос", ("route",), buckets=COUNT_BUCKETS
+)
+HTTP_INFLIGHT = registry.gauge("main_back_http_inflight_requests", "Запросы в обработке")
+
+def _server_timing(stats, total: float) -> bytes:
+    db = stats.db_connect_seconds + stats.db_query_seconds
+    parts = [
+        f'db;dur={db * 1000:.1f};desc="{stats.db_connects} conn, {stats.db_queries} queries"',
+        f"db-connect;dur={stats.db_connect_seconds * 1000:.1f}",
+        f'redis;dur={stats.redis_seconds * 1000:.1f};desc="{stats.redis_commands} commands"',
+        # Остальное: код обработчика, валидация и сериализация ответа, внешние HTTP-вызовы
+        f"app;dur={max(0.0, total - db - stats.redis_seconds) * 1000:.1f}",
+        f"total;dur={total * 1000:.1f}",
+    ]
+    return ", ".join(parts).encode("latin-1")
+
+
+class InstrumentationMiddleware:
+    def __init__(self, app, server_timing: bool = False) -> None:
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        stats, token = begin_request()
+        status = {"code": 500}
+
+        async def send_with_timing(message: dict) -> None:
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                total = time.perf_counter() - started
+                HTTP_DURATION.labels(route_label(scope), scope["method"]).observe(total)
+                if self.server_timing:
+                    message = {**message, "headers": [*message.get("headers", []), (b"server-timing", _server_timing(stats, total))]}
+            await send(message)
+
+        HTTP_INFLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            HTTP_INFLIGHT.dec()
+            end_request(token)
+            route = route_label(scope)
+            HTTP_REQUESTS.labels(route, scope["method"], status["code"]).inc()
+            REQUEST_DB_SECONDS.labels(route).observe(stats.db_connect_seconds + stats.db_query_seconds)
+            REQUEST_DB_OPERATIONS.labels(route).observe(stats.db_connects + stats.db_queries)
+            REQUEST_REDIS_SECONDS.labels(route).observe(stats.redis_seconds)
+            REQUEST_REDIS_COMMANDS.labels(route).observe(stats.redis_commands)
@@ -3,14 +3,31 @@
 # Все эндпоинты только для авторизованных пользователей.
 # После мероприятия авторизация отключена — доступ без токена.
 """
+import base64
+import binascii
+import bisect
+import json
+import zlib
+from datetime import datetime, timezone
 from pathlib import Path
+from typing import Literal
 from urllib.parse import quote
 
-import httpx
-from fastapi import APIRouter, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 
-# from dependencies.auth import get_current_user
-from schemas.gallery import FileListResponse, GalleryStatusResponse, StreamUrlItem, StreamUrlResponse, StreamUrlsBatchResponse
+from dependencies.auth import get_current_user
+from dependencies.redis import RedisDep
+from schemas.gallery import (
+    FileListResponse,
+    GalleryStatusResponse,
+    MomentItem,
+    MomentsListResponse,
+    SelectionZipRequest,
+    StreamUrlItem,
+    StreamUrlResponse,
+    StreamUrlsBatchResponse,
+)
+from services.gallery_listing import FileStorageError, gallery_listing_service
 from services.session import session_service
 from conf.settings import settings
 
@@ -22,7 +39,18 @@ DOWNLOAD_ALLOWED = {"wedding_day_all_photos", "wedding_day_video"}
 ARCHIVE_TYPES = {"wedding_day_all_photos", "wedding_day_video", "wedding_best_moments"}
 # Ширина превью для сетки галереи (полный размер — только в лайтбоксе)
 GALLERY_THUMB_WIDTH = 480
+# Стандартные ширины превью для srcset (формат AVIF/WebP/JPEG файловое хранилище выбирает по Accept)
+GALLERY_SRCSET_WIDTHS = (320, 480, 768, 1080)
+# Максимальный размер страницы /stream-urls-batch
+GALLERY_BATCH_MAX_LIMIT = 500
+# Поля элемента, которые можно запросить через fields (path есть всегда)
+BATCH_ITEM_FIELDS = {"url", "thumb_url", "thumb_srcset", "poster_url", "sprite_vtt_url", "meta"}
+# Максимум файлов в ZIP выборки (File_storage допускает до 500)
+GALLERY_ZIP_MAX_FILES = 300
 _IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp"}
+_VIDEO_EXTENSIONS = {".mp4", ".mov", ".m4v", ".mkv", ".webm"}
+# Ширина постера видео (блок плеера на всю ширину карточки)
+GALLERY_POSTER_WIDTH = 1080
 
 
 @router.get("/status", response_model=GalleryStatusResponse)
@@ -49,60 +77,218 @@ def _is_image_path(path: str) -> bool:
     return Path(path).suffix.lower() in _IMAGE_EXTENSIONS
 
 
-def _thumb_url(path: str, width: int = GALLERY_THUMB_WIDTH) -> str:
-    token = session_service.generate_media_token(path=path)
+def _is_video_path(path: str) -> bool:
+    return Path(path).suffix.lower() in _VIDEO_EXTENSIONS
+
+
+def _thumb_url(path: str, width: int = GALLERY_THUMB_WIDTH, token: str | None = None) -> str:
+    token = token or session_service.generate_media_token(path=path)
     base = settings.file_storage_media_url_base.rstrip("/")
     return f"{base}/thumb?path={quote(path)}&w={width}&token={token}"
 
 
+def _thumb_srcset(path: str, token: str | None = None) -> str:
+    """srcset превью стандартных ширин: "<url> 320w, <url> 480w, ..."."""
+    token = token or session_service.generate_media_token(path=path)
+    return ", ".join(f"{_thumb_url(path, w, token)} {w}w" for w in GALLERY_SRCSET_WIDTHS)
+
+
+async def _get_listing(folder: str, order: str = "name") -> dict:
+    """Список папки из кеша Main_back (ревалидация по ETag файлового хранилища)."""
+    if folder not in settings.file_storage_folders:
+        raise HTTPException(status_code=400, detail="Неизвестная папка")
+    try:
+        return await gallery_listing_service.get_listing(folder, order)
+    except FileStorageError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+
 @router.get("/list", response_model=FileListResponse)
 async def gallery_list(
     folder: str = Query(..., description="Имя папки: couple_photo, background_photo, dress_code, wedding_day_all_photos, wedding_day_video, zip"),
     # current_user: dict = Depends(get_current_user),
 ):
     """Список файлов в папке. Только для авторизованных."""
+    return await _get_listing(folder)
+
+
+def _path_sort_key(path: str) -> tuple[str, ...]:
+    """Ключ сортировки, совпадающий с порядком /list файлового хранилища (по частям пути)."""
+    return tuple(path.split("/"))
+
+
+def _encode_cursor(last_path: str, last_time: float | None = None) -> str:
+    payload: dict = {"after": last_path}
+    if last_time is not None:
+        payload["t"] = last_time
+    raw = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[str, float | None]:
+    """Курсор — последний отданный путь (и его время съёмки для order=time). Неверный курсор → 400."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        after = payload["after"]
+        after_time = payload.get("t")
+    except (binascii.Error, ValueError, KeyError, TypeError, AttributeError):
+        raise HTTPException(status_code=400, detail="Неверный курсор")
+    if not isinstance(after, str) or not (after_time is None or isinstance(after_time, (int, float))):
+        raise HTTPException(status_code=400, detail="Неверный курсор")
+    return after, after_time
+
+
+def _parse_capture_time(value: str, name: str) -> float:
+    """from/to: ISO 8601 (2024-08-17T18:30). Время съёмки хранится как показания часов камеры,
+    поэтому часовой пояс, если указан, отбрасывается."""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Неверное время в {name}")
+    return parsed.replace(tzinfo=timezone.utc).timestamp()
+
+
+def _capture_time_iso(value: float) -> str:
+    """Время съёмки из capture_times обратно в ISO 8601 (показания часов камеры)."""
+    return datetime.fromtimestamp(value, tz=timezone.utc).replace(tzinfo=None).isoformat()
+
+
+async def _get_moments(folder: str) -> list[dict]:
     if folder not in settings.file_storage_folders:
         raise HTTPException(status_code=400, detail="Неизвестная папка")
-    token = session_service.generate_media_token(scope="list")
-    async with httpx.AsyncClient() as client:
-        r = await client.get(
-            f"{settings.file_storage_internal_url}/list",
-            params={"folder": folder, "token": token},
-            timeout=60.0,
+    try:
+        return (await gallery_listing_service.get_moments(folder)).get("moments") or []
+    except FileStorageError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+
+@router.get("/moments", response_model=MomentsListResponse)
+async def gallery_moments(
+    folder: str = Query("wedding_day_all_photos", description="Папка с фото"),
+    # current_user: dict = Depends(get_current_user),
+):
+    """Моменты папки — фото, разбитые по паузам в съёмке. Фото момента —
+    stream-urls-batch?order=time&moment=<id>."""
+    moments = await _get_moments(folder)
+    return MomentsListResponse(folder=folder, moments=[
+        MomentItem(
+            id=m["id"],
+            start=_capture_time_iso(m["start"]),
+            end=_capture_time_iso(m["end"]),
+            count=m["count"],
+            cover_path=m.get("cover"),
+            cover_thumb_url=_thumb_url(m["cover"]) if m.get("cover") else None,
         )
-    if r.status_code != 200:
-        raise HTTPException(status_code=r.status_code, detail=r.text or "Ошибка файлового хранилища")
-    return r.json()
+        for m in moments
+    ])
+
+
+def _parse_fields(fields: str | None) -> set[str]:
+    if not fields:
+        return set(BATCH_ITEM_FIELDS)
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested - BATCH_ITEM_FIELDS - {"path"}
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Неизвестные поля: {', '.join(sorted(unknown))}")
+    return requested & BATCH_ITEM_FIELDS
 
 
 @router.get("/stream-urls-batch", response_model=StreamUrlsBatchResponse)
 async def get_stream_urls_batch(
     folder: str = Query(..., description="Папка: dress_code, couple_photo и т.д."),
+    cursor: str | None = Query(None, description="next_cursor из предыдущей страницы"),
+    limit: int | None = Query(None, ge=1, le=GALLERY_BATCH_MAX_LIMIT, description="Размер страницы; без limit — вся папка"),
+    fields: str | None = Query(
+        None,
+        description="Поля элемента через запятую: url, thumb_url, thumb_srcset, poster_url, sprite_vtt_url, meta (по умолчанию все)",
+    ),
+    order: Literal["name", "time"] = Query("name", description="name — по пути, time — по времени съёмки"),
+    time_from: str | None = Query(None, alias="from", description="Только order=time: снято не раньше (ISO 8601)"),
+    time_to: str | None = Query(None, alias="to", description="Только order=time: снято раньше (ISO 8601)"),
+    moment: str | None = Query(None, description="Только order=time: id момента из /gallery/moments"),
     # current_user: dict = Depends(get_current_user),
 ):
-    """Все stream-URL для папки одним запросом (галерея, дресс-код и др.)."""
-    if folder not in settings.file_storage_folders:
-        raise HTTPException(status_code=400, detail="Неизвестная папка")
-    token = session_service.generate_media_token(scope="list")
-    async with httpx.AsyncClient() as client:
-        r = await client.get(
-            f"{settings.file_storage_internal_url}/list",
-            params={"folder": folder, "token": token},
-            timeout=60.0,
-        )
-    if r.status_code != 200:
-        raise HTTPException(status_code=r.status_code, detail=r.text or "Ошибка файлового хранилища")
-    data = r.json()
+    """Stream-URL для папки одним запросом (галерея, дресс-код и др.).
+    С limit/cursor — постранично (курсор по пути), fields ограничивает набор URL в элементах.
+    meta — размеры, время съёмки и blurhash фото (из списка хранилища, без дополнительных запросов).
+    order=time — в порядке съёмки; from/to выбирают диапазон времени (двоичным поиском по списку,
+    отсортированному в хранилище), total — число файлов в диапазоне. moment — то же, диапазон момента."""
+    if order != "time" and (time_from or time_to or moment):
+        raise HTTPException(status_code=400, detail="from/to и moment доступны только с order=time")
+    if moment and (time_from or time_to):
+        raise HTTPException(status_code=400, detail="moment нельзя сочетать с from/to")
+    data = await _get_listing(folder, order)
+    wanted = _parse_fields(fields)
     paths = data.get("paths") or []
+    image_meta = (data.get("meta") or {}) if "meta" in wanted else {}
+    times = (data.get("capture_times") or []) if order == "time" else None
+    if times is not None and len(times) != len(paths):
+        raise HTTPException(status_code=502, detail="Файловое хранилище не вернуло время съёмки")
+
+    lo, hi = 0, len(paths)
+    if times is not None:
+        if time_from:
+            lo = bisect.bisect_left(times, _parse_capture_time(time_from, "from"))
+        if time_to:
+            hi = max(lo, bisect.bisect_left(times, _parse_capture_time(time_to, "to")))
+        if moment:
+            found = next((m for m in await _get_moments(folder) if m["id"] == moment), None)
+            if found is None:
+                raise HTTPException(status_code=404, detail="Момент не найден")
+            # Границы по времени, а не по индексам: список и моменты кешируются независимо
+            lo = bisect.bisect_left(times, found["start"])
+            if found.get("until") is not None:
+                hi = max(lo, bisect.bisect_left(times, found["until"]))
+    start = lo
+    if cursor:
+        after, after_time = _decode_cursor(cursor)
+        if times is None:
+            start = bisect.bisect_right(paths, _path_sort_key(after), key=_path_sort_key)
+        elif after_time is None:
+            raise HTTPException(status_code=400, detail="Курсор не от order=time")
+        else:
+            # Файлы с одинаковым временем упорядочены по пути — ищем внутри их блока
+            tie_lo = bisect.bisect_left(times, after_time)
+            tie_hi = bisect.bisect_right(times, after_time)
+            start = max(lo, bisect.bisect_right(paths, after, tie_lo, tie_hi))
+    end = hi if limit is None else min(hi, start + limit)
+    page = paths[start:end]
+
     base = settings.file_storage_media_url_base.rstrip("/")
     items = []
     use_thumbs = folder == "wedding_day_all_photos"
-    for path in paths:
+    for path in page:
+        # Один токен на путь: stream и все превью используют его
         media_token = session_service.generate_media_token(path=path)
-        url = f"{base}/stream?path={quote(path)}&token={media_token}"
-        thumb_url = _thumb_url(path) if use_thumbs and _is_image_path(path) else None
-        items.append(StreamUrlItem(path=path, url=url, thumb_url=thumb_url))
-    return StreamUrlsBatchResponse(items=items)
+        url = f"{base}/stream?path={quote(path)}&token={media_token}" if "url" in wanted else None
+        thumb_url = None
+        thumb_srcset = None
+        if use_thumbs and _is_image_path(path):
+            if "thumb_url" in wanted:
+                thumb_url = _thumb_url(path, token=media_token)
+            if "thumb_srcset" in wanted:
+                thumb_srcset = _thumb_srcset(path, token=media_token)
+        poster_url = None
+        sprite_vtt_url = None
+        if folder == "wedding_day_video" and _is_video_path(path):
+            if "poster_url" in wanted:
+                poster_url = f"{base}/poster?path={quote(path)}&w={GALLERY_POSTER_WIDTH}&token={media_token}"
+            if "sprite_vtt_url" in wanted:
+                sprite_vtt_url = f"{base}/sprite.vtt?path={quote(path)}&token={media_token}"
+        items.append(StreamUrlItem(
+            path=path,
+            url=url,
+            thumb_url=thumb_url,
+            thumb_srcset=thumb_srcset,
+            poster_url=poster_url,
+            sprite_vtt_url=sprite_vtt_url,
+            meta=image_meta.get(path),
+        ))
+    next_cursor = None
+    if page and end < hi:
+        next_cursor = _encode_cursor(page[-1], times[end - 1] if times is not None else None)
+    return StreamUrlsBatchResponse(items=items, next_cursor=next_cursor, total=hi - lo)
 
 
 @router.get("/stream-url", response_model=StreamUrlResponse)
@@ -117,6 +303,21 @@ async def get_stream_url(
     return StreamUrlResponse(url=url)
 
 
+@router.get("/hls-url", response_model=StreamUrlResponse)
+async def get_hls_url(
+    path: str = Query(..., description="Относительный путь к видео, например wedding_day_video/wedding_video.mp4"),
+    # current_user: dict = Depends(get_current_user),
+):
+    """URL master-плейлиста HLS (несколько битрейтов). Пока видео не упаковано, файловое хранилище
+    отвечает 503 — плеер должен взять MP4 из /stream-url."""
+    if not path.startswith("wedding_day_video/"):
+        raise HTTPException(status_code=400, detail="HLS доступен только для видео из wedding_day_video")
+    base = settings.file_storage_media_url_base.rstrip("/")
+    token = session_service.generate_media_token(path=path)
+    url = f"{base}/hls?path={quote(path)}&file=master.m3u8&token={token}"
+    return StreamUrlResponse(url=url)
+
+
 @router.get("/download-url", response_model=StreamUrlResponse)
 async def get_download_url(
     path: str = Query(...),
@@ -147,3 +348,65 @@ async def get_archive_url(
     token = session_service.generate_media_token(scope=f"archive:{type}")
     url = f"{base}/archive?type={quote(type)}&token={token}"
     return StreamUrlResponse(url=url)
+
+
+def _encode_selection(paths: list[str]) -> str:
+    """Выборка для claim files медиа-токена: zlib + base64url (формат File_storage app.services.zipstream)."""
+    raw = zlib.compress("\n".join(paths).encode("utf-8"), 9)
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+@router.post("/selection-zip-url", response_model=StreamUrlResponse)
+async def get_selection_zip_url(
+    body: SelectionZipRequest,
+    # current_user: dict = Depends(get_current_user),
+):
+    """URL для скачивания выбранных файлов одним ZIP (собирается на лету, поддерживает докачку).
+    Только файлы из wedding_day_all_photos и wedding_day_video."""
+    paths = list(dict.fromkeys(p.replace("\\", "/").strip("/") for p in body.paths))
+    if not paths:
+        raise HTTPException(status_code=400, detail="Не выбрано ни одного файла")
+    if len(paths) > GALLERY_ZIP_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"Можно выбрать не больше {GALLERY_ZIP_MAX_FILES} файлов")
+    by_folder: dict[str, list[str]] = {}
+    for path in paths:
+        folder = path.split("/", 1)[0]
+        if folder not in DOWNLOAD_ALLOWED:
+            raise HTTPException(
+                status_code=403,
+                detail="Скачивание разрешено только для файлов из wedding_day_all_photos и wedding_day_video",
+            )
+        by_folder.setdefault(folder, []).append(path)
+    for folder, folder_paths in by_folder.items():
+        known = set((await _get_listing(folder)).get("paths") or [])
+        missing = [p for p in folder_paths if p not in known]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Файл не найден: {missing[0]}")
+
+    base = settings.file_storage_media_url_base.rstrip("/")
+    token = session_service.generate_media_token(scope="zip", files=_encode_selection(paths))
+    return StreamUrlResponse(url=f"{base}/zip?token={token}")
+
+
+@router.get("/upload-url", response_model=StreamUrlResponse)
+async def get_upload_url(
+    current_user: dict = Depends(get_current_user),
+    redis_client: RedisDep = None,
+):
+    """URL для загрузки фото гостями (tus: POST создаёт загрузку, PATCH докачивает части).
+    Только для авторизованного гостя, даже после отключения авторизации галереи: токен scope=upload
+    содержит UUID гостя, File_storage привязывает к нему загрузки. Не больше
+    GALLERY_UPLOAD_TOKENS_PER_DAY URL в сутки; истёк — клиент запрашивает новый и продолжает ту же загрузку."""
+    guest_uuid = current_user["uuid"]
+    key = f"gallery:upload_tokens:{guest_uuid}:{datetime.now(timezone.utc):%Y%m%d}"
+    issued = await redis_client.incr(key)
+    if issued == 1:
+        await redis_client.expire(key, 24 * 3600)
+    if issued > settings.gallery_upload_tokens_per_day:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Слишком много запросов на загрузку. Попробуйте завтра.",
+        )
+    base = settings.file_storage_media_url_base.rstrip("/")
+    token = session_service.generate_media_token(scope="upload", guest=guest_uuid)
+    return StreamUrlResponse(url=f"{base}/uploads?token={token}")
@@ -17,6 +17,7 @@ from schemas.oauth import (
 from services.oauth.oauth_factory import oauth_factory
 from services.session import session_service
 from services.guest import guest_service
+from conf import tracing
 from conf.settings import settings
 import httpx
 import json
@@ -127,7 +128,7 @@ async def exchange_code(
         )
     
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
+        async with httpx.AsyncClient(timeout=10.0, transport=tracing.AsyncTracingTransport()) as client:
             # VK ID (id.vk.ru): при наличии code_verifier используем PKCE (документация: client_secret обязателен для server-side)
             if request.code_verifier:
                 post_data: dict = {
@@ -234,7 +235,7 @@ async def yandex_oauth_callback(
     if error or not code:
         return RedirectResponse(url=f"{login_url}?oauth_error=yandex_denied", status_code=302)
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
+        async with httpx.AsyncClient(timeout=10.0, transport=tracing.AsyncTracingTransport()) as client:
             redirect_uri = _yandex_callback_redirect_uri()
             response = await client.post(
                 "https://oauth.yandex.ru/token",
@@ -5,20 +5,56 @@ class StreamUrlResponse(BaseModel):
     url: str
 
 
+class ImageMetaItem(BaseModel):
+    """Метаданные фото: место под карточку в сетке и заглушка до загрузки превью."""
+    width: int  # Размеры при показе (с учётом EXIF Orientation)
+    height: int
+    orientation: int
+    taken_at: str | None = None  # Время съёмки (EXIF), ISO 8601 без часового пояса
+    blurhash: str | None = None
+
+
 class StreamUrlItem(BaseModel):
     path: str
-    url: str
+    url: str | None = None
     thumb_url: str | None = None
+    thumb_srcset: str | None = None  # srcset превью стандартных ширин
+    poster_url: str | None = None  # Постер видео (кадр) — для <video poster>
+    sprite_vtt_url: str | None = None  # WebVTT превью перемотки (плитки спрайта)
+    meta: ImageMetaItem | None = None  # Для фото, если хранилище уже извлекло метаданные
 
 
 class StreamUrlsBatchResponse(BaseModel):
     """Массив путей и stream-URL для папки (один запрос вместо N)."""
     items: list[StreamUrlItem]
+    next_cursor: str | None = None  # Курсор следующей страницы (None — страниц больше нет)
+    total: int | None = None  # Всего файлов в папке (с from/to — в диапазоне)
+
+
+class MomentItem(BaseModel):
+    """Момент (церемония, ужин, танцы…) — виртуальный альбом из фото, снятых подряд."""
+    id: str  # Передаётся в stream-urls-batch?moment=
+    start: str  # Время первого и последнего кадра, ISO 8601 без часового пояса
+    end: str
+    count: int
+    cover_path: str | None = None
+    cover_thumb_url: str | None = None
+
+
+class MomentsListResponse(BaseModel):
+    folder: str
+    moments: list[MomentItem]
+
+
+class SelectionZipRequest(BaseModel):
+    """Выбранные файлы для ZIP на лету (порядок сохраняется в архиве)."""
+    paths: list[str]
 
 
 class FileListResponse(BaseModel):
     folder: str
     paths: list[str]
+    version: str | None = None
 
 
 class GalleryStatusResponse(BaseModel):
@@ -0,0 +1,27 @@
+"""
+Схемы сводки медленных запросов (GET /debug/slow-queries)
+"""
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class SlowQueryItem(BaseModel):
+    """Статистика одного текста SQL"""
+    statement: str = Field(..., description="Текст SQL с плейсхолдерами $1, $2")
+    calls: int = Field(..., description="Число выполнений")
+    total_ms: float = Field(..., description="Суммарное время, мс")
+    mean_ms: float = Field(..., description="Среднее время, мс")
+    max_ms: float = Field(..., description="Максимальное время, мс")
+    slow_calls: int = Field(..., description="Выполнений дольше порога")
+    last_slow_at: Optional[str] = Field(None, description="Время последнего медленного выполнения")
+    last_slow_ms: Optional[float] = Field(None, description="Длительность последнего медленного выполнения, мс")
+    last_slow_params: Optional[List[str]] = Field(None, description="Его параметры (обезличенные)")
+    plan: Optional[str] = Field(None, description="Последний снятый план (EXPLAIN)")
+    plan_captured_at: Optional[str] = Field(None, description="Когда снят план")
+
+
+class SlowQueriesResponse(BaseModel):
+    """Top-N запросов к БД с момента старта процесса"""
+    threshold_ms: float = Field(..., description="Порог медленного запроса, мс")
+    queries: List[SlowQueryItem]
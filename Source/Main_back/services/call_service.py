@@ -4,6 +4,7 @@
 import httpx
 import logging
 from typing import Optional
+from conf import tracing
 from conf.settings import settings
 
 logger = logging.getLogger(__name__)
@@ -48,7 +49,7 @@ class CallService:
             if not phone_normalized.startswith('+'):
                 phone_normalized = '+' + phone_normalized
             
-            async with httpx.AsyncClient(timeout=30.0) as client:
+            async with httpx.AsyncClient(timeout=30.0, transport=tracing.AsyncTracingTransport()) as client:
                 # Zvonok.com API для Flash Call
                 # GET запрос с параметрами в URL
                 # НЕ передаем pincode - Zvonok.com сам сгенерирует код
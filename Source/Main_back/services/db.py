@@ -0,0 +1,109 @@
+"""
+Подключение к PostgreSQL для сервисов Main_back. Соединение — подкласс asyncpg.Connection,
+который замеряет подключение и каждый запрос (services/instrumentation.py), оборачивает их
+в спаны трассировки (conf/tracing.py) и ведёт журнал медленных запросов (services/slow_queries.py).
+"""
+import asyncio
+import logging
+import time
+
+import asyncpg
+
+from conf import tracing
+from conf.settings import settings
+from services.instrumentation import record_db
+from services.slow_queries import SlowQueryLog, is_read_only, normalize_statement
+
+logger = logging.getLogger(__name__)
+
+# Журнал медленных запросов: порог и доля запросов с EXPLAIN (env, см. conf/settings.py)
+slow_query_log = SlowQueryLog(
+    threshold_seconds=settings.main_back_slow_query_ms / 1000,
+    explain_ratio=settings.main_back_slow_query_explain_ratio,
+)
+# Фоновые EXPLAIN: не больше одного одновременно, ссылки держим до завершения
+_explain_tasks: set[asyncio.Task] = set()
+
+
+def _connect_kwargs() -> dict:
+    return {
+        "host": settings.DB_HOST,
+        "port": settings.DB_PORT,
+        "user": settings.DB_USER,
+        "password": settings.DB_PASSWORD,
+        "database": settings.DB_NAME,
+    }
+
+
+class InstrumentedConnection(asyncpg.Connection):
+    """Соединение asyncpg с замером execute/executemany/fetch/fetchrow/fetchval."""
+
+    async def _timed(self, operation: str, call, query: str, *args, **kwargs):
+        # В спан и журнал — текст SQL с плейсхолдерами $1, $2; значения параметров не пишутся
+        statement = normalize_statement(query)
+        with tracing.span(f"db.{operation}", tracing.CLIENT, **{"db.system": "postgresql", "db.statement": statement}):
+            started = time.perf_counter()
+            failed = True
+            try:
+                result = await call(query, *args, **kwargs)
+                failed = False
+                return result
+            finally:
+                elapsed = time.perf_counter() - started
+                record_db(operation, elapsed, failed)
+                if slow_query_log.record(statement, args, elapsed) and not failed and operation != "executemany":
+                    _schedule_explain(query, args)
+
+    async def execute(self, query: str, *args, timeout: float | None = None) -> str:
+        return await self._timed("execute", super().execute, query, *args, timeout=timeout)
+
+    async def executemany(self, command: str, args, *, timeout: float | None = None):
+        return await self._timed("executemany", super().executemany, command, args, timeout=timeout)
+
+    async def fetch(self, query: str, *args, timeout: float | None = None, record_class=None) -> list:
+        return await self._timed("fetch", super().fetch, query, *args, timeout=timeout, record_class=record_class)
+
+    async def fetchrow(self, query: str, *args, timeout: float | None = None, record_class=None):
+        return await self._timed("fetchrow", super().fetchrow, query, *args, timeout=timeout, record_class=record_class)
+
+    async def fetchval(self, query: str, *args, column: int = 0, timeout: float | None = None):
+        return await self._timed("fetchval", super().fetchval, query, *args, column=column, timeout=timeout)
+
+
+async def connect() -> InstrumentedConnection:
+    """Новое соединение с БД по настройкам (закрывает вызывающий: conn.close())."""
+    with tracing.span("db.connect", tracing.CLIENT, **{"db.system": "postgresql", "server.address": settings.DB_HOST}):
+        started = time.perf_counter()
+        failed = True
+        try:
+            conn = await asyncpg.connect(**_connect_kwargs(), connection_class=InstrumentedConnection)
+            failed = False
+            return conn
+        finally:
+            record_db("connect", time.perf_counter() - started, failed)
+
+
+def _schedule_explain(query: str, args: tuple) -> None:
+    if _explain_tasks:
+        return
+    task = asyncio.get_running_loop().create_task(_capture_plan(query, args))
+    _explain_tasks.add(task)
+    task.add_done_callback(_explain_tasks.discard)
+
+
+async def _capture_plan(query: str, args: tuple) -> None:
+    """План медленного запроса в журнал. SELECT выполняется повторно (ANALYZE, BUFFERS — реальные
+    время и чтения), изменяющие запросы — только EXPLAIN, без выполнения."""
+    statement = normalize_statement(query)
+    prefix = "EXPLAIN (ANALYZE, BUFFERS) " if is_read_only(statement) else "EXPLAIN "
+    try:
+        # Обычное соединение: EXPLAIN не попадает в метрики и журнал и не запускает свой EXPLAIN
+        conn = await asyncpg.connect(**_connect_kwargs())
+        try:
+            rows = await conn.fetch(prefix + query, *args)
+        finally:
+            await conn.close()
+    except Exception as exc:
+        logger.warning("Не удалось снять план запроса %s: %s", statement[:200], exc)
+        return
+    slow_query_log.set_plan(statement, "\n".join(row[0] for row in rows))
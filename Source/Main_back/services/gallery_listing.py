@@ -0,0 +1,130 @@
+"""
+Кеш списков папок файлового хранилища.
+Список папки хранится в памяти вместе с ETag (версией папки). В течение TTL запросы
+к файловому хранилищу не выполняются; после TTL — ревалидация с If-None-Match (304 → кеш жив).
+Одновременные запросы одной папки объединяются в один запрос к хранилищу (single-flight).
+Список запрашивается с метаданными фото (размеры, время съёмки, blurhash) — они дозаполняются
+в хранилище в фоне, и ETag меняется вместе с ними. Порядок по времени съёмки (order="time") —
+отдельная запись кеша: пути в порядке съёмки и время каждого (capture_times). Почти одинаковые фото
+скрываются в хранилище (hide_duplicates, настройка GALLERY_HIDE_DUPLICATES) — только в общей ленте
+wedding_day_all_photos: подборки (couple_photo, dress_code и т.п.) показываются целиком. Так же кешируются
+моменты папки (/moments — кластеры по времени съёмки).
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+
+import httpx
+
+from conf import tracing
+from conf.settings import settings
+from services.session import session_service
+
+logger = logging.getLogger(__name__)
+
+# Папки, в которых скрываются почти одинаковые фото (GALLERY_HIDE_DUPLICATES)
+HIDE_DUPLICATES_FOLDERS = {"wedding_day_all_photos"}
+
+
+class FileStorageError(Exception):
+    """Ошибка ответа файлового хранилища"""
+    def __init__(self, detail: str, status_code: int = 502):
+        self.detail = detail
+        self.status_code = status_code
+        super().__init__(detail)
+
+
+@dataclass
+class _ListingEntry:
+    etag: str | None
+    data: dict
+    checked_at: float
+
+
+class GalleryListingService:
+    """Кеш /list файлового хранилища с условной ревалидацией и single-flight."""
+
+    def __init__(self) -> None:
+        # Ключ — (папка, эндпоинт хранилища, порядок)
+        self._entries: dict[tuple[str, str, str], _ListingEntry] = {}
+        self._inflight: dict[tuple[str, str, str], asyncio.Task] = {}
+        self._client: httpx.AsyncClient | None = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Общий httpx-клиент (keep-alive к файловому хранилищу)."""
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=60.0, transport=tracing.AsyncTracingTransport())
+        return self._client
+
+    async def get_listing(self, folder: str, order: str = "name") -> dict:
+        """Список папки: {"folder", "paths", "version", "meta"} (meta — метаданные фото по пути),
+        для order="time" — ещё "capture_times". Из кеша, если он свежий."""
+        return await self._get((folder, "list", order))
+
+    async def get_moments(self, folder: str) -> dict:
+        """Моменты папки: {"folder", "version", "moments"}; границы моментов — время съёмки
+        из списка order="time". Из кеша, если он свежий."""
+        return await self._get((folder, "moments", "time"))
+
+    async def _get(self, key: tuple[str, str, str]) -> dict:
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry.checked_at < settings.gallery_list_cache_ttl:
+            return entry.data
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._refresh(key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _t, k=key: self._inflight.pop(k, None))
+        # shield: отмена одного клиентского запроса не должна отменять общий запрос к хранилищу
+        return await asyncio.shield(task)
+
+    def invalidate(self, folder: str | None = None) -> None:
+        """Сбрасывает кеш папки (или всех папок)."""
+        if folder is None:
+            self._entries.clear()
+        else:
+            for key in [k for k in self._entries if k[0] == folder]:
+                self._entries.pop(key, None)
+
+    async def _refresh(self, key: tuple[str, str, str]) -> dict:
+        folder, endpoint, order = key
+        entry = self._entries.get(key)
+        headers = {}
+        if entry is not None and entry.etag:
+            headers["If-None-Match"] = entry.etag
+        token = session_service.generate_media_token(scope="list")
+        params = {"folder": folder, "token": token}
+        if endpoint == "list":
+            params.update(meta="true", order=order)
+        if settings.gallery_hide_duplicates and folder in HIDE_DUPLICATES_FOLDERS:
+            params["hide_duplicates"] = "true"
+        try:
+            r = await self._get_client().get(
+                f"{settings.file_storage_internal_url}/{endpoint}",
+                params=params,
+                headers=headers,
+            )
+        except httpx.HTTPError as exc:
+            if entry is not None:
+                # Хранилище недоступно — отдаём устаревший список, а не ошибку
+                logger.warning("Файловое хранилище недоступно (%s), отдаём кеш папки %s", exc, folder)
+                return entry.data
+            raise FileStorageError("Файловое хранилище недоступно", status_code=502) from exc
+
+        if r.status_code == 304 and entry is not None:
+            entry.checked_at = time.monotonic()
+            return entry.data
+        if r.status_code != 200:
+            raise FileStorageError(r.text or "Ошибка файлового хранилища", status_code=r.status_code)
+        data = r.json()
+        self._entries[key] = _ListingEntry(
+            etag=r.headers.get("etag"),
+            data=data,
+            checked_at=time.monotonic(),
+        )
+        return data
+
+
+# Экземпляр сервиса
+gallery_listing_service = GalleryListingService()
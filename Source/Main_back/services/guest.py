@@ -1,9 +1,8 @@
 """
 Сервис для работы с гостями
 """
-import asyncpg
 from typing import Optional, List
-from conf.settings import settings
+from services import db
 
 
 class GuestService:
@@ -16,13 +15,7 @@ class GuestService:
         """
         Получает гостя по номеру телефона
         """
-        conn = await asyncpg.connect(
-            host=settings.DB_HOST,
-            port=settings.DB_PORT,
-            user=settings.DB_USER,
-            password=settings.DB_PASSWORD,
-            database=settings.DB_NAME
-        )
+        conn = await db.connect()
         
         try:
             row = await conn.fetchrow(
@@ -60,13 +53,7 @@ class GuestService:
         """
         Обновляет статус RSVP для гостя
         """
-        conn = await asyncpg.connect(
-            host=settings.DB_HOST,
-            port=settings.DB_PORT,
-            user=settings.DB_USER,
-            password=settings.DB_PASSWORD,
-            database=settings.DB_NAME
-        )
+        conn = await db.connect()
         
         try:
             await conn.execute(
@@ -90,13 +77,7 @@ class GuestService:
         """
         Получает статус RSVP для гостя
         """
-        conn = await asyncpg.connect(
-            host=settings.DB_HOST,
-            port=settings.DB_PORT,
-            user=settings.DB_USER,
-            password=settings.DB_PASSWORD,
-            database=settings.DB_NAME
-        )
+        conn = await db.connect()
         
         try:
             row = await conn.fetchrow(
@@ -117,13 +98,7 @@ class GuestService:
 
     async def get_guest_by_uuid(self, guest_uuid: str) -> Optional[dict]:
         """Получает гостя по UUID."""
-        conn = await asyncpg.connect(
-            host=settings.DB_HOST,
-            port=settings.DB_PORT,
-            user=settings.DB_USER,
-            password=settings.DB_PASSWORD,
-            database=settings.DB_NAME
-        )
+        conn = await db.connect()
         try:
             row = await conn.fetchrow(
                 """
@@ -155,13 +130,7 @@ class GuestService:
         """Список гостей с сортировкой. sort_by: last_name, first_name, patronomic, phone."""
         allowed = {"last_name", "first_name", "patronomic", "phone"}
         order_col = sort_by if sort_by in allowed else "last_name"
-        conn = await asyncpg.connect(
-            host=settings.DB_HOST,
-            port=settings.DB_PORT,
-            user=settings.DB_USER,
-            password=settings.DB_PASSWORD,
-            database=settings.DB_NAME
-        )
+        conn = await db.connect()
         try:
             rows = await conn.fetch(
                 f"""
@@ -185,13 +154,7 @@ class GuestService:
 
     async def get_famili_prefer_forms(self, guest_uuid: str) -> List[str]:
         """Возвращает массив UUID из famili_prefer_forms для гостя."""
-        conn = await asyncpg.connect(
-            host=settings.DB_HOST,
-            port=settings.DB_PORT,
-            user=settings.DB_USER,
-            password=settings.DB_PASSWORD,
-            database=settings.DB_NAME
-        )
+        conn = await db.connect()
         try:
             row = await conn.fetchrow(
                 "SELECT famili_prefer_forms FROM guests WHERE uuid = $1",
@@ -209,13 +172,7 @@ class GuestService:
         """Добавляет guest_uuid_to_add в famili_prefer_forms владельца owner_uuid.
         Не добавляет дубликат. Проверяет, что добавляемый гость существует.
         """
-        conn = await asyncpg.connect(
-            host=settings.DB_HOST,
-            port=settings.DB_PORT,
-            user=settings.DB_USER,
-            password=settings.DB_PASSWORD,
-            database=settings.DB_NAME
-        )
+        conn = await db.connect()
         try:
             # Проверяем, что гость для добавления существует
             target = await conn.fetchrow(
@@ -246,13 +203,7 @@ class GuestService:
         self, owner_uuid: str, guest_uuid_to_remove: str
     ) -> None:
         """Удаляет guest_uuid_to_remove из famili_prefer_forms владельца owner_uuid."""
-        conn = await asyncpg.connect(
-            host=settings.DB_HOST,
-            port=settings.DB_PORT,
-            user=settings.DB_USER,
-            password=settings.DB_PASSWORD,
-            database=settings.DB_NAME
-        )
+        conn = await db.connect()
         try:
             await conn.execute(
                 """
@@ -269,13 +220,7 @@ class GuestService:
 
     async def get_have_allergies(self, guest_uuid: str) -> Optional[bool]:
         """Получает флаг «есть ли аллергии» для гостя."""
-        conn = await asyncpg.connect(
-            host=settings.DB_HOST,
-            port=settings.DB_PORT,
-            user=settings.DB_USER,
-            password=settings.DB_PASSWORD,
-            database=settings.DB_NAME
-        )
+        conn = await db.connect()
         try:
             row = await conn.fetchrow(
                 "SELECT have_allergies FROM guests WHERE uuid = $1",
@@ -287,13 +232,7 @@ class GuestService:
 
     async def set_have_allergies(self, guest_uuid: str, have_allergies: bool) -> None:
         """Устанавливает флаг «есть ли аллергии» для гостя."""
-        conn = await asyncpg.connect(
-            host=settings.DB_HOST,
-            port=settings.DB_PORT,
-            user=settings.DB_USER,
-            password=settings.DB_PASSWORD,
-            database=settings.DB_NAME
-        )
+        conn = await db.connect()
         try:
             await conn.execute(
                 """
@@ -0,0 +1,103 @@
+"""
+Замеры обращений к БД и Redis: общие метрики (/metrics) и счётчики текущего HTTP-запроса.
+Счётчики запроса лежат в contextvar — их заводит InstrumentationMiddleware (middleware.py),
+а пишут обёртки соединения БД (services/db.py) и клиент Redis (dependencies/redis.py).
+"""
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+import redis.asyncio as redis
+
+from conf import tracing
+from conf.metrics import registry
+
+# Запросы к БД и команды Redis обычно укладываются в миллисекунды
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+DB_OPERATIONS = registry.counter(
+    "main_back_db_operations_total", "Подключения и запросы к БД", ("operation",)
+)
+DB_OPERATION_SECONDS = registry.histogram(
+    "main_back_db_operation_seconds", "Длительность подключения или запроса к БД", ("operation",), buckets=FAST_BUCKETS
+)
+DB_ERRORS = registry.counter(
+    "main_back_db_errors_total", "Подключения и запросы к БД, завершившиеся исключением", ("operation",)
+)
+REDIS_COMMANDS = registry.counter(
+    "main_back_redis_commands_total", "Команды Redis", ("command",)
+)
+REDIS_COMMAND_SECONDS = registry.histogram(
+    "main_back_redis_command_seconds", "Длительность команды Redis", ("command",), buckets=FAST_BUCKETS
+)
+REDIS_ERRORS = registry.counter(
+    "main_back_redis_errors_total", "Команды Redis, завершившиеся исключением", ("command",)
+)
+
+
+@dataclass
+class RequestStats:
+    """Обращения к БД и Redis в рамках одного HTTP-запроса."""
+    db_connects: int = 0
+    db_connect_seconds: float = 0.0
+    db_queries: int = 0
+    db_query_seconds: float = 0.0
+    redis_commands: int = 0
+    redis_seconds: float = 0.0
+
+
+# Задачи и потоки, запущенные из обработчика, получают копию контекста — с тем же объектом RequestStats
+_request_stats: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+def begin_request():
+    """Заводит счётчики для текущего запроса. Возвращает их и токен для end_request()."""
+    stats = RequestStats()
+    return stats, _request_stats.set(stats)
+
+
+def end_request(token) -> None:
+    _request_stats.reset(token)
+
+
+def record_db(operation: str, seconds: float, failed: bool = False) -> None:
+    DB_OPERATIONS.labels(operation).inc()
+    DB_OPERATION_SECONDS.labels(operation).observe(seconds)
+    if failed:
+        DB_ERRORS.labels(operation).inc()
+    stats = _request_stats.get()
+    if stats is None:
+        return  # Вне HTTP-запроса (скрипты импорта, фоновые задачи)
+    if operation == "connect":
+        stats.db_connects += 1
+        stats.db_connect_seconds += seconds
+    else:
+        stats.db_queries += 1
+        stats.db_query_seconds += seconds
+
+
+def record_redis(command: str, seconds: float, failed: bool = False) -> None:
+    REDIS_COMMANDS.labels(command).inc()
+    REDIS_COMMAND_SECONDS.labels(command).observe(seconds)
+    if failed:
+        REDIS_ERRORS.labels(command).inc()
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.redis_commands += 1
+        stats.redis_seconds += seconds
+
+
+class InstrumentedRedis(redis.Redis):
+    """Клиент Redis, замеряющий каждую команду (имя команды — метка и спан, аргументы не пишутся)."""
+
+    async def execute_command(self, *args, **options):
+        command = str(args[0]).lower() if args else "unknown"
+        with tracing.span(f"redis.{command}", tracing.CLIENT, **{"db.system": "redis", "db.operation": command}):
+            started = time.perf_counter()
+            failed = True
+            try:
+                result = await super().execute_command(*args, **options)
+                failed = False
+                return result
+            finally:
+                record_redis(command, time.perf_counter() - started, failed)
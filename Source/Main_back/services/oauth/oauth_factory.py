@@ -5,6 +5,7 @@ import httpx
 import logging
 from typing import Literal, Optional, Tuple
 from abc import ABC, abstractmethod
+from conf import tracing
 from conf.settings import settings
 
 logger = logging.getLogger(__name__)
@@ -35,7 +36,7 @@ class VKOAuthProvider(OAuthProviderBase):
         if not access_token or not access_token.strip():
             return None
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
+            async with httpx.AsyncClient(timeout=10.0, transport=tracing.AsyncTracingTransport()) as client:
                 # 1) Официальный способ VK ID: POST с Bearer и client_id (id.vk.com/docs)
                 response = await client.post(
                     "https://id.vk.ru/oauth2/user_info",
@@ -124,7 +125,7 @@ class YandexOAuthProvider(OAuthProviderBase):
         Получает номер телефона пользователя из Яндекс
         """
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
+            async with httpx.AsyncClient(timeout=10.0, transport=tracing.AsyncTracingTransport()) as client:
                 response = await client.get(
                     "https://login.yandex.ru/info",
                     headers={"Authorization": f"OAuth {access_token}"},
@@ -1,10 +1,9 @@
 """
 Сервис для работы с пожеланиями гостей
 """
-import asyncpg
 import json
 from typing import Optional, List
-from conf.settings import settings
+from services import db
 from services.guest import guest_service
 
 
@@ -16,13 +15,7 @@ class PreferencesService:
         guest_uuid: str
     ) -> Optional[str]:
         """Получает предпочтение по еде для гостя"""
-        conn = await asyncpg.connect(
-            host=settings.DB_HOST,
-            port=settings.DB_PORT,
-            user=settings.DB_USER,
-            password=settings.DB_PASSWORD,
-            database=settings.DB_NAME
-        )
+        conn = await db.connect()
         
         try:
             row = await conn.fetchrow(
@@ -39,13 +32,7 @@ class PreferencesService:
         food_choice: str
     ) -> None:
         """Устанавливает предпочтение по еде для гостя (UPSERT)"""
-        conn = await asyncpg.connect(
-            host=settings.DB_HOST,
-            port=settings.DB_PORT,
-            user=settings.DB_USER,
-            password=settings.DB_PASSWORD,
-            database=settings.DB_NAME
-        )
+        conn = await db.connect()
         
         try:
             await conn.execute(
@@ -66,13 +53,7 @@ class PreferencesService:
         guest_uuid: str
     ) -> Optional[List[str]]:
         """Получает предпочтения по алкоголю для гостя"""
-        conn = await asyncpg.connect(
-            host=settings.DB_HOST,
-            port=settings.DB_PORT,
-            user=settings.DB_USER,
-            password=settings.DB_PASSWORD,
-            database=settings.DB_NAME
-        )
+        conn = await db.connect()
         
         try:
             row = await conn.fetchrow(
@@ -96,13 +77,7 @@ class PreferencesService:
         alcohol_choices: List[str]
     ) -> None:
         """Устанавливает предпочтения по алкоголю для гостя (UPSERT)"""
-        conn = await asyncpg.connect(
-            host=settings.DB_HOST,
-            port=settings.DB_PORT,
-            user=settings.DB_USER,
-            password=settings.DB_PASSWORD,
-            database=settings.DB_NAME
-        )
+        conn = await db.connect()
         
         try:
             # Преобразуем список в JSON строку для JSONB
@@ -125,13 +100,7 @@ class PreferencesService:
         guest_uuid: str
     ) -> List[str]:
         """Получает список аллергий для гостя"""
-        conn = await asyncpg.connect(
-            host=settings.DB_HOST,
-            port=settings.DB_PORT,
-            user=settings.DB_USER,
-            password=settings.DB_PASSWORD,
-            database=settings.DB_NAME
-        )
+        conn = await db.connect()
         
         try:
             rows = await conn.fetch(
@@ -148,13 +117,7 @@ class PreferencesService:
         allergen: str
     ) -> None:
         """Добавляет аллергию для гостя"""
-        conn = await asyncpg.connect(
-            host=settings.DB_HOST,
-            port=settings.DB_PORT,
-            user=settings.DB_USER,
-            password=settings.DB_PASSWORD,
-            database=settings.DB_NAME
-        )
+        conn = await db.connect()
         
         try:
             await conn.execute(
@@ -171,13 +134,7 @@ class PreferencesService:
         allergen: str
     ) -> None:
         """Удаляет аллергию для гостя"""
-        conn = await asyncpg.connect(
-            host=settings.DB_HOST,
-            port=settings.DB_PORT,
-            user=settings.DB_USER,
-            password=settings.DB_PASSWORD,
-            database=settings.DB_NAME
-        )
+        conn = await db.connect()
         
         try:
             await conn.execute(
@@ -53,11 +53,15 @@ class SessionService:
         return token
     
     @staticmethod
-    def generate_media_token(scope: str | None = None, path: str | None = None) -> str:
+    def generate_media_token(
+        scope: str | None = None, path: str | None = None, files: str | None = None, guest: str | None = None
+    ) -> str:
         """
         Генерирует JWT для доступа к файловому хранилищу (type=media).
         Один и тот же path/scope в пределах одного временного окна (MEDIA_TOKEN_TTL)
         даёт один и тот же токен — чтобы URL был стабильным и браузер мог кешировать.
+        files — закодированная выборка путей для ZIP на лету (scope=zip).
+        guest — UUID гостя, которому выдан токен (scope=upload: загрузки привязываются к гостю).
         """
         ttl = getattr(settings, "MEDIA_TOKEN_TTL", 3600)
         now_ts = int(datetime.utcnow().timestamp())
@@ -73,6 +77,10 @@ class SessionService:
             payload["scope"] = scope
         if path is not None:
             payload["path"] = path
+        if files is not None:
+            payload["files"] = files
+        if guest is not None:
+            payload["guest"] = guest
         token = jwt.encode(
             payload,
             settings.SECRET_KEY,
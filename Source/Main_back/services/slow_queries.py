@@ -0,0 +1,143 @@
+"""
+Журнал медленных запросов к БД. Каждый запрос через services/db.py учитывается по тексту SQL:
+число вызовов, суммарное и максимальное время. Запросы дольше MAIN_BACK_SLOW_QUERY_MS пишутся в
+лог с обезличенными параметрами. Для доли медленных запросов (MAIN_BACK_SLOW_QUERY_EXPLAIN_RATIO,
+не чаще раза в EXPLAIN_INTERVAL на запрос) в фоне снимается план: EXPLAIN (ANALYZE, BUFFERS)
+для SELECT, для изменяющих запросов — EXPLAIN без выполнения. Сводка top-N — GET /debug/slow-queries.
+"""
+import datetime
+import functools
+import logging
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+# Разных текстов SQL в сервисах — десятки; предел на случай динамически собранных запросов
+MAX_STATEMENTS = 500
+# Не чаще одного плана на запрос за интервал (сек): план повторно выполняет медленный запрос
+EXPLAIN_INTERVAL = 300
+_MAX_LOGGED_STATEMENT = 500
+
+
+@functools.lru_cache(maxsize=1024)
+def normalize_statement(query: str) -> str:
+    """Текст SQL в одну строку — ключ статистики (параметры в запросах — плейсхолдеры $1, $2)."""
+    return " ".join(query.split())
+
+
+def redact_param(value) -> str:
+    """Значение параметра для лога: числа, bool и NULL — как есть, остальное — только тип и размер
+    (телефоны, имена и токены в лог не попадают)."""
+    if value is None or isinstance(value, (bool, int, float)):
+        return repr(value)
+    if isinstance(value, uuid.UUID):
+        return "<uuid>"
+    if isinstance(value, (str, bytes)):
+        return f"<{type(value).__name__} len={len(value)}>"
+    if isinstance(value, (list, tuple)):
+        return f"<{type(value).__name__} len={len(value)}>"
+    return f"<{type(value).__name__}>"
+
+
+def redact_params(args) -> list[str]:
+    return [redact_param(v) for v in args]
+
+
+def is_read_only(statement: str) -> bool:
+    """SELECT без изменяющих CTE: такой запрос можно выполнить повторно под EXPLAIN ANALYZE."""
+    head = statement.lstrip("( ").split(" ", 1)[0].upper()
+    if head == "SELECT":
+        return True
+    if head == "WITH":
+        upper = statement.upper()
+        return not any(f"{verb} " in upper for verb in ("INSERT", "UPDATE", "DELETE", "MERGE"))
+    return False
+
+
+@dataclass
+class StatementStats:
+    statement: str
+    calls: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    slow_calls: int = 0
+    last_slow_at: str | None = None
+    last_slow_seconds: float | None = None
+    last_slow_params: list[str] | None = None
+    plan: str | None = None
+    plan_captured_at: str | None = None
+    # time.monotonic() последнего запуска EXPLAIN
+    explained_at: float = 0.0
+
+
+class SlowQueryLog:
+    """Статистика запросов по тексту SQL и выбор медленных запросов для снятия плана."""
+
+    def __init__(self, threshold_seconds: float, explain_ratio: float) -> None:
+        self.threshold_seconds = threshold_seconds
+        self.explain_ratio = explain_ratio
+        self._stats: dict[str, StatementStats] = {}
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, args, seconds: float) -> bool:
+        """Учитывает выполненный запрос. Возвращает True, если для него нужно снять план."""
+        with self._lock:
+            stats = self._stats.get(statement)
+            if stats is None:
+                if len(self._stats) >= MAX_STATEMENTS:
+                    self._evict()
+                stats = self._stats[statement] = StatementStats(statement)
+            stats.calls += 1
+            stats.total_seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+            if seconds < self.threshold_seconds:
+                return False
+            params = redact_params(args)
+            stats.slow_calls += 1
+            stats.last_slow_at = datetime.datetime.now().isoformat(timespec="seconds")
+            stats.last_slow_seconds = seconds
+            stats.last_slow_params = params
+            explain = (
+                self.explain_ratio > 0
+                and time.monotonic() - stats.explained_at >= EXPLAIN_INTERVAL
+                and random.random() < self.explain_ratio
+            )
+            if explain:
+                stats.explained_at = time.monotonic()
+        logger.warning(
+            "Медленный запрос %.0f мс: %s; параметры: %s",
+            seconds * 1000, statement[:_MAX_LOGGED_STATEMENT], ", ".join(params) or "нет",
+        )
+        return explain
+
+    def set_plan(self, statement: str, plan: str) -> None:
+        with self._lock:
+            stats = self._stats.get(statement)
+            if stats is not None:
+                stats.plan = plan
+                stats.plan_captured_at = datetime.datetime.now().isoformat(timespec="seconds")
+        logger.warning("План медленного запроса %s:\n%s", statement[:_MAX_LOGGED_STATEMENT], plan)
+
+    def top(self, limit: int = 20, order: str = "total") -> list[StatementStats]:
+        """Запросы с наибольшим суммарным (total), максимальным (max) временем или числом медленных (slow)."""
+        keys = {
+            "total": lambda s: s.total_seconds,
+            "max": lambda s: s.max_seconds,
+            "slow": lambda s: (s.slow_calls, s.total_seconds),
+        }
+        with self._lock:
+            items = list(self._stats.values())
+        return sorted(items, key=keys.get(order, keys["total"]), reverse=True)[:max(0, limit)]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+    def _evict(self) -> None:
+        # Освобождаем место: выбрасываем запрос с наименьшим суммарным временем
+        victim = min(self._stats.values(), key=lambda s: s.total_seconds)
+        del self._stats[victim.statement]
@@ -1,9 +1,8 @@
 """
 Сервис для работы с вишлистом
 """
-import asyncpg
 from typing import List, Optional
-from conf.settings import settings
+from services import db
 
 
 class WishlistService:
@@ -13,13 +12,7 @@ class WishlistService:
         self
     ) -> List[dict]:
         """Получает все предметы из вишлиста"""
-        conn = await asyncpg.connect(
-            host=settings.DB_HOST,
-            port=settings.DB_PORT,
-            user=settings.DB_USER,
-            password=settings.DB_PASSWORD,
-            database=settings.DB_NAME
-        )
+        conn = await db.connect()
         
         try:
             rows = await conn.fetch(
@@ -52,13 +45,7 @@ class WishlistService:
         item_uuid: str
     ) -> Optional[dict]:
         """Получает предмет вишлиста по UUID"""
-        conn = await asyncpg.connect(
-            host=settings.DB_HOST,
-            port=settings.DB_PORT,
-            user=settings.DB_USER,
-            password=settings.DB_PASSWORD,
-            database=settings.DB_NAME
-        )
+        conn = await db.connect()
         
         try:
             row = await conn.fetchrow(
@@ -91,13 +78,7 @@ class WishlistService:
         guest_uuid: str
     ) -> dict:
         """Бронирует предмет из вишлиста за гостем"""
-        conn = await asyncpg.connect(
-            host=settings.DB_HOST,
-            port=settings.DB_PORT,
-            user=settings.DB_USER,
-            password=settings.DB_PASSWORD,
-            database=settings.DB_NAME
-        )
+        conn = await db.connect()
         
         try:
             # Проверяем что предмет существует и не забронирован
@@ -127,13 +108,7 @@ class WishlistService:
         guest_uuid: str
     ) -> None:
         """Отменяет бронирование предмета (только если забронирован текущим гостем)"""
-        conn = await asyncpg.connect(
-            host=settings.DB_HOST,
-            port=settings.DB_PORT,
-            user=settings.DB_USER,
-            password=settings.DB_PASSWORD,
-            database=settings.DB_NAME
-        )
+        conn = await db.connect()
         
         try:
             # Проверяем что предмет забронирован именно этим гостем
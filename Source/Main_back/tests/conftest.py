@@ -0,0 +1,199 @@
+"""
+Общие фикстуры тестов Main_back. Тесты планов запросов поднимают отдельную временную БД на сервере
+из настроек (DB_HOST, DB_PORT, DB_USER, DB_PASSWORD — тот же .env, что у приложения), накатывают
+схему из DataBase/migrations и заполняют её синтетическими данными. Рабочая БД (DB_NAME) не меняется.
+
+Переменные окружения:
+    QUERY_PLAN_GUESTS   — число гостей в синтетических данных (по умолчанию 20000)
+    QUERY_PLAN_WISHLIST — число предметов вишлиста (по умолчанию 2000)
+"""
+import asyncio
+import os
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+
+import pytest
+
+MAIN_BACK_DIR = Path(__file__).resolve().parents[1]
+SOURCE_DIR = MAIN_BACK_DIR.parent
+MIGRATIONS_DIR = SOURCE_DIR / "DataBase" / "migrations"
+# Порядок как при инициализации контейнера postgres
+MIGRATIONS = ("init.sql", "add_guest_id.sql", "add_wishlist_link.sql")
+
+# Импорты как в контейнере: services.* из Main_back, conf.* из корня Source
+for path in (MAIN_BACK_DIR, SOURCE_DIR):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+# Минимум для образцов в sample (семья guest_4..guest_6, гость guest_7 из другой семьи)
+MIN_GUESTS = 7
+
+# Данные детерминированные (без random()): одинаковая статистика планировщика от запуска к запуску.
+# Семьи по три гостя подряд: каждый может заполнять пожелания за двух остальных.
+SEED_SQL = """
+INSERT INTO guests (guest_id, last_name, first_name, patronomic, phone, sex_uuid, rsvp, have_allergies, friend)
+SELECT
+    'guest_' || g,
+    'Фамилия' || (g * 7919 % 1009),
+    'Имя' || (g * 104729 % 211),
+    CASE WHEN g % 10 = 0 THEN NULL ELSE 'Отчество' || (g % 97) END,
+    '+7900' || lpad(g::text, 7, '0'),
+    CASE WHEN g % 2 = 0 THEN '550e8400-e29b-41d4-a716-446655440000'::uuid
+         ELSE '550e8400-e29b-41d4-a716-446655440001'::uuid END,
+    CASE g % 3 WHEN 0 THEN NULL WHEN 1 THEN TRUE ELSE FALSE END,
+    CASE g % 4 WHEN 0 THEN TRUE WHEN 1 THEN FALSE ELSE NULL END,
+    g % 5 = 0
+FROM generate_series(1, {guests}) AS g;
+
+CREATE TEMP VIEW seeded AS
+SELECT uuid, substring(guest_id FROM 7)::int AS n, have_allergies FROM guests;
+
+WITH families AS (
+    SELECT (n - 1) / 3 AS family, array_agg(uuid) AS uuids FROM seeded GROUP BY 1
+)
+UPDATE guests g
+SET famili_prefer_forms = array_remove(f.uuids, g.uuid)
+FROM seeded s JOIN families f ON f.family = (s.n - 1) / 3
+WHERE g.uuid = s.uuid;
+
+INSERT INTO food_preferences (user_uuid, food_choice)
+SELECT uuid, (ARRAY['Мясо', 'Рыба', 'Веган', 'Нет предпочтений'])[1 + n % 4]
+FROM seeded WHERE n % 10 < 7;
+
+INSERT INTO alcohol_preferences (user_uuid, alcohol_choice)
+SELECT uuid, (ARRAY[
+    '[]', '["Шампанское"]', '["Вино красное", "Вино белое"]', '["Вино белое", "Коньяк", "Виски"]'
+])[1 + n % 4]::jsonb
+FROM seeded WHERE n % 10 < 6;
+
+INSERT INTO allergies (user_uuid, allergen, created_at)
+SELECT uuid, (ARRAY['Орехи', 'Молоко', 'Глютен', 'Цитрусы', 'Морепродукты'])[1 + (n + k) % 5],
+       CURRENT_TIMESTAMP - k * INTERVAL '1 day'
+FROM seeded CROSS JOIN generate_series(0, 1) AS k
+WHERE have_allergies AND (k = 0 OR n % 2 = 0);
+
+INSERT INTO wishlist (wish_id, owner_type, item, link, is_donation, user_uuid)
+SELECT
+    'wish_' || ((w + 1) / 2),
+    CASE WHEN w % 2 = 0 THEN 'bride' ELSE 'groom' END,
+    'Подарок ' || w,
+    CASE WHEN w % 3 = 0 THEN 'https://example.com/gift/' || w END,
+    w % 50 = 0,
+    s.uuid
+FROM generate_series(1, {wishlist}) AS w
+LEFT JOIN seeded s ON s.n = w AND w % 4 = 0;
+
+ANALYZE;
+"""
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.environ.get(name, str(default)))
+
+
+@dataclass
+class PlanDatabase:
+    """Временная БД с синтетическими данными."""
+    connect_kwargs: dict
+    guests: int
+    wishlist: int
+
+
+@dataclass
+class Sample:
+    """Записи синтетической БД, на которых вызываются методы сервисов."""
+    guest_uuid: str
+    phone: str
+    relative_uuid: str
+    other_guest_uuid: str
+    free_item_uuid: str
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture(scope="session")
+def plan_db():
+    """Создаёт временную БД, накатывает миграции и синтетические данные; services.db ходит в неё."""
+    try:
+        import asyncpg
+        from services import db
+    except Exception as exc:
+        pytest.skip(f"Main_back не импортируется (зависимости или .env): {exc}")
+
+    server_kwargs = db._connect_kwargs()
+    database = f"query_plans_{os.getpid()}"
+    guests = max(MIN_GUESTS, _env_int("QUERY_PLAN_GUESTS", 20000))
+    wishlist = max(2, _env_int("QUERY_PLAN_WISHLIST", 2000))
+
+    async def create() -> None:
+        admin = await asyncpg.connect(**server_kwargs, timeout=5)
+        try:
+            await admin.execute(f'CREATE DATABASE "{database}"')
+        finally:
+            await admin.close()
+
+    async def seed() -> None:
+        conn = await asyncpg.connect(**{**server_kwargs, "database": database})
+        try:
+            for name in MIGRATIONS:
+                await conn.execute((MIGRATIONS_DIR / name).read_text(encoding="utf-8"))
+            await conn.execute(SEED_SQL.format(guests=guests, wishlist=wishlist))
+        finally:
+            await conn.close()
+
+    async def drop() -> None:
+        admin = await asyncpg.connect(**server_kwargs)
+        try:
+            await admin.execute(f'DROP DATABASE IF EXISTS "{database}" WITH (FORCE)')
+        finally:
+            await admin.close()
+
+    try:
+        _run(create())
+    except (OSError, asyncio.TimeoutError, asyncpg.PostgresError) as exc:
+        pytest.skip(f"PostgreSQL недоступен или нет прав на CREATE DATABASE: {exc}")
+    try:
+        # Ошибка в миграциях или данных — падение теста, а не пропуск
+        _run(seed())
+    except BaseException:
+        _run(drop())
+        raise
+
+    connect_kwargs = {**server_kwargs, "database": database}
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(db, "_connect_kwargs", lambda: dict(connect_kwargs))
+        yield PlanDatabase(connect_kwargs, guests, wishlist)
+    _run(drop())
+
+
+@pytest.fixture(scope="session")
+def sample(plan_db) -> Sample:
+    import asyncpg
+
+    async def load() -> Sample:
+        conn = await asyncpg.connect(**plan_db.connect_kwargs)
+        try:
+            guests = {
+                row["guest_id"]: row
+                for row in await conn.fetch(
+                    "SELECT guest_id, uuid, phone FROM guests WHERE guest_id = ANY($1::varchar[])",
+                    ["guest_4", "guest_5", "guest_7"],
+                )
+            }
+            item_uuid = await conn.fetchval(
+                "SELECT uuid FROM wishlist WHERE user_uuid IS NULL ORDER BY wish_id, owner_type LIMIT 1"
+            )
+        finally:
+            await conn.close()
+        return Sample(
+            guest_uuid=str(guests["guest_4"]["uuid"]),
+            phone=guests["guest_4"]["phone"],
+            relative_uuid=str(guests["guest_5"]["uuid"]),
+            other_guest_uuid=str(guests["guest_7"]["uuid"]),
+            free_item_uuid=str(item_uuid),
+        )
+
+    return _run(load())
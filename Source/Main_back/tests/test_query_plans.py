@@ -0,0 +1,199 @@
+"""
+Регрессия планов запросов: каждый метод GuestService, PreferencesService и WishlistService
+вызывается на синтетической БД (conftest.py), каждый выполненный им SQL с теми же параметрами
+прогоняется через EXPLAIN (FORMAT JSON) — без выполнения.
+
+Проверяется:
+- запросы по ключу (гость, предмет вишлиста, пожелания гостя) не читают таблицы целиком (Seq Scan);
+  полные выборки (список гостей, весь вишлист) помечены full_scan — для них Seq Scan ожидаем;
+- оценка стоимости плана (Total Cost) не выросла больше чем в QUERY_PLAN_COST_TOLERANCE раз
+  (по умолчанию 1.5) относительно query_plan_baselines.json.
+
+Файл query_plan_baselines.json лежит в репозитории. Запрос без базовой оценки — падение теста:
+новый или изменённый SQL добавляется в файл осознанно. Файл пишет только QUERY_PLAN_UPDATE_BASELINES=1 —
+перезаписывает его целиком (после изменения схемы или SQL; изменения файла проверяются на ревью).
+Оценки сравниваются, только если файл снят на том же объёме данных (QUERY_PLAN_GUESTS, QUERY_PLAN_WISHLIST).
+"""
+import asyncio
+import contextlib
+import json
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Awaitable, Callable
+
+import pytest
+
+try:
+    import asyncpg
+
+    from services import db
+    from services.guest import guest_service
+    from services.preferences import preferences_service
+    from services.slow_queries import normalize_statement
+    from services.wishlist_service import wishlist_service
+except Exception as exc:  # Нет зависимостей или не заданы настройки (.env)
+    pytest.skip(f"Main_back не импортируется: {exc}", allow_module_level=True)
+
+BASELINES_PATH = Path(__file__).with_name("query_plan_baselines.json")
+# Справочники на пару строк: читать их целиком дешевле любого индекса
+SMALL_TABLES = {"sex"}
+
+
+def _env_flag(name: str) -> bool:
+    return os.environ.get(name, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+@dataclass(frozen=True)
+class Case:
+    name: str
+    call: Callable[..., Awaitable]
+    full_scan: bool = False
+
+
+async def _remove_and_restore_relative(s):
+    await guest_service.remove_from_famili_prefer_forms(s.guest_uuid, s.relative_uuid)
+    await guest_service.add_to_famili_prefer_forms(s.guest_uuid, s.relative_uuid)
+
+
+async def _add_and_delete_allergy(s):
+    await preferences_service.add_allergy(s.guest_uuid, "Киви")
+    await preferences_service.delete_allergy(s.guest_uuid, "Киви")
+
+
+async def _reserve_and_unreserve(s):
+    await wishlist_service.reserve_item(s.free_item_uuid, s.guest_uuid)
+    await wishlist_service.unreserve_item(s.free_item_uuid, s.guest_uuid)
+
+
+CASES = [
+    Case("guest.get_guest_by_phone", lambda s: guest_service.get_guest_by_phone(s.phone)),
+    Case("guest.get_guest_by_uuid", lambda s: guest_service.get_guest_by_uuid(s.guest_uuid)),
+    Case("guest.update_rsvp", lambda s: guest_service.update_rsvp(s.guest_uuid, True)),
+    Case("guest.get_rsvp", lambda s: guest_service.get_rsvp(s.guest_uuid)),
+    *(
+        Case(f"guest.list_guests[{column}]", lambda s, column=column: guest_service.list_guests(column), full_scan=True)
+        for column in ("last_name", "first_name", "patronomic", "phone")
+    ),
+    Case("guest.get_famili_prefer_forms", lambda s: guest_service.get_famili_prefer_forms(s.guest_uuid)),
+    Case(
+        "guest.add_to_famili_prefer_forms",
+        lambda s: guest_service.add_to_famili_prefer_forms(s.guest_uuid, s.other_guest_uuid),
+    ),
+    Case("guest.remove_from_famili_prefer_forms", _remove_and_restore_relative),
+    Case("guest.get_have_allergies", lambda s: guest_service.get_have_allergies(s.guest_uuid)),
+    Case("guest.set_have_allergies", lambda s: guest_service.set_have_allergies(s.guest_uuid, True)),
+    Case("preferences.get_food_preference", lambda s: preferences_service.get_food_preference(s.guest_uuid)),
+    Case("preferences.set_food_preference", lambda s: preferences_service.set_food_preference(s.guest_uuid, "Рыба")),
+    Case("preferences.get_alcohol_preferences", lambda s: preferences_service.get_alcohol_preferences(s.guest_uuid)),
+    Case(
+        "preferences.set_alcohol_preferences",
+        lambda s: preferences_service.set_alcohol_preferences(s.guest_uuid, ["Шампанское"]),
+    ),
+    Case("preferences.get_allergies", lambda s: preferences_service.get_allergies(s.guest_uuid)),
+    Case("preferences.add_allergy/delete_allergy", _add_and_delete_allergy),
+    Case("preferences.get_all_preferences", lambda s: preferences_service.get_all_preferences(s.guest_uuid)),
+    Case("wishlist.get_all_wishlist_items", lambda s: wishlist_service.get_all_wishlist_items(), full_scan=True),
+    Case("wishlist.get_wishlist_item_by_uuid", lambda s: wishlist_service.get_wishlist_item_by_uuid(s.free_item_uuid)),
+    Case("wishlist.reserve_item/unreserve_item", _reserve_and_unreserve),
+]
+
+
+@contextlib.contextmanager
+def capture_statements():
+    """Перехватывает SQL, выполненный через services.db: {нормализованный текст: (запрос, параметры)}."""
+    statements: dict[str, tuple[str, tuple]] = {}
+    original = db.InstrumentedConnection._timed
+
+    async def capturing(self, operation, call, query, *args, **kwargs):
+        if operation != "executemany":
+            statements.setdefault(normalize_statement(query), (query, args))
+        return await original(self, operation, call, query, *args, **kwargs)
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(db.InstrumentedConnection, "_timed", capturing)
+        yield statements
+
+
+async def explain(connect_kwargs: dict, query: str, args: tuple) -> dict:
+    conn = await asyncpg.connect(**connect_kwargs)
+    try:
+        return json.loads(await conn.fetchval("EXPLAIN (FORMAT JSON) " + query, *args))[0]["Plan"]
+    finally:
+        await conn.close()
+
+
+def _nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", ()):
+        yield from _nodes(child)
+
+
+def seq_scans(plan: dict) -> list[str]:
+    return [
+        node["Relation Name"]
+        for node in _nodes(plan)
+        if node["Node Type"] == "Seq Scan" and node.get("Relation Name") not in SMALL_TABLES
+    ]
+
+
+class Baselines:
+    """Оценки стоимости планов из query_plan_baselines.json: {случай: {SQL: Total Cost}}."""
+
+    def __init__(self, path: Path, guests: int, wishlist: int, update: bool, tolerance: float) -> None:
+        self.path = path
+        self.scale = {"guests": guests, "wishlist": wishlist}
+        self.update = update
+        self.tolerance = tolerance
+        data = json.loads(path.read_text(encoding="utf-8")) if path.exists() else {"scale": self.scale, "costs": {}}
+        # Файл другого объёма данных не сравниваем: стоимости на другом числе строк несопоставимы
+        self.compare = data.get("scale") == self.scale and not update
+        self.costs: dict[str, dict[str, float]] = {} if update else data["costs"]
+
+    def check(self, case: str, statement: str, cost: float) -> str | None:
+        """Сверяет оценку с базовой (в режиме обновления — запоминает). Возвращает описание ошибки."""
+        if self.update:
+            self.costs.setdefault(case, {})[statement] = round(cost, 2)
+            return None
+        if not self.compare:
+            return None
+        baseline = self.costs.get(case, {}).get(statement)
+        if baseline is None:
+            return f"нет базовой оценки (добавьте: QUERY_PLAN_UPDATE_BASELINES=1), стоимость {cost:.2f}: {statement}"
+        if cost > baseline * self.tolerance:
+            return f"стоимость плана {cost:.2f} > {baseline:.2f} × {self.tolerance}: {statement}"
+        return None
+
+    def save(self) -> None:
+        if not self.update:
+            return
+        data = {"scale": self.scale, "costs": {case: dict(sorted(v.items())) for case, v in sorted(self.costs.items())}}
+        self.path.write_text(json.dumps(data, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+
+
+@pytest.fixture(scope="module")
+def baselines(plan_db):
+    tolerance = float(os.environ.get("QUERY_PLAN_COST_TOLERANCE", "1.5"))
+    store = Baselines(
+        BASELINES_PATH, plan_db.guests, plan_db.wishlist, _env_flag("QUERY_PLAN_UPDATE_BASELINES"), tolerance
+    )
+    yield store
+    store.save()
+
+
+@pytest.mark.parametrize("case", CASES, ids=lambda case: case.name)
+def test_query_plan(case, plan_db, sample, baselines):
+    with capture_statements() as statements:
+        asyncio.run(case.call(sample))
+    assert statements, f"{case.name}: ни одного запроса к БД"
+
+    failures = []
+    for statement, (query, args) in statements.items():
+        plan = asyncio.run(explain(plan_db.connect_kwargs, query, args))
+        scanned = seq_scans(plan)
+        if scanned and not case.full_scan:
+            failures.append(f"Seq Scan по {', '.join(scanned)}: {statement}")
+        regression = baselines.check(case.name, statement, plan["Total Cost"])
+        if regression:
+            failures.append(regression)
+    assert not failures, "\n".join(failures)
@@ -8,6 +8,7 @@ from celery import Celery
 # Добавляем корневую папку в путь
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+from conf import tracing
 from conf.settings import settings
 
 # Создаем Celery приложение
@@ -30,3 +31,5 @@ celery_app.conf.update(
     task_soft_time_limit=settings.CELERY_TASK_SOFT_TIME_LIMIT,
 )
 
+# Трассировка: traceparent в заголовках задач (публикация из Main_back), спан задачи в воркере
+tracing.install_celery("notifications_worker")
@@ -10,6 +10,7 @@ import httpx
 # Добавляем корневую папку в путь
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
+from conf import tracing
 from conf.settings import settings
 
 logger = logging.getLogger(__name__)
@@ -50,7 +51,7 @@ def send_verification_call(
         # Zvonok.com API для Flash Call
         # GET запрос с параметрами в URL
         # НЕ передаем pincode - Zvonok.com сам сгенерирует код
-        with httpx.Client(timeout=30.0) as client:
+        with httpx.Client(timeout=30.0, transport=tracing.TracingTransport()) as client:
             response = client.get(
                 f"https://zvonok.com/manager/cabapi_external/api/v1/phones/flashcall/",
                 params={
@@ -0,0 +1,230 @@
+"""
+Метрики в текстовом формате Prometheus (GET /metrics) без внешних зависимостей. Общие для Main_back
+и File_storage: conf/ входит в каждый образ, у каждого процесса свой реестр registry.
+
+Счётчики, gauge и гистограммы с метками. Изменение значения — словарь и lock дочерней серии, текст
+собирается только при запросе /metrics. Значения, которые сервис уже считает сам (кеш превью,
+очередь рендера), не дублируются: их отдают функции, вызываемые при сборе.
+
+    from conf.metrics import registry
+
+    REQUESTS = registry.counter("service_requests_total", "Запросы", ("route",))
+    REQUESTS.labels(route_label(scope)).inc()
+"""
+import bisect
+import math
+import threading
+from typing import Callable, Iterable
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# Время ответа и запросов к БД/Redis: от 5 мс (кеш, 304) до 10 с (холодный диск, большой Range)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Функция сбора: значение без меток или пары (значения меток, значение)
+Collector = Callable[[], float | Iterable[tuple[tuple, float]]]
+
+# Путь без подходящего маршрута: метка не должна плодить серии по произвольным URL
+UNMATCHED_ROUTE = "unmatched"
+
+
+def route_label(scope: dict) -> str:
+    """Метка маршрута для ASGI-запроса: шаблон пути, который маршрутизатор FastAPI кладёт в scope,
+    а не конкретный URL."""
+    route = scope.get("route")
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels_text(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), collect: Collector | None = None) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._collect = collect
+        self._children: dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """Серия с данными значениями меток (создаётся при первом обращении, затем берётся из словаря)."""
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name}: ожидались метки {self.labelnames}")
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self) -> list[str]:
+        if self._collect is not None:
+            collected = self._collect()
+            if isinstance(collected, (int, float)):
+                return [f"{self.name} {_number(collected)}"]
+            return [f"{self.name}{_labels_text(self.labelnames, values)} {_number(v)}" for values, v in collected]
+        with self._lock:
+            children = list(self._children.items())
+        lines = []
+        for values, child in sorted(children):
+            lines.extend(child.samples(self.name, self.labelnames, values))
+        return lines
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}", *self._samples()]
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self) -> None:
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def samples(self, name: str, labelnames: tuple[str, ...], values: tuple) -> list[str]:
+        return [f"{name}{_labels_text(labelnames, values)} {_number(self.value)}"]
+
+
+class Counter(_Metric):
+    """Монотонный счётчик: запросы, байты, промахи."""
+
+    kind = "counter"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    """Текущее значение: запросы в работе, размер кеша."""
+
+    kind = "gauge"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.labels().dec(amount)
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+
+class _HistogramValue:
+    __slots__ = ("buckets", "counts", "sum", "_lock")
+
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self.buckets = buckets
+        # Счётчики по корзинам без накопления; последняя — больше верхней границы (+Inf)
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def samples(self, name: str, labelnames: tuple[str, ...], values: tuple) -> list[str]:
+        with self._lock:
+            counts = list(self.counts)
+            total_sum = self.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip((*self.buckets, math.inf), counts):
+            cumulative += count
+            le = f'le="{_number(bound)}"'
+            lines.append(f"{name}_bucket{_labels_text(labelnames, values, le)} {cumulative}")
+        lines.append(f"{name}_sum{_labels_text(labelnames, values)} {_number(total_sum)}")
+        lines.append(f"{name}_count{_labels_text(labelnames, values)} {cumulative}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Распределение длительностей по корзинам (le — «не больше»)."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramValue:
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+
+class MetricsRegistry:
+    """Метрики процесса по именам; render() — текст для /metrics."""
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), collect: Collector | None = None) -> Counter:
+        return self._register(Counter(name, documentation, labelnames, collect))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), collect: Collector | None = None) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames, collect))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
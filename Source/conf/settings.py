@@ -144,6 +144,50 @@ class Settings(BaseSettings):
         """URL файлового хранилища для внутренних запросов из Main_back. Переопределение: env FILE_STORAGE_INTERNAL_URL."""
         return os.environ.get("FILE_STORAGE_INTERNAL_URL", "http://file_storage:8001")
 
+    @property
+    def gallery_list_cache_ttl(self) -> int:
+        """Сколько секунд Main_back отдаёт список папки из кеша, не обращаясь к файловому хранилищу.
+        После истечения — ревалидация через If-None-Match. Переопределение: env GALLERY_LIST_CACHE_TTL."""
+        return int(os.environ.get("GALLERY_LIST_CACHE_TTL", "300"))
+
+    @property
+    def gallery_hide_duplicates(self) -> bool:
+        """Скрывать в общей ленте (wedding_day_all_photos) почти одинаковые фото (отчёт duplicates файлового
+        хранилища). По умолчанию выключено: поиск почти одинаковых может ошибаться, а скрытое фото гость не найдёт.
+        Переопределение: env GALLERY_HIDE_DUPLICATES."""
+        return os.environ.get("GALLERY_HIDE_DUPLICATES", "false").strip().lower() in ("1", "true", "yes", "on")
+
+    @property
+    def gallery_upload_tokens_per_day(self) -> int:
+        """Сколько URL загрузки фото (GET /gallery/upload-url) гость может получить за сутки; сверх — 429.
+        Переопределение: env GALLERY_UPLOAD_TOKENS_PER_DAY."""
+        return int(os.environ.get("GALLERY_UPLOAD_TOKENS_PER_DAY", "20"))
+
+    @property
+    def main_back_server_timing(self) -> bool:
+        """Добавлять к ответам Main_back заголовок Server-Timing (время в БД, Redis и обработчике).
+        Раскрывает внутренние замеры клиенту — включать для отладки. Переопределение: env MAIN_BACK_SERVER_TIMING."""
+        return os.environ.get("MAIN_BACK_SERVER_TIMING", "false").strip().lower() in ("1", "true", "yes", "on")
+
+    @property
+    def main_back_metrics_token(self) -> str:
+        """Bearer-токен для GET /metrics и /debug/slow-queries Main_back; пусто — эндпоинты выключены (404).
+        Снаружи Nginx их не проксирует, токен нужен для сбора метрик из внутренней сети.
+        Переопределение: env MAIN_BACK_METRICS_TOKEN."""
+        return os.environ.get("MAIN_BACK_METRICS_TOKEN", "").strip()
+
+    @property
+    def main_back_slow_query_ms(self) -> float:
+        """Порог медленного запроса к БД (мс): такие запросы пишутся в лог с обезличенными параметрами.
+        Переопределение: env MAIN_BACK_SLOW_QUERY_MS."""
+        return float(os.environ.get("MAIN_BACK_SLOW_QUERY_MS", "200"))
+
+    @property
+    def main_back_slow_query_explain_ratio(self) -> float:
+        """Доля медленных запросов, для которых в фоне снимается EXPLAIN (ANALYZE, BUFFERS); 0 — не снимать.
+        Переопределение: env MAIN_BACK_SLOW_QUERY_EXPLAIN_RATIO."""
+        return max(0.0, min(1.0, float(os.environ.get("MAIN_BACK_SLOW_QUERY_EXPLAIN_RATIO", "0.1"))))
+
     @property
     def file_storage_data_root(self) -> Path:
         """Корневая папка данных файлового хранилища"""
@@ -155,10 +199,145 @@ class Settings(BaseSettings):
         root = self.file_storage_data_root
         return {name: root / name for name in self.file_storage_folders}
 
+    @property
+    def file_storage_index_refresh_interval(self) -> float:
+        """Период (сек) пересканирования индекса файлов хранилища. Переопределение: env FILE_STORAGE_INDEX_REFRESH_INTERVAL."""
+        return float(os.environ.get("FILE_STORAGE_INDEX_REFRESH_INTERVAL", "30"))
+
+    @property
+    def file_storage_thumb_workers(self) -> int:
+        """Число процессов рендера превью. Переопределение: env FILE_STORAGE_THUMB_WORKERS (по умолчанию min(4, CPU))."""
+        return int(os.environ.get("FILE_STORAGE_THUMB_WORKERS", min(4, os.cpu_count() or 1)))
+
+    @property
+    def file_storage_thumb_queue_size(self) -> int:
+        """Максимум рендеров превью в очереди; сверх него — 503 + Retry-After. Переопределение: env FILE_STORAGE_THUMB_QUEUE_SIZE."""
+        return int(os.environ.get("FILE_STORAGE_THUMB_QUEUE_SIZE", "64"))
+
+    @property
+    def file_storage_thumb_widths(self) -> tuple[int, ...]:
+        """Разрешённые ширины превью (запрос другой ширины приводится к ближайшей); они же генерируются заранее.
+        Переопределение: env FILE_STORAGE_THUMB_WIDTHS (через запятую)."""
+        raw = os.environ.get("FILE_STORAGE_THUMB_WIDTHS", "320,480,768,1080")
+        return tuple(int(w) for w in raw.split(",") if w.strip())
+
+    @property
+    def file_storage_thumb_cache_max_bytes(self) -> int:
+        """Бюджет дискового кеша превью в байтах. Переопределение: env FILE_STORAGE_THUMB_CACHE_MAX_MB (мегабайты)."""
+        return int(os.environ.get("FILE_STORAGE_THUMB_CACHE_MAX_MB", "2048")) * 1024 * 1024
+
+    @property
+    def file_storage_meta_workers(self) -> int:
+        """Потоков извлечения метаданных фото (размеры, EXIF, blurhash). Переопределение: env FILE_STORAGE_META_WORKERS."""
+        return int(os.environ.get("FILE_STORAGE_META_WORKERS", "2"))
+
+    @property
+    def file_storage_duplicate_max_distance(self) -> int:
+        """Порог почти одинаковых фото: различающихся бит dHash из 64 (0 — только точные совпадения хеша).
+        Переопределение: env FILE_STORAGE_DUPLICATE_MAX_DISTANCE."""
+        return int(os.environ.get("FILE_STORAGE_DUPLICATE_MAX_DISTANCE", "6"))
+
+    @property
+    def file_storage_archive_skip_duplicates(self) -> bool:
+        """Не класть в архив фото дубликаты из отчёта duplicates (остаётся лучший снимок группы).
+        По умолчанию выключено — в архиве все фото. Переопределение: env FILE_STORAGE_ARCHIVE_SKIP_DUPLICATES."""
+        return os.environ.get("FILE_STORAGE_ARCHIVE_SKIP_DUPLICATES", "false").strip().lower() in ("1", "true", "yes", "on")
+
+    @property
+    def file_storage_metrics_token(self) -> str:
+        """Bearer-токен для GET /metrics File_storage; пусто — эндпоинт выключен (404). Снаружи Nginx
+        его не проксирует, токен нужен для сбора метрик из внутренней сети.
+        Переопределение: env FILE_STORAGE_METRICS_TOKEN."""
+        return os.environ.get("FILE_STORAGE_METRICS_TOKEN", "").strip()
+
+    @property
+    def file_storage_archive_rebuild_interval(self) -> float:
+        """Период (сек) проверки готовых архивов data/zip/; 0 — фоновая пересборка выключена.
+        Переопределение: env FILE_STORAGE_ARCHIVE_REBUILD_INTERVAL."""
+        return float(os.environ.get("FILE_STORAGE_ARCHIVE_REBUILD_INTERVAL", "300"))
+
+    @property
+    def file_storage_upload_max_bytes(self) -> int:
+        """Максимальный размер файла загрузки гостя (Tus-Max-Size). Переопределение: env FILE_STORAGE_UPLOAD_MAX_MB (мегабайты)."""
+        return int(os.environ.get("FILE_STORAGE_UPLOAD_MAX_MB", "50")) * 1024 * 1024
+
+    @property
+    def file_storage_upload_guest_max_bytes(self) -> int:
+        """Сколько байт один гость может загрузить за сутки (сумма Upload-Length); сверх — 429.
+        Переопределение: env FILE_STORAGE_UPLOAD_GUEST_MAX_MB (мегабайты)."""
+        return int(os.environ.get("FILE_STORAGE_UPLOAD_GUEST_MAX_MB", "500")) * 1024 * 1024
+
+    @property
+    def file_storage_upload_guest_max_files(self) -> int:
+        """Сколько загрузок один гость может создать за сутки; сверх — 429.
+        Переопределение: env FILE_STORAGE_UPLOAD_GUEST_MAX_FILES."""
+        return int(os.environ.get("FILE_STORAGE_UPLOAD_GUEST_MAX_FILES", "100"))
+
+    @property
+    def file_storage_upload_expire_hours(self) -> float:
+        """Через сколько часов незавершённая загрузка удаляется. Переопределение: env FILE_STORAGE_UPLOAD_EXPIRE_HOURS."""
+        return float(os.environ.get("FILE_STORAGE_UPLOAD_EXPIRE_HOURS", "24"))
+
+    @property
+    def file_storage_upload_max_active(self) -> int:
+        """Максимум одновременно принимаемых PATCH-частей; сверх него — 503 + Retry-After.
+        Переопределение: env FILE_STORAGE_UPLOAD_MAX_ACTIVE."""
+        return int(os.environ.get("FILE_STORAGE_UPLOAD_MAX_ACTIVE", "64"))
+
+    @property
+    def file_storage_upload_moderation(self) -> bool:
+        """Загрузки гостей попадают в галерею только после одобрения (app.commands.moderate_uploads);
+        выключено — сразу после обработки. Переопределение: env FILE_STORAGE_UPLOAD_MODERATION."""
+        return os.environ.get("FILE_STORAGE_UPLOAD_MODERATION", "true").strip().lower() in ("1", "true", "yes", "on")
+
+    @property
+    def file_storage_ffmpeg(self) -> str:
+        """Путь к ffmpeg (HLS, кадры видео). Переопределение: env FILE_STORAGE_FFMPEG."""
+        return os.environ.get("FILE_STORAGE_FFMPEG", "ffmpeg")
+
+    @property
+    def file_storage_ffprobe(self) -> str:
+        """Путь к ffprobe. Переопределение: env FILE_STORAGE_FFPROBE."""
+        return os.environ.get("FILE_STORAGE_FFPROBE", "ffprobe")
+
+    @property
+    def file_storage_accel_redirect(self) -> bool:
+        """Отдача байтов через Nginx (X-Accel-Redirect): File_storage только проверяет токен и путь.
+        Переопределение: env FILE_STORAGE_ACCEL_REDIRECT (true/false, по умолчанию false)."""
+        return os.environ.get("FILE_STORAGE_ACCEL_REDIRECT", "false").strip().lower() in ("1", "true", "yes", "on")
+
+    @property
+    def file_storage_accel_prefix(self) -> str:
+        """Internal-location Nginx, указывающий на data/. Переопределение: env FILE_STORAGE_ACCEL_PREFIX."""
+        return "/" + os.environ.get("FILE_STORAGE_ACCEL_PREFIX", "/_protected_media/").strip("/") + "/"
+
     @property
     def file_storage_media_url_base(self) -> str:
         """Базовый URL для доступа к файловому хранилищу (через Nginx /media/)."""
         return (self.FILE_STORAGE_MEDIA_URL_BASE or f"{self.SITE_ORIGIN.rstrip('/')}/media")
 
+    @property
+    def tracing_exporter(self) -> str:
+        """Куда выгружать спаны трассировки (conf/tracing.py): none — выключено, file — JSON Lines
+        в TRACING_FILE, otlp — POST в коллектор TRACING_OTLP_ENDPOINT. Переопределение: env TRACING_EXPORTER."""
+        return os.environ.get("TRACING_EXPORTER", "none").strip().lower()
+
+    @property
+    def tracing_file(self) -> str:
+        """Файл спанов для TRACING_EXPORTER=file; {service} — имя сервиса (main_back, file_storage, ...).
+        Переопределение: env TRACING_FILE."""
+        return os.environ.get("TRACING_FILE", "/tmp/traces/{service}.jsonl")
+
+    @property
+    def tracing_otlp_endpoint(self) -> str:
+        """OTLP/HTTP-приёмник спанов (JSON) для TRACING_EXPORTER=otlp. Переопределение: env TRACING_OTLP_ENDPOINT."""
+        return os.environ.get("TRACING_OTLP_ENDPOINT", "http://otel-collector:4318/v1/traces")
+
+    @property
+    def tracing_sample_ratio(self) -> float:
+        """Доля новых трасс, которые записываются (0..1); продолжение чужой трассы следует её решению.
+        Переопределение: env TRACING_SAMPLE_RATIO."""
+        return max(0.0, min(1.0, float(os.environ.get("TRACING_SAMPLE_RATIO", "1.0"))))
+
 
 settings = Settings()
\ No newline at end of file
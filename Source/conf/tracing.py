@@ -0,0 +1,479 @@
+"""
+Распределённая трассировка без внешних зависимостей. Общая для Main_back, File_storage и воркеров
+Celery: conf/ входит в каждый образ.
+
+Контекст трассы передаётся по W3C Trace Context: заголовок traceparent в HTTP-запросах и в
+заголовках задач Celery. Спаны создаются вокруг входящих запросов, запросов к БД и Redis,
+исходящих запросов httpx и обработки изображений. Законченные спаны копятся в памяти. Фоновый
+поток отправляет их пачками в формате OTLP JSON: в файл (JSON Lines, пачка на строку; файл можно
+отправить в коллектор позже) или POST'ом в OTLP/HTTP-коллектор.
+
+По умолчанию (TRACING_EXPORTER=none) трассировка выключена: span() ничего не создаёт и
+заголовки не добавляются.
+
+    from conf import tracing
+
+    tracing.configure("main_back")
+    with tracing.span("guests.import", rows=len(rows)):
+        ...
+"""
+import atexit
+import json
+import logging
+import os
+import random
+import secrets
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+
+try:
+    import httpx
+except ImportError:
+    httpx = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+# SpanKind OTLP
+INTERNAL, SERVER, CLIENT, PRODUCER, CONSUMER = 1, 2, 3, 4, 5
+
+TRACEPARENT = "traceparent"
+
+# Пачка на отправку и предел очереди: при недоступном коллекторе лишние спаны отбрасываются
+_BATCH_SIZE = 256
+_MAX_QUEUED = 4096
+_FLUSH_INTERVAL = 5.0
+# Длинные SQL и прочие строковые атрибуты обрезаются
+_MAX_ATTRIBUTE_LENGTH = 1000
+
+
+@dataclass(frozen=True)
+class SpanContext:
+    """Родитель из другого процесса (разобранный traceparent)."""
+    trace_id: str
+    span_id: str
+    sampled: bool
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    kind: int
+    sampled: bool
+    start_ns: int = field(default_factory=time.time_ns)
+    end_ns: int = 0
+    attributes: dict = field(default_factory=dict)
+    error: str | None = None
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def set_attribute(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def record_error(self, exc: BaseException) -> None:
+        self.error = f"{type(exc).__name__}: {exc}"[:_MAX_ATTRIBUTE_LENGTH]
+
+
+def parse_traceparent(value: str | None) -> SpanContext | None:
+    """Разбирает traceparent (версия 00 и совместимые будущие); некорректный — None."""
+    if not value:
+        return None
+    parts = value.strip().lower().split("-")
+    if len(parts) < 4:
+        return None
+    version, trace_id, span_id, flags = parts[:4]
+    if len(version) != 2 or version == "ff" or (version == "00" and len(parts) != 4):
+        return None
+    if len(trace_id) != 32 or len(span_id) != 16 or len(flags) != 2:
+        return None
+    try:
+        int(trace_id, 16)
+        int(span_id, 16)
+        sampled = bool(int(flags, 16) & 1)
+    except ValueError:
+        return None
+    if trace_id == "0" * 32 or span_id == "0" * 16:
+        return None
+    return SpanContext(trace_id, span_id, sampled)
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)[:_MAX_ATTRIBUTE_LENGTH]}
+
+
+def _otlp_span(span: Span) -> dict:
+    raw = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": span.kind,
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in span.attributes.items() if v is not None],
+        # STATUS_CODE_ERROR = 2, UNSET = 0
+        "status": {"code": 2, "message": span.error} if span.error else {"code": 0},
+    }
+    if span.parent_id:
+        raw["parentSpanId"] = span.parent_id
+    return raw
+
+
+def otlp_payload(service_name: str, spans: list[Span]) -> dict:
+    """Тело ExportTraceServiceRequest в OTLP JSON."""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [
+                {"key": "service.name", "value": {"stringValue": service_name}},
+                {"key": "process.pid", "value": {"intValue": str(os.getpid())}},
+            ]},
+            "scopeSpans": [{"scope": {"name": "wedding.tracing"}, "spans": [_otlp_span(s) for s in spans]}],
+        }]
+    }
+
+
+class _BatchExporter:
+    """Очередь законченных спанов и фоновый поток, отправляющий их пачками."""
+
+    def __init__(self, service_name: str, file_path: Path | None = None, otlp_endpoint: str | None = None) -> None:
+        self.service_name = service_name
+        self.file_path = file_path
+        self.otlp_endpoint = otlp_endpoint
+        self.dropped = 0
+        self._reset()
+        # После fork (prefork Celery, пулы процессов) поток родителя в потомке не существует
+        os.register_at_fork(after_in_child=self._reset)
+        atexit.register(self.flush)
+
+    def _reset(self) -> None:
+        self._lock = threading.Lock()
+        self._queue: list[Span] = []
+        self._wakeup = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def submit(self, span: Span) -> None:
+        with self._lock:
+            if len(self._queue) >= _MAX_QUEUED:
+                self.dropped += 1
+                return
+            self._queue.append(span)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-export", daemon=True)
+                self._thread.start()
+            if len(self._queue) >= _BATCH_SIZE:
+                self._wakeup.set()
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(_FLUSH_INTERVAL)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        while True:
+            with self._lock:
+                batch, self._queue = self._queue[:_BATCH_SIZE], self._queue[_BATCH_SIZE:]
+            if not batch:
+                return
+            try:
+                self._export(json.dumps(otlp_payload(self.service_name, batch), ensure_ascii=False))
+            except Exception as exc:
+                # Трассировка не должна ронять сервис: пачка теряется
+                logger.warning("Не удалось выгрузить %s спанов: %s", len(batch), exc)
+                return
+
+    def _export(self, payload: str) -> None:
+        if self.file_path is not None:
+            self.file_path.parent.mkdir(parents=True, exist_ok=True)
+            # Одна запись на пачку в режиме append: строки процессов-соседей не перемешиваются
+            fd = os.open(self.file_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            try:
+                os.write(fd, (payload + "\n").encode("utf-8"))
+            finally:
+                os.close(fd)
+        if self.otlp_endpoint:
+            request = urllib.request.Request(
+                self.otlp_endpoint,
+                data=payload.encode("utf-8"),
+                headers={"Content-Type": "application/json"},
+                method="POST",
+            )
+            with urllib.request.urlopen(request, timeout=10):
+                pass
+
+
+class _Tracer:
+    def __init__(self, exporter: _BatchExporter, sample_ratio: float) -> None:
+        self.exporter = exporter
+        self.sample_ratio = sample_ratio
+
+
+_tracer: _Tracer | None = None
+_current: ContextVar[Span | None] = ContextVar("trace_span", default=None)
+
+
+def configure(service_name: str) -> bool:
+    """Включает трассировку процесса по настройкам TRACING_*. Повторный вызов ничего не меняет.
+    Возвращает, включена ли трассировка."""
+    global _tracer
+    if _tracer is not None:
+        return True
+    try:
+        from conf.settings import settings
+        exporter = settings.tracing_exporter
+    except Exception as exc:
+        logger.warning("Трассировка выключена: настройки недоступны (%s)", exc)
+        return False
+    if exporter == "none":
+        return False
+    if exporter == "file":
+        path = Path(settings.tracing_file.format(service=service_name))
+        _tracer = _Tracer(_BatchExporter(service_name, file_path=path), settings.tracing_sample_ratio)
+    elif exporter == "otlp":
+        _tracer = _Tracer(
+            _BatchExporter(service_name, otlp_endpoint=settings.tracing_otlp_endpoint), settings.tracing_sample_ratio
+        )
+    else:
+        logger.warning("Трассировка выключена: неизвестный TRACING_EXPORTER=%s", exporter)
+        return False
+    logger.info("Трассировка %s: экспорт %s, доля трасс %.2f", service_name, exporter, settings.tracing_sample_ratio)
+    return True
+
+
+def enabled() -> bool:
+    return _tracer is not None
+
+
+def current_span() -> Span | None:
+    return _current.get()
+
+
+def start_span(
+    name: str, kind: int = INTERNAL, parent: Span | SpanContext | None = None, attributes: dict | None = None
+) -> Span | None:
+    """Новый спан (не делает его текущим). Родитель по умолчанию — текущий спан; без родителя
+    начинается новая трасса, которая записывается с вероятностью TRACING_SAMPLE_RATIO."""
+    if _tracer is None:
+        return None
+    if parent is None:
+        parent = _current.get()
+    if parent is None:
+        trace_id, parent_id = secrets.token_hex(16), None
+        sampled = random.random() < _tracer.sample_ratio
+    else:
+        trace_id, parent_id, sampled = parent.trace_id, parent.span_id, parent.sampled
+    return Span(
+        name=name,
+        trace_id=trace_id,
+        span_id=secrets.token_hex(8),
+        parent_id=parent_id,
+        kind=kind,
+        sampled=sampled,
+        attributes=dict(attributes or {}),
+    )
+
+
+def end_span(span: Span | None) -> None:
+    if span is None or span.end_ns:
+        return
+    span.end_ns = time.time_ns()
+    if span.sampled and _tracer is not None:
+        _tracer.exporter.submit(span)
+
+
+@contextmanager
+def span(name: str, kind: int = INTERNAL, **attributes):
+    """Спан вокруг блока (sync и async): текущий внутри блока, исключение отмечается ошибкой."""
+    current = start_span(name, kind, attributes=attributes)
+    if current is None:
+        yield None
+        return
+    token = _current.set(current)
+    try:
+        yield current
+    except Exception as exc:
+        current.record_error(exc)
+        raise
+    finally:
+        _current.reset(token)
+        end_span(current)
+
+
+def inject(headers: dict) -> dict:
+    """Добавляет traceparent текущего спана в заголовки (HTTP или задачи Celery)."""
+    current = _current.get()
+    if current is not None:
+        headers[TRACEPARENT] = current.traceparent
+    return headers
+
+
+class TracingMiddleware:
+    """ASGI: серверный спан на запрос, продолжающий трассу из входящего traceparent.
+    Имя — метод и шаблон пути FastAPI; строка запроса не пишется (в ней бывают токены)."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or _tracer is None:
+            await self.app(scope, receive, send)
+            return
+        parent = None
+        for name, value in scope.get("headers") or []:
+            if name == b"traceparent":
+                parent = parse_traceparent(value.decode("latin-1"))
+                break
+        method = scope["method"]
+        server_span = start_span(method, SERVER, parent=parent, attributes={"http.method": method, "url.path": scope["path"]})
+        status = {"code": 500}
+
+        async def send_traced(message: dict) -> None:
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        token = _current.set(server_span)
+        try:
+            await self.app(scope, receive, send_traced)
+        except Exception as exc:
+            server_span.record_error(exc)
+            raise
+        finally:
+            _current.reset(token)
+            route = getattr(scope.get("route"), "path", None)
+            server_span.name = f"{method} {route or 'unmatched'}"
+            server_span.set_attribute("http.route", route)
+            server_span.set_attribute("http.status_code", status["code"])
+            if status["code"] >= 500 and server_span.error is None:
+                server_span.error = f"HTTP {status['code']}"
+            end_span(server_span)
+
+
+def _client_span_attributes(request) -> dict:
+    # Только хост и путь: в строке запроса бывают ключи API и токены
+    return {"http.method": request.method, "server.address": request.url.host, "url.path": request.url.path}
+
+
+if httpx is not None:
+
+    class AsyncTracingTransport(httpx.AsyncBaseTransport):
+        """Транспорт httpx.AsyncClient: клиентский спан на запрос (до получения заголовков ответа)
+        и traceparent в заголовках."""
+
+        def __init__(self, transport: httpx.AsyncBaseTransport | None = None) -> None:
+            self._transport = transport or httpx.AsyncHTTPTransport()
+
+        async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+            with span(f"HTTP {request.method} {request.url.host}", CLIENT, **_client_span_attributes(request)) as current:
+                if current is not None:
+                    request.headers[TRACEPARENT] = current.traceparent
+                response = await self._transport.handle_async_request(request)
+                if current is not None:
+                    current.set_attribute("http.status_code", response.status_code)
+                return response
+
+        async def aclose(self) -> None:
+            await self._transport.aclose()
+
+    class TracingTransport(httpx.BaseTransport):
+        """То же для синхронного httpx.Client (задачи Celery)."""
+
+        def __init__(self, transport: httpx.BaseTransport | None = None) -> None:
+            self._transport = transport or httpx.HTTPTransport()
+
+        def handle_request(self, request: httpx.Request) -> httpx.Response:
+            with span(f"HTTP {request.method} {request.url.host}", CLIENT, **_client_span_attributes(request)) as current:
+                if current is not None:
+                    request.headers[TRACEPARENT] = current.traceparent
+                response = self._transport.handle_request(request)
+                if current is not None:
+                    current.set_attribute("http.status_code", response.status_code)
+                return response
+
+        def close(self) -> None:
+            self._transport.close()
+
+
+# Спаны задач Celery по task_id: открываются в task_prerun, закрываются в task_postrun
+_task_spans: dict[str, tuple[Span, object]] = {}
+_publish_spans: dict[str, Span] = {}
+
+
+def _before_task_publish(sender=None, headers=None, **_kwargs) -> None:
+    if headers is None:
+        return
+    producer = start_span(f"celery.publish {sender}", PRODUCER, attributes={"celery.task_name": sender})
+    if producer is None:
+        return
+    headers[TRACEPARENT] = producer.traceparent
+    task_id = headers.get("id")
+    if task_id:
+        _publish_spans[task_id] = producer
+    else:
+        end_span(producer)
+
+
+def _after_task_publish(headers=None, **_kwargs) -> None:
+    task_id = (headers or {}).get("id")
+    if task_id:
+        end_span(_publish_spans.pop(task_id, None))
+
+
+def _task_prerun(task_id=None, task=None, **_kwargs) -> None:
+    request = getattr(task, "request", None)
+    # Протокол 2: заголовки сообщения становятся атрибутами task.request
+    value = getattr(request, TRACEPARENT, None) or (getattr(request, "headers", None) or {}).get(TRACEPARENT)
+    consumer = start_span(
+        f"celery.task {task.name}",
+        CONSUMER,
+        parent=parse_traceparent(value),
+        attributes={"celery.task_name": task.name, "celery.task_id": task_id, "celery.retries": getattr(request, "retries", 0)},
+    )
+    if consumer is not None:
+        _task_spans[task_id] = (consumer, _current.set(consumer))
+
+
+def _task_failure(task_id=None, exception=None, **_kwargs) -> None:
+    entry = _task_spans.get(task_id)
+    if entry is not None and exception is not None:
+        entry[0].record_error(exception)
+
+
+def _task_postrun(task_id=None, state=None, **_kwargs) -> None:
+    entry = _task_spans.pop(task_id, None)
+    if entry is None:
+        return
+    consumer, token = entry
+    consumer.set_attribute("celery.state", state)
+    try:
+        _current.reset(token)
+    except ValueError:
+        _current.set(None)
+    end_span(consumer)
+
+
+def install_celery(service_name: str) -> None:
+    """Трассировка задач Celery процесса. При публикации в заголовки задачи пишется traceparent
+    (спан publish). Воркер продолжает трассу спаном задачи и включает экспорт как service_name."""
+    from celery import signals
+
+    signals.worker_init.connect(lambda **_kwargs: configure(service_name), weak=False)
+    signals.before_task_publish.connect(_before_task_publish, weak=False)
+    signals.after_task_publish.connect(_after_task_publish, weak=False)
+    signals.task_prerun.connect(_task_prerun, weak=False)
+    signals.task_failure.connect(_task_failure, weak=False)
+    signals.task_postrun.connect(_task_postrun, weak=False)